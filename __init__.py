@@ -46,7 +46,7 @@ from anki.hooks import addHook, wrap
 
 from aqt.qt import QAction, QMenu, QColorDialog, QMessageBox, QInputDialog, QLabel,\
    QPushButton, QDialog, QVBoxLayout, QComboBox, QHBoxLayout, QSpinBox, QCheckBox
-from aqt.qt import QKeySequence,QColor
+from aqt.qt import QKeySequence,QColor,QTimer
 from aqt.qt import pyqtSlot as slot
 
 # 导入语言模块
@@ -73,6 +73,13 @@ ts_auto_hide_pointer = True
 ts_default_small_canvas = False
 ts_zen_mode = False
 ts_follow = False
+ts_tiled_canvas = False
+ts_worker_canvas = False
+ts_low_latency = False
+ts_render_megapixels = 16.0
+ts_simplify_tolerance = 0.5
+ts_undo_memory = 32.0
+ts_bake_threshold = 0
 ts_ConvertDotStrokes = True
 
 ts_color = "#272828"
@@ -101,6 +108,10 @@ ts_default_Calligraphy = "false"
 
 # 添加全局变量跟踪当前是否显示卡片正面
 is_question_side = True
+# 当前复习页面是否带有绘图层，有则开关AnkiDraw时不必重新生成页面
+ts_layer_in_page = False
+# 笔迹加载请求的编号，每次显示问题或答案时递增，之前发出的加载请求随之作废
+stroke_load_generation = 0
 
 @slot()
 def ts_change_color():
@@ -132,7 +143,58 @@ def ts_change_opacity():
     value, accepted = QInputDialog.getDouble(mw, lang.get_text("dialog_ankidraw", "AnkiDraw"), lang.get_text("dialog_enter_opacity", "Enter the opacity (0 = transparent, 100 = opaque):"), 100 * ts_opacity, 0, 100, 2)
     if accepted:
         ts_opacity = value / 100
-        execute_js("canvas.style.opacity = " + str(ts_opacity))
+        # 主画布、分块、Worker画布和快照都使用同一个透明度变量
+        apply_live_settings()
+
+
+@slot()
+def ts_change_render_resolution():
+    """
+    Set the maximum canvas resolution (megapixels per layer) used for HiDPI rendering.
+    """
+    global ts_render_megapixels
+    value, accepted = QInputDialog.getDouble(mw, lang.get_text("dialog_ankidraw", "AnkiDraw"), lang.get_text("dialog_enter_render_megapixels", "Maximum canvas resolution in megapixels (0 = no limit):"), ts_render_megapixels, 0, 500, 1)
+    if accepted:
+        ts_render_megapixels = value
+        execute_js("renderMegapixelBudget = " + str(ts_render_megapixels) + ";")
+        execute_js("if (typeof resize === 'function') { resize(); }")
+
+
+@slot()
+def ts_change_simplify_tolerance():
+    """
+    Set the tolerance (pixels) used to simplify strokes when they are finished.
+    """
+    global ts_simplify_tolerance
+    value, accepted = QInputDialog.getDouble(mw, lang.get_text("dialog_ankidraw", "AnkiDraw"), lang.get_text("dialog_enter_simplify_tolerance", "Stroke simplification tolerance in pixels (0 = keep every point):"), ts_simplify_tolerance, 0, 10, 2)
+    if accepted:
+        ts_simplify_tolerance = value
+        execute_js("simplifyTolerance = " + str(ts_simplify_tolerance) + ";")
+
+
+@slot()
+def ts_change_undo_memory():
+    """
+    Set how much memory (megabytes) the undo/redo history may keep.
+    """
+    global ts_undo_memory
+    value, accepted = QInputDialog.getDouble(mw, lang.get_text("dialog_ankidraw", "AnkiDraw"), lang.get_text("dialog_enter_undo_memory", "Memory for undo history in megabytes (0 = no limit):"), ts_undo_memory, 0, 1024, 1)
+    if accepted:
+        ts_undo_memory = value
+        execute_js("undoMemoryLimit = " + str(ts_undo_memory) + "; if (typeof trim_undo_log === 'function') { trim_undo_log(); }")
+
+
+@slot()
+def ts_change_bake_threshold():
+    """
+    Set how many strokes from earlier reviews a card may keep as editable
+    strokes before they are baked into a background image (0 = never).
+    """
+    global ts_bake_threshold
+    value, accepted = QInputDialog.getInt(mw, lang.get_text("dialog_ankidraw", "AnkiDraw"), lang.get_text("dialog_enter_bake_threshold", "Bake strokes from earlier reviews into an image when a card has more than this many (0 = never):"), ts_bake_threshold, 0, 100000, 50)
+    if accepted:
+        ts_bake_threshold = value
+        execute_js("bakeStrokeThreshold = " + str(ts_bake_threshold) + ";")
 
 
 @slot()
@@ -315,60 +377,36 @@ class CustomDialog(QDialog):
             color_name = qcolor.name(QColor.HexArgb)
             self.color_label.setText(f"{lang.get_text('dialog_background_color', 'Background color:')} {color_name}")
 
-def get_css_for_toolbar_location(location, x_offset, y_offset, orient_column, canvas_width, canvas_height, background_color):
-    orient = "column" if orient_column else "row"
-    switch = {
-        0: f"""
-                        --button-bar-pt: {y_offset}px;
-                        --button-bar-pr: unset;
-                        --button-bar-pb: unset;
-                        --button-bar-pl: {x_offset}px;
-                        --button-bar-orientation: {orient};
-                        --small-canvas-height: {canvas_height};
-                        --small-canvas-width: {canvas_width};
-                        --background-color: {background_color};
-                    """,
-        1: f"""
-                        --button-bar-pt: {y_offset}px;
-                        --button-bar-pr: {x_offset}px;
-                        --button-bar-pb: unset;
-                        --button-bar-pl: unset;
-                        --button-bar-orientation: {orient};
-                        --small-canvas-height: {canvas_height};
-                        --small-canvas-width: {canvas_width};
-                        --background-color: {background_color};
-                    """,
-        2: f"""
-                        --button-bar-pt: unset;
-                        --button-bar-pr: unset;
-                        --button-bar-pb: {y_offset}px;
-                        --button-bar-pl: {x_offset}px;
-                        --button-bar-orientation: {orient};
-                        --small-canvas-height: {canvas_height};
-                        --small-canvas-width: {canvas_width};
-                        --background-color: {background_color};
-                    """,
-        3: f"""
-                        --button-bar-pt: unset;
-                        --button-bar-pr: {x_offset}px;
-                        --button-bar-pb: {y_offset}px;
-                        --button-bar-pl: unset;
-                        --button-bar-orientation: {orient};
-                        --small-canvas-height: {canvas_height};
-                        --small-canvas-width: {canvas_width};
-                        --background-color: {background_color};
-                    """,
+def get_toolbar_location_vars(location, x_offset, y_offset, orient_column, canvas_width, canvas_height, background_color):
+    """工具栏位置、小画布尺寸和背景色对应的CSS变量"""
+    if location not in (0, 1, 2, 3):
+        return {
+            "--button-bar-pt": "2px",
+            "--button-bar-pr": "2px",
+            "--button-bar-pb": "unset",
+            "--button-bar-pl": "unset",
+            "--button-bar-orientation": "column",
+            "--small-canvas-height": "500",
+            "--small-canvas-width": "500",
+            "--background-color": "#FFFFFF00",
+        }
+    # 0: 左上，1: 右上，2: 左下，3: 右下
+    right = location in (1, 3)
+    bottom = location in (2, 3)
+    return {
+        "--button-bar-pt": "unset" if bottom else f"{y_offset}px",
+        "--button-bar-pr": f"{x_offset}px" if right else "unset",
+        "--button-bar-pb": f"{y_offset}px" if bottom else "unset",
+        "--button-bar-pl": "unset" if right else f"{x_offset}px",
+        "--button-bar-orientation": "column" if orient_column else "row",
+        "--small-canvas-height": str(canvas_height),
+        "--small-canvas-width": str(canvas_width),
+        "--background-color": str(background_color),
     }
-    return switch.get(location, """
-                        --button-bar-pt: 2px;
-                        --button-bar-pr: 2px;
-                        --button-bar-pb: unset;
-                        --button-bar-pl: unset;
-                        --button-bar-orientation: column;
-                        --small-canvas-height: 500;
-                        --small-canvas-width: 500;
-                        --background-color: #FFFFFF00;
-                    """)
+
+def get_css_for_toolbar_location(location, x_offset, y_offset, orient_column, canvas_width, canvas_height, background_color):
+    css_vars = get_toolbar_location_vars(location, x_offset, y_offset, orient_column, canvas_width, canvas_height, background_color)
+    return "".join(f"{name}: {value};\n" for name, value in css_vars.items())
 
 def get_css_for_auto_hide(auto_hide, zen):
     return "none" if auto_hide or zen else "flex"
@@ -379,6 +417,20 @@ def get_css_for_zen_mode(hide):
 def get_css_for_auto_hide_pointer(auto_hide):
     return "none" if auto_hide else "default"
 
+def ts_live_settings():
+    """可以在页面中即时应用的设置，CSS变量覆盖样式表中页面生成时的值"""
+    css_vars = get_toolbar_location_vars(ts_location, ts_x_offset, ts_y_offset, ts_orient_vertical, ts_small_width, ts_small_height, ts_background_color)
+    css_vars["--ankidraw-opacity"] = str(ts_opacity)
+    css_vars["--ankidraw-toolbar-display"] = get_css_for_zen_mode(ts_zen_mode)
+    css_vars["--ankidraw-auto-hide-display"] = get_css_for_auto_hide(ts_auto_hide, ts_zen_mode)
+    css_vars["--ankidraw-pointer-cursor"] = get_css_for_auto_hide_pointer(ts_auto_hide_pointer)
+    return {"cssVars": css_vars, "smallCanvas": ts_default_small_canvas}
+
+def apply_live_settings():
+    """把设置应用到当前页面，不重新加载复习页面"""
+    import json
+    execute_js(f"if (typeof apply_live_settings === 'function') {{ apply_live_settings({json.dumps(ts_live_settings())}); }}")
+
 @slot()
 def ts_change_toolbar_settings():
     global ts_orient_vertical, ts_y_offset, ts_x_offset, ts_location, ts_small_width, ts_small_height, ts_background_color
@@ -395,8 +447,7 @@ def ts_change_toolbar_settings():
         ts_background_color = dialog.color_label.text()[-9:]
         ts_small_width = dialog.small_width_spin_box.value()
         ts_orient_vertical = dialog.checkbox2.isChecked()
-        ts_switch()
-        ts_switch()
+        apply_live_settings()
 
 
 def ts_save():
@@ -414,6 +465,13 @@ def ts_save():
     mw.pm.profile['ts_default_small_canvas'] = ts_default_small_canvas
     mw.pm.profile['ts_zen_mode'] = ts_zen_mode
     mw.pm.profile['ts_follow'] = ts_follow
+    mw.pm.profile['ts_tiled_canvas'] = ts_tiled_canvas
+    mw.pm.profile['ts_worker_canvas'] = ts_worker_canvas
+    mw.pm.profile['ts_low_latency'] = ts_low_latency
+    mw.pm.profile['ts_render_megapixels'] = ts_render_megapixels
+    mw.pm.profile['ts_simplify_tolerance'] = ts_simplify_tolerance
+    mw.pm.profile['ts_undo_memory'] = ts_undo_memory
+    mw.pm.profile['ts_bake_threshold'] = ts_bake_threshold
     mw.pm.profile['ts_location'] = ts_location
     mw.pm.profile['ts_x_offset'] = ts_x_offset
     mw.pm.profile['ts_y_offset'] = ts_y_offset
@@ -436,7 +494,7 @@ def ts_load():
     Load configuration from profile, set states of checkable menu objects
     and turn on night mode if it were enabled on previous session.
     """
-    global ts_state_on, ts_color, ts_profile_loaded, ts_line_width, ts_opacity, ts_ConvertDotStrokes, ts_auto_hide, ts_auto_hide_pointer, ts_default_small_canvas, ts_zen_mode, ts_follow, ts_orient_vertical, ts_y_offset, ts_x_offset, ts_location, ts_small_width, ts_small_height, ts_background_color, ts_line_color, ts_line_line_width, ts_rectangle_color, ts_rectangle_line_width
+    global ts_state_on, ts_color, ts_profile_loaded, ts_line_width, ts_opacity, ts_ConvertDotStrokes, ts_auto_hide, ts_auto_hide_pointer, ts_default_small_canvas, ts_zen_mode, ts_follow, ts_tiled_canvas, ts_worker_canvas, ts_low_latency, ts_render_megapixels, ts_simplify_tolerance, ts_undo_memory, ts_bake_threshold, ts_orient_vertical, ts_y_offset, ts_x_offset, ts_location, ts_small_width, ts_small_height, ts_background_color, ts_line_color, ts_line_line_width, ts_rectangle_color, ts_rectangle_line_width
     try:
         # 加载笔迹保存设置
         if 'ankidraw_save_strokes_enabled' in mw.pm.profile:
@@ -454,6 +512,14 @@ def ts_load():
         ts_default_small_canvas = mw.pm.profile['ts_default_small_canvas']
         ts_zen_mode = mw.pm.profile['ts_zen_mode']
         ts_follow = mw.pm.profile['ts_follow']
+        # 新增的设置使用默认值，避免旧配置缺少该键时重置所有设置
+        ts_tiled_canvas = mw.pm.profile.get('ts_tiled_canvas', False)
+        ts_worker_canvas = mw.pm.profile.get('ts_worker_canvas', False)
+        ts_low_latency = mw.pm.profile.get('ts_low_latency', False)
+        ts_render_megapixels = mw.pm.profile.get('ts_render_megapixels', 16.0)
+        ts_simplify_tolerance = mw.pm.profile.get('ts_simplify_tolerance', 0.5)
+        ts_undo_memory = mw.pm.profile.get('ts_undo_memory', 32.0)
+        ts_bake_threshold = mw.pm.profile.get('ts_bake_threshold', 0)
         ts_ConvertDotStrokes = bool(mw.pm.profile['ts_default_ConvertDotStrokes'])#fix for previously being a string value, defaults string value to true bool, will be saved as true or false bool after
         ts_orient_vertical = mw.pm.profile['ts_orient_vertical']
         ts_y_offset = mw.pm.profile['ts_y_offset']
@@ -493,6 +559,13 @@ def ts_load():
         ts_default_small_canvas = False
         ts_zen_mode = False
         ts_follow = False
+        ts_tiled_canvas = False
+        ts_worker_canvas = False
+        ts_low_latency = False
+        ts_render_megapixels = 16.0
+        ts_simplify_tolerance = 0.5
+        ts_undo_memory = 32.0
+        ts_bake_threshold = 0
         ts_ConvertDotStrokes = True
         ts_orient_vertical = True
         ts_y_offset = 2
@@ -525,9 +598,43 @@ def ts_load():
         assure_plugged_in()
 
 
-def execute_js(code):
+# 等待发送到页面的脚本，在本轮Qt事件循环结束时合并为一次eval发送
+pending_js = []
+js_flush_scheduled = False
+
+
+def execute_js(code, immediate=False):
+    """
+    Queue a script for the reviewer page. Scripts queued during one Qt
+    event-loop iteration are sent together, in order, as a single eval.
+    Pass immediate=True (or call flush_js()) when the script must reach the
+    page before control returns, e.g. before the page is reloaded.
+    """
+    global js_flush_scheduled
+    pending_js.append(code)
+    if immediate:
+        flush_js()
+    elif not js_flush_scheduled:
+        js_flush_scheduled = True
+        QTimer.singleShot(0, flush_js)
+
+
+def flush_js():
+    """Send all queued scripts to the reviewer page now."""
+    global js_flush_scheduled
+    js_flush_scheduled = False
+    if not pending_js:
+        return
+    scripts = pending_js[:]
+    del pending_js[:]
     web_object = mw.reviewer.web
-    web_object.eval(code)
+    if len(scripts) == 1:
+        web_object.eval(scripts[0])
+        return
+    import json
+    # 每段脚本单独以全局作用域执行，一段出错(包括语法错误)不影响后面的脚本
+    web_object.eval("[" + ",".join(json.dumps(code) for code in scripts) + "].forEach(function(code) {"
+                    " try { (0, eval)(code); } catch (e) { console.error('AnkiDraw Error: 执行脚本出错', e); } });")
 
 
 # 修改bridge_command函数，添加处理正面/全部笔迹的命令
@@ -617,6 +724,88 @@ def bridge_command(cmd):
             import traceback
             traceback.print_exc()
             
+    elif cmd.startswith("ankidraw:patch_strokes:"):
+        # 格式: ankidraw:patch_strokes:[cardId]:[front|all]:[patchData]
+        if not stroke_manager.get_save_strokes_enabled():
+            print("Debug - 笔迹补丁: 笔迹保存功能已禁用，跳过保存")
+            return
+        try:
+            parts = cmd.split(":", 4)
+            if len(parts) >= 5:
+                card_id, front = parts[2], parts[3] == "front"
+                if not stroke_storage.patch_stroke_data(card_id, front, parts[4]):
+                    # 文件与页面不一致，请页面发送完整数据
+                    import json
+                    execute_js(f"if (typeof request_full_stroke_save === 'function') {{ request_full_stroke_save({json.dumps(str(card_id))}, {str(front).lower()}); }}")
+        except Exception as e:
+            print(f"应用笔迹补丁时出错: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    elif cmd.startswith("ankidraw:save_baked_strokes:"):
+        # 格式: ankidraw:save_baked_strokes:[cardId]:[front|all]:[bakedData]
+        if not stroke_manager.get_save_strokes_enabled():
+            print("Debug - 保存底图: 笔迹保存功能已禁用，跳过保存")
+            return
+        try:
+            parts = cmd.split(":", 4)
+            if len(parts) >= 5:
+                card_id, front = parts[2], parts[3] == "front"
+                success = stroke_storage.save_baked_stroke_data(card_id, front, parts[4])
+                print(f"Debug - 保存底图: {'成功' if success else '失败'}")
+                if success:
+                    # 底图和存档已写入，页面这时才移除被合并的矢量笔画
+                    import json
+                    execute_js(f"if (typeof commit_bake === 'function') {{ commit_bake({json.dumps(str(card_id))}, {str(front).lower()}); }}")
+        except Exception as e:
+            print(f"保存底图数据时出错: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    elif cmd.startswith("ankidraw:load_baked_strokes:"):
+        # 格式: ankidraw:load_baked_strokes:[cardId]
+        try:
+            card_id = cmd.split(":", 2)[2]
+            if is_stale_stroke_load(card_id, None, is_question_side):
+                return
+            baked = stroke_storage.load_baked_stroke_data(card_id, is_question_side)
+            if baked:
+                import json
+                # 只发送图片和位置，矢量存档在恢复时才需要
+                layer = {key: baked[key] for key in ('image', 'left', 'top', 'width', 'height')}
+                execute_js(f"show_baked_layer({json.dumps(str(card_id))}, {json.dumps(json.dumps(layer))});")
+        except Exception as e:
+            print(f"加载底图数据时出错: {e}")
+    
+    elif cmd.startswith("ankidraw:delete_baked_strokes:"):
+        # 格式: ankidraw:delete_baked_strokes:[cardId]:[front|all]，旧格式没有正反面
+        try:
+            parts = cmd.split(":")
+            front = parts[3] == "front" if len(parts) > 3 else is_question_side
+            stroke_storage.delete_baked_stroke_data(parts[2], front)
+        except Exception as e:
+            print(f"删除底图数据时出错: {e}")
+    
+    elif cmd.startswith("ankidraw:save_ink_snapshot:"):
+        # 格式: ankidraw:save_ink_snapshot:[cardId]:[front|all]:[snapshotData]
+        if not stroke_manager.get_save_strokes_enabled():
+            return
+        try:
+            parts = cmd.split(":", 4)
+            if len(parts) >= 5:
+                stroke_storage.save_stroke_snapshot(parts[2], parts[3] == "front", parts[4])
+        except Exception as e:
+            print(f"保存快照时出错: {e}")
+    
+    elif cmd.startswith("ankidraw:delete_ink_snapshot:"):
+        # 格式: ankidraw:delete_ink_snapshot:[cardId]:[front|all]
+        try:
+            parts = cmd.split(":")
+            if len(parts) >= 4:
+                stroke_storage.delete_stroke_snapshot(parts[2], parts[3] == "front")
+        except Exception as e:
+            print(f"删除快照时出错: {e}")
+    
     elif cmd.startswith("ankidraw:restore_front_window_size:"):
         # 格式: ankidraw:restore_front_window_size:[cardId]:[dpr]:[osType]
         try:
@@ -801,10 +990,13 @@ def bridge_command(cmd):
             traceback.print_exc()
     
     elif cmd.startswith("ankidraw:load_front_strokes:"):
-        # 格式: ankidraw:load_front_strokes:[cardId]
+        # 格式: ankidraw:load_front_strokes:[cardId]:[generation]
         try:
-            card_id = cmd.split(":", 2)[2]
+            card_id, generation = parse_stroke_load_command(cmd)
             print(f"Debug - 加载正面笔迹: 请求卡片ID={card_id}")
+            if is_stale_stroke_load(card_id, generation, True):
+                print(f"Debug - 加载正面笔迹: 请求已过期，跳过 卡片ID={card_id}, 编号={generation}")
+                return
             stroke_data = stroke_storage.load_front_stroke_data(card_id)
             
             if stroke_data:
@@ -812,17 +1004,20 @@ def bridge_command(cmd):
                 # 转义JSON字符串，确保安全传递
                 stroke_data = stroke_data.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
                 # 将笔迹数据发送回JavaScript
-                execute_js(f'load_saved_strokes("{stroke_data}", true);') # true表示是正面笔迹
+                execute_js(f'load_saved_strokes("{stroke_data}", true, {js_generation(generation)});') # true表示是正面笔迹
             else:
                 print(f"Debug - 加载正面笔迹: 未找到笔迹数据")
         except Exception as e:
             print(f"加载正面笔迹数据时出错: {e}")
     
     elif cmd.startswith("ankidraw:load_all_strokes:"):
-        # 格式: ankidraw:load_all_strokes:[cardId]
+        # 格式: ankidraw:load_all_strokes:[cardId]:[generation]
         try:
-            card_id = cmd.split(":", 2)[2]
+            card_id, generation = parse_stroke_load_command(cmd)
             print(f"Debug - 加载全部笔迹: 请求卡片ID={card_id}")
+            if is_stale_stroke_load(card_id, generation, False):
+                print(f"Debug - 加载全部笔迹: 请求已过期，跳过 卡片ID={card_id}, 编号={generation}")
+                return
             stroke_data = stroke_storage.load_all_stroke_data(card_id)
             
             if stroke_data:
@@ -830,7 +1025,7 @@ def bridge_command(cmd):
                 # 转义JSON字符串，确保安全传递
                 stroke_data = stroke_data.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
                 # 将笔迹数据发送回JavaScript
-                execute_js(f'load_saved_strokes("{stroke_data}", false);') # false表示不只是正面笔迹
+                execute_js(f'load_saved_strokes("{stroke_data}", false, {js_generation(generation)});') # false表示不只是正面笔迹
             else:
                 print(f"Debug - 加载全部笔迹: 未找到笔迹数据")
         except Exception as e:
@@ -841,6 +1036,9 @@ def bridge_command(cmd):
         try:
             card_id = cmd.split(":", 2)[2]
             print(f"Debug - 兼容模式加载笔迹: 请求卡片ID={card_id}")
+            if is_stale_stroke_load(card_id, None, is_question_side):
+                print(f"Debug - 兼容模式加载笔迹: 卡片已切换，跳过 卡片ID={card_id}")
+                return
             
             # 根据当前显示的是正面还是背面，加载不同的笔迹
             if is_question_side:
@@ -896,15 +1094,47 @@ def assure_plugged_in():
         mw.reviewer.revHtml = custom
 
 def resize_js():
-    execute_js("if (typeof resize === 'function') { setTimeout(resize, 101); }");
+    # 画布尺寸由页面中的观察器维护，这里只请求在下一帧检查一次
+    execute_js("if (typeof schedule_resize === 'function') { schedule_resize(); }");
     
 def clear_blackboard():
     assure_plugged_in()
 
     if ts_state_on:
         execute_js("if (typeof clear_canvas === 'function') { clear_canvas(); }")
-        # is qFade the reason for having to wait?
-        execute_js("if (typeof resize === 'function') { setTimeout(resize, 101); }");
+        execute_js("if (typeof schedule_resize === 'function') { schedule_resize(); }");
+
+def show_stroke_snapshot(card_id, front):
+    """在发送矢量笔迹之前先显示这一面的笔迹快照"""
+    snapshot = stroke_storage.load_stroke_snapshot(card_id, front)
+    if not snapshot:
+        return
+    import json
+    execute_js(f"if (typeof show_ink_snapshot === 'function') {{ show_ink_snapshot({json.dumps(str(card_id))}, {str(front).lower()}, {json.dumps(snapshot)}); }}")
+
+def next_stroke_load_generation():
+    """开始加载新一面的笔迹，返回新的请求编号"""
+    global stroke_load_generation
+    stroke_load_generation += 1
+    return stroke_load_generation
+
+def parse_stroke_load_command(cmd):
+    """从 ankidraw:load_*_strokes:[cardId]:[generation] 中取出卡片ID和请求编号，旧格式没有编号"""
+    parts = cmd.split(":")
+    generation = int(parts[3]) if len(parts) > 3 and parts[3].isdigit() else None
+    return parts[2], generation
+
+def is_stale_stroke_load(card_id, generation, front):
+    """加载请求是否已被之后的请求取代：编号不是最新的，或者卡片、正反面已经切换"""
+    if generation is None:
+        # 页面自己发出的旧格式请求，只检查卡片
+        current = get_current_card_id()
+        return current is not None and str(card_id) != str(current)
+    return (generation != stroke_load_generation or front != is_question_side or
+            str(card_id) != str(get_current_card_id()))
+
+def js_generation(generation):
+    return "undefined" if generation is None else str(generation)
 
 def get_current_card_id():
     """获取当前正在复习的卡片ID"""
@@ -921,6 +1151,8 @@ def load_card_strokes():
     """清空画布并加载当前卡片正面的笔迹"""
     global is_question_side
     is_question_side = True
+    # 之前的加载请求作废
+    generation = next_stroke_load_generation()
     
     # 首先清空画布
     clear_blackboard()
@@ -934,8 +1166,11 @@ def load_card_strokes():
     if not card_id:
         return
         
-    # 使用JavaScript获取并加载正面笔迹数据
-    execute_js(f"if (typeof pycmd === 'function') {{ pycmd('ankidraw:load_front_strokes:{card_id}'); }}")
+    # 页面记下卡片和请求编号，之后收到的旧请求的笔迹不再解析
+    execute_js(f"if (typeof begin_stroke_load === 'function') {{ begin_stroke_load('{card_id}', true, {generation}); }}")
+    # 先显示快照，再获取并加载正面笔迹数据
+    show_stroke_snapshot(card_id, True)
+    execute_js(f"if (typeof pycmd === 'function') {{ pycmd('ankidraw:load_front_strokes:{card_id}:{generation}'); }}")
     # 调整画布大小
     resize_js()
 
@@ -944,6 +1179,8 @@ def load_answer_strokes():
     """加载当前卡片的所有笔迹（包括背面）"""
     global is_question_side
     is_question_side = False
+    # 之前的加载请求作废
+    generation = next_stroke_load_generation()
     
     # 检查AnkiDraw是否开启
     if not ts_state_on:
@@ -971,9 +1208,10 @@ def load_answer_strokes():
             # 确保两者都有预期的结构
             if (isinstance(front_data, dict) and isinstance(all_data, dict) and
                 'arrays_of_points' in front_data and 'arrays_of_points' in all_data and
-                'line_type_history' in front_data and 'line_type_history' in all_data):
+                'line_type_history' in front_data and 'line_type_history' in all_data and
+                not front_data.get('baked') and not all_data.get('baked')):
                 
-                # 合并笔迹数据
+                # 合并笔迹数据(有底图时笔画数不能反映内容，不合并)
                 all_data['arrays_of_points'] = front_data['arrays_of_points'] + all_data['arrays_of_points']
                 all_data['line_type_history'] = front_data['line_type_history'] + all_data['line_type_history']
                 
@@ -990,8 +1228,11 @@ def load_answer_strokes():
             import traceback
             traceback.print_exc()
     
-    # 使用JavaScript获取并加载全部笔迹数据
-    execute_js(f"if (typeof pycmd === 'function') {{ pycmd('ankidraw:load_all_strokes:{card_id}'); }}")
+    # 正面的快照状态不适用于背面；先显示快照，再获取并加载全部笔迹数据
+    execute_js("if (typeof reset_ink_snapshot === 'function') { reset_ink_snapshot(); }")
+    execute_js(f"if (typeof begin_stroke_load === 'function') {{ begin_stroke_load('{card_id}', false, {generation}); }}")
+    show_stroke_snapshot(card_id, False)
+    execute_js(f"if (typeof pycmd === 'function') {{ pycmd('ankidraw:load_all_strokes:{card_id}:{generation}'); }}")
     # 调整画布大小
     resize_js()
 
@@ -1052,37 +1293,77 @@ def delayed_menu_setup():
         ts_menu_small_default.setChecked(ts_default_small_canvas)
         ts_menu_zen_mode.setChecked(ts_zen_mode)
         ts_menu_follow.setChecked(ts_follow)
-
+        ts_menu_tiled_canvas.setChecked(ts_tiled_canvas)
+        ts_menu_worker_canvas.setChecked(ts_worker_canvas)
+        ts_menu_low_latency.setChecked(ts_low_latency)
+
+
+
+# 注入到网页端的本地化字符串及其英文默认值
+JS_STRING_KEYS = {
+    "eraser_size": "Eraser Size",
+    "eraser_box_selection": "Box Selection",
+    "eraser_precision": "Erase Partially",
+    "line_style": "Line Style",
+    "line_style_solid": "Solid",
+    "line_style_dashed": "Dashed",
+    "line_style_wavy": "Wavy",
+    "tooltip_toggle_visibility": "Toggle visiblity (, comma)",
+    "tooltip_toggle_eraser": "Toggle Eraser (Alt + Q)",
+    "tooltip_line_tool": "Line Tool (Alt + L)",
+    "tooltip_rectangle_tool": "Rectangle Tool (Alt + R)",
+    "tooltip_perfect_freehand": "Perfect Freehand (Alt + x)",
+    "tooltip_toggle_calligrapher": "Toggle calligrapher (Alt + c)",
+    "tooltip_undo_last_stroke": "Undo the last stroke (Alt + z, redo: Alt + y)",
+    "tooltip_clean_canvas": "Clean canvas (. dot)",
+    "tooltip_toggle_fullscreen": "Toggle fullscreen canvas(Alt + b)",
+    "tooltip_restore_window_size": "Restore to writing window size",
+}
+
+# 按语言代码缓存的字符串表，每种语言只生成一次
+_js_string_tables = {}
+
+# 模板文件内容缓存，模板与语言无关，只需读取一次
+_template_cache = {}
+
+
+def read_template(name):
+    """读取templates目录下的模板文件，结果会被缓存"""
+    content = _template_cache.get(name)
+    if content is None:
+        import os
+        addon_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(addon_dir, "templates", name), "r", encoding="utf-8") as f:
+            content = f.read()
+        _template_cache[name] = content
+    return content
+
+
+def get_js_string_table():
+    """
+    获取当前语言的网页端字符串表(JSON)。
+    JS通过ankidraw_text()读取其中的文本，因此脚本本身与语言无关。
+    """
+    lang_code = lang.current_language
+    table = _js_string_tables.get(lang_code)
+    if table is None:
+        import json
+        strings = {key: lang.get_text(key, default) for key, default in JS_STRING_KEYS.items()}
+        # 防止字符串中出现</script>提前结束脚本标签
+        table = json.dumps(strings, ensure_ascii=False).replace("</", "<\\/")
+        _js_string_tables[lang_code] = table
+    return table
 
 
 def blackboard():
     """
     Load and return the HTML, CSS and JS required for the AnkiDraw functionality.
     """
-    import os
-    
-    # 获取插件目录路径
-    addon_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # 读取HTML文件
-    html_path = os.path.join(addon_dir, "templates", "blackboard.html")
-    with open(html_path, "r", encoding="utf-8") as f:
-        html_content = f.read()
-    
-    # 读取CSS文件
-    css_path = os.path.join(addon_dir, "templates", "blackboard.css")
-    with open(css_path, "r", encoding="utf-8") as f:
-        css_content = f.read()
-    
-    # 读取JS文件
-    js_path = os.path.join(addon_dir, "templates", "blackboard.js")
-    with open(js_path, "r", encoding="utf-8") as f:
-        js_content = f.read()
-    
-    # 读取橡皮擦JS文件
-    eraser_js_path = os.path.join(addon_dir, "templates", "eraser.js")
-    with open(eraser_js_path, "r", encoding="utf-8") as f:
-        eraser_js_content = f.read()
+    html_content = read_template("blackboard.html")
+    css_content = read_template("blackboard.css")
+    js_content = read_template("blackboard.js")
+    hotkeys_js_content = read_template("hotkeys.js")
+    eraser_js_content = read_template("eraser.js")
     
     # 获取额外的JavaScript代码，用于在每次卡片显示时获取卡片ID
     card_id_js = """
@@ -1158,31 +1439,28 @@ def blackboard():
     js_content = js_content.replace('/*CONVERT_DOT_STROKES_PLACEHOLDER*/', str(ts_ConvertDotStrokes).lower())
     js_content = js_content.replace('/*SMALL_CANVAS_PLACEHOLDER*/', str(ts_default_small_canvas).lower())
     js_content = js_content.replace('/*FOLLOW_PLACEHOLDER*/', str(ts_follow).lower())
+    js_content = js_content.replace('/*MAX_MEGAPIXELS_PLACEHOLDER*/', str(ts_render_megapixels))
+    js_content = js_content.replace('/*LOW_LATENCY_PLACEHOLDER*/', str(ts_low_latency).lower())
+    js_content = js_content.replace('/*SIMPLIFY_TOLERANCE_PLACEHOLDER*/', str(ts_simplify_tolerance))
+    stroke_store_js_content = read_template("stroke_store.js")
+    stroke_index_js_content = read_template("stroke_index.js")
+    undo_log_js_content = read_template("undo_log.js").replace('/*UNDO_MEMORY_PLACEHOLDER*/', str(ts_undo_memory))
+    checkpoints_js_content = read_template("layer_checkpoints.js")
+    snapshot_js_content = read_template("ink_snapshot.js")
+    drawing_layer_js_content = read_template("drawing_layer.js")
+    baking_js_content = read_template("stroke_baking.js").replace('/*BAKE_THRESHOLD_PLACEHOLDER*/', str(ts_bake_threshold))
+    tiles_js_content = read_template("canvas_tiles.js").replace('/*TILED_CANVAS_PLACEHOLDER*/', str(ts_tiled_canvas).lower())
+    import json
+    worker_js_content = read_template("canvas_worker.js").replace('/*WORKER_CANVAS_PLACEHOLDER*/', str(ts_worker_canvas).lower())
+    # Worker脚本作为字符串嵌入，由页面通过Blob启动
+    worker_js_content = worker_js_content.replace('/*INK_WORKER_SOURCE_PLACEHOLDER*/',
+                                                  json.dumps(read_template("ink_worker.js")).replace("</", "<\\/"))
     
     # 将获取卡片ID和加载笔迹的代码添加到JS代码末尾
     js_content = js_content + card_id_js
     
-    # 替换eraser.js中的"Eraser Size"文本
-    eraser_js_content = eraser_js_content.replace('sliderTitle.textContent = \'Eraser Size\';', 
-                                                 f'sliderTitle.textContent = \'{lang.get_text("eraser_size", "Eraser Size")}\';')
-    
-    # 替换eraser.js中的"Box Selection"文本
-    eraser_js_content = eraser_js_content.replace('label.textContent = \'Box Selection\';', 
-                                                 f'label.textContent = \'{lang.get_text("eraser_box_selection", "Box Selection")}\';')
-    
-    # 替换blackboard.js中的直线样式文本
-    js_content = js_content.replace('sliderTitle.textContent = \'Line Style\';', 
-                                   f'sliderTitle.textContent = \'{lang.get_text("line_style", "Line Style")}\';')
-    js_content = js_content.replace('text.textContent = \'Solid\';', 
-                                   f'text.textContent = \'{lang.get_text("line_style_solid", "Solid")}\';')
-    js_content = js_content.replace('text.textContent = \'Dashed\';', 
-                                   f'text.textContent = \'{lang.get_text("line_style_dashed", "Dashed")}\';')
-    js_content = js_content.replace('text.textContent = \'Wavy\';', 
-                                   f'text.textContent = \'{lang.get_text("line_style_wavy", "Wavy")}\';')
-    
     # 替换HTML文件中的橡皮擦图标SVG代码
-    with open(os.path.join(addon_dir, "templates", "eraser_icon.svg"), "r", encoding="utf-8") as f:
-        eraser_svg = f.read()
+    eraser_svg = read_template("eraser_icon.svg")
     html_content = html_content.replace('<!-- ERASER_ICON_SVG_PLACEHOLDER -->', eraser_svg)
     
     # 添加恢复窗口大小按钮的JavaScript函数
@@ -1214,29 +1492,6 @@ def blackboard():
     # 将恢复窗口大小函数添加到JS内容中
     js_content = js_content + restore_window_js
     
-    # 替换HTML文件中的工具栏按钮提示文本，实现多语言支持
-    html_content = html_content.replace('title="Toggle visiblity (, comma)"', 
-                                       f'title="{lang.get_text("tooltip_toggle_visibility", "Toggle visiblity (, comma)")}"')
-    html_content = html_content.replace('title="Toggle Eraser (Alt + Q)"', 
-                                       f'title="{lang.get_text("tooltip_toggle_eraser", "Toggle Eraser (Alt + Q)")}"')
-    html_content = html_content.replace('title="Line Tool (Alt + L)"', 
-                                       f'title="{lang.get_text("tooltip_line_tool", "Line Tool (Alt + L)")}"')
-    html_content = html_content.replace('title="Rectangle Tool (Alt + R)"', 
-                                       f'title="{lang.get_text("tooltip_rectangle_tool", "Rectangle Tool (Alt + R)")}"')
-    html_content = html_content.replace('title="Perfect Freehand (Alt + x)"', 
-                                       f'title="{lang.get_text("tooltip_perfect_freehand", "Perfect Freehand (Alt + x)")}"')
-    html_content = html_content.replace('title="Toggle calligrapher (Alt + c)"', 
-                                       f'title="{lang.get_text("tooltip_toggle_calligrapher", "Toggle calligrapher (Alt + c)")}"')
-    html_content = html_content.replace('title="Undo the last stroke (Alt + z)"', 
-                                       f'title="{lang.get_text("tooltip_undo_last_stroke", "Undo the last stroke (Alt + z)")}"')
-    html_content = html_content.replace('title="Clean canvas (. dot)"', 
-                                       f'title="{lang.get_text("tooltip_clean_canvas", "Clean canvas (. dot)")}"')
-    html_content = html_content.replace('title="Toggle fullscreen canvas(Alt + b)"', 
-                                       f'title="{lang.get_text("tooltip_toggle_fullscreen", "Toggle fullscreen canvas(Alt + b)")}"')
-    # 添加窗口大小按钮的多语言支持
-    html_content = html_content.replace('title="Restore to writing window size"', 
-                                       f'title="{lang.get_text("tooltip_restore_window_size", "Restore to writing window size")}"')
-    
     # 构建完整的HTML，确保eraser.js在主JS之前加载
     return f"""
 <style>
@@ -1246,12 +1501,47 @@ def blackboard():
 {html_content}
 
 <script>
-// 先加载eraser.js内容
+// 当前语言的界面文本
+var ankidraw_strings = {get_js_string_table()};
+</script>
+
+<script>
+// 键盘快捷键分发，其他模块加载时登记快捷键
+{hotkeys_js_content}
+
+// 再加载eraser.js内容
 {eraser_js_content}
 
 // 设置保存的橡皮擦大小
 updateEraserSize({eraser.eraser_size});
 
+// 笔画存储
+{stroke_store_js_content}
+
+// 笔画空间索引
+{stroke_index_js_content}
+
+// 撤销/重做日志
+{undo_log_js_content}
+
+// 分块画布
+{tiles_js_content}
+
+// 已提交图层的检查点
+{checkpoints_js_content}
+
+// 旧笔迹合并为底图
+{baking_js_content}
+
+// 打开卡片时先显示的笔迹快照
+{snapshot_js_content}
+
+// 后台线程绘制
+{worker_js_content}
+
+// 绘图层的显示/隐藏和设置的即时应用
+{drawing_layer_js_content}
+
 // 再加载主JS
 {js_content}
 </script>
@@ -1259,8 +1549,9 @@ updateEraserSize({eraser.eraser_size});
 
 
 def custom(*args, **kwargs):
-    global ts_state_on
+    global ts_state_on, ts_layer_in_page
     default = ts_default_review_html(*args, **kwargs)
+    ts_layer_in_page = ts_state_on
     if not ts_state_on:
         return default
     output = (
@@ -1340,8 +1631,7 @@ def ts_change_auto_hide_settings():
     """
     global ts_auto_hide
     ts_auto_hide = not ts_auto_hide
-    ts_switch()
-    ts_switch()
+    apply_live_settings()
 
 @slot()
 def ts_change_follow_settings():
@@ -1353,6 +1643,36 @@ def ts_change_follow_settings():
     execute_js("fullscreen_follow = " + str(ts_follow).lower() + ";")
     execute_js("if (typeof resize === 'function') { resize(); }")
 
+@slot()
+def ts_change_tiled_canvas_settings():
+    """
+    Switch tiled canvas for long cards.
+    """
+    global ts_tiled_canvas
+    ts_tiled_canvas = not ts_tiled_canvas
+    # 画布的创建方式随之改变，需要重新生成页面
+    reload_current_screen()
+
+@slot()
+def ts_change_worker_canvas_settings():
+    """
+    Switch rendering of finished strokes in a background worker.
+    """
+    global ts_worker_canvas
+    ts_worker_canvas = not ts_worker_canvas
+    # 画布的创建方式随之改变，需要重新生成页面
+    reload_current_screen()
+
+@slot()
+def ts_change_low_latency_settings():
+    """
+    Switch low-latency ink (coalesced and predicted pointer events).
+    """
+    global ts_low_latency
+    ts_low_latency = not ts_low_latency
+    # 画布的创建方式随之改变，需要重新生成页面
+    reload_current_screen()
+
 @slot()
 def ts_change_small_default_settings():
     """
@@ -1360,8 +1680,7 @@ def ts_change_small_default_settings():
     """
     global ts_default_small_canvas
     ts_default_small_canvas = not ts_default_small_canvas
-    ts_switch()
-    ts_switch()
+    apply_live_settings()
 
 @slot()
 def ts_change_zen_mode_settings():
@@ -1370,8 +1689,7 @@ def ts_change_zen_mode_settings():
     """
     global ts_zen_mode
     ts_zen_mode = not ts_zen_mode
-    ts_switch()
-    ts_switch()
+    apply_live_settings()
     
 @slot()
 def ts_change_auto_hide_pointer_settings():
@@ -1380,8 +1698,7 @@ def ts_change_auto_hide_pointer_settings():
     """
     global ts_auto_hide_pointer
     ts_auto_hide_pointer = not ts_auto_hide_pointer
-    ts_switch()
-    ts_switch()
+    apply_live_settings()
       
 
 @slot()
@@ -1395,8 +1712,30 @@ def ts_switch():
     else:
         ts_on()
 
+    if mw.state == "review" and ts_layer_in_page:
+        # 页面中已有绘图层，直接显示或隐藏
+        set_drawing_layer_attached(ts_state_on)
+        return
+
+    reload_current_screen()
 
-    # Reload current screen.
+def set_drawing_layer_attached(attached):
+    """在当前复习页面中显示或隐藏绘图层"""
+    if not attached:
+        execute_js("if (typeof detach_drawing_layer === 'function') { detach_drawing_layer(); }")
+        return
+    execute_js("if (typeof attach_drawing_layer === 'function') { attach_drawing_layer(); }")
+    # 关闭期间修改的设置和切换的卡片都要同步到页面
+    apply_live_settings()
+    if mw.reviewer.state == "answer":
+        load_answer_strokes()
+    else:
+        load_card_strokes()
+
+def reload_current_screen():
+    """重新生成当前页面"""
+    # 先把排队的脚本发送到当前页面，重新加载后的页面不应收到它们
+    flush_js()
 
     if mw.state == "review":
         #mw.moveToState('overview')
@@ -1410,7 +1749,7 @@ def ts_setup_menu():
     """
     Initialize menu. 
     """
-    global ts_menu_switch, ts_menu_auto_hide, ts_menu_auto_hide_pointer, ts_menu_small_default, ts_menu_zen_mode, ts_menu_follow, ts_menu_eraser, ts_menu_line, ts_menu_line_color, ts_menu_line_width, ts_menu_rectangle, ts_menu_rectangle_color, ts_menu_rectangle_width, ts_menu_toolbar_control, ts_menu_language, ts_menu_clear_all_strokes, ts_menu_stroke_manager, ts_menu_toolbar_settings, ts_menu_restore_window_size, ts_menu_hotkey_config
+    global ts_menu_switch, ts_menu_auto_hide, ts_menu_auto_hide_pointer, ts_menu_small_default, ts_menu_zen_mode, ts_menu_follow, ts_menu_tiled_canvas, ts_menu_worker_canvas, ts_menu_low_latency, ts_menu_eraser, ts_menu_line, ts_menu_line_color, ts_menu_line_width, ts_menu_rectangle, ts_menu_rectangle_color, ts_menu_rectangle_width, ts_menu_toolbar_control, ts_menu_language, ts_menu_clear_all_strokes, ts_menu_stroke_manager, ts_menu_unbake_strokes, ts_menu_toolbar_settings, ts_menu_restore_window_size, ts_menu_hotkey_config
     
     # 确保工具栏配置已加载
     toolbar_control.load_toolbar_config()
@@ -1432,11 +1771,18 @@ def ts_setup_menu():
     ts_menu_auto_hide = QAction(lang.get_text("menu_auto_hide_toolbar", "Auto &hide toolbar when drawing"), mw, checkable=True)
     ts_menu_auto_hide_pointer = QAction(lang.get_text("menu_auto_hide_pointer", "Auto &hide pointer when drawing"), mw, checkable=True)
     ts_menu_follow = QAction(lang.get_text("menu_follow_when_scrolling", "&Follow when scrolling (faster on big cards)"), mw, checkable=True)
+    ts_menu_tiled_canvas = QAction(lang.get_text("menu_tiled_canvas", "&Tiled canvas (less memory on long cards)"), mw, checkable=True)
+    ts_menu_worker_canvas = QAction(lang.get_text("menu_worker_canvas", "Render ink in a background &worker"), mw, checkable=True)
+    ts_menu_low_latency = QAction(lang.get_text("menu_low_latency", "Low-latency &ink (stylus)"), mw, checkable=True)
     ts_menu_small_default = QAction(lang.get_text("menu_small_canvas_default", "&Small Canvas by default"), mw, checkable=True)
     ts_menu_zen_mode = QAction(lang.get_text("menu_enable_zen_mode", "Enable Zen Mode(hide toolbar until this is disabled)"), mw, checkable=True)
     ts_menu_color = QAction(lang.get_text("menu_set_pen_color", "Set &pen color"), mw)
     ts_menu_width = QAction(lang.get_text("menu_set_pen_width", "Set pen &width"), mw)
     ts_menu_opacity = QAction(lang.get_text("menu_set_pen_opacity", "Set pen &opacity"), mw)
+    ts_menu_simplify = QAction(lang.get_text("menu_set_simplify_tolerance", "Set stroke &simplification"), mw)
+    ts_menu_undo_memory = QAction(lang.get_text("menu_undo_memory", "Set &undo history memory"), mw)
+    ts_menu_bake_threshold = QAction(lang.get_text("menu_bake_threshold", "Bake &old strokes into an image"), mw)
+    ts_menu_render_resolution = QAction(lang.get_text("menu_render_resolution", "Set canvas &resolution limit"), mw)
     ts_menu_toolbar_settings = QAction(lang.get_text("menu_toolbar_canvas_location", "&Toolbar and canvas location settings"), mw)
     
     # 新增恢复窗口大小菜单项
@@ -1447,6 +1793,10 @@ def ts_setup_menu():
     ts_menu_stroke_manager = QAction(lang.get_text("menu_stroke_management", "Pen Trace Management"), mw)
     ts_menu_stroke_manager.triggered.connect(stroke_manager.show_stroke_manager)
     
+    # 把当前卡片合并到底图的笔画恢复为矢量笔画
+    ts_menu_unbake_strokes = QAction(lang.get_text("menu_unbake_strokes", "Unbake Strokes on This Card"), mw)
+    ts_menu_unbake_strokes.triggered.connect(ts_unbake_current_card)
+    
     # 添加快捷键设置菜单项
     ts_menu_hotkey_config = QAction(lang.get_text("menu_hotkey_config", "自定义快捷键设置"), mw)
     ts_menu_hotkey_config.triggered.connect(hotkey_manager.show_hotkey_config_dialog)
@@ -1482,6 +1832,9 @@ def ts_setup_menu():
     ts_menu_auto_hide.setChecked(ts_auto_hide)
     ts_menu_auto_hide_pointer.setChecked(ts_auto_hide_pointer)
     ts_menu_follow.setChecked(ts_follow)
+    ts_menu_tiled_canvas.setChecked(ts_tiled_canvas)
+    ts_menu_worker_canvas.setChecked(ts_worker_canvas)
+    ts_menu_low_latency.setChecked(ts_low_latency)
     ts_menu_small_default.setChecked(ts_default_small_canvas)
     ts_menu_zen_mode.setChecked(ts_zen_mode)
     
@@ -1490,11 +1843,18 @@ def ts_setup_menu():
     ts_menu_auto_hide.triggered.connect(ts_change_auto_hide_settings)
     ts_menu_auto_hide_pointer.triggered.connect(ts_change_auto_hide_pointer_settings)
     ts_menu_follow.triggered.connect(ts_change_follow_settings)
+    ts_menu_tiled_canvas.triggered.connect(ts_change_tiled_canvas_settings)
+    ts_menu_worker_canvas.triggered.connect(ts_change_worker_canvas_settings)
+    ts_menu_low_latency.triggered.connect(ts_change_low_latency_settings)
     ts_menu_small_default.triggered.connect(ts_change_small_default_settings)
     ts_menu_zen_mode.triggered.connect(ts_change_zen_mode_settings)
     ts_menu_color.triggered.connect(ts_change_color)
     ts_menu_width.triggered.connect(ts_change_width)
     ts_menu_opacity.triggered.connect(ts_change_opacity)
+    ts_menu_simplify.triggered.connect(ts_change_simplify_tolerance)
+    ts_menu_render_resolution.triggered.connect(ts_change_render_resolution)
+    ts_menu_undo_memory.triggered.connect(ts_change_undo_memory)
+    ts_menu_bake_threshold.triggered.connect(ts_change_bake_threshold)
     ts_menu_line.triggered.connect(eraser.toggle_line_tool)
     ts_menu_line_color.triggered.connect(ts_change_line_color)
     ts_menu_line_width.triggered.connect(ts_change_line_width)
@@ -1514,6 +1874,12 @@ def ts_setup_menu():
     view_submenu.addAction(ts_menu_auto_hide)
     view_submenu.addAction(ts_menu_auto_hide_pointer)
     view_submenu.addAction(ts_menu_follow)
+    view_submenu.addAction(ts_menu_tiled_canvas)
+    view_submenu.addAction(ts_menu_worker_canvas)
+    view_submenu.addAction(ts_menu_low_latency)
+    view_submenu.addAction(ts_menu_render_resolution)
+    view_submenu.addAction(ts_menu_undo_memory)
+    view_submenu.addAction(ts_menu_bake_threshold)
     view_submenu.addAction(ts_menu_small_default)
     view_submenu.addAction(ts_menu_zen_mode)
     
@@ -1525,6 +1891,7 @@ def ts_setup_menu():
     pen_submenu.addAction(ts_menu_color)
     pen_submenu.addAction(ts_menu_width)
     pen_submenu.addAction(ts_menu_opacity)
+    pen_submenu.addAction(ts_menu_simplify)
     tool_submenu.addMenu(pen_submenu)
     
     # 直线工具设置
@@ -1554,6 +1921,7 @@ def ts_setup_menu():
     
     # 添加笔迹管理菜单
     mw.addon_view_menu.addAction(ts_menu_stroke_manager)
+    mw.addon_view_menu.addAction(ts_menu_unbake_strokes)
     mw.addon_view_menu.addSeparator()
     
     # 语言设置
@@ -1594,6 +1962,24 @@ def ts_clear_all_saved_strokes():
         except Exception as e:
             showInfo(lang.get_text("dialog_clear_error", f"清除笔迹数据时出错: {e}"))
 
+# 把合并到底图的笔画恢复为矢量笔画
+@slot()
+def ts_unbake_current_card():
+    """恢复当前卡片当前一面合并到底图的笔画"""
+    from aqt.utils import tooltip
+    card_id = get_current_card_id()
+    if not card_id or not ts_state_on:
+        tooltip(lang.get_text("tooltip_unbake_no_card", "Open a card in the reviewer with AnkiDraw on first."))
+        return
+    baked = stroke_storage.load_baked_stroke_data(card_id, is_question_side)
+    if not baked:
+        tooltip(lang.get_text("tooltip_unbake_nothing", "No baked strokes on this side of the card."))
+        return
+    import json
+    # 页面只在底图仍然显示时恢复，恢复并保存矢量笔画后再删除底图文件
+    archive = {'archive': baked.get('archive', [])}
+    execute_js(f"if (typeof unbake_strokes === 'function') {{ unbake_strokes({json.dumps(str(card_id))}, {json.dumps(json.dumps(archive))}); }}")
+
 # 新增恢复窗口大小的功能
 @slot()
 def restore_writing_window_size():
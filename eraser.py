@@ -69,15 +69,8 @@ def setup_eraser_shortcuts():
     Set up keyboard shortcut for toggling eraser.
     """
     from . import execute_js
-    execute_js("""
-    document.addEventListener('keyup', function(e) {
-        // Alt + Q to toggle eraser
-        if ((e.key === "q" || e.key === "Q") && e.altKey) {
-            e.preventDefault();
-            toggleEraser();
-        }
-    });
-    """)
+    # 快捷键按id登记，重复调用不会叠加监听器
+    execute_js("if (typeof register_eraser_hotkeys === 'function') { register_eraser_hotkeys(); }")
 
 def set_eraser_size(size):
     """
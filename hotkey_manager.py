@@ -59,6 +59,18 @@ default_hotkey_config = {
     'restore_window_size': ''  # 恢复窗口大小按钮
 }
 
+# 工具对应的工具栏按钮
+tool_button_ids = {
+    'visibility': 'ts_visibility_button',
+    'eraser': 'ts_eraser_button',
+    'line': 'ts_line_button',
+    'rectangle': 'ts_rectangle_button',
+    'undo': 'ts_undo_button',
+    'clear': 'ts_clear_button',
+    'fullscreen': 'ts_switch_fullscreen_button',
+    'restore_window_size': 'ts_restore_window_size_button'
+}
+
 # 当前快捷键配置
 hotkey_config = dict(default_hotkey_config)
 
@@ -311,127 +323,10 @@ def apply_hotkey_config():
     """
     from . import execute_js
     
-    # 构建JavaScript代码来设置快捷键
-    js_code = """
-    // 清除所有现有的快捷键处理器
-    if (window.ankidraw_hotkey_handlers) {
-        for (let handler of window.ankidraw_hotkey_handlers) {
-            document.removeEventListener('keydown', handler);
-        }
-    }
-    
-    // 初始化新的处理器数组
-    window.ankidraw_hotkey_handlers = [];
-    
-    // 添加快捷键处理函数
-    function addHotkeyHandler(hotkey, action) {
-        if (!hotkey) return; // 跳过未设置的快捷键
-        
-        const handler = function(e) {
-            // 检查是否在输入框中
-            if (e.target.tagName === 'INPUT' || e.target.tagName === 'TEXTAREA') {
-                return;
-            }
-            
-            // 解析快捷键
-            const parts = hotkey.split('+');
-            let match = true;
-            
-            // 检查Alt键
-            if (parts.includes('Alt') && !e.altKey) match = false;
-            // 检查Ctrl键
-            if (parts.includes('Ctrl') && !e.ctrlKey) match = false;
-            // 检查Shift键
-            if (parts.includes('Shift') && !e.shiftKey) match = false;
-            
-            // 检查主键
-            const mainKey = parts[parts.length - 1].toLowerCase();
-            if (e.key.toLowerCase() !== mainKey) match = false;
-            
-            if (match) {
-                e.preventDefault();
-                action();
-                return false;
-            }
-        };
-        
-        document.addEventListener('keydown', handler);
-        window.ankidraw_hotkey_handlers.push(handler);
-    }
-    """
-    
-    # 为每个工具添加快捷键处理
-    for tool_id, shortcut in hotkey_config.items():
-        if not shortcut:
-            continue
-        
-        if tool_id == 'visibility':
-            js_code += f"""
-            // 绘图工具快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_visibility_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'eraser':
-            js_code += f"""
-            // 橡皮擦快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_eraser_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'line':
-            js_code += f"""
-            // 直线工具快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_line_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'rectangle':
-            js_code += f"""
-            // 矩形工具快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_rectangle_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'undo':
-            js_code += f"""
-            // 撤销按钮快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_undo_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'clear':
-            js_code += f"""
-            // 清除画布按钮快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_clear_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'fullscreen':
-            js_code += f"""
-            // 全屏切换按钮快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_fullscreen_button');
-                if (btn) btn.click();
-            }});
-            """
-        elif tool_id == 'restore_window_size':
-            js_code += f"""
-            // 恢复窗口大小按钮快捷键
-            addHotkeyHandler('{shortcut}', function() {{
-                const btn = document.getElementById('ts_restore_window_size_button');
-                if (btn) btn.click();
-            }});
-            """
-    
-    # 执行JavaScript代码
-    execute_js(js_code)
+    # 工具 -> 按钮id，快捷键由页面中的快捷键分发表按id登记，重复应用只替换原来的登记
+    chords = {tool_button_ids[tool_id]: shortcut or ''
+              for tool_id, shortcut in hotkey_config.items() if tool_id in tool_button_ids}
+    execute_js(f"if (typeof bind_button_hotkeys === 'function') {{ bind_button_hotkeys('custom', {json.dumps(chords)}); }}")
 
 def show_hotkey_config_dialog():
     """
@@ -22,6 +22,9 @@ from . import lang
 # 全局变量，控制是否保存笔迹
 save_strokes_enabled = True
 
+# 未设置笔画简化容差时，批量压缩使用的容差(CSS像素)
+DEFAULT_COMPACT_TOLERANCE = 0.5
+
 # 导入笔迹存储模块
 from . import stroke_storage
 
@@ -292,6 +295,95 @@ def clean_invalid_strokes(files_to_clean):
             showWarning(f"{lang.get_text('stroke_manager_clear_error', '清理失效笔迹时出错:')} {e}")
         return 0
 
+def simplify_points(points, tolerance):
+    """
+    Ramer-Douglas-Peucker简化，与blackboard.js中的simplify_points相同
+    参数: 点列表([x, y, ...])，容差(CSS像素)
+    返回: 保留下来的点列表
+    """
+    count = len(points)
+    if count <= 2 or tolerance <= 0:
+        return points
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first][0], points[first][1]
+        dx, dy = points[last][0] - ax, points[last][1] - ay
+        length_sq = dx * dx + dy * dy
+        max_dist_sq = 0
+        index = -1
+        for i in range(first + 1, last):
+            px, py = points[i][0] - ax, points[i][1] - ay
+            if length_sq == 0:
+                dist_sq = px * px + py * py
+            else:
+                cross = px * dy - py * dx
+                dist_sq = cross * cross / length_sq
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+        if index >= 0 and max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def compact_stroke_data(data, tolerance):
+    """
+    简化一份笔迹数据中的手写笔画，直线和矩形(两个点)保持不变
+    参数: 解析后的笔迹数据，容差
+    返回: (简化前点数, 简化后点数)
+    """
+    before = after = 0
+    lines = data.get('arrays_of_points') if isinstance(data, dict) else None
+    if not isinstance(lines, list):
+        return 0, 0
+    for index, points in enumerate(lines):
+        if not isinstance(points, list) or len(points) <= 2:
+            continue
+        try:
+            simplified = simplify_points(points, tolerance)
+        except (TypeError, IndexError):
+            # 格式不符合预期的笔画保持原样
+            continue
+        before += len(points)
+        after += len(simplified)
+        lines[index] = simplified
+    return before, after
+
+def compact_all_strokes(tolerance):
+    """
+    批量简化所有已保存的笔迹文件
+    参数: 容差(CSS像素)
+    返回: (修改的文件数, 简化前点数, 简化后点数)
+    """
+    strokes_folder = stroke_storage.get_stroke_data_path()
+    changed_files = total_before = total_after = 0
+    for file in os.listdir(strokes_folder):
+        # 只处理卡片的笔迹文件，底图、快照等其他文件保持不变
+        if not re.fullmatch(r"card_(\d+)_(front|all)\.json", file):
+            continue
+        file_path = os.path.join(strokes_folder, file)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            before, after = compact_stroke_data(data, tolerance)
+            total_before += before
+            total_after += after
+            if after < before:
+                # 先写入临时文件再替换，中途中断不会留下不完整的笔迹文件
+                temp_path = file_path + ".tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(temp_path, file_path)
+                changed_files += 1
+        except Exception as e:
+            print(f"Debug - 压缩笔迹: 跳过文件 {file}: {e}")
+    return changed_files, total_before, total_after
+
 
 class StrokeManagerDialog(QDialog):
     """笔迹管理对话框"""
@@ -347,6 +439,12 @@ class StrokeManagerDialog(QDialog):
         
         layout.addLayout(clean_layout)
         
+        # 压缩所有笔迹按钮
+        compact_btn = QPushButton(lang.get_text("stroke_manager_compact_all", "压缩所有笔迹"))
+        compact_btn.clicked.connect(self.compact_all_strokes)
+        compact_btn.setToolTip(lang.get_text("stroke_manager_compact_tooltip", "按笔画简化容差删除多余的采样点，减小笔迹文件并加快绘制"))
+        layout.addWidget(compact_btn)
+        
         # 进度条
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
@@ -472,6 +570,37 @@ class StrokeManagerDialog(QDialog):
         else:
             self.progress_bar.setVisible(False)
     
+    def compact_all_strokes(self):
+        """压缩所有笔迹"""
+        from . import ts_simplify_tolerance
+        tolerance = ts_simplify_tolerance if ts_simplify_tolerance > 0 else DEFAULT_COMPACT_TOLERANCE
+        if not askUser(f"{lang.get_text('stroke_manager_compact_question', '将以下容差(像素)简化所有已保存的手写笔画，此操作会修改笔迹文件: ')}{tolerance:g}\n\n"
+                       f"{lang.get_text('stroke_manager_compact_backup', '操作前会自动导出一份备份。是否继续？')}"):
+            return
+        
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(10)
+        
+        backup_path = export_strokes(os.path.join(
+            os.path.expanduser("~"), 
+            f"AnkiDraw_Strokes_Auto_Backup_{time.strftime('%Y%m%d_%H%M%S')}.zip"
+        ))
+        if not backup_path:
+            self.progress_bar.setVisible(False)
+            return
+        
+        self.progress_bar.setValue(30)
+        changed_files, points_before, points_after = compact_all_strokes(tolerance)
+        
+        self.progress_bar.setValue(100)
+        self.progress_bar.setVisible(False)
+        self.update_stats()
+        
+        QMessageBox.information(self, lang.get_text("stroke_manager_compact_complete", "压缩完成"), 
+                              f"{lang.get_text('stroke_manager_compact_files', '修改的笔迹文件: ')}{changed_files}\n"
+                              f"{lang.get_text('stroke_manager_compact_points', '采样点: ')}{points_before} -> {points_after}\n"
+                              f"{lang.get_text('stroke_manager_backup_saved', '备份已保存到: ')}{backup_path}")
+    
     def clear_all_strokes(self):
         """清空所有笔迹"""
         if askUser(lang.get_text("stroke_manager_clear_warning_message", "<span style='color: red; font-weight: bold;'>警告：此操作无法撤销！</span><br><br>确定要删除所有保存的笔迹数据吗？")):
@@ -118,8 +118,10 @@ def save_all_stroke_data(card_id, stroke_data, window_width=None, window_height=
                     'line_type_history' in front_strokes and 'line_type_history' in current_strokes):
                     
                     # 如果当前笔迹中没有保存正面笔迹的内容，则合并它们
-                    # 检查是否已经包含正面笔迹，通过比较数组长度
-                    if len(current_strokes['arrays_of_points']) < len(front_strokes['arrays_of_points']):
+                    # 检查是否已经包含正面笔迹，通过比较数组长度；
+                    # 有底图时笔画数不能反映内容，不合并
+                    if (not front_strokes.get('baked') and not current_strokes.get('baked') and
+                            len(current_strokes['arrays_of_points']) < len(front_strokes['arrays_of_points'])):
                         # 合并笔迹数据
                         current_strokes['arrays_of_points'] = front_strokes['arrays_of_points'] + current_strokes['arrays_of_points']
                         current_strokes['line_type_history'] = front_strokes['line_type_history'] + current_strokes['line_type_history']
@@ -168,6 +170,79 @@ def save_all_stroke_data(card_id, stroke_data, window_width=None, window_height=
         traceback.print_exc()
         return False
 
+# 按补丁修改笔迹文件
+def patch_stroke_data(card_id, front, patch_data):
+    """把页面发送的补丁应用到上次保存的笔迹文件，只传输变化的笔画
+    
+    参数:
+    card_id -- 卡片ID
+    front -- 是否为正面笔迹
+    patch_data -- 补丁JSON字符串：base、result、changes、line_type_history、baked、lastModified、window_size(可选)
+    
+    返回:
+    是否成功应用；文件与补丁的基准不一致时返回False，由页面改为保存完整数据
+    """
+    try:
+        card_id = str(card_id)
+        patch = json.loads(patch_data)
+        base_folder = get_stroke_data_path()
+        stroke_file = os.path.join(base_folder, f"card_{card_id}_{'front' if front else 'all'}.json")
+        if not os.path.exists(stroke_file):
+            return False
+        with open(stroke_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        lines = data.get('arrays_of_points', [])
+        strokes = data.get('strokes', [])
+        if len(lines) != patch['base']['lines'] or len(strokes) != patch['base']['strokes']:
+            print(f"Debug - 笔迹补丁: 文件与页面不一致，笔画数={len(lines)}/{len(strokes)}")
+            return False
+        
+        for change in patch['changes']:
+            op = change['op']
+            index = change.get('index', 0)
+            if op == 'clear':
+                lines, strokes = [], []
+            elif op == 'insert_line' and 0 <= index <= len(lines):
+                lines.insert(index, change['points'])
+            elif op == 'remove_line' and 0 <= index < len(lines) and len(lines[index]) == change['count']:
+                del lines[index]
+            elif op == 'insert_stroke' and 0 <= index <= len(strokes):
+                strokes.insert(index, change['stroke'])
+            elif op == 'remove_stroke' and 0 <= index < len(strokes):
+                del strokes[index]
+            else:
+                print(f"Debug - 笔迹补丁: 无法应用 {op} @ {index}")
+                return False
+        if len(lines) != patch['result']['lines'] or len(strokes) != patch['result']['strokes']:
+            print(f"Debug - 笔迹补丁: 应用后笔画数不一致")
+            return False
+        
+        data['arrays_of_points'] = lines
+        data['strokes'] = strokes
+        # 缓存的路径对象无法序列化，载入后重新生成
+        data['perfect_cache'] = [None] * len(lines)
+        data['line_type_history'] = patch.get('line_type_history', [])
+        data['baked'] = patch.get('baked', False)
+        data['lastModified'] = patch.get('lastModified')
+        if patch.get('window_size'):
+            data['window_size'] = {
+                'width': patch['window_size']['width'],
+                'height': patch['window_size']['height']
+            }
+        
+        # 先写入临时文件再替换，中途失败不会留下不完整的笔迹文件
+        temp_file = stroke_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_file, stroke_file)
+        print(f"Debug - 笔迹补丁: 已应用 {len(patch['changes'])} 处变化到 {stroke_file}")
+        return True
+    except Exception as e:
+        print(f"应用笔迹补丁时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 # 获取正面笔迹的窗口大小
 def get_front_window_size(card_id):
     """从正面笔迹数据中获取窗口大小
@@ -384,8 +459,10 @@ def delete_stroke_data(card_id):
         all_file = os.path.join(base_folder, f"card_{card_id}_all.json")
         legacy_file = os.path.join(base_folder, f"card_{card_id}.json")
         
-        # 删除所有可能的文件
-        for file_path in [front_file, all_file, legacy_file]:
+        # 删除所有可能的文件，包括合并的底图和快照
+        for file_path in [front_file, all_file, legacy_file,
+                          get_baked_stroke_file(card_id, True), get_baked_stroke_file(card_id, False),
+                          get_snapshot_file(card_id, True), get_snapshot_file(card_id, False)]:
             if os.path.exists(file_path):
                 os.remove(file_path)
                 print(f"Debug - 删除笔迹: 已删除文件 {file_path}")
@@ -395,4 +472,155 @@ def delete_stroke_data(card_id):
         print(f"删除笔迹数据时出错: {e}")
         import traceback
         traceback.print_exc()
-        return False 
\ No newline at end of file
+        return False 
+
+# 合并的底图
+def get_baked_stroke_file(card_id, front):
+    """获取卡片正面或全部笔迹的底图文件路径，与笔迹文件放在同一目录"""
+    side = "front" if front else "all"
+    return os.path.join(get_stroke_data_path(), f"card_{card_id}_{side}_baked.json")
+
+def save_baked_stroke_data(card_id, front, baked_data):
+    """保存合并旧笔画生成的底图和被合并笔画的矢量数据
+    
+    参数:
+    card_id -- 卡片ID
+    front -- 是否为正面笔迹
+    baked_data -- 底图数据JSON字符串：image、left、top、width、height、replace、archive
+    
+    返回:
+    是否成功保存
+    """
+    try:
+        card_id = str(card_id)
+        data = json.loads(baked_data)
+        baked_file = get_baked_stroke_file(card_id, front)
+        
+        # 之前合并的笔画仍然在底图中，矢量数据按合并顺序追加，恢复时全部放回
+        archive = []
+        if not data.get('replace') and os.path.exists(baked_file):
+            with open(baked_file, "r", encoding="utf-8") as f:
+                archive = json.load(f).get('archive', [])
+        archive.append(data.get('archive', {}))
+        
+        stored = {
+            'image': data['image'],
+            'left': data['left'],
+            'top': data['top'],
+            'width': data['width'],
+            'height': data['height'],
+            'archive': archive
+        }
+        with open(baked_file, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+        
+        print(f"Debug - 保存底图: 已写入文件 {baked_file}, 存档批次={len(archive)}")
+        return True
+    except Exception as e:
+        print(f"保存底图数据时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def load_baked_stroke_data(card_id, front):
+    """加载卡片正面或全部笔迹的底图
+    
+    返回:
+    解析后的底图数据，如果没有则返回None
+    """
+    try:
+        baked_file = get_baked_stroke_file(str(card_id), front)
+        if not os.path.exists(baked_file):
+            print(f"Debug - 加载底图: 文件不存在 {baked_file}")
+            return None
+        with open(baked_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"加载底图数据时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def delete_baked_stroke_data(card_id, front):
+    """删除卡片正面或全部笔迹的底图(恢复为矢量笔画后)"""
+    try:
+        baked_file = get_baked_stroke_file(str(card_id), front)
+        if os.path.exists(baked_file):
+            os.remove(baked_file)
+            print(f"Debug - 删除底图: 已删除文件 {baked_file}")
+        return True
+    except Exception as e:
+        print(f"删除底图数据时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+# 笔迹快照
+def get_snapshot_file(card_id, front):
+    """获取卡片正面或全部笔迹的快照文件路径，与笔迹文件放在同一目录"""
+    side = "front" if front else "all"
+    return os.path.join(get_stroke_data_path(), f"card_{card_id}_{side}_snapshot.json")
+
+def save_stroke_snapshot(card_id, front, snapshot_data):
+    """保存打开卡片时先显示的笔迹快照
+    
+    参数:
+    card_id -- 卡片ID
+    front -- 是否为正面笔迹
+    snapshot_data -- 快照数据JSON字符串：image、width、height、window
+    
+    返回:
+    是否成功保存
+    """
+    try:
+        snapshot_file = get_snapshot_file(str(card_id), front)
+        # 确认是有效的JSON后再写入
+        json.loads(snapshot_data)
+        with open(snapshot_file, "w", encoding="utf-8") as f:
+            f.write(snapshot_data)
+        print(f"Debug - 保存快照: 已写入文件 {snapshot_file}, 数据长度={len(snapshot_data)}")
+        return True
+    except Exception as e:
+        print(f"保存快照时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def load_stroke_snapshot(card_id, front):
+    """加载卡片正面或全部笔迹的快照
+    
+    返回:
+    快照数据JSON字符串；没有快照或笔迹文件在快照之后修改过时返回None
+    """
+    try:
+        card_id = str(card_id)
+        snapshot_file = get_snapshot_file(card_id, front)
+        side = "front" if front else "all"
+        stroke_file = os.path.join(get_stroke_data_path(), f"card_{card_id}_{side}.json")
+        if not os.path.exists(snapshot_file) or not os.path.exists(stroke_file):
+            return None
+        # 快照在保存笔迹之后生成，比笔迹文件旧说明快照已过期
+        if os.path.getmtime(snapshot_file) < os.path.getmtime(stroke_file):
+            print(f"Debug - 加载快照: 快照已过期 {snapshot_file}")
+            return None
+        with open(snapshot_file, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception as e:
+        print(f"加载快照时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def delete_stroke_snapshot(card_id, front):
+    """删除卡片正面或全部笔迹的快照(窗口大小变化或笔迹被清空后)"""
+    try:
+        snapshot_file = get_snapshot_file(str(card_id), front)
+        if os.path.exists(snapshot_file):
+            os.remove(snapshot_file)
+            print(f"Debug - 删除快照: 已删除文件 {snapshot_file}")
+        return True
+    except Exception as e:
+        print(f"删除快照时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
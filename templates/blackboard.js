@@ -0,0 +1,5719 @@
+﻿var visible = /*VISIBILITY_PLACEHOLDER*/;
+var perfectFreehand = /*PERFECT_FREEHAND_PLACEHOLDER*/;
+var canvas = document.getElementById('main_canvas');
+var wrapper = document.getElementById('canvas_wrapper');
+var optionBar = document.getElementById('pencil_button_bar');
+var ts_undo_button = document.getElementById('ts_undo_button');
+var ctx = canvas.getContext('2d');
+var secondary_canvas = document.getElementById('secondary_canvas');
+// 低延迟模式(由Python端设置)：使用合并事件和预测事件，正在书写的笔画使用desynchronized画布
+var lowLatencyInk = /*LOW_LATENCY_PLACEHOLDER*/;
+var secondary_ctx = secondary_canvas.getContext('2d', lowLatencyInk ? { desynchronized: true } : undefined);
+var ts_visibility_button = document.getElementById('ts_visibility_button');
+var ts_kanji_button = document.getElementById('ts_kanji_button');
+var ts_perfect_freehand_button = document.getElementById('ts_perfect_freehand_button');
+var ts_switch_fullscreen_button = document.getElementById('ts_switch_fullscreen_button');
+var arrays_of_points = [ ];
+var convertDotStrokes = /*CONVERT_DOT_STROKES_PLACEHOLDER*/;
+var color = '#fff';
+var calligraphy = /*CALLIGRAPHY_PLACEHOLDER*/;
+var perfect_cache = [ ];
+var line_width = 4;
+var small_canvas = /*SMALL_CANVAS_PLACEHOLDER*/;
+var fullscreen_follow = /*FOLLOW_PLACEHOLDER*/;
+var lineMode = false;
+var startPoint = null;
+// 渲染分辨率：位图按设备像素比放大，但单层位图不超过该预算(百万像素)，0表示不限制
+var renderMegapixelBudget = /*MAX_MEGAPIXELS_PLACEHOLDER*/;
+// 超大卡片上允许降低到的最低缩放比例
+var MIN_RENDER_SCALE = 0.5;
+// 当前画布位图相对CSS像素的缩放比例；笔迹坐标始终以CSS像素保存，与该比例无关
+var renderScale = 1;
+// 笔画完成时的简化容差(CSS像素)，0表示保留所有采样点
+var simplifyTolerance = /*SIMPLIFY_TOLERANCE_PLACEHOLDER*/;
+
+// 表示当前正在处理笔迹数据的保存或加载，防止重复操作
+var isProcessingStrokeData = false;
+// 存储当前卡片ID
+var currentCardId = '';
+// 最近一次加载请求的编号，由Python端在显示问题或答案时设置
+var strokeLoadGeneration = 0;
+// 标记是否发生了笔迹变化，用于决定是否需要保存
+var strokesChanged = false;
+// 防抖计时器ID，用于延迟保存操作
+var saveDebounceTimer = null;
+// 跟踪当前是否正面笔迹模式
+var isQuestionSide = true; // 默认为正面
+
+// 表示是否使用Surface Pen笔端擦除模式
+var isPenEraserActive = false;
+
+// 表示是否使用Surface Pen侧键激活橡皮擦模式
+var isSidePenButtonEraser = false;
+// 保存侧键激活橡皮擦之前的工具状态
+var previousToolState = {
+    perfectFreehand: false,
+    calligraphy: false,
+    lineMode: false,
+    rectangleMode: false,
+    eraserMode: false
+};
+
+// 直线工具专用属性
+var lineColor = '#fff'; // 直线颜色，默认与普通画笔相同
+var lineWidth = 4; // 直线线宽，默认与普通画笔相同
+
+// 矩形工具专用属性
+var rectangleMode = false;
+var rectangleColor = '#fff'; // 矩形颜色，默认与普通画笔相同
+var rectangleWidth = 4; // 矩形线宽，默认与普通画笔相同
+var isDrawingRect = false; // 是否正在绘制矩形
+var rectStartX = 0; // 矩形起始X坐标
+var rectStartY = 0; // 矩形起始Y坐标
+
+// 直线样式相关变量
+var lineStyle = 'solid'; // 直线样式：solid(实线)、dashed(虚线)、wavy(波浪线)
+var lineDashPattern = []; // 虚线模式
+var lineStyleSlider = null; // 直线样式选择器
+var lineStyleSliderTimeout = null; // 直线样式选择器隐藏计时器
+
+/**
+ * 从Python端注入的本地化字符串表(ankidraw_strings)中读取界面文本
+ * @param {string} key - 语言文件中的键
+ * @param {string} fallback - 字符串表缺失该键时使用的英文文本
+ */
+function ankidraw_text(key, fallback) {
+    if (typeof ankidraw_strings !== 'undefined' && ankidraw_strings && ankidraw_strings[key]) {
+        return ankidraw_strings[key];
+    }
+    return fallback;
+}
+
+/**
+ * 根据data-i18n-title属性为工具栏按钮设置本地化提示文本
+ */
+function apply_localized_labels() {
+    var elements = document.querySelectorAll('[data-i18n-title]');
+    elements.forEach(function(el) {
+        el.title = ankidraw_text(el.dataset.i18nTitle, el.title);
+    });
+}
+
+apply_localized_labels();
+
+canvas.onselectstart = function() { return false; };
+secondary_canvas.onselectstart = function() { return false; };
+wrapper.onselectstart = function() { return false; };
+
+function switch_perfect_freehand()
+{
+    // 功能已禁用
+    perfectFreehand = false;
+    ts_perfect_freehand_button.className = '';
+    ts_redraw()
+}
+
+function switch_small_canvas()
+{
+    stop_drawing();
+    
+    small_canvas = !small_canvas;
+    if(!small_canvas)
+    {
+        ts_switch_fullscreen_button.className = 'active';
+    }
+    else{
+        ts_switch_fullscreen_button.className = '';
+    }
+    resize();
+}
+
+function switch_visibility()
+{
+	stop_drawing();
+    
+    // Add debug logs to console
+    console.log("Before toggle - visible:", visible);
+    console.log("Before toggle - optionBar.className:", optionBar.className);
+    
+    if (visible)
+    {
+        // Hide canvas
+        canvas.style.display='none';
+        secondary_canvas.style.display=canvas.style.display;
+        if (tileLayer) tileLayer.style.display = canvas.style.display;
+        if (workerCanvasElement) workerCanvasElement.style.display = canvas.style.display;
+        ts_visibility_button.className = '';
+        
+        // Force toolbar to collapse - explicitly set all other buttons to none
+        optionBar.className = 'touch_disable';
+        
+        // Make sure all buttons except the first one are hidden
+        var buttons = optionBar.querySelectorAll('button:not(:first-child)');
+        buttons.forEach(function(btn) {
+            btn.dataset.originalDisplay = btn.style.display;
+            btn.style.display = 'none';
+        });
+        
+        // Force the toolbar to update its class immediately
+        setTimeout(function() {
+            console.log("After hide - optionBar.className:", optionBar.className);
+        }, 10);
+    }
+    else
+    {
+        // Show canvas
+        canvas.style.display='block';
+        secondary_canvas.style.display=canvas.style.display;
+        if (tileLayer) tileLayer.style.display = canvas.style.display;
+        if (workerCanvasElement) workerCanvasElement.style.display = canvas.style.display;
+        ts_visibility_button.className = 'active';
+        
+        // Restore toolbar to expanded state
+        optionBar.className = '';
+        
+        // Restore all buttons to their original display state
+        var buttons = optionBar.querySelectorAll('button:not(:first-child)');
+        buttons.forEach(function(btn) {
+            btn.style.display = btn.dataset.originalDisplay || '';
+        });
+        
+        // Force the toolbar to update its class immediately
+        setTimeout(function() {
+            console.log("After show - optionBar.className:", optionBar.className);
+        }, 10);
+    }
+    visible = !visible;
+    
+    // Add final debug log
+    console.log("After toggle - visible:", visible);
+    console.log("After toggle - optionBar.className:", optionBar.className);
+}
+
+//Initialize event listeners at the start;
+canvas.addEventListener("pointerdown", pointerDownLine);
+canvas.addEventListener("pointermove", pointerMoveLine);
+window.addEventListener("pointerup", pointerUpLine);
+canvas.addEventListener("pointerdown", pointerDownCaligraphy);
+canvas.addEventListener("pointermove", pointerMoveCaligraphy);
+window.addEventListener("pointerup", pointerUpCaligraphy);
+
+// 添加Surface Pen笔端擦除事件
+canvas.addEventListener("pointerdown", handlePenEraser);
+canvas.addEventListener("pointermove", handlePenEraserMove);
+window.addEventListener("pointerup", stopPenEraser);
+
+function switch_drawing_mode()
+{
+    // 功能已禁用
+    calligraphy = false;
+    ts_kanji_button.className = '';
+}
+
+function switch_class(e,c)
+{
+    var reg = new RegExp('(\\\s|^)' + c + '(\\s|$)');
+    if (e.className.match(new RegExp('(\\s|^)' + c + '(\\s|$)')))
+    {
+        e.className = e.className.replace(reg, '');
+    }
+    else
+    {
+        e.className += c;
+    }
+}
+/**
+ * 计算画布位图的缩放比例
+ * 以设备像素比为上限，使 宽x高x比例² 不超过renderMegapixelBudget；
+ * 卡片过长时降低比例，但不低于MIN_RENDER_SCALE
+ * @param {number} width - 画布宽度(CSS像素)
+ * @param {number} height - 画布高度(CSS像素)
+ * @returns {number} 缩放比例
+ */
+function compute_render_scale(width, height) {
+    var scale = window.devicePixelRatio || 1;
+    var area = width * height;
+    if (renderMegapixelBudget > 0 && area > 0) {
+        var budgetScale = Math.sqrt(renderMegapixelBudget * 1000000 / area);
+        if (budgetScale < scale) {
+            scale = Math.max(budgetScale, Math.min(MIN_RENDER_SCALE, scale));
+        }
+    }
+    return scale;
+}
+
+// 画布尺寸服务：由ResizeObserver/MutationObserver/窗口事件触发，每帧最多调整一次，尺寸不变时不重新分配位图
+var resizeFrameRequested = false;
+// 上一次实际应用的画布尺寸和模式
+var appliedCanvasLayout = null;
+var sizingStats = {
+    scheduled: 0, // 收到的调整请求数
+    applied: 0,   // 实际重新分配画布的次数
+    skipped: 0,   // 尺寸未变化而跳过的次数
+    preserved: 0  // 调整尺寸时保留原有笔迹、只补画新露出区域的次数
+};
+
+/**
+ * 请求在下一帧调整画布尺寸，同一帧内的多次请求合并为一次
+ */
+function schedule_resize() {
+    sizingStats.scheduled++;
+    if (resizeFrameRequested) return;
+    resizeFrameRequested = true;
+    window.requestAnimationFrame(function() {
+        resizeFrameRequested = false;
+        resize();
+    });
+}
+
+/**
+ * 获取卡片内容的尺寸
+ * 优先只测量卡片内容(#qa)，画布不在其中，因此无需先隐藏画布再强制重排；
+ * 找不到内容元素时退回到隐藏画布后测量整个页面
+ * @param {Element} card - 卡片元素
+ * @returns {Object} {width, height}
+ */
+function measure_page_size(card) {
+    var docEl = document.documentElement;
+    var content = document.getElementById('qa');
+    if (content && !wrapper.contains(content)) {
+        var rect = content.getBoundingClientRect();
+        var bodyStyle = getComputedStyle(document.body);
+        var bottomSpace = (parseFloat(bodyStyle.paddingBottom) || 0) + (parseFloat(bodyStyle.marginBottom) || 0);
+        return {
+            width: Math.max(docEl.clientWidth, Math.ceil(rect.left + window.scrollX + content.scrollWidth)),
+            height: Math.max(docEl.clientHeight,
+                Math.ceil(rect.top + window.scrollY + Math.max(rect.height, content.scrollHeight) + bottomSpace))
+        };
+    }
+    
+    // Check size of page without canvas
+    var display = canvas_wrapper.style.display;
+    canvas_wrapper.style.display = 'none';
+    var size = {
+        width: Math.max(
+            docEl.scrollWidth, docEl.offsetWidth, docEl.clientWidth,
+            document.body.scrollWidth, document.body.offsetWidth, document.body.clientWidth,
+            card.scrollWidth, card.offsetWidth
+        ),
+        height: Math.max(
+            docEl.scrollHeight, docEl.offsetHeight, docEl.clientHeight,
+            document.body.scrollHeight, document.body.offsetHeight, document.body.clientHeight,
+            card.scrollHeight, card.offsetHeight
+        )
+    };
+    canvas_wrapper.style.display = display || 'block';
+    return size;
+}
+
+/**
+ * 按画布模式设置画布和工具栏位置相关的样式，只在模式变化时调用
+ * @param {string} mode - 'page'、'small'或'follow'
+ */
+function apply_canvas_mode_styles(mode) {
+    var rootStyle = document.documentElement.style;
+    var computed = getComputedStyle(document.documentElement);
+    canvas.style["border-style"] = mode === 'small' ? "dashed" : "none";
+    if (mode === 'small') {
+        rootStyle.setProperty('--canvas-bar-pt', computed.getPropertyValue('--button-bar-pt'));
+        rootStyle.setProperty('--canvas-bar-pr', computed.getPropertyValue('--button-bar-pr'));
+        rootStyle.setProperty('--canvas-bar-pb', computed.getPropertyValue('--button-bar-pb'));
+        rootStyle.setProperty('--canvas-bar-pl', computed.getPropertyValue('--button-bar-pl'));
+    } else {
+        rootStyle.setProperty('--canvas-bar-pt', '0px');
+        rootStyle.setProperty('--canvas-bar-pr', '0px');
+        rootStyle.setProperty('--canvas-bar-pb', 'unset');
+        rootStyle.setProperty('--canvas-bar-pl', 'unset');
+    }
+    rootStyle.setProperty('--canvas-bar-position', mode === 'page' ? 'absolute' : 'fixed');
+}
+
+/**
+ * 画布尺寸变大后，只补画新露出的右侧和下方区域，原有内容已被复制到新位图
+ * @param {number} oldWidth - 原宽度(CSS像素)
+ * @param {number} oldHeight - 原高度(CSS像素)
+ * @param {number} newWidth - 新宽度(CSS像素)
+ * @param {number} newHeight - 新高度(CSS像素)
+ */
+function repaint_exposed_regions(oldWidth, oldHeight, newWidth, newHeight) {
+    var regions = [];
+    // 多补画1像素，覆盖原边缘处被裁掉的抗锯齿像素
+    if (newWidth > oldWidth) {
+        regions.push({ left: Math.max(0, oldWidth - 1), top: 0, right: newWidth, bottom: newHeight });
+    }
+    if (newHeight > oldHeight) {
+        regions.push({ left: 0, top: Math.max(0, oldHeight - 1), right: Math.min(oldWidth, newWidth), bottom: newHeight });
+    }
+    for (var i = 0; i < regions.length; i++) {
+        var region = regions[i];
+        if (paintedRange) {
+            region.top = Math.max(region.top, paintedRange.top);
+            region.bottom = Math.min(region.bottom, paintedRange.bottom);
+        }
+        if (region.bottom > region.top) lazyPaintRegions.push(region);
+    }
+    if (regions.length) {
+        sizingStats.preserved++;
+        request_redraw_frame();
+    }
+}
+
+function resize() {
+    // 绘图层隐藏时不调整，重新显示时再检查
+    if (!drawingLayerAttached) return;
+    var card = document.getElementsByClassName('card')[0];
+    
+    // 卡片尚未加载：MutationObserver会在卡片出现时再次触发
+    if (!card) {
+        if (typeof MutationObserver === 'undefined') window.setTimeout(resize, 100);
+        return;
+    }
+    
+    var mode = small_canvas ? 'small' : (fullscreen_follow ? 'follow' : 'page');
+    if (!appliedCanvasLayout || appliedCanvasLayout.mode !== mode) {
+        apply_canvas_mode_styles(mode);
+    }
+    
+    var page = measure_page_size(card);
+    var width, height;
+    if (mode === 'page') {
+        width = page.width;
+        height = page.height;
+    } else if (mode === 'small') {
+        var rootStyle = getComputedStyle(document.documentElement);
+        width = Math.min(page.width, parseInt(rootStyle.getPropertyValue('--small-canvas-width')));
+        height = Math.min(page.height, parseInt(rootStyle.getPropertyValue('--small-canvas-height')));
+    } else {
+        width = page.width - 1;
+        height = page.height - 1;
+    }
+    
+    /* Backing store scale: DPR capped by the megapixel budget (tiles are allocated lazily, so they use the full DPR) */
+    var dpr = use_tiled_canvas() ? (window.devicePixelRatio || 1) : compute_render_scale(width, height);
+    var layout = {
+        mode: mode,
+        width: width,
+        height: height,
+        scale: dpr,
+        tiled: use_tiled_canvas(),
+        worker: workerCanvas && !workerCanvasFailed
+    };
+    if (appliedCanvasLayout &&
+        Object.keys(layout).every(function(key) { return layout[key] === appliedCanvasLayout[key]; })) {
+        // 尺寸和模式都没有变化，不重新分配位图(设置canvas.width会清空画布)
+        sizingStats.skipped++;
+        on_viewport_scroll();
+        return;
+    }
+    appliedCanvasLayout = layout;
+    sizingStats.applied++;
+    // 窗口大小变化后原有快照不再适用，按新的大小重新生成
+    if (snapshotWindow !== current_snapshot_window() && (arrays_of_points.length || strokes.length)) {
+        schedule_ink_snapshot();
+    }
+    renderScale = dpr;
+    
+    /* CSS size is the same */
+    canvas.style.height = height + 'px';
+    canvas.style.width = width + 'px';
+    wrapper.style.width = width + 'px';
+    canvas_wrapper.style.display = 'block';
+    secondary_canvas.style.height = canvas.style.height;
+    secondary_canvas.style.width = canvas.style.width;
+    invalidate_canvas_rect();
+    
+    if (use_tiled_canvas()) {
+        // 分块模式：笔迹按需画在分块上，不再分配整页大小的位图
+        suspend_ink_worker();
+        if (resize_tiled_surfaces(dpr)) {
+            ts_redraw();
+        }
+    } else {
+        leave_tiled_mode();
+        
+        /* Increase DOM size and scale */
+        secondary_ctx.canvas.width = width * dpr;
+        secondary_ctx.canvas.height = height * dpr;
+        secondary_ctx.scale(dpr, dpr);
+        
+        if (start_ink_worker()) {
+            // 后台线程模式：已提交笔迹由Worker画在它自己的画布上
+            if (resize_worker_surface(dpr)) {
+                ts_redraw();
+            }
+        } else {
+            ctx.canvas.width = width * dpr;
+            ctx.canvas.height = height * dpr;
+            ctx.scale(dpr, dpr);
+            
+            // 只有缩放比例变化时才需要重建已提交图层，否则保留原有内容并重新展示
+            if (sync_committed_layer_size()) {
+                ts_redraw();
+            }
+        }
+    }
+    update_pen_settings();
+    // 视口高度可能变化，补画新露出的区域
+    on_viewport_scroll();
+    
+    // 添加调试日志
+    console.log('AnkiDraw Debug: 画布大小已更新', 
+                'width:', width, 
+                'height:', height,
+                'mode:', mode,
+                'tiled:', use_tiled_canvas(),
+                'worker:', use_worker_canvas(),
+                'renderScale:', renderScale,
+                'window.innerWidth:', window.innerWidth,
+                'window.innerHeight:', window.innerHeight);
+}
+
+/**
+ * 监听页面内容和窗口尺寸的变化
+ * 画布本身是绝对定位或固定定位的，不影响被观察元素的尺寸，因此不会互相触发
+ */
+function setup_sizing_observers() {
+    if (typeof ResizeObserver !== 'undefined') {
+        var resizeObserver = new ResizeObserver(schedule_resize);
+        resizeObserver.observe(document.documentElement);
+        resizeObserver.observe(document.body);
+        var content = document.getElementById('qa');
+        if (content) resizeObserver.observe(content);
+    }
+    if (typeof MutationObserver !== 'undefined') {
+        new MutationObserver(function(mutations) {
+            for (var i = 0; i < mutations.length; i++) {
+                // 画布、分块和工具栏自身的变化不影响页面尺寸
+                if (!wrapper.contains(mutations[i].target)) {
+                    schedule_resize();
+                    return;
+                }
+            }
+        }).observe(document.body, { childList: true, subtree: true });
+    }
+}
+
+window.addEventListener('resize', schedule_resize);
+window.addEventListener('load', schedule_resize);
+setup_sizing_observers();
+schedule_resize();
+request_redraw_frame();
+
+
+var isPointerDown = false;
+var mouseX = 0;
+var mouseY = 0;
+// 预测事件给出的临时笔尾，只画在secondary_canvas上，不保存
+var predictedPoints = [];
+// 上一帧是否画过临时笔尾，画过则需要整笔重画以去掉它
+var predictedTailDrawn = false;
+var lowLatencyStats = {
+    moveEvents: 0,      // pointermove事件数
+    coalescedSamples: 0 // 从合并事件中取得的采样点数
+};
+
+// 画布位置缓存，避免每个指针事件都调用getBoundingClientRect强制布局
+var canvasRectCache = null;
+
+/**
+ * 获取画布的位置，结果会被缓存直到滚动或尺寸变化
+ * @returns {DOMRect} 画布的位置
+ */
+function get_canvas_rect() {
+    if (!canvasRectCache) {
+        canvasRectCache = canvas.getBoundingClientRect();
+    }
+    return canvasRectCache;
+}
+
+function invalidate_canvas_rect() {
+    canvasRectCache = null;
+}
+
+window.addEventListener('scroll', invalidate_canvas_rect, { passive: true, capture: true });
+window.addEventListener('resize', invalidate_canvas_rect);
+
+/**
+ * 获取低延迟模式的统计信息，用于诊断
+ */
+function get_low_latency_stats() {
+    var stats = Object.assign({}, lowLatencyStats);
+    stats.enabled = lowLatencyInk;
+    var attributes = secondary_ctx.getContextAttributes ? secondary_ctx.getContextAttributes() : {};
+    stats.desynchronized = !!attributes.desynchronized;
+    return stats;
+}
+
+function update_pen_settings(){
+    ctx.lineJoin = ctx.lineCap = 'round';
+    ctx.lineWidth = line_width;
+    ctx.strokeStyle = color;
+    ctx.fillStyle = color;
+    secondary_ctx.lineJoin = ctx.lineJoin;
+    secondary_ctx.lineWidth = ctx.lineWidth;
+    secondary_ctx.strokeStyle = ctx.strokeStyle;
+    secondary_ctx.fillStyle = ctx.fillStyle;
+    committed_ctx.lineJoin = committed_ctx.lineCap = 'round';
+    committed_ctx.lineWidth = ctx.lineWidth;
+    committed_ctx.strokeStyle = ctx.strokeStyle;
+    committed_ctx.fillStyle = ctx.fillStyle;
+    sync_worker_settings();
+    ts_present();
+}
+
+// 专门更新直线工具的设置
+function update_line_settings(){
+    secondary_ctx.lineJoin = 'round';
+    secondary_ctx.lineCap = 'round';
+    secondary_ctx.lineWidth = lineWidth; // 使用直线专用的线宽
+    secondary_ctx.strokeStyle = lineColor; // 使用直线专用的颜色
+    secondary_ctx.fillStyle = lineColor;
+    
+    // 根据直线样式设置不同的样式
+    if (lineStyle === 'dashed' && lineDashPattern.length > 0) {
+        // 设置虚线模式
+        secondary_ctx.setLineDash(lineDashPattern);
+    } else {
+        // 清除虚线模式，用于实线
+        secondary_ctx.setLineDash([]);
+    }
+}
+
+// 在文件顶部添加全局变量以跟踪笔迹和窗口大小状态
+var strokeOperation = ''; // 记录最近的操作类型：'A'=添加，'E'=擦除，'U'=撤销
+var lastWindowSize = { width: 0, height: 0 }; // 记录最后保存的窗口大小
+
+function ts_undo(){
+    var op = undo_operation();
+    if (!op) return;
+    console.log('AnkiDraw Debug: 撤销操作，类型:', op.type);
+    
+    // 设置操作类型为撤销
+    strokeOperation = 'U';
+    after_history_change();
+}
+
+function ts_redo(){
+    var op = redo_operation();
+    if (!op) return;
+    console.log('AnkiDraw Debug: 重做操作，类型:', op.type);
+    
+    // 重做不改变保存的窗口大小
+    strokeOperation = 'U';
+    after_history_change();
+}
+
+/**
+ * 撤销或重做之后更新撤销按钮，并在状态与已保存的不同时触发保存。
+ * 被撤销或重做的笔画所在区域已由mark_*函数记录为局部重绘
+ */
+function after_history_change() {
+    ts_undo_button.className = undoLog.length ? "active" : "";
+    if (undo_log_dirty()) {
+        strokesChanged = true;
+        save_strokes_debounced();
+    }
+}
+
+/**
+ * 把一条被橡皮擦删除的笔画恢复到原来的位置
+ * @param {Object} erased - 撤销日志中擦除操作的一条删除记录
+ */
+function restore_erased_stroke(erased) {
+    if (erased.pieces) {
+        // 精确擦除：先移除切开后剩下的部分，再放回原来的笔画
+        for (var k = erased.pieces.length - 1; k >= 0; k--) {
+            arrays_of_points.splice(erased.index + k, 1);
+            perfect_cache.splice(erased.index + k, 1);
+            mark_line_removed(erased.index + k, erased.pieces[k]);
+        }
+    }
+    if (erased.lineType === 'C') {
+        // 恢复书法笔画
+        strokes.splice(erased.index, 0, erased.calligraphyStroke);
+        mark_calligraphy_inserted(erased.index, erased.calligraphyStroke);
+    } else {
+        // 恢复普通笔画
+        arrays_of_points.splice(erased.index, 0, erased.points);
+        perfect_cache.splice(erased.index, 0, erased.perfectCache);
+        mark_line_inserted(erased.index, erased.points);
+    }
+}
+
+/**
+ * 按删除记录删除一条笔画，精确擦除时把切开后剩下的部分放回原来的位置。
+ * 擦除和重做擦除共用，与restore_erased_stroke互为逆操作
+ * @param {Object} erased - {points|calligraphyStroke, perfectCache, lineType, index, pieces}
+ */
+function remove_erased_stroke(erased) {
+    if (erased.lineType === 'C') {
+        mark_calligraphy_removed(erased.index, strokes.splice(erased.index, 1)[0]);
+        return;
+    }
+    arrays_of_points.splice(erased.index, 1);
+    perfect_cache.splice(erased.index, 1);
+    mark_line_removed(erased.index, erased.points);
+    // 剩下的部分作为新笔画放回原来的位置，只有它们需要生成路径
+    var pieces = erased.pieces || [];
+    for (var k = 0; k < pieces.length; k++) {
+        arrays_of_points.splice(erased.index + k, 0, pieces[k]);
+        perfect_cache.splice(erased.index + k, 0, null);
+        mark_line_inserted(erased.index + k, pieces[k]);
+    }
+}
+
+/**
+ * 整体替换画布上的笔画(清空画布及其撤销/重做)
+ */
+function replace_all_strokes(lines, cache, calligraphyStrokes) {
+    stop_drawing();
+    arrays_of_points = lines;
+    perfect_cache = cache;
+    strokes = calligraphyStrokes;
+    reset_line_index();
+    ts_clear();
+}
+
+function ts_redraw() {
+    pleaseRedrawEverything = true;
+    request_redraw_frame();
+}
+
+function ts_clear() {
+	pleaseRedrawEverything = true;
+    fullClear = true;
+    request_redraw_frame();
+}
+
+/**
+ * 清空画布
+ * @param {boolean} undoable - 用户清空画布时记录到撤销日志；切换卡片等由程序清空时连同撤销日志一起清空
+ */
+function clear_canvas(undoable)
+{
+    if (undoable) {
+        if (!arrays_of_points.length && !strokes.length && !hasBakedLayer) return;
+        record_operation({ type: 'clear', lines: arrays_of_points, perfectCache: perfect_cache, strokes: strokes, baked: hasBakedLayer });
+        //don't continue to put points into an empty array(pointermove) if clearing while drawing on the canvas
+        replace_all_strokes([], [], []);
+        set_baked_layer_visible(false);
+        strokeOperation = 'E';
+    } else {
+        stop_drawing();
+        arrays_of_points = [];
+        // 撤销日志一并清空，之前的笔画视图(包括撤销记录中的)都不再使用
+        reset_undo_log();
+        reset_stroke_store();
+        reset_line_index();
+        strokes = [];
+        perfect_cache = [];
+        clear_baked_layer();
+        reset_ink_snapshot();
+        ts_clear();
+        ts_undo_button.className = "";
+    }
+    
+    // 标记笔迹已变化并保存（清空）
+    strokesChanged = true;
+    save_strokes_debounced();
+}
+
+function stop_drawing() {
+    // 清除所有待处理的笔触计时器
+    if (pendingPenStrokeTimer) {
+        clearTimeout(pendingPenStrokeTimer);
+        pendingPenStroke = null;
+    }
+    
+    if (pendingCalligraphyTimer) {
+        clearTimeout(pendingCalligraphyTimer);
+        pendingCalligraphyStroke = null;
+    }
+    
+    isPointerDown = false;
+}
+
+function start_drawing() {
+    ts_undo_button.className = "active"
+    isPointerDown = true;
+}
+
+// 渲染循环状态：只有存在待绘制笔迹或重绘请求时才申请下一帧，空闲时不占用CPU/GPU
+var renderFrameRequested = false;
+var renderLoopStats = {
+    frames: 0,        // 实际执行的绘制帧数
+    requests: 0,      // 申请新帧的次数(合并后的)
+    idleCycles: 0,    // 渲染循环进入空闲的次数
+    lastFrameTime: 0, // 最近一帧的时间戳
+    idleSince: 0      // 进入空闲的时间戳，0表示循环正在运行
+};
+
+/**
+ * 申请一帧重绘，同一帧内的多次申请会被合并
+ */
+function request_redraw_frame() {
+    if (renderFrameRequested) return;
+    renderFrameRequested = true;
+    renderLoopStats.requests++;
+    renderLoopStats.idleSince = 0;
+    window.requestAnimationFrame(draw_last_line_segment);
+}
+
+/**
+ * 判断是否还有未绘制到画布上的笔迹
+ * @returns {boolean} 有待绘制内容时返回true
+ */
+function has_pending_ink() {
+    return pleaseRedrawEverything || dirtyRegion !== null || lazyPaintRegions.length > 0 ||
+        nextLine < arrays_of_points.length ||
+        nextStroke < strokes.length;
+}
+
+/**
+ * 获取渲染循环的运行统计，用于诊断
+ * @returns {Object} 统计信息副本
+ */
+function get_render_loop_stats() {
+    var stats = Object.assign({}, renderLoopStats);
+    stats.running = renderFrameRequested;
+    return stats;
+}
+
+function draw_last_line_segment(timestamp) {
+    renderFrameRequested = false;
+    renderLoopStats.frames++;
+    renderLoopStats.lastFrameTime = timestamp || Date.now();
+    draw_upto_latest_point_async(nextLine, nextPoint, nextStroke);
+    
+    if (isPointerDown || has_pending_ink()) {
+        request_redraw_frame();
+    } else {
+        renderLoopStats.idleCycles++;
+        renderLoopStats.idleSince = renderLoopStats.lastFrameTime;
+    }
+}
+
+var nextLine = 0;
+var nextPoint = 0;
+var nextStroke = 0;
+var p1,p2,p3;
+// 正在绘制(尚未提交)的手写笔画在arrays_of_points中的下标，-1表示没有
+var liveLineIndex = -1;
+
+// 已提交笔迹的离屏图层。完成的笔画只绘制到这里，主画布只负责展示该图层，
+// 正在绘制的笔画画在secondary_canvas上，因此书写时的开销只与当前笔画有关
+var committed_canvas = document.createElement('canvas');
+var committed_ctx = committed_canvas.getContext('2d');
+// 已提交图层当前的缩放比例，0表示尚未按画布尺寸分配
+var committedLayerDpr = 0;
+var committedLayerStats = {
+    rebuilds: 0, // 整层重建次数
+    appends: 0,  // 增量追加的笔画数
+    presents: 0  // 图层展示到主画布的次数
+};
+
+function is_last_path_and_currently_drawn(i){
+    return (isPointerDown && arrays_of_points.length-1 == i)//the path is complete unless its the last of the array and the pointer is still down
+}
+
+function all_drawing_finished(i){
+    return (!isPointerDown && arrays_of_points.length-1 == i)//the path is complete unless its the last of the array and the pointer is still down
+}
+
+/**
+ * 判断某条线是否为正在绘制中的手写笔画
+ * 直线和矩形在抬笔时才加入数组，因此永远不是正在绘制的笔画
+ * @param {number} i - 线在arrays_of_points中的下标
+ */
+function is_live_line(i) {
+    return isPointerDown && i === liveLineIndex && is_last_path_and_currently_drawn(i);
+}
+
+async function draw_path_at_some_point_async(startX, startY, midX, midY, endX, endY, lineWidth, targetCtx) {
+		targetCtx = targetCtx || ctx;
+		targetCtx.beginPath();
+		targetCtx.moveTo((startX + (midX - startX) / 2), (startY + (midY - startY)/ 2));//midpoint calculation for x and y
+		targetCtx.quadraticCurveTo(midX, midY, (midX + (endX - midX) / 2), (midY + (endY - midY)/ 2));
+		targetCtx.lineWidth = lineWidth;
+		targetCtx.stroke();
+};
+
+/**
+ * 使已提交图层与主画布的像素尺寸保持一致
+ * @returns {boolean} 图层被重新分配(内容已清空)时返回true
+ */
+function sync_committed_layer_size() {
+    var dpr = renderScale;
+    if (committed_canvas.width === ctx.canvas.width &&
+        committed_canvas.height === ctx.canvas.height &&
+        committedLayerDpr === dpr) {
+        return false;
+    }
+    // 检查点与图层尺寸对应
+    reset_layer_checkpoints();
+    // 缩放比例不变时把原有内容复制到新图层，只补画新露出的区域
+    var preserve = committedLayerDpr === dpr && committed_canvas.width > 1 && committed_canvas.height > 1;
+    var oldWidth = committed_canvas.width / dpr;
+    var oldHeight = committed_canvas.height / dpr;
+    if (preserve) {
+        var previous = committed_canvas;
+        committed_canvas = document.createElement('canvas');
+        committed_canvas.width = ctx.canvas.width;
+        committed_canvas.height = ctx.canvas.height;
+        committed_ctx = committed_canvas.getContext('2d');
+        committed_ctx.drawImage(previous, 0, 0);
+        previous.width = previous.height = 0;
+    } else {
+        committed_canvas.width = ctx.canvas.width;
+        committed_canvas.height = ctx.canvas.height;
+    }
+    committed_ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+    committed_ctx.lineJoin = committed_ctx.lineCap = 'round';
+    committedLayerDpr = dpr;
+    if (preserve) {
+        repaint_exposed_regions(oldWidth, oldHeight, committed_canvas.width / dpr, committed_canvas.height / dpr);
+        return false;
+    }
+    return true;
+}
+
+/**
+ * 清空secondary_canvas，与其当前的坐标变换无关
+ */
+function clear_secondary_canvas() {
+    secondary_ctx.save();
+    secondary_ctx.setTransform(1, 0, 0, 1, 0, 0);
+    secondary_ctx.clearRect(0, 0, secondary_canvas.width, secondary_canvas.height);
+    secondary_ctx.restore();
+}
+
+/**
+ * 清空已提交笔迹，分块模式下直接释放所有分块
+ */
+function clear_committed_layer() {
+    if (use_tiled_canvas()) {
+        release_all_tiles();
+        return;
+    }
+    if (use_worker_canvas()) {
+        worker_clear_layer();
+        return;
+    }
+    committed_ctx.save();
+    committed_ctx.setTransform(1, 0, 0, 1, 0, 0);
+    committed_ctx.clearRect(0, 0, committed_canvas.width, committed_canvas.height);
+    committed_ctx.restore();
+}
+
+/**
+ * 将一条已完成的线提交到已提交图层(或其经过的分块)
+ * @param {number} i - 线在arrays_of_points中的下标
+ */
+function commit_line_to_layer(i) {
+    if (use_tiled_canvas()) {
+        tiles_draw_line(i);
+    } else if (use_worker_canvas()) {
+        worker_draw_line(i);
+    } else {
+        draw_committed_line(committed_ctx, i);
+    }
+}
+
+/**
+ * 将一个书法笔画提交到已提交图层(或其经过的分块)
+ * @param {Stroke} stroke - 书法笔画
+ */
+function commit_calligraphy_to_layer(stroke) {
+    if (use_tiled_canvas()) {
+        tiles_draw_calligraphy(stroke);
+    } else if (use_worker_canvas()) {
+        worker_draw_calligraphy(stroke);
+    } else {
+        stroke.draw(WEIGHT, committed_ctx);
+    }
+}
+
+/**
+ * 将已提交图层复制到主画布；分块和Worker画布本身就是可见的，无需复制
+ */
+function present_committed_layer() {
+    if (use_tiled_canvas() || use_worker_canvas()) return;
+    ctx.save();
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.clearRect(0, 0, ctx.canvas.width, ctx.canvas.height);
+    ctx.drawImage(committed_canvas, 0, 0);
+    ctx.restore();
+    committedLayerStats.presents++;
+}
+
+/**
+ * 从指定点开始逐段绘制手写笔画
+ * @param {CanvasRenderingContext2D} targetCtx - 绘图上下文
+ * @param {Array} points - 笔画的点
+ * @param {number} startPoint - 起始点下标
+ */
+function draw_line_segments(targetCtx, points, startPoint) {
+    var line = read_line(points);
+    var xy = line.xy;
+    ///0,0,0; 0,0,1; 0,1,2 or x+1,x+2,x+3
+    //take the 2 previous points in addition to current one at the start of the loop.
+    var i2 = startPoint > 1 ? startPoint-2 : 0;
+    var i3 = startPoint > 0 ? startPoint-1 : 0;
+    // 使用笔画中存储的线宽和颜色
+    targetCtx.strokeStyle = line.color || color;
+    for(var j = startPoint; j < line.count; j++){
+        var i1 = i2;
+        i2 = i3;
+        i3 = j;
+        draw_path_at_some_point_async(xy[i1*2],xy[i1*2+1],xy[i2*2],xy[i2*2+1],xy[i3*2],xy[i3*2+1], line.width || line_width, targetCtx);
+    }
+}
+
+/**
+ * 以Perfect Freehand方式填充笔画
+ * @param {CanvasRenderingContext2D} targetCtx - 绘图上下文
+ * @param {number} i - 线在arrays_of_points中的下标
+ * @param {boolean} complete - 笔画是否已完成，只有完成的笔画才会缓存路径
+ */
+function fill_perfect_line(targetCtx, i, complete) {
+    var path = perfect_cache[i];
+    // 从文件载入的缓存项不是Path2D(JSON序列化后为空对象)，需要重新生成
+    if (!(path instanceof Path2D) || !complete) {
+        path = new Path2D(getFreeDrawSvgPath(arrays_of_points[i], complete));
+        if (complete) perfect_cache[i] = path;
+    }
+    targetCtx.fillStyle = read_line(arrays_of_points[i]).color || color;
+    targetCtx.fill(path);
+}
+
+// 已完成笔画的Path2D缓存，以笔画的点数组为键，笔画被删除后缓存随之回收
+var strokePathCache = new WeakMap();
+
+/**
+ * 为已完成的普通笔画、直线或矩形生成Path2D及其描边样式
+ * @param {Object} line - read_line返回的笔画数据 {xy, count, color, width, style}
+ * @returns {Object} {path, color, width, dashPattern}
+ */
+function build_stroke_path(line) {
+    var xy = line.xy;
+    var entry = {
+        path: new Path2D(),
+        color: line.color || color,
+        width: line.width || line_width,
+        dashPattern: []
+    };
+    
+    if (line.count === 2) {
+        var styleInfo = line.style || { style: 'solid', dashPattern: [] };
+        if (styleInfo.style === 'rectangle') {
+            entry.path.rect(xy[0], xy[1], xy[2] - xy[0], xy[3] - xy[1]);
+        } else if (styleInfo.style === 'wavy') {
+            entry.path = create_wavy_line_path(xy[0], xy[1], xy[2], xy[3], 2);
+        } else {
+            if (styleInfo.style === 'dashed' && styleInfo.dashPattern && styleInfo.dashPattern.length > 0) {
+                entry.dashPattern = styleInfo.dashPattern;
+            }
+            entry.path.moveTo(xy[0], xy[1]);
+            entry.path.lineTo(xy[2], xy[3]);
+        }
+        return entry;
+    }
+    
+    // 与draw_path_at_some_point_async相同的中点二次曲线，相邻曲线首尾相接，可连成一条路径
+    var x2 = xy[0], y2 = xy[1];
+    entry.path.moveTo(x2, y2);
+    for (var j = 0; j < line.count; j++) {
+        var x3 = xy[j * 2], y3 = xy[j * 2 + 1];
+        entry.path.quadraticCurveTo(x2, y2, (x2 + (x3 - x2) / 2), (y2 + (y3 - y2) / 2));
+        x2 = x3;
+        y2 = y3;
+    }
+    return entry;
+}
+
+/**
+ * 获取笔画的缓存路径，点数变化时重新生成
+ * @param {Array} points - 笔画的点
+ * @returns {Object} {path, color, width, dashPattern}
+ */
+function get_stroke_path(points) {
+    var entry = strokePathCache.get(points);
+    if (!entry || entry.pointCount !== points.length) {
+        entry = build_stroke_path(read_line(points));
+        entry.pointCount = points.length;
+        strokePathCache.set(points, entry);
+    }
+    return entry;
+}
+
+/**
+ * 使某条笔画的缓存路径失效，修改笔画的点之后调用
+ * @param {Array} points - 笔画的点
+ */
+function invalidate_stroke_path(points) {
+    strokePathCache.delete(points);
+    strokeBoundsCache.delete(points);
+}
+
+// 笔画包围盒缓存，键与strokePathCache相同(普通笔画为点数组，书法笔画为Stroke对象)
+var strokeBoundsCache = new WeakMap();
+// 待局部重绘的区域(CSS像素)，null表示没有
+var dirtyRegion = null;
+var dirtyRedrawStats = {
+    partialRedraws: 0, // 局部重绘次数
+    redrawnStrokes: 0  // 局部重绘中实际重画的笔画数
+};
+
+/**
+ * 获取普通笔画、直线或矩形的包围盒，已包含线宽
+ * @param {Array} points - 笔画的点
+ * @returns {Object} {left, top, right, bottom}
+ */
+function get_line_bounds(points) {
+    var bounds = strokeBoundsCache.get(points);
+    if (bounds && bounds.pointCount === points.length) return bounds;
+    
+    var line = read_line(points);
+    var xy = line.xy;
+    var left = Infinity, top = Infinity, right = -Infinity, bottom = -Infinity;
+    for (var j = 0; j < line.count; j++) {
+        var x = xy[j * 2], y = xy[j * 2 + 1];
+        if (x < left) left = x;
+        if (x > right) right = x;
+        if (y < top) top = y;
+        if (y > bottom) bottom = y;
+    }
+    // 线宽一半之外再留出波浪线振幅和抗锯齿的余量；Perfect Freehand的笔画可能比线宽更粗
+    var pad = (line.width || line_width) + 2;
+    bounds = {
+        left: left - pad,
+        top: top - pad,
+        right: right + pad,
+        bottom: bottom + pad,
+        pointCount: line.count
+    };
+    strokeBoundsCache.set(points, bounds);
+    return bounds;
+}
+
+/**
+ * 获取书法笔画的包围盒，按控制点计算并留出笔锋宽度
+ * @param {Stroke} stroke - 书法笔画
+ * @returns {Object} {left, top, right, bottom}
+ */
+function get_calligraphy_bounds(stroke) {
+    var bounds = strokeBoundsCache.get(stroke);
+    if (bounds) return bounds;
+    
+    var left = Infinity, top = Infinity, right = -Infinity, bottom = -Infinity;
+    var parts = read_calligraphy_points(stroke);
+    for (var s = 0; s < parts.length; s++) {
+        var xy = parts[s];
+        for (var j = 0; j + 1 < xy.length; j += 2) {
+            var x = xy[j], y = xy[j + 1];
+            if (x < left) left = x;
+            if (x > right) right = x;
+            if (y < top) top = y;
+            if (y > bottom) bottom = y;
+        }
+    }
+    var pad = WEIGHT * 2;
+    bounds = { left: left - pad, top: top - pad, right: right + pad, bottom: bottom + pad };
+    strokeBoundsCache.set(stroke, bounds);
+    return bounds;
+}
+
+function bounds_intersect(a, b) {
+    return a.left < b.right && a.right > b.left && a.top < b.bottom && a.bottom > b.top;
+}
+
+/**
+ * 点(x, y)是否落在包围盒向外扩展radius后的范围内，用于命中检测前的快速排除
+ */
+function point_near_bounds(bounds, x, y, radius) {
+    return x >= bounds.left - radius && x <= bounds.right + radius &&
+        y >= bounds.top - radius && y <= bounds.bottom + radius;
+}
+
+/**
+ * 将一个区域并入待局部重绘区域，并申请一帧
+ * @param {Object} bounds - {left, top, right, bottom}
+ */
+function add_dirty_region(bounds) {
+    if (!bounds || !isFinite(bounds.left)) return;
+    if (!dirtyRegion) {
+        dirtyRegion = { left: bounds.left, top: bounds.top, right: bounds.right, bottom: bounds.bottom };
+    } else {
+        dirtyRegion.left = Math.min(dirtyRegion.left, bounds.left);
+        dirtyRegion.top = Math.min(dirtyRegion.top, bounds.top);
+        dirtyRegion.right = Math.max(dirtyRegion.right, bounds.right);
+        dirtyRegion.bottom = Math.max(dirtyRegion.bottom, bounds.bottom);
+    }
+    request_redraw_frame();
+}
+
+/**
+ * 记录arrays_of_points中第i条线已被移除(在splice/pop之后调用)
+ * @param {number} i - 被移除的下标
+ * @param {Array} points - 被移除的线
+ */
+function mark_line_removed(i, points) {
+    if (use_worker_canvas()) worker_forget_line(points);
+    unindex_line(points);
+    invalidate_line_positions(i);
+    if (i < nextLine) {
+        nextLine--;
+        drop_checkpoints_after(i, Infinity);
+        add_dirty_region(get_line_bounds(points));
+    }
+    if (i < liveLineIndex) liveLineIndex--;
+}
+
+/**
+ * 记录第i条线被重新插入arrays_of_points(在splice之后调用)
+ * @param {number} i - 插入的下标
+ * @param {Array} points - 插入的线
+ */
+function mark_line_inserted(i, points) {
+    // 先补登记末尾的新笔画，否则从末尾向前的补登记会在这条笔画处停止
+    sync_line_index();
+    if (!lineIndexEntries.has(points)) index_line(points);
+    invalidate_line_positions(i);
+    if (i < nextLine) {
+        nextLine++;
+        drop_checkpoints_after(i, Infinity);
+        add_dirty_region(get_line_bounds(points));
+    } else {
+        request_redraw_frame();
+    }
+    if (i <= liveLineIndex) liveLineIndex++;
+}
+
+/**
+ * 记录strokes中第i个书法笔画已被移除
+ * @param {number} i - 被移除的下标
+ * @param {Stroke} stroke - 被移除的笔画
+ */
+function mark_calligraphy_removed(i, stroke) {
+    if (i < nextStroke) {
+        nextStroke--;
+        drop_checkpoints_after(Infinity, i);
+        add_dirty_region(get_calligraphy_bounds(stroke));
+    }
+}
+
+/**
+ * 记录第i个书法笔画被重新插入strokes
+ * @param {number} i - 插入的下标
+ * @param {Stroke} stroke - 插入的笔画
+ */
+function mark_calligraphy_inserted(i, stroke) {
+    if (i < nextStroke) {
+        nextStroke++;
+        drop_checkpoints_after(Infinity, i);
+        add_dirty_region(get_calligraphy_bounds(stroke));
+    } else {
+        request_redraw_frame();
+    }
+}
+
+/**
+ * 只重绘已提交图层中的脏区域：裁剪到该区域，清空后只重画与之相交的已提交笔画，
+ * 再把这块区域复制到主画布
+ * @param {Object} region - {left, top, right, bottom}，CSS像素
+ */
+function redraw_dirty_region(region) {
+    if (use_tiled_canvas()) {
+        dirtyRedrawStats.redrawnStrokes += tiles_redraw_region(region);
+        dirtyRedrawStats.partialRedraws++;
+        return;
+    }
+    if (use_worker_canvas()) {
+        dirtyRedrawStats.redrawnStrokes += worker_redraw_region(region);
+        dirtyRedrawStats.partialRedraws++;
+        return;
+    }
+    var dpr = committedLayerDpr;
+    // 对齐到设备像素，避免裁剪边缘出现半透明接缝
+    var px = Math.max(0, Math.floor(region.left * dpr));
+    var py = Math.max(0, Math.floor(region.top * dpr));
+    var pr = Math.min(committed_canvas.width, Math.ceil(region.right * dpr));
+    var pb = Math.min(committed_canvas.height, Math.ceil(region.bottom * dpr));
+    if (pr <= px || pb <= py) return;
+    var clip = { left: px / dpr, top: py / dpr, right: pr / dpr, bottom: pb / dpr };
+    
+    committed_ctx.save();
+    committed_ctx.beginPath();
+    committed_ctx.rect(clip.left, clip.top, clip.right - clip.left, clip.bottom - clip.top);
+    committed_ctx.clip();
+    committed_ctx.clearRect(clip.left, clip.top, clip.right - clip.left, clip.bottom - clip.top);
+    
+    var lineCount = Math.min(nextLine, arrays_of_points.length);
+    for (var i = 0; i < lineCount; i++) {
+        if (is_live_line(i) || !arrays_of_points[i].length) continue;
+        if (bounds_intersect(get_line_bounds(arrays_of_points[i]), clip)) {
+            draw_committed_line(committed_ctx, i);
+            dirtyRedrawStats.redrawnStrokes++;
+        }
+    }
+    var strokeCount = Math.min(nextStroke, strokes.length);
+    for (var i = 0; i < strokeCount; i++) {
+        if (bounds_intersect(get_calligraphy_bounds(strokes[i]), clip)) {
+            strokes[i].draw(WEIGHT, committed_ctx);
+            dirtyRedrawStats.redrawnStrokes++;
+        }
+    }
+    committed_ctx.restore();
+    
+    ctx.save();
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.clearRect(px, py, pr - px, pb - py);
+    ctx.drawImage(committed_canvas, px, py, pr - px, pb - py, px, py, pr - px, pb - py);
+    ctx.restore();
+    dirtyRedrawStats.partialRedraws++;
+}
+
+// 视口裁剪：整页画布上只绘制可见区域(加上边距)附近的笔画，其余笔画在滚动到附近时再绘制
+var CULL_MARGIN = 400; // 可见区域上下额外绘制的范围(CSS像素)
+// 已提交图层中已经绘制好的纵向范围，null表示尚未绘制
+var paintedRange = null;
+// 因滚动而需要补画的区域
+var lazyPaintRegions = [];
+var cullingStats = {
+    skippedAppends: 0, // 因不在可见范围而延后绘制的笔画数
+    lazyPaints: 0      // 滚动后补画区域的次数
+};
+
+/**
+ * 当前是否对整页画布做视口裁剪；小画布和跟随滚动模式下画布本身就只有一屏大小
+ */
+function use_viewport_culling() {
+    return !small_canvas && !fullscreen_follow;
+}
+
+/**
+ * 计算需要绘制的区域：当前视口加上下边距，使用画布坐标
+ * @returns {Object} {left, top, right, bottom}
+ */
+function get_cull_band() {
+    var viewTop = Math.max(0, -wrapper.getBoundingClientRect().top);
+    return {
+        left: 0,
+        top: Math.max(0, viewTop - CULL_MARGIN),
+        right: parseFloat(canvas.style.width) || window.innerWidth,
+        bottom: viewTop + window.innerHeight + CULL_MARGIN
+    };
+}
+
+/**
+ * 判断包围盒是否位于已绘制范围内
+ */
+function is_in_painted_range(bounds) {
+    return !paintedRange || (bounds.bottom > paintedRange.top && bounds.top < paintedRange.bottom);
+}
+
+/**
+ * 滚动时扩展已绘制范围，新露出的区域放入补画队列；跳跃式滚动时直接按新位置重建
+ */
+function on_viewport_scroll() {
+    if (!paintedRange || !use_viewport_culling()) return;
+    var band = get_cull_band();
+    if (band.top >= paintedRange.top && band.bottom <= paintedRange.bottom) return;
+    
+    if (band.bottom < paintedRange.top || band.top > paintedRange.bottom) {
+        ts_redraw();
+        return;
+    }
+    if (band.top < paintedRange.top) {
+        lazyPaintRegions.push({ left: band.left, top: band.top, right: band.right, bottom: paintedRange.top });
+        paintedRange.top = band.top;
+    }
+    if (band.bottom > paintedRange.bottom) {
+        lazyPaintRegions.push({ left: band.left, top: paintedRange.bottom, right: band.right, bottom: band.bottom });
+        paintedRange.bottom = band.bottom;
+    }
+    request_redraw_frame();
+}
+
+window.addEventListener('scroll', on_viewport_scroll, { passive: true });
+
+/**
+ * 将一条已完成的线完整绘制到指定上下文
+ * @param {CanvasRenderingContext2D} targetCtx - 绘图上下文
+ * @param {number} i - 线在arrays_of_points中的下标
+ */
+function draw_committed_line(targetCtx, i) {
+    var points = arrays_of_points[i];
+    if (!points || points.length === 0) return;
+    if (perfectFreehand) {
+        fill_perfect_line(targetCtx, i, true);
+        return;
+    }
+    // 直线、矩形和普通笔画都使用缓存路径，一次stroke完成绘制
+    var entry = get_stroke_path(points);
+    targetCtx.lineWidth = entry.width;
+    targetCtx.strokeStyle = entry.color;
+    targetCtx.setLineDash(entry.dashPattern);
+    targetCtx.stroke(entry.path);
+    targetCtx.setLineDash([]);
+}
+
+/**
+ * 在secondary_canvas上绘制正在书写的笔画，只绘制新增的部分
+ * @param {number} i - 线在arrays_of_points中的下标
+ * @param {number} startPoint - 上次绘制到的点
+ */
+function draw_live_line(i, startPoint) {
+    var points = arrays_of_points[i];
+    secondary_ctx.setLineDash([]);
+    secondary_ctx.lineJoin = secondary_ctx.lineCap = 'round';
+    if (perfectFreehand) {
+        clear_secondary_canvas();
+        fill_perfect_line(secondary_ctx, i, false);
+    } else if (predictedTailDrawn && startPoint > 0) {
+        // 上一帧的临时笔尾不能单独擦除，用一条路径整笔重画
+        clear_secondary_canvas();
+        var entry = get_stroke_path(points);
+        secondary_ctx.lineWidth = entry.width;
+        secondary_ctx.strokeStyle = entry.color;
+        secondary_ctx.stroke(entry.path);
+    } else {
+        if (startPoint === 0) clear_secondary_canvas();
+        draw_line_segments(secondary_ctx, points, startPoint);
+    }
+    predictedTailDrawn = draw_predicted_tail(points);
+    nextPoint = points.length;//track which point was last drawn so we can pick up where we left off on the next refresh.
+}
+
+/**
+ * 从笔画最后一点沿预测事件画出临时笔尾，下一帧会被真实采样替换
+ * @param {Array} points - 正在书写的笔画
+ * @returns {boolean} 画了笔尾时返回true
+ */
+function draw_predicted_tail(points) {
+    if (!lowLatencyInk || !predictedPoints.length || !points.length) return false;
+    var last = points[points.length - 1];
+    secondary_ctx.beginPath();
+    secondary_ctx.moveTo(last[0], last[1]);
+    for (var k = 0; k < predictedPoints.length; k++) {
+        secondary_ctx.lineTo(predictedPoints[k][0], predictedPoints[k][1]);
+    }
+    secondary_ctx.lineWidth = last[3] || line_width;
+    secondary_ctx.strokeStyle = last[2] || color;
+    secondary_ctx.stroke();
+    return true;
+}
+
+var pleaseRedrawEverything = false;
+var fullClear = false;
+// 只需要把已提交图层重新展示到主画布(例如主画布被resize清空)
+var pleasePresentLayer = false;
+
+/**
+ * 请求将已提交图层重新复制到主画布，不重建图层
+ */
+function ts_present() {
+    pleasePresentLayer = true;
+    request_redraw_frame();
+}
+
+async function draw_upto_latest_point_async(startLine, startPoint, startStroke){
+	var fullRedraw = false;//keep track if this call started a full redraw to unset pleaseRedrawEverything flag later.
+	var layerChanged = false;
+	if (pleaseRedrawEverything) {// rebuild the committed layer from start
+	dirtyRegion = null;//the full rebuild covers any pending dirty region
+	lazyPaintRegions = [];
+	fullRedraw = true;
+	layerChanged = true;
+	startLine = 0;
+	startPoint = 0;
+    startStroke = 0;
+	clear_committed_layer();
+	reset_layer_checkpoints();
+	committedLayerStats.rebuilds++;
+	// 清空画布或撤销时，正在书写的笔画可能已被移除，同时清掉它的临时内容
+	if (liveLineIndex >= 0 && !is_live_line(liveLineIndex)) {
+		clear_secondary_canvas();
+		liveLineIndex = -1;
+	}
+	paintedRange = null;
+	if (use_viewport_culling()) {
+		// only paint what is near the viewport, the rest is painted when scrolled to
+		paintedRange = get_cull_band();
+		nextLine = (liveLineIndex >= 0 && is_live_line(liveLineIndex)) ? liveLineIndex : arrays_of_points.length;
+		nextStroke = strokes.length;
+		redraw_dirty_region(paintedRange);
+		startLine = nextLine;
+		startStroke = nextStroke;
+	}
+	} else if (dirtyRegion) {// erase/undo only touched part of the layer
+	var region = dirtyRegion;
+	dirtyRegion = null;
+	if (paintedRange) {// nothing outside the painted range needs repainting
+		region.top = Math.max(region.top, paintedRange.top);
+		region.bottom = Math.min(region.bottom, paintedRange.bottom);
+	}
+	// 重放最近检查点之后的笔画比局部重绘更少时，从检查点恢复
+	if (region.bottom > region.top && !restore_layer_checkpoint(region)) redraw_dirty_region(region);
+	startLine = nextLine;
+	startStroke = nextStroke;
+	}
+	while (lazyPaintRegions.length) {// strokes scrolled into view
+	redraw_dirty_region(lazyPaintRegions.shift());
+	cullingStats.lazyPaints++;
+	}
+
+	for(var i = startLine; i < arrays_of_points.length; i++){ //Draw Lines
+		nextLine = i;
+		if (is_live_line(i)) {
+			// 正在书写的笔画只画在secondary_canvas上
+			draw_live_line(i, startPoint);
+			break;
+		}
+		
+		if (is_in_painted_range(get_line_bounds(arrays_of_points[i]))) {
+			commit_line_to_layer(i);
+			layerChanged = true;
+		} else {
+			cullingStats.skippedAppends++;
+		}
+		if (!fullRedraw) committedLayerStats.appends++;
+		if (i === liveLineIndex) {
+			// 笔画已提交到图层，清除其在secondary_canvas上的临时内容
+			clear_secondary_canvas();
+			liveLineIndex = -1;
+		}
+		nextLine = i + 1;
+		nextPoint = 0;
+        startPoint = 0;
+        maybe_capture_checkpoint();
+    }
+    //Draw Calligraphy Strokes one by one starting from the given point
+    for(var i = startStroke; i < strokes.length; i++){
+        nextStroke = i+1;
+        if (is_in_painted_range(get_calligraphy_bounds(strokes[i]))) {
+            commit_calligraphy_to_layer(strokes[i]);
+            layerChanged = true;
+        } else {
+            cullingStats.skippedAppends++;
+        }
+        maybe_capture_checkpoint();
+    }
+    // 视口裁剪下的整层重建不经过上面的循环
+    if (fullRedraw) maybe_capture_checkpoint();
+
+    if (layerChanged || pleasePresentLayer) {
+        pleasePresentLayer = false;
+        present_committed_layer();
+    }
+    // Worker模式下本帧的所有绘制命令合并为一条消息
+    flush_worker_batch();
+
+	if (fullRedraw) {//finished full redraw, now can unset redraw all flag so no more full redraws until necessary
+    pleaseRedrawEverything = false;
+	fullRedraw = false;
+    nextStroke = strokes.length;
+        if(fullClear){// start again from 0.
+            nextLine = 0;
+            nextPoint = 0;
+            nextStroke = 0;
+            fullClear = false;
+        }
+        
+        // 如果画布上没有任何笔迹，确保重置所有绘图状态
+        if (arrays_of_points.length === 0 && strokes.length === 0) {
+            nextLine = 0;
+            nextPoint = 0;
+            nextStroke = 0;
+        }
+	}
+}
+
+var drawingWithPressurePenOnly = false; // hack for drawing with 2 main pointers when using a presure sensitive pen
+
+// 添加临时变量跟踪最近的笔事件
+var lastPenDownTime = 0;
+var pendingPenStroke = null;
+var pendingPenStrokeTimer = null;
+
+function pointerDownLine(e) {
+    // 如果使用Surface Pen笔端擦除模式，不进行绘制
+    if (!visible || calligraphy || eraserMode || isPenEraserActive) return;
+    
+    // 对Surface Pen做特殊处理，延迟绘制以避免擦除模式误触发的点
+    if (e.pointerType === 'pen') {
+        e.preventDefault();
+        
+        // 存储当前笔触信息和时间戳
+        invalidate_canvas_rect();
+        var rect = get_canvas_rect();
+        var x = e.clientX - rect.left;
+        var y = e.clientY - rect.top;
+        lastPenDownTime = Date.now();
+        
+        // 清除之前可能存在的待定笔触计时器
+        if (pendingPenStrokeTimer) {
+            clearTimeout(pendingPenStrokeTimer);
+        }
+        
+        // 暂存笔触信息
+        pendingPenStroke = {
+            x: x,
+            y: y,
+            lineMode: lineMode,
+            rectangleMode: rectangleMode,
+            e: e,
+            button: e.button // 保存按钮信息
+        };
+        
+        // 延迟处理，给系统时间检测笔端擦除按钮
+        pendingPenStrokeTimer = setTimeout(function() {
+            // 检查在延迟期间是否激活了笔端擦除或侧方按键橡皮擦
+            if (isPenEraserActive || eraserMode) {
+                pendingPenStroke = null;
+                return;
+            }
+            
+            // 如果是侧方按键（Surface Pen按钮1或2）点击，不绘制
+            if (pendingPenStroke.button === 1 || pendingPenStroke.button === 2) {
+                pendingPenStroke = null;
+                return;
+            }
+            
+            // 执行常规的笔触处理
+            isPointerDown = true;
+            
+            if (pendingPenStroke.lineMode) {
+                startPoint = { x: pendingPenStroke.x, y: pendingPenStroke.y };
+            } else if (pendingPenStroke.rectangleMode) {
+                rectangleStartPoint = { x: pendingPenStroke.x, y: pendingPenStroke.y };
+            } else {
+                mouseX = pendingPenStroke.x;
+                mouseY = pendingPenStroke.y;
+                arrays_of_points.push(begin_line(mouseX, mouseY, color, line_width));
+                perfect_cache.push(null);
+                record_line_added(arrays_of_points[arrays_of_points.length - 1], 'L');
+                liveLineIndex = arrays_of_points.length - 1;
+                request_redraw_frame();
+                
+                // 如果这是完全清空画布后的第一笔，需要立即更新绘制状态
+                if (arrays_of_points.length === 1) {
+                    ts_redraw();
+                }
+            }
+            
+            pendingPenStroke = null;
+        }, 20); // 延迟20毫秒，这个值可能需要根据实际情况调整
+        
+        return;
+    }
+    
+    // 非笔触设备的原始处理逻辑
+    isPointerDown = true;
+    invalidate_canvas_rect();
+    var rect = get_canvas_rect();
+    var x = e.clientX - rect.left;
+    var y = e.clientY - rect.top;
+    
+    if (lineMode) {
+        startPoint = { x: x, y: y };
+        return;
+    }
+    
+    if (rectangleMode) {
+        rectangleStartPoint = { x: x, y: y };
+        return;
+    }
+    
+    mouseX = x;
+    mouseY = y;
+    arrays_of_points.push(begin_line(mouseX, mouseY, color, line_width));
+    perfect_cache.push(null);
+    record_line_added(arrays_of_points[arrays_of_points.length - 1], 'L');
+    liveLineIndex = arrays_of_points.length - 1;
+    request_redraw_frame();
+    
+    // 如果这是完全清空画布后的第一笔，需要立即更新绘制状态
+    if (arrays_of_points.length === 1) {
+        ts_redraw();
+    }
+}
+
+function pointerMoveLine(e) {
+    if (!visible || !isPointerDown || calligraphy || eraserMode || isPenEraserActive) return;
+    
+    var rect = get_canvas_rect();
+    var x = e.clientX - rect.left;
+    var y = e.clientY - rect.top;
+    lowLatencyStats.moveEvents++;
+    
+    if (lineMode) {
+        if (startPoint) {
+            // 清除上一次的临时线条
+            clear_secondary_canvas();
+            
+            // 使用直线专用设置
+            update_line_settings();
+            
+            // 根据当前样式绘制临时线条
+            if (lineStyle === 'wavy') {
+                // 绘制波浪线预览，使用当前设置的颜色和线宽
+                drawWavyLine(secondary_ctx, startPoint.x, startPoint.y, x, y, 2, 2, lineColor, lineWidth);
+            } else {
+                // 绘制直线/虚线预览
+                secondary_ctx.beginPath();
+                secondary_ctx.moveTo(startPoint.x, startPoint.y);
+                secondary_ctx.lineTo(x, y);
+                secondary_ctx.stroke();
+            }
+        }
+        return;
+    }
+    
+    if (rectangleMode) {
+        if (rectangleStartPoint) {
+            // 清除上一次的临时矩形
+            clear_secondary_canvas();
+            
+            // 使用矩形专用设置
+            update_rectangle_settings();
+            
+            // 绘制矩形预览
+            secondary_ctx.beginPath();
+            secondary_ctx.rect(
+                rectangleStartPoint.x, 
+                rectangleStartPoint.y, 
+                x - rectangleStartPoint.x, 
+                y - rectangleStartPoint.y
+            );
+            secondary_ctx.stroke();
+        }
+        return;
+    }
+    
+    var points = arrays_of_points[arrays_of_points.length - 1];
+    if (lowLatencyInk) {
+        // 合并事件包含两次pointermove之间的全部采样，最后一个与e本身相同
+        var samples = e.getCoalescedEvents ? e.getCoalescedEvents() : [];
+        for (var k = 0; k < samples.length; k++) {
+            line_push_point(points, samples[k].clientX - rect.left, samples[k].clientY - rect.top);
+        }
+        lowLatencyStats.coalescedSamples += samples.length;
+        if (!samples.length) line_push_point(points, x, y);
+        
+        var predicted = e.getPredictedEvents ? e.getPredictedEvents() : [];
+        predictedPoints = [];
+        for (var k = 0; k < predicted.length; k++) {
+            predictedPoints.push([predicted[k].clientX - rect.left, predicted[k].clientY - rect.top]);
+        }
+    } else {
+        line_push_point(points, x, y);
+    }
+    mouseX = x;
+    mouseY = y;
+    request_redraw_frame();
+}
+
+/**
+ * 生成波浪线路径
+ * @param {number} x1 - 起点X坐标
+ * @param {number} y1 - 起点Y坐标
+ * @param {number} x2 - 终点X坐标
+ * @param {number} y2 - 终点Y坐标
+ * @param {number} amplitude - 波浪振幅
+ * @returns {Path2D} 波浪线路径
+ */
+function create_wavy_line_path(x1, y1, x2, y2, amplitude) {
+    // 计算线段长度
+    const dx = x2 - x1;
+    const dy = y2 - y1;
+    const length = Math.sqrt(dx * dx + dy * dy);
+    
+    // 计算方向向量
+    const dirX = dx / length;
+    const dirY = dy / length;
+    
+    // 计算垂直于方向的向量
+    const perpX = -dirY;
+    const perpY = dirX;
+    
+    // 波浪的固定波长(像素)
+    const wavelength = 10; 
+    
+    // 使用路径绘制，而不是直接连接点
+    const path = new Path2D();
+    path.moveTo(x1, y1);
+    
+    // 通过更多的点来绘制更平滑的曲线
+    // 使用更小的步长来确保曲线平滑
+    const stepSize = 0.5; 
+    const totalSteps = Math.ceil(length / stepSize);
+    
+    for (let i = 0; i <= totalSteps; i++) {
+        const t = i / totalSteps; // 归一化参数 [0, 1]
+        
+        // 计算当前点在直线上的位置
+        const x = x1 + dirX * length * t;
+        const y = y1 + dirY * length * t;
+        
+        // 使用固定波长计算波浪
+        // 当前点的位置除以波长，然后乘以2π得到角度
+        const angle = (length * t / wavelength) * Math.PI * 2;
+        
+        // 使用正弦函数创建波浪
+        const wave = Math.sin(angle);
+        
+        // 使用固定振幅 - 减小为原来的一半
+        const fixedAmplitude = amplitude / 2; 
+        
+        // 应用偏移量垂直于直线方向
+        const offsetX = perpX * fixedAmplitude * wave;
+        const offsetY = perpY * fixedAmplitude * wave;
+        
+        // 绘制到当前点
+        if (i === 0) {
+            path.moveTo(x + offsetX, y + offsetY);
+        } else {
+            path.lineTo(x + offsetX, y + offsetY);
+        }
+    }
+    
+    return path;
+}
+
+/**
+ * 绘制波浪线
+ * @param {CanvasRenderingContext2D} ctx - 绘图上下文
+ * @param {number} x1 - 起点X坐标
+ * @param {number} y1 - 起点Y坐标
+ * @param {number} x2 - 终点X坐标
+ * @param {number} y2 - 终点Y坐标
+ * @param {number} amplitude - 波浪振幅
+ * @param {number} frequency - 波浪频率
+ * @param {string} [strokeColor] - 线条颜色，如果未提供则使用全局lineColor
+ * @param {number} [strokeWidth] - 线条宽度，如果未提供则使用全局lineWidth
+ */
+function drawWavyLine(ctx, x1, y1, x2, y2, amplitude, frequency, strokeColor, strokeWidth) {
+    // 保存当前绘图状态
+    ctx.save();
+    
+    // 设置线条样式，优先使用传入的颜色和宽度
+    ctx.lineWidth = strokeWidth || lineWidth;
+    ctx.strokeStyle = strokeColor || lineColor;
+    ctx.lineCap = 'round';
+    ctx.lineJoin = 'round';
+    
+    // 使用曲线属性绘制路径
+    ctx.stroke(create_wavy_line_path(x1, y1, x2, y2, amplitude));
+    ctx.restore();
+}
+
+// 修改pointerUpLine函数
+function pointerUpLine(e) {
+    // 当矩形正在绘制时，不处理普通的指针抬起事件
+    if (isDrawingRect) return;
+    
+    if (!isPointerDown || calligraphy || eraserMode || isPenEraserActive) return;
+    
+    var rect = get_canvas_rect();
+    var x = e.clientX - rect.left;
+    var y = e.clientY - rect.top;
+    
+    if (lineMode && startPoint) {
+        var endX = x;
+        var endY = y;
+        
+        // 保存当前样式信息
+        var currentStyle = {
+            style: lineStyle,
+            dashPattern: lineDashPattern.slice()
+        };
+        
+        // 保存线条数据 - 直线只需要两个点
+        // 为每个点添加颜色和线宽信息，同时添加样式信息
+        arrays_of_points.push(store_line([
+            [startPoint.x, startPoint.y, lineColor, lineWidth, currentStyle], // 添加样式信息
+            [endX, endY, lineColor, lineWidth, currentStyle]
+        ]));
+        perfect_cache.push(null);
+        record_line_added(arrays_of_points[arrays_of_points.length - 1], 'L');
+        
+        // 设置操作类型为添加
+        strokeOperation = 'A';
+        
+        // 清除临时画布
+        clear_secondary_canvas();
+        
+        // 新的直线会在下一帧追加到已提交图层
+        request_redraw_frame();
+        
+        startPoint = null;
+        isPointerDown = false;
+        
+        // 标记笔迹已变化，触发保存
+        strokesChanged = true;
+        save_strokes_debounced();
+        return;
+    } else if (rectangleMode && rectangleStartPoint) {
+        var endX = x;
+        var endY = y;
+        
+        // 创建矩形样式信息对象
+        var currentStyle = {
+            style: 'rectangle' // 标记为矩形
+        };
+        
+        // 保存矩形数据 - 存储矩形左上角和右下角的点
+        arrays_of_points.push(store_line([
+            [rectangleStartPoint.x, rectangleStartPoint.y, rectangleColor, rectangleWidth, currentStyle], // 起点(左上)
+            [endX, endY, rectangleColor, rectangleWidth, currentStyle] // 终点(右下)
+        ]));
+        perfect_cache.push(null);
+        record_line_added(arrays_of_points[arrays_of_points.length - 1], 'R'); // 使用R表示矩形类型
+        
+        // 设置操作类型为添加
+        strokeOperation = 'A';
+        
+        // 清除临时画布
+        clear_secondary_canvas();
+        
+        // 新的矩形会在下一帧追加到已提交图层
+        request_redraw_frame();
+        
+        rectangleStartPoint = null;
+        isPointerDown = false;
+        
+        // 标记笔迹已变化，触发保存
+        strokesChanged = true;
+        save_strokes_debounced();
+        return;
+    } else {
+        // 松开鼠标/触控笔后，下一帧会把该笔画提交到已提交图层
+        predictedPoints = [];
+        if (liveLineIndex >= 0) {
+            simplify_line(arrays_of_points[liveLineIndex], simplifyTolerance);
+            seal_line(arrays_of_points[liveLineIndex]);
+        }
+        request_redraw_frame();
+        
+        // 设置操作类型为添加
+        strokeOperation = 'A';
+    }
+    
+    isPointerDown = false;
+    
+    // 标记笔迹已变化，触发保存
+    strokesChanged = true;
+    save_strokes_debounced();
+}
+
+// 键盘快捷键，按键松开时触发
+register_hotkey('core:undo', 'Alt+Z', function() { ts_undo(); });
+register_hotkey('core:redo', 'Alt+Y', function() { ts_redo(); });
+register_hotkey('core:redo_shift', 'Alt+Shift+Y', function() { ts_redo(); });
+register_hotkey('core:redo_z', 'Alt+Shift+Z', function() { ts_redo(); });
+register_hotkey('core:clear', '.', function() { clear_canvas(true); }, { preventDefault: false });
+register_hotkey('core:visibility', ',', function() { switch_visibility(); }, { preventDefault: false });
+// 书法家功能(alt + C)和完美手写功能(alt + X)已禁用
+register_hotkey('core:small_canvas', 'Alt+B', function() { switch_small_canvas(); });
+register_hotkey('core:line', 'Alt+L', function() { switch_line_mode(); });
+register_hotkey('core:rectangle', 'Alt+R', function() { switch_rectangle_mode(); });
+var simplifyStats = {
+    strokes: 0,      // 简化过的笔画数
+    pointsBefore: 0, // 简化前的点数
+    pointsAfter: 0   // 简化后的点数
+};
+
+/**
+ * Ramer–Douglas–Peucker简化：保留首尾点，删除到保留线段距离小于容差的点
+ * @param {Float32Array} xy - 笔画坐标，x0, y0, x1, y1, ...
+ * @param {number} count - 点数
+ * @param {number} tolerance - 容差(CSS像素)
+ * @returns {Uint8Array} 每个点是否保留
+ */
+function simplify_points(xy, count, tolerance) {
+    var keep = new Uint8Array(count);
+    if (count <= 2 || !(tolerance > 0)) {
+        keep.fill(1);
+        return keep;
+    }
+    keep[0] = keep[count - 1] = 1;
+    var toleranceSq = tolerance * tolerance;
+    // 用栈代替递归，避免长笔画递归过深
+    var stack = [0, count - 1];
+    while (stack.length) {
+        var last = stack.pop();
+        var first = stack.pop();
+        var ax = xy[first * 2], ay = xy[first * 2 + 1];
+        var dx = xy[last * 2] - ax, dy = xy[last * 2 + 1] - ay;
+        var lengthSq = dx * dx + dy * dy;
+        var maxDistSq = 0;
+        var index = -1;
+        for (var i = first + 1; i < last; i++) {
+            var px = xy[i * 2] - ax, py = xy[i * 2 + 1] - ay;
+            var distSq;
+            if (lengthSq === 0) {
+                distSq = px * px + py * py;
+            } else {
+                var cross = px * dy - py * dx;
+                distSq = cross * cross / lengthSq;
+            }
+            if (distSq > maxDistSq) {
+                maxDistSq = distSq;
+                index = i;
+            }
+        }
+        if (index >= 0 && maxDistSq > toleranceSq) {
+            keep[index] = 1;
+            stack.push(first, index, index, last);
+        }
+    }
+    return keep;
+}
+
+/**
+ * 笔画完成时就地简化其点数组(数组本身不变，缓存和撤销记录仍指向同一个数组)
+ * 直线、矩形只有两个点，不受影响
+ * @param {Array} points - 笔画的点
+ * @param {number} tolerance - 容差(CSS像素)
+ */
+function simplify_line(points, tolerance) {
+    if (!points || points.length <= 2 || !(tolerance > 0)) return;
+    var line = read_line(points);
+    var keep = simplify_points(line.xy, line.count, tolerance);
+    var before = line.count;
+    var after = filter_line_points(points, keep);
+    simplifyStats.strokes++;
+    simplifyStats.pointsBefore += before;
+    simplifyStats.pointsAfter += after;
+    if (after !== before) invalidate_stroke_path(points);
+}
+
+// ----------------------------------------- Perfect Freehand -----------------------------------------
+
+function med(A, B) {
+  return [(A[0] + B[0]) / 2, (A[1] + B[1]) / 2];
+}
+
+// Trim SVG path data so number are each two decimal points. This
+// improves SVG exports, and prevents rendering errors on points
+// with long decimals.
+const TO_FIXED_PRECISION = /(\s?[A-Z]?,?-?[0-9]*\.[0-9]{0,2})(([0-9]|e|-)*)/g;
+
+function getSvgPathFromStroke(points){
+  if (!points.length) {
+    return "";
+  }
+
+  const max = points.length - 1;
+
+  return points
+    .reduce(
+      (acc, point, i, arr) => {
+        if (i === max) {
+          acc.push(point, med(point, arr[0]), "L", arr[0], "Z");
+        } else {
+          acc.push(point, med(point, arr[i + 1]));
+        }
+        return acc;
+      },
+      ["M", points[0], "Q"],
+    )
+    .join(" ")
+    .replace(TO_FIXED_PRECISION, "$1");
+}
+
+function getFreeDrawSvgPath(inputPoints, complete) {
+  // Consider changing the options for simulated pressure vs real pressure
+  const options = {
+    simulatePressure: inputPoints[0][2] > 1,
+    size: line_width,
+    thinning: 0.6,
+    smoothing: 0.5,
+    streamline: 0.5,
+    easing: (t) => Math.sin((t * Math.PI) / 2), // https://easings.net/#easeOutSine
+    last: complete, // LastCommittedPoint is added on pointerup
+  };
+
+  return getSvgPathFromStroke(getStroke(inputPoints, options));
+}
+/*
+ -------------------------------- Caligrapher ------------------------------------------
+ Created By: August Toman-Yih
+ Git Repository: https://github.com/atomanyih/Calligrapher
+*/
+/* ------------------------------        script.js        -----------------------------*/
+//Modified to work with current canvas and board
+//share the same canvas with pressure drawing
+ /*var canvas = document.getElementById('canvas'),
+    width = canvas.width,
+    height = canvas.height,
+    context = canvas.getContext("2d");
+	*/
+
+//FIXME REORGANIZE EBERYTING
+//--- constants ---//
+RESOLUTION = 4; 
+WEIGHT = 15;
+MIN_MOUSE_DIST = 5;
+SPLIT_THRESHOLD = 8;
+SQUARE_SIZE = 300;
+    
+//--- variables ---//
+strokes = [];
+points = [];
+lines = [];
+currentPath = [];
+errPoint = [];
+//use shared isPointerDown instead
+//mouseDown = false;
+
+// // share update function with pressure drawing so they don't clearRect eachother
+// function update() {
+//     ctx.clearRect(0,0,ctx.canvas.width,ctx.canvas.height);
+//     for(var i = 0; i<strokes.length; i++)
+//         strokes[i].draw(WEIGHT,ctx);
+// }
+
+function drawCurrentPath() {
+    secondary_ctx.beginPath();
+    secondary_ctx.moveTo(currentPath[0][0],currentPath[0][1]);
+    for(var i = 1; i<currentPath.length; i++) {
+        secondary_ctx.lineTo(currentPath[i][0],currentPath[i][1]);
+    } 
+    secondary_ctx.stroke();
+}
+
+// 添加书法笔触延迟处理变量
+var pendingCalligraphyStroke = null;
+var pendingCalligraphyTimer = null;
+
+function pointerDownCaligraphy(e) {
+    wrapper.classList.add('nopointer');
+    if (!e.isPrimary || !calligraphy || isPenEraserActive) { return; }
+    
+    // 对Surface Pen做特殊处理，延迟绘制以避免擦除模式误触发
+    if (e.pointerType === 'pen') {
+        e.preventDefault();
+        
+        // 清除之前可能存在的待定笔触计时器
+        if (pendingCalligraphyTimer) {
+            clearTimeout(pendingCalligraphyTimer);
+        }
+        
+        // 存储当前事件
+        pendingCalligraphyStroke = { 
+            e: e,
+            button: e.button // 保存按钮信息
+        };
+        
+        // 延迟处理，给系统时间检测笔端擦除按钮
+        pendingCalligraphyTimer = setTimeout(function() {
+            // 如果当前处于笔端擦除模式，或侧方按键橡皮擦模式，则不处理
+            if (isPenEraserActive || eraserMode) {
+                pendingCalligraphyStroke = null;
+                return;
+            }
+            
+            // 如果是侧方按键（Surface Pen按钮1或2）点击，不绘制
+            if (pendingCalligraphyStroke.button === 1 || pendingCalligraphyStroke.button === 2) {
+                pendingCalligraphyStroke = null;
+                return;
+            }
+            
+            start_drawing();
+            
+            pendingCalligraphyStroke = null;
+        }, 20); // 延迟20毫秒，这个值可能需要根据实际情况调整
+        
+        return;
+    }
+    
+    // 非Surface Pen设备的原始处理逻辑
+    event.preventDefault(); // 点击按钮时不要绘制任何内容，特别是为了让撤销功能正常工作
+    start_drawing();
+}
+
+function pointerMoveCaligraphy(e) {
+    if (!e.isPrimary || !calligraphy || isPenEraserActive) { return; }
+    if(isPointerDown) {
+        var mousePos = [e.offsetX, e.offsetY];
+        if(currentPath.length != 0) {
+            if(getDist(mousePos,currentPath[currentPath.length-1])>=MIN_MOUSE_DIST)
+                currentPath.push(mousePos);
+            drawCurrentPath();
+        } else
+            currentPath.push(mousePos);
+    } 
+};
+
+function pointerUpCaligraphy(e) {
+    wrapper.classList.remove('nopointer');
+    stop_drawing();
+    if (!e.isPrimary || !calligraphy || !currentPath.length || isPenEraserActive) { return; }
+    points = currentPath;
+    
+    var curves = fitStroke(points);
+    
+    strokes.push(new Stroke(curves));
+    record_calligraphy_added(strokes[strokes.length - 1]);
+    request_redraw_frame();
+    
+    currentPath = [];// clear the array on pointer up so it doesnt enter new lines when clicking on buttons
+    clear_secondary_canvas();//clear the guide line in second canvas
+    
+    // 标记笔迹已变化，触发保存
+    strokesChanged = true;
+    save_strokes_debounced();
+}
+
+// // handled in ts_undo()
+// keydown = function(event) {
+//     var k = event.keyCode;
+//     console.log(k);
+//     if(k==68) {
+//         strokes.pop();
+//     }
+//     update();
+// };
+//
+//window.addEventListener("keydown",keydown,true);
+//
+//update();
+
+/* ------------------------------Unchanged Caligrapher Code------------------------------*/
+/* ------------------------------        Corners.js        ------------------------------*/
+/**
+ * @classDescription        A shape made out of bezier curves. Hopefully connected
+ * @param {Array} sections
+ */
+ function BezierShape(sections) {
+    this.sections = sections;
+    this.name = ""; //optional
+    this.skeleton = [];
+}
+
+BezierShape.prototype.copy = function() {
+    var newSections = [],
+        newSkeleton = [];
+    for(var i in this.sections) {
+        newSections[i] = [];
+        for(var j = 0; j<4; j++) {
+            newSections[i][j] = this.sections[i][j].slice(0);
+        }
+    }
+    for(var i in this.skeleton)
+        newSkeleton[i] = this.skeleton[i].copy();
+    
+    var copy = new BezierShape(newSections);
+    copy.name = this.name;
+    copy.skeleton = newSkeleton;
+    return copy;
+};
+
+/**
+ * Draws the BezierShape NO SCALING OR NUFFIN. Probably only used internally
+ * @param {Object} ctx
+ */
+BezierShape.prototype.draw = function(ctx) {
+    var x = this.sections[0][0][0], //ew
+        y = this.sections[0][0][1];
+    ctx.beginPath();
+    ctx.moveTo(x,y);
+    for(var i = 0; i < this.sections.length; i++) {
+        var b = this.sections[i];
+        ctx.bezierCurveTo(b[1][0],b[1][1],b[2][0],b[2][1],b[3][0],b[3][1]);
+    }
+    ctx.closePath();
+    
+    ctx.fill();
+};
+
+function Bone(points,offset) {
+    this.points = points;
+    this.offset = offset;
+}
+
+Bone.prototype.copy = function() {
+    var nP = [];
+    for(var i in this.points)
+        nP[i] = this.points[i].slice(0);
+    return new Bone(nP,this.offset);
+};
+
+function drawCornerScaled(corner,pos,dir,width,height,ctx) { //FIXME degree, radian inconsistency
+    ctx.save();
+    ctx.translate(pos[0],pos[1]);
+    ctx.rotate(dir);
+    ctx.scale(height,width);
+    
+    corner.draw(ctx);
+    ctx.restore();
+}
+
+function drawCorner(corner,pos,dir,width,ctx) {
+    drawCornerScaled(corner,pos,dir,width,width,ctx);
+}
+
+function drawDICorner(corner,pos,dir,width,ctx) {
+    if(corner == null)
+        return;
+    
+    // corner rotation
+    var pos = attrs.point,
+        inAngle = attrs.inAngle-corner.skeleton["armA"].offset, //This is so the whole corner is rotated //FIXME a little gross
+        outAngle = attrs.outAngle,
+        c = setBoneAngles(corner,[["armB",(outAngle-inAngle)/180*Math.PI]]); 
+
+    drawCorner(c,pos,inAngle/180*Math.PI,width,ctx);
+}
+
+
+
+// HERE ARE SOME CORNERS // some may need to be rotated
+kappa = 0.5522847498;
+// Circle-ish thing. Not a corner.
+CIRCLE = new BezierShape([
+    [[-5,0],[-5,-5*kappa],[-5*kappa,-5],[0,-5]],
+    [[0,-5],[5*kappa,-5],[5,-5*kappa],[5,0]],
+    [[5,0],[5,5*kappa],[5*kappa,5],[0,5]],
+    [[0,5],[-5*kappa,5],[-5,5*kappa],[-5,0]]
+]);
+                
+        
+C1 = new BezierShape([
+     [[15,6],  [-3,4],     [-11,5],   [-20,0]]
+    ,[[-20,0],  [-15,-5],  [4,-9],    [13,-5]]
+    ,[[13,-5], [20,0],     [21,8],    [15,6]]
+]);
+C1.name = "C1";
+
+C2 = new BezierShape([
+     [[2,5],    [-2,5],     [-12,2],    [-13,-2]]
+    ,[[-13,2],  [-7,-5],    [0,-5],     [2,-5]]
+    ,[[2,-5],   [3,-5],     [3,5],      [2,5]]
+]);
+C2.name = "C2";
+
+C3 = new BezierShape([
+    [[-8,5],    [-10,5],    [-10,-5],   [-8,-5]]
+   ,[[-8,-5],   [3,-5],     [15,0],     [15,5]]
+   ,[[15,5],    [10,7],     [2,5],      [-8,5]]
+]);
+C3.name = "C3";
+
+C4 = new BezierShape([
+    [[0,5],     [-2,5],     [-4,7],     [-5,8]]
+   ,[[-5,8],    [-7,10],    [-9,12],    [-8,5]]
+   ,[[-8,5],    [-7,3],     [-5,-5],    [0,-5]]
+   ,[[0,-5],    [3,-5],     [3,5],      [0,5]]
+]);
+C4.name = "C4";
+
+C5 = new BezierShape([
+    [[0,-5],    [-3,-5],    [-3,5],     [0,5]]
+   ,[[0,5],     [8,5],      [10,5],     [15,2]]
+   ,[[15,2],    [12,-2],    [-2,-5],    [0,-5]]
+]);
+C5.name = "C5";
+
+C6 = new BezierShape([
+    [[0,5],     [-6,6],     [-8,7],     [-12,8]]
+    ,[[-12,8],  [-13,9],    [-13,7],    [-12,6]]
+    ,[[-12,6],  [-10,3],    [-5,-4],    [0,-5]]
+    ,[[0,-5],   [3,-5],     [3,5],      [0,5]]
+]);
+C6.name = "C6";
+
+C7 = new BezierShape([
+    [[-5,-5],[0,-5],[11,-7],[15,-6]]
+    ,[[15,-6],[17,-5],[2,4],[1,5]]
+    ,[[1,5],[0,5],[0,5],[-5,5]]
+    ,[[-5,5],[-8,5],[-8,-5],[-5,-5]]
+]);
+C7.name = "C7";
+
+SI_CORNERS = [C1,C2,C3,C4,C5,C6,C7];
+
+C8 = new BezierShape([
+    [[-13,3],   [-20,3],    [-20,-3],   [-13,-3]],
+    [[-13,-3],  [-5,-5],    [-6,-7],    [-4,-8]],
+    [[-4,-8],   [0,-8],     [12,3],     [7,5]],
+    [[7,5],     [5,6],      [5,8],      [3,13]],
+    [[3,13],    [3,20],     [-3,20],    [-3,13]],
+    [[-3,13],   [-5,5],     [-10,5],    [-13,3]]
+]);
+C8.name = "C8";
+C8.skeleton["armA"] = new Bone([[0,0],[0,1],[0,2],[0,3],[1,0],[1,1],[5,2],[5,3]],0);
+C8.skeleton["armB"] = new Bone([[4,0],[4,1],[4,2],[4,3],[3,2],[3,3],[5,0],[5,1],
+                                [1,2],[1,3],[2,0],[2,1]],90);
+
+C8R = horizFlipCopy(C8);
+
+/*C9 = new BezierShape([ //TODO fix corner so that stem moves depending on angle
+    [[-3,-10],  [-3,-15],   [3,-15],    [3,-10]],
+    [[3,-10],   [5,-5],     [6,6],      [0,11]],
+    [[0,11],    [-5,15],    [-3,5],     [-10,3]],
+    [[-10,3],   [-15,3],    [-15,-3],   [-10,-3]],
+    [[-10,-3],  [-5,-5],    [-5,-7],    [-3,-10]]
+]);
+C9.name = "C9";
+C9.skeleton["armA"] = new Bone([[0,0],[0,1],[0,2],[0,3],[1,0],[1,1],[4,2],[4,3]],90);
+C9.skeleton["armB"] = new Bone([[3,0],[3,1],[3,2],[3,3],[4,0],[4,1],[2,2],[2,3]],180);*/
+
+C9 = new BezierShape([ //note, 90º angles look a little weird
+   [[-4,-12],[-4,-15],[4,-15],[5,-12]],
+   [[5,-12],[5,-2],[6,3],[1,8]],
+   [[-1,8],[-3,11],[-4,2],[-12,-5]],
+   [[-12,-5],[-15,-7],[-15,-9],[-10,-8]],
+   [[-10,-8],[-6,-8],[-4,-7],[-4,-12]] 
+]);
+C9.name = "C9";
+C9.skeleton["armA"] = new Bone([[0,0],[0,1],[0,2],[0,3],[1,0],[1,1],[4,2],[4,3],[1,2]],90); //not that this actually matters
+C9.skeleton["armB"] = new Bone([[3,0],[3,1],[3,2],[3,3],[4,0],[4,1],[2,2],[2,3]],210);
+
+C9R = vertFlipCopy(C9);
+
+C10 = new BezierShape([
+    [[-5,5],[-6,5],[-6,-5],[-5,-5]],
+    [[-5,-5],[-2,-7],[2,-7],[5,-5]],
+    [[5,-5],[6,-5],[6,5],[5,5]],
+    [[5,5],[2,7],[-2,7],[-5,5]]
+]);
+
+C10.name = "C10";
+C10.skeleton["armA"] = new Bone([[0,0],[0,1],[0,2],[0,3],[1,0],[1,2],[3,2],[3,3]],0);
+C10.skeleton["armB"] = new Bone([[2,0],[2,1],[2,2],[2,3],[3,0],[3,1],[1,2],[1,3]],0);
+
+function linInterpolate(y0,y1,mu) {
+    return y0*(1-mu) + y1*mu;
+}
+
+function cosInterpolate(y0,y1,mu) {
+    var mu2 = (1-Math.cos(mu*Math.PI))/2;
+    return y0*(1-mu2)+y1*mu2;
+}
+
+/**
+ * Returns a function that linearly interpolates between the values given
+ */
+function linFunction(points) {
+    return function(t) {
+        if(t==0)
+            return points[0][1];
+        for(var i = 1; i<points.length; i++) {
+            var p0 = points[i-1],
+                p1 = points[i];
+            if(t<=p1[0] && t>p0[0]) {
+                var mu = (t-p0[0])/(p1[0]-p0[0]);
+                return linInterpolate(p0[1],p1[1],mu); //cubic might be better
+            }
+        }
+    };
+}
+
+/**
+ * Returns a function that cosine interpolates between the values given
+ */
+function cosFunction(points) {
+    return function(t) {
+        if(t==0)
+            return points[0][1];
+        for(var i = 1; i<points.length; i++) {
+            var p0 = points[i-1],
+                p1 = points[i];
+            if(t<=p1[0] && t>p0[0]) {
+                var mu = (t-p0[0])/(p1[0]-p0[0]);
+                return cosInterpolate(p0[1],p1[1],mu); //cubic might be better
+            }
+        }
+    };
+}
+
+//example thickness functions
+function one(t) {
+    return 1;
+}
+
+function test(t) {
+    return t;
+}
+
+//These are ugly
+SEGMENT_I = cosFunction([[0,1],[.5,.7],[1,1]]); //FIXME, sometimes extends past corners
+SEGMENT_II = linFunction([[0,1],[.5,.8],[1,.2]]); //kinda ugly :||
+SEGMENT_III = linFunction([[0,.2],[.5,.8],[1,1]]);
+
+HEN = [C2,SEGMENT_I,C3];
+SHU1 = [C4,SEGMENT_I,C5];
+SHU2 = [C4,SEGMENT_II];
+NA = [C6,SEGMENT_I,C7];
+DIAN = [C1];
+OTHER = [C4,SEGMENT_II];
+
+function RAND(t) {
+    return Math.random();
+}
+
+function setBoneAngles(c,dirList) {
+    var c = c.copy();
+    
+    for(var i in dirList) {
+        var dir = dirList[i][1],
+            bone = dirList[i][0];
+        for(var j in c.skeleton[bone].points) {
+            var p = c.skeleton[bone].points[j],
+                offset = c.skeleton[bone].offset/180*Math.PI,
+                vec = c.sections[p[0]][p[1]];
+            //console.log(vec);
+            //console.log(dir-offset);
+            //console.log(rotate(vec,dir-offset));
+            c.sections[p[0]][p[1]] = rotate(vec,dir-offset);
+            
+        }
+    }
+    
+    return c;
+}
+
+function vertFlipCopy(c) {
+    var c = c.copy();
+    
+    for(var i in c.sections){
+        for(var j in c.sections[i]) {
+            c.sections[i][j][1] = -c.sections[i][j][1];
+        }
+    }
+    for(var i in c.skeleton) {
+        c.skeleton[i].offset = 360 - c.skeleton[i].offset;
+    }
+    return c
+}
+
+function horizFlipCopy(c) {
+    var c = c.copy();
+    
+    for(var i in c.sections){
+        for(var j in c.sections[i]) {
+            c.sections[i][j][0] = -c.sections[i][j][0];
+        }
+    }
+    for(var i in c.skeleton) {
+        c.skeleton[i].offset = 180 - c.skeleton[i].offset;
+        if(c.skeleton[i].offset<0)
+            c.skeleton[i].offset += 360;
+    }
+    return c
+}
+
+/* ------------------------------        bezier.js        ------------------------------*/
+
+//TODO use vectors for everything so it's less stupid
+
+// Generalized recurvsive BEZIER FUNCTIONS (why am I doing it this way I don't know)
+/**
+ * returns a point on the bezier curve
+ * @param {Array} ps    Control points of bezier curve
+ * @param {Numeric} t   Location along bezier curve [0,1]  
+ * @return {Array}      Returns the point on the bezier curve
+ */
+ function bezierPos(ps, t) {
+    var size = ps.length;
+    if(size == 1)
+        return ps[0];
+        
+        //WARNING, changed direction on this. May cause problems
+    var bx = (t) * bezierPos(ps.slice(1),t)[0] + (1-t) * bezierPos(ps.slice(0,size-1),t)[0],
+        by = (t) * bezierPos(ps.slice(1),t)[1] + (1-t) * bezierPos(ps.slice(0,size-1),t)[1];
+        
+    return [bx,by];
+}
+
+function bezierSlo(ps, t) {
+    var size = ps.length;
+    
+    if(size == 1)
+        return ps[0];
+        
+    var dx = bezierPos(ps.slice(0,size-1),t)[0] - bezierPos(ps.slice(1),t)[0] ,
+        dy = bezierPos(ps.slice(0,size-1),t)[1] - bezierPos(ps.slice(1),t)[1];
+        
+    return dy/dx;
+}
+
+// Bezier function class. Meant simply as a math thing (no drawing or any bullshit)
+/**
+ * @class Bezier function class.
+ * @return {Bezier} Returns the bezier function
+ */
+function Bezier(controlPoints) {
+    this.order = controlPoints.length-1; //useful? or obtuse? //Answer: not used anywhere
+    this.controlPoints = controlPoints; 
+}
+
+Bezier.prototype.getStart = function() {
+    return this.controlPoints[0];
+};
+
+Bezier.prototype.getEnd = function() {
+    return this.controlPoints[this.order];
+};
+
+Bezier.prototype.getPoint = function(t) {
+    return bezierPos(this.controlPoints,t);
+};
+
+Bezier.prototype.drawPlain = function(ctx) {
+    if(this.order == 3) {
+        var c = this.controlPoints;
+        ctx.beginPath();
+        ctx.moveTo(c[0][0],c[0][1]);
+        ctx.bezierCurveTo(c[1][0],c[1][1],c[2][0],c[2][1],c[3][0],c[3][1]);
+        ctx.stroke();
+    }
+        
+};
+
+Bezier.prototype.getDerivativeVector = function(t) {
+    var size = 0.001,
+        p0 = null,
+        p1 = null;
+    if(t<size) {
+        p0 = bezierPos(this.controlPoints,t);
+        p1 = bezierPos(this.controlPoints,t+2*size);
+    } else if (1-t<size) {
+        p0 = bezierPos(this.controlPoints,t-2*size);
+        p1 = bezierPos(this.controlPoints,t);
+    } else {
+        p0 = bezierPos(this.controlPoints,t-size);
+        p1 = bezierPos(this.controlPoints,t+size); 
+    }
+    return sub(p1,p0);
+};
+
+Bezier.prototype.getTangentVector = function(t) {
+    return normalize(this.getDerivativeVector(t));
+};
+
+Bezier.prototype.getLength = function() {
+    var res = 50, //FIXME: can't use resolution :|| that would be circular
+        len = 0,
+        point = this.getStart();
+    for(var i = 0; i <= res; i++){
+        var t = i/res;
+        len += getDist(point,this.getPoint(t));
+        point = this.getPoint(t);
+    }
+    return len;
+};
+
+Bezier.prototype.getLengthAt = function(t) {
+    return getLengthAtWithStep(t,0.01);
+};
+
+Bezier.prototype.getLengthAtWithStep = function(t,s) {
+    var tt = 0,
+        len = 0,
+        point = this.getStart();
+    while(tt <= t) {
+        var newPoint = this.getPoint(tt);
+        len += getDist(point,newPoint);
+        point = newPoint;
+        t += s;
+    }
+    return len;
+};
+
+Bezier.prototype.getPointByLength = function(l) {//doesn't actually return a point. bad name
+    var t = 0,
+        len = 0,
+        point = this.getStart();
+    while(len < l) {
+        var newPoint = this.getPoint(t);
+        len += getDist(point,newPoint);
+        point = newPoint;
+        t += 0.01;
+        if(t>=1)
+            return 1; //so we don't extrapolate or anything stupid
+    }
+    return t;
+};
+
+Bezier.prototype.getPointByLengthBack = function(l) {//doesn't actually return a point. bad name
+    var t = 1,
+        len = 0,
+        point = this.getEnd();
+    while(len < l) {
+        var newPoint = this.getPoint(t)
+        len += getDist(point,newPoint);
+        point = newPoint;
+        t -= 0.01;
+        if(t<=0)
+            return 1; //so we don't extrapolate or anything stupid
+    }
+    return t;
+};
+
+function getSlopeVector(slope,length) {
+    var x = length * Math.cos(Math.atan(slope)),
+        y = length * Math.sin(Math.atan(slope));
+    return [x,y];
+}
+
+function scalePoint(s0,s1,p0,p1,v) { //Could probs be simplified, also currently not used
+    var xScale = (p1[0]-p0[0])/(s1[0]-s0[0]), //scaling factos
+        yScale = (p1[1]-p0[1])/(s1[1]-s0[1]),
+        x = p0[0]+xScale*(v[0]-s0[0]), //Scaled x and y
+        y = p0[1]+yScale*(v[1]-s0[1]);
+    return [x,y];
+}
+
+//Draws a bezier curve scaled between the two points (good idea? bad idea? dunno.) 
+/**
+ * @param {Bezier}  curve   The bezier curve to be drawn
+ * @param {Numerical} wid   Nominal width
+ * @param {Function} wF     Width function
+ * @param {Context} ctx     Context to draw to
+ */
+//FIXME width function gets "bunched up" around control points (detail below)
+//      the bezier calculation means that more of t is spent near control points. turn on debug to see
+//      this is good for detail b/c it means higher resolution at tight curves (a happy accident)
+//      but the width contour gets a bit bunched up. solution: instead of wF(t), use wF(currentLength/totalLength)
+
+//FIXME Ugly (code)
+function drawBezier(curve,wid,wF,ctx) { 
+    var length = curve.getLength(),
+        numPoints = Math.round(length/RESOLUTION),
+        leftPoints = [],
+        rightPoints = [],
+        currentPoint = sub(scale(curve.getStart(),2),curve.controlPoints[1]);
+
+    for(var i = 0; i <= numPoints; i++){
+        var t = i/numPoints,
+            centerPoint = curve.getPoint(t)
+            offset = scale(perpNorm(sub(centerPoint,currentPoint)),wF(t)*wid/2);
+            
+        leftPoints.push(add(centerPoint,offset));
+        rightPoints.push(sub(centerPoint,offset));
+        currentPoint = centerPoint;
+
+    }
+    //Drawing the polygon
+    var s = leftPoints[0];
+    ctx.beginPath();
+    ctx.moveTo(s[0],s[1]); //starting from start center
+    for(var i = 0; i < leftPoints.length; i++){
+        var p = leftPoints[i];
+        ctx.lineTo(p[0],p[1]);
+    }
+    for(var i = rightPoints.length-1; i >= 0; i--){
+        var p = rightPoints[i];
+        ctx.lineTo(p[0],p[1]);
+    }
+    ctx.closePath();
+    ctx.fill();
+}
+
+function drawBezierTransformed(p0,p1,curve,wid,wF,ctx) {
+    var s0 = curve.getStart(),
+        s1 = curve.getEnd(),
+        xScale = (p1[0]-p0[0])/(s1[0]-s0[0]), //scaling factos
+        yScale = (p1[1]-p0[1])/(s1[1]-s0[1]),
+        controlPoints = [];
+        
+    for(var i = 0; i <= curve.order; i++) {
+        var p = curve.controlPoints[i],
+            x = p0[0]+xScale*(p[0]-s0[0]), //Scaled x and y
+            y = p0[1]+yScale*(p[1]-s0[1]);
+        controlPoints[i] = [x,y];
+    }
+    drawBezier(new Bezier(controlPoints),wid,wF,ctx);
+        
+}
+
+/* ------------------------------        curveFitting.js        ------------------------------*/
+function getLengths(chord) {
+    var lens = [0]; //first is 0
+    
+    for(var i = 1; i<chord.length; i++)
+        lens[i] = lens[i-1]+getDist(chord[i],chord[i-1]);
+    return lens;
+}
+
+function normalizeList(lens) {
+    for(var i = 1; i<lens.length; i++)
+        lens[i] = lens[i]/lens[lens.length-1];
+    return lens;
+}
+
+function findListMax(list) {
+    var iMax = 0,
+        max = list[0];
+    for(var i = 0; i<list.length; i++) {
+        if(max<list[i]) {
+            iMax = i;
+            max = list[i];
+        }
+    }
+    return [iMax,max];       
+}
+
+function findListMin(list) {
+    var iMin = 0,
+        min = list[0];
+    for(var i in list) {
+        if(min>list[i]) {
+            iMin = i;
+            min = list[i];
+        }
+    }
+    return [iMin,min];
+}
+
+function parameterize(chord) {
+    /*var lens = getLengths(chord);
+    return normalizeList(lens);*/
+    var lens = [0]; //first is 0
+    
+    for(var i = 1; i<chord.length; i++)
+        lens[i] = lens[i-1]+getDist(chord[i],chord[i-1]);
+    for(var i = 1; i<chord.length; i++)
+        lens[i] = lens[i]/(lens[chord.length-1]);
+    return lens;
+    
+}
+
+function parameterizeByLength(chord, curve) {
+    var lens = getLengths(chord),
+        ts = [0];
+    for(var i = 1; i<chord.length; i++) {
+        ts[i] = curve.getPointByLength(lens[i]);
+    }
+    return normalizeList(ts);
+}
+
+function coefficientHelper(chord,ts) { //bad name
+    var c00 = 0, c01 = 0, c02x = 0, c02y = 0,
+        c10 = 0, c11 = 0, c12x = 0, c12y = 0,
+        x0 = chord[0][0],
+        y0 = chord[0][1],
+        x3 = chord[chord.length-1][0],
+        y3 = chord[chord.length-1][1];
+        
+    for(var i = 0; i<ts.length; i++) {
+        var t = ts[i],
+            px = chord[i][0],
+            py = chord[i][1];
+        c00 += 3*Math.pow(t,2)*Math.pow(1-t,4); //I'm doing it the dumb way cause it's easier to read
+        c01 += 3*Math.pow(t,3)*Math.pow(1-t,3);
+        c02x += t*Math.pow(1-t,2)*(px - Math.pow(1-t,3) * x0 - Math.pow(t,3) * x3);
+        c02y += t*Math.pow(1-t,2)*(py - Math.pow(1-t,3) * y0 - Math.pow(t,3) * y3);
+        
+        c10 += 3*Math.pow(t,3)*Math.pow(1-t,3);
+        c11 += 3*Math.pow(t,4)*Math.pow(1-t,2);
+        c12x += Math.pow(t,2)*(1-t)*(px - Math.pow(1-t,3) * x0 - Math.pow(t,3) * x3);
+        c12y += Math.pow(t,2)*(1-t)*(py - Math.pow(1-t,3) * y0 - Math.pow(t,3) * y3);
+    }
+    return [[[c00,c01,c02x],[c10,c11,c12x]],
+            [[c00,c01,c02y],[c10,c11,c12y]]];
+}
+
+function leastSquaresFit(chord,ts) { //IT FUCKIN WORKS FUCK YEAAAAAAAH
+    if(chord.length < 4) {
+        var c1 = chord[0],
+            c4 = chord[chord.length-1],
+            c2 = midpoint(c1,c4,0.25),
+            c3 = midpoint(c1,c4,0.75);
+        return new Bezier([c1,c2,c3,c4]);
+    }
+    var cs = coefficientHelper(chord,ts),
+        xs = gaussianElimination(cs[0]),
+        ys = gaussianElimination(cs[1]);
+    
+    return new Bezier([chord[0], [xs[0],ys[0]], [xs[1],ys[1]], chord[chord.length-1]]);
+}
+
+function getMaxErrorPoint(chord,ts,curve) {
+    var max = 0,
+        iMax = 0;
+    for(var i = 0; i<ts.length; i++) {
+        var dist = getDist(curve.getPoint(ts[i]),chord[i]);
+        if(dist > max) {
+            max = dist;
+            iMax = i;
+        }
+    }
+    return [iMax,max];
+}
+
+function fitStroke(chord) {
+    var chords = splitChord(chord,detectCorners(chord)),
+        curves = [];
+        
+    for(var i in chords) {
+        var ts = parameterize(chords[i]),
+            curve = leastSquaresFit(chords[i],ts);
+        curves.push(curve);
+    }
+    
+    return curves;
+}
+
+function splitCurve(chord,ts,curve) { //TODO FIGURE THIS FUCKING SHIT OUT
+    var errs = [];
+    for(var i = 1; i<chord.length; i++) {
+        var chord1 = chord.slice(0,i+1),
+            chord2 = chord.slice(i),
+            ts1    = parameterize(chord1),
+            ts2    = parameterize(chord2),
+            curve1 = leastSquaresFit(chord1,ts1),
+            curve2 = leastSquaresFit(chord2,ts2);
+        errs.push(sumSquaredError(chord1,ts1,curve1) +
+                  sumSquaredError(chord2,ts2,curve2));
+    }
+    //console.log(errs);
+    return findListMin(errs);
+}
+
+function splitCurveAt(chord,i) {
+    var chord1 = chord.slice(0,i+1),
+        chord2 = chord.slice(i),
+        ts1    = parameterize(chord1),
+        ts2    = parameterize(chord2),
+        curve1 = leastSquaresFit(chord1,ts1),
+        curve2 = leastSquaresFit(chord2,ts2);
+    return [curve1,curve2];
+}
+
+function sumSquaredError(chord,ts,curve) {
+    var sum = 0;
+    for(var i in chord) {
+        sum += Math.pow(getDist(chord[i],curve.getPoint(ts[i])),2);
+    }
+    return sum;
+}
+
+// corner detection?
+
+function detectCorners(chord) {
+    var segmentLength = 30,
+        angleThreshold = 135,
+        indices = [];
+    for(var i = 1; i<chord.length-1; i++) {
+        var angle = getSmallerAngle(getAngleBetween(sub(chord[i-1],chord[i]), sub(chord[i+1],chord[i])))*180/Math.PI;
+
+        if(angle<=angleThreshold) {
+            indices.push(i);
+        }
+    }
+    
+    return indices;
+}
+
+//returns the shortest segment of the chord that is at least the given length
+function getChordSegmentByLength(chord,length) {
+    var dist = 0;
+    var i = 0;
+    while(dist<length) {
+        i++;
+        if(i >= chord.length) //if it's not long enough just return the whole thing
+            return chord; 
+        dist+=getDist(chord[i],chord[i-1]); 
+    }
+    return chord.slice(0,i);
+}
+
+function splitChord(chord,indices) {
+    var newChords = [],
+        ind = 0;
+    for(var i in indices) {
+        newChords.push(chord.slice(ind,indices[i]+1));
+        ind = indices[i];
+    }
+    newChords.push(chord.slice(ind));
+    return newChords;
+}
+
+function chordPrint(chord) {
+    var s = "| ";
+    for(var i in chord) {
+        s+= chord[i] + " | ";
+    }
+    //console.log(s);
+}
+
+/* ------------------------------        strokeDrawing.js        ------------------------------*/
+
+//Stroke drawing and analysis
+//Basically, a "stroke" will be a collection of segments
+//the segments when drawn will be assigned corners and types and stuff
+
+function drawSegment(wF,segment,width,ctx) {
+    drawBezier(segment,width,wF,ctx);
+    //ctx.fillStyle = "rgba(0,0,0,1)";
+}
+
+
+
+function drawBasicStroke(segment,width,ctx) { //TODO
+    var attrs = getSegmentAttributes(segment),
+        comps = checkRules2(attrs,RULE_BS);
+    
+    //corners
+    if(comps.length == 1){ //dian
+        var point = midpoint(attrs.startPoint,attrs.endPoint,0.5);  //FIXME these stupid width division factors
+        drawCornerScaled(comps[0],point,degToRad(attrs.startAngle),width/13,attrs.length/20,ctx);
+    } else {
+        drawCorner(comps[0],attrs.startPoint,degToRad(attrs.startAngle),width/10,ctx);
+        if(comps.length == 3) {
+            drawCorner(comps[2],attrs.endPoint,degToRad(attrs.endAngle),width/10,ctx);
+        }
+        
+        drawSegment(comps[1],segment,width,ctx);
+    }
+}
+
+function Stroke(segments) {
+    this.segments = segments;
+}
+
+Stroke.prototype.drawPlain = function(ctx) {
+    var x = this.segments[0].getStart()[0],
+        y = this.segments[0].getStart()[1];
+    ctx.moveTo(x,y);
+    for(var i = 0; i < this.segments.length; i++) {
+        var b = this.segments[i].controlPoints;
+        ctx.bezierCurveTo(b[1][0],b[1][1],b[2][0],b[2][1],b[3][0],b[3][1]);
+    }
+    ctx.stroke();      
+};
+
+Stroke.prototype.draw = function(width, ctx) {
+    if(this.segments.length == 1){ //Basic Stroke
+        drawBasicStroke(this.segments[0],width,ctx);
+    } else { //Compound stroke
+        drawCompoundStroke(this,width,ctx);
+    }
+};
+
+function drawCompoundStroke(stroke,width,ctx) { //FIXME copypasta
+    var numSegments = stroke.segments.length;
+
+    //corners
+    var attrs = getSegmentAttributes(stroke.segments[0]),
+        corners = [];
+    
+    var corner = checkRules2(attrs,RULE_CC_START);//checkRules(attrs,COMPOUND_CORNER_START);
+    if(corner != null)
+        drawCorner(corner,attrs.startPoint,attrs.startAngle/180*Math.PI,width/10,ctx);
+    corners.push(corner);
+    
+    for(var i = 1; i<numSegments; i++) {
+        attrs = getCornerAttributes(stroke.segments[i-1],stroke.segments[i]);
+        corner = checkRules2(attrs,RULE_CC_MID);//checkRules(attrs,COMPOUND_CORNER_MID);
+        if(corner != null)
+            drawDICorner(corner,attrs,width/10,ctx);
+        corners.push(corner);
+    }
+    attrs = getSegmentAttributes(stroke.segments[numSegments-1]);
+    corner = checkRules2(attrs,RULE_CC_END);//checkRules(attrs,COMPOUND_CORNER_END);
+    if(corner != null)
+        drawCorner(corner,attrs.endPoint,attrs.endAngle/180*Math.PI,width/10,ctx);
+    corners.push(corner);
+    
+    //SEGMENTS FIXME gross code
+    
+    if(corners[0] == null)
+        drawSegment(SEGMENT_III,stroke.segments[0],width,ctx);
+    else
+        drawSegment(SEGMENT_I,stroke.segments[0],width,ctx);
+    for(var i = 1; i<numSegments-1; i++) {
+        drawSegment(SEGMENT_I,stroke.segments[i],width,ctx); //FIXME only segment I. this is not done!
+    }
+    if(corners[numSegments] == null)
+        drawSegment(SEGMENT_II,stroke.segments[numSegments-1],width,ctx);
+    else
+        drawSegment(SEGMENT_I,stroke.segments[numSegments-1],width,ctx);
+    //ctx.fillStyle = "rgba(0,0,0,1)";
+    
+}
+
+function inRange(num,range) {
+    return num >= range[0] && num < range[1];
+}
+
+function inRanges(num,ranges) {
+    for(var i = 0; i<ranges.length; i++) {
+        if(inRange(num,ranges[i]))
+            return true;
+    }
+    return false;
+}
+
+function getSegmentAttributes(seg) {
+    var attrs = {
+        "startAngle" : getSegAngleStart(seg) *180/Math.PI,
+        "endAngle" : getSegAngleEnd(seg) * 180/Math.PI,
+        "startPoint" : seg.getStart(),
+        "endPoint" : seg.getEnd(),
+        "length" : seg.getLength()
+    };
+    return attrs;
+}
+
+function getCornerAttributes(inSeg, outSeg) {
+    var attrs = {
+        "inAngle" : getSegAngleEnd(inSeg) * 180/Math.PI,
+        "outAngle" : getSegAngleStart(outSeg) * 180/Math.PI,
+        "point" : inSeg.getEnd()
+    };
+    attrs.betweenAngle = getInnerAngle(attrs.inAngle,attrs.outAngle);
+    //console.log(attrs.inAngle,attrs.outAngle);
+    //console.log(attrs.betweenAngle);
+    return attrs;
+}
+
+function getInnerAngle(inAngle, outAngle) { //If outAngle is past inAngle, then it's negative
+    inAngle = reduceAngleDeg(inAngle+180);
+    var ang = Math.abs(getSmallerAngleDeg(inAngle - outAngle));
+    if(inAngle>outAngle){
+        if(inAngle-180<outAngle)
+            return ang;
+        return -ang;
+    } else {
+        if(outAngle-180<inAngle)
+            return -ang;
+        return ang;
+    }
+        
+}
+
+function innerAngleHelper(angle) { //if it's negative then it is the other angle
+    if(angle>180)
+        return angle-360;
+    return angle;
+}
+
+function checkRule(obj,rule) {
+    if(rule[0] == "Result")
+        return rule[1];
+    //console.log(rule[0]);
+    if(inRange(obj[rule[0]],rule[1]))
+        return checkRule(obj,rule[2]);
+    return null;
+}
+
+function checkRules(obj,ruleset) { //checks all rules, no shortcircuiting currently
+    var results = [];
+    //console.log("Checking rules");
+    for(var i = 0; i<ruleset.length-1; i++) {
+        var result = checkRule(obj,ruleset[i]);
+        if(result != null)
+            results.push(result);
+    }
+    if(results.length > 1)
+        throw "Overlapping conditions";
+    if(results.length == 1)
+        return results[0];
+    //console.log("no result");
+    return ruleset[ruleset.length-1]; //default
+}
+
+function checkRules2(obj,ruleset) {
+    var results = [];
+    //console.log("Checking rules");
+    for(var i = 0; i<ruleset.length; i++) {
+        if(ruleset[i].check(obj))
+            return ruleset[i].result;
+    }
+    //console.log("No Result");
+    return null
+}
+
+function Rule(result,condition) {
+    this.condition = condition;
+    this.result = result;
+}
+
+Rule.prototype.check = function(attrs) {
+    return checkCond(attrs,this.condition);
+}
+
+function checkCond(attrs,cond) {
+    var op = OPERATIONS[cond[1]],
+        val = attrs[cond[0]];
+    //console.log("Op:",cond[1]);
+    //console.log(cond[0],val);
+    return op(attrs,val,cond.slice(2));
+}
+
+
+TH1 = 60;
+TH2 = 40;
+
+OPERATIONS = {
+    "TRUE" : function(a,n,r) {
+        return true;
+    },
+    "IN_RANGE" : function(a,n,r) {
+        for(var i in r)
+            if(n>=r[i][0] && n<r[i][1])
+                return true;
+            return false;
+    },
+    "GREATER_THAN" : function(a,n,r) {
+        return n>=r;
+    },
+    "LESS_THAN" : function(a,n,r) {
+        return n<r;
+    },
+    "OR" : function(a,n,c) {
+        for(var i in c)
+            if(checkCond(a,c[i]))
+                return true; 
+            return false;
+    },
+    "AND" : function(a,n,c) {
+        for(var i in c) 
+            if(!checkCond(a,c[i]))
+                return false; 
+            return true;
+    }
+};
+
+RULE_CC_START = [
+    new Rule(C2, ["startAngle", "IN_RANGE", [0,10], [350,360]]),
+    new Rule(C4, ["startAngle", "IN_RANGE", [80,350]])
+];
+
+RULE_CC_END = [
+    new Rule(C3, ["endAngle", "IN_RANGE", [0,10], [350,360]]),
+    new Rule(C7, ["endAngle", "IN_RANGE", [10,80]]),
+    new Rule(C5, ["engAngle", "IN_RANGE", [80,100]])
+];
+
+RULE_CC_MID = [
+    new Rule(C8, ["", "AND", ["inAngle", "IN_RANGE",[0,45],[315,360]],
+                             ["betweenAngle", "IN_RANGE",[0,180]]]),
+    new Rule(C8R,["", "AND", ["inAngle", "IN_RANGE", [60,170]], //a little ugly :| but accurate?
+                            ["betweenAngle", "IN_RANGE",[-180,0]]]), 
+    new Rule(C9, ["", "AND", ["inAngle", "IN_RANGE", [45,145]],
+                             ["betweenAngle", "IN_RANGE", [0,180]]]),
+    new Rule(C9R,["", "AND", ["inAngle", "IN_RANGE", [0,60], [240,360]],
+                            ["betweenAngle","IN_RANGE",[-180,0]]])
+];
+
+RULE_BS = [ //TODO, fix the "default" case
+    new Rule(DIAN,["length","LESS_THAN",TH2]),
+    new Rule(HEN,["startAngle","IN_RANGE",[0,10],[350,360]]),
+    new Rule(SHU1,["", "AND", ["startAngle","IN_RANGE",[80,100]],
+                              ["length","GREATER_THAN",TH1]]),
+    new Rule(SHU2,["", "AND", ["startAngle","IN_RANGE",[80,100]],
+                              ["length","IN_RANGE",[TH2,TH1]]]), //to prevent overlap
+    new Rule(NA,["startAngle","IN_RANGE",[10,80]]),
+    new Rule(OTHER,["","TRUE"])
+];
+
+// Rules
+BASIC_STROKE = [
+    ["startAngle", [0,10]]
+];
+
+COMPOUND_CORNER_START = [
+    ["startAngle",   [0,10],    ["Result",C2]],
+    ["startAngle",   [80,350],  ["Result",C4]],
+    ["startAngle",   [350,360], ["Result",C2]],
+    null
+    ];
+
+COMPOUND_CORNER_MID = [
+    ["inAngle",     [0,45], ["betweenAngle", [0,180], ["Result", C8]]],
+    ["inAngle",     [315,360], ["betweenAngle", [0,180], ["Result", C8]]],
+    ["inAngle",     [45,135], ["betweenAngle", [-180,-90], ["Result", C8R]]],
+    ["inAngle",     [45,135], ["betweenAngle", [0,180], ["Result", C9]]],
+    ["inAngle",     [45,180], ["betweenAngle", [-90,0], ["Result", C9R]]],
+    ["inAngle",     [0,45], ["betweenAngle", [-180,0], ["Result", C9R]]],
+    ["inAngle",     [315,360], ["betweenAngle", [-180,0], ["Result", C9R]]],
+    null
+];
+
+COMPOUND_CORNER_END = [
+    ["endAngle",   [0,10],    ["Result",C3]],
+    ["endAngle",   [10,80],   ["Result",C7]],
+    ["endAngle",   [80,100],  ["Result",C5]],
+    null
+    ];
+   
+/* ------------------------------        examples.js        ------------------------------*/
+
+// (ugly) Character examples for testing
+
+//compound stroke
+CSTROKE_1 = new Stroke([
+    new Bezier([[50,110],[60,110],[190,100],[200,90]]),
+    new Bezier([[200,90],[205,90],[200,150],[195,150]]),
+    new Bezier([[195,150],[170,160],[120,150],[100,150]])
+])
+
+/* ------------------------------        Character.js        ------------------------------*/
+// Angle test distance
+var ANG_DIST = 0.3;
+
+function getSegAngleStart(curve) {
+    var start = curve.getStart(),
+        point = curve.getPoint(curve.getPointByLength(20)),//curve.getPoint(ANG_DIST),
+        dir   = getAngle(sub(point,start));
+    if(dir<0)                   //No like
+        dir += 2*Math.PI;
+    return dir;
+}
+
+function getSegAngleEnd(curve) {
+    var end = curve.getEnd(),
+        point = curve.getPoint(curve.getPointByLengthBack(20)),//curve.getPoint(1-ANG_DIST),
+        dir   = getAngle(sub(end,point)); //different from counterpart, maybe bad?
+    if(dir<0)
+        dir += 2*Math.PI;
+    return dir;
+}
+
+/* ------------------------------        Math.js        ------------------------------*/
+
+/*
+ * A bunch of stuff
+ */
+
+ function vectorSum(v1, c, v2) {
+    var result = [];
+    for (var i = 0; i < v1.length; i++)
+        result[i] = v1[i] + c * v2[i];
+    return result;
+}
+
+/**
+ * Prints a matrix in row,column format
+ */
+function matrixPrint(matrix) {
+    for (var i = 0; i < matrix.length; i++) {
+        //console.log(matrix[i]);
+    }
+}
+
+function zeroes(r, c) {
+    var m = [];
+    for (var i = 0; i < r; i++) {
+        m[i] = [];
+        for (var j = 0; j < c; j++)
+            m[i][j] = 0;
+    }
+    return m;
+}
+
+//Basic matrix operations
+function transpose(m) {
+    var result = zeroes(m[0].length, m.length);
+    for (var r = 0; r < result.length; r++) {
+        for(var c = 0; c < result[0].length; c++) {
+            result[r][c] = m[c][r];
+        }
+    }
+    return result;
+}
+
+function matrixMult(m1,m2) {
+    if(m1[0].length != m2.length)
+        throw "Matrix dimension mismatch. Cannot multiply";
+    
+    var result = zeroes(m1.length,m2[0].length);
+    
+    for(var r = 0; r<result.length; r++) {
+        for(var c = 0; c<result[0].length; c++) {
+            result[r][c]=mMultHelper(m1,m2,r,c);
+        }
+    }
+    return result;
+}
+
+function mMultHelper(m1,m2,r,c) { //does dot producting BS
+    var result = 0;
+    for(var i = 0; i<m1.length; i++)
+        result += m1[r][i]*m2[i][c];
+    return result;
+}
+
+//probably will never be used
+function rowProduct(m,r) {
+    var result = 1;
+    for(var i = 0; i<m[0].length; i++)
+        result *= m[r][i];
+    return result;
+}
+
+function colProduct(m,c) {
+    var result = 1;
+    for(var i = 0; i<m.length; i++)
+        result *= m[i][c];
+    return result;
+}
+
+/** indexed row,column 
+ *  DOES NOT DO ANY LEGITIMACY CHECKS OR ANYTHING
+ * @param {Object} matrix
+ */
+function gaussianElimination1(matrix) {
+    matrix = matrix.slice(0); //shallow copy (it's cool cause it's ints)
+    
+    for(var i = 0; i<matrix.length; i++) {//each row get the first coeffecient
+        var temp = gElHelper1(matrix[i]),
+            p = temp[0],
+            a = temp[1];
+            
+        for(var j = 0; j<matrix.length; j++) { //remove from other rows
+            var b = matrix[j][p];
+            
+            if(b != 0 && i != j)
+                matrix[j] = vectorSum(matrix[j],-b/a,matrix[i]);
+        }
+    }
+
+    //This part assumes that you end up with something in almost row echelon form (coeffecients may not be 1)    
+    var result = [],
+        numVars = matrix[0].length-1;
+    for(var i = 0; i<numVars; i++) { //grabbing the results
+        result[i] = matrix[i][numVars]/matrix[i][i];
+    }
+    return result;
+    
+    
+}
+//Helper function returns the first position of a nonzero coeffecient and the coefficient itself
+function gElHelper1(vector) {
+    for(var i = 0; i<vector.length; i++)
+        if(vector[i] != 0)
+            return [i,vector[i]];
+    return -1
+}
+
+function gaussianElimination(matrix) {
+    matrix = matrix.slice(0);
+    var numRows = matrix.length,
+        numCols = matrix[0].length,
+        sol = [];
+        
+    //matrixPrint(matrix);
+    
+    for(var c = 0; c<numRows; c++) {
+        var iMax = gElHelper(matrix,c);
+        
+        if(matrix[iMax][c] == 0)
+            throw "Matrix is singular"
+        swapRows(matrix,c,iMax);
+        
+        for(var d = c+1; d<numRows; d++) {
+            var mult = matrix[d][c]/matrix[c][c];
+            
+            matrix[d] = vectorSum(matrix[d],-mult,matrix[c]);
+        }
+    }
+    
+    for(var r = 0; r<numRows; r++) {
+        var i = numRows-r-1;
+        
+        for(var s = r+1; s<numRows; s++) {
+            var mult = -matrix[s][i]/matrix[r][i]
+            matrix[s] = vectorSum(matrix[s],mult,matrix[r]);
+        }
+        sol.push(matrix[r][numCols-1]/matrix[r][i]);
+    }
+    
+    return sol.reverse();
+}
+//Helper function finds the pos of the max in the column
+function gElHelper(matrix,c) {
+    var iMax = 0;
+    for(var i = c; i<matrix.length; i++) {
+        if(Math.abs(matrix[i][c])>Math.abs(matrix[iMax][c]))
+            iMax = i;
+    }
+    return iMax
+}
+
+function swapRows(matrix,r0,r1) {
+    var i = matrix[r0];
+    matrix[r0]=matrix[r1];
+    matrix[r1]=i;
+    return matrix;
+}
+
+/* ------------------------------        Vector.js        ------------------------------*/
+
+// Math
+function truncate(vector, max) {
+    var mag = getMag(vector);
+    if(mag > max)
+        return scale(vector,max/mag);
+    return vector;
+}
+
+function perp(vector) {
+    return [vector[1],-vector[0]];
+}
+
+function perpNorm(vector) {
+    return normalize(perp(vector));
+}
+
+function normalize(vector) {
+    //if(vector[0]==0 && vector[1]==0)
+    //    return [0,1];
+    var mag = getMag(vector);
+    return scale(vector,1/mag);
+}
+
+function normalizeTo(vector,mag) {
+    return scale(normalize(vector),mag);
+}
+
+function projectedLength(vector,along) {
+    return dot(vector,along)/getMag(along);
+}
+
+function project(vector,along) {
+    
+}
+
+function scale(vector,factor) {
+    return [vector[0]*factor,vector[1]*factor];
+}
+
+function add(vector1, vector2) {
+    return [vector1[0]+vector2[0],vector1[1]+vector2[1]];
+}
+
+function sub(vector1, vector2) {
+    return [vector1[0]-vector2[0],vector1[1]-vector2[1]];
+}
+
+function getMag(vector) {
+    return getDist([0,0],vector);
+}
+    
+function getDist(vector1,vector2) {
+    return Math.sqrt(Math.pow((vector2[0]-vector1[0]),2)+Math.pow((vector2[1]-vector1[1]),2));
+}
+
+function getAngle(vector) {
+    var quad = 0;
+    if(vector[0]===0) // because 0 and -0 are not always the same
+        vector[0] = +0;
+    if(vector[0]<0)
+        quad = Math.PI;
+    else if(vector[0]>0 && vector[1]<0)
+        quad = 2*Math.PI;
+    return reduceAngle(Math.atan(vector[1]/vector[0])+quad);
+}
+
+function getAngleBetween(vector1,vector2) {
+    return Math.abs(getAngle(vector1)-getAngle(vector2));
+}
+
+function getSmallerAngle(angle) {
+    if(angle > Math.PI)
+        return 2*Math.PI-angle;
+    if(angle < -Math.PI)
+        return -2*Math.PI-angle
+    return angle;
+}
+
+function getSmallerAngleDeg(angle) {
+    if(angle > 180)
+        return 360-angle;
+    if(angle < -180)
+        return -360-angle;
+    return angle;
+}
+
+function radToDeg(angle) {
+    return angle*180/Math.PI;
+}
+
+function degToRad(angle) {
+    return angle*Math.PI/180;
+}
+
+function reduceAngle(angle) {
+    return angle-Math.floor(angle/(2*Math.PI))*2*Math.PI;
+}
+
+function reduceAngleDeg(angle) {
+    return angle-Math.floor(angle/360)*360;
+}
+
+function dot(vector1,vector2) {
+    return vector1[0]*vector2[0]+vector1[1]*vector2[1];
+}
+
+function point(vector,dir) {
+    var mag = getMag(vector);
+    return [Math.cos(dir)*mag,Math.sin(dir)*mag];
+}
+
+function rotate(v,rad) {
+    var ang = getAngle(v);
+    if(v[0] == 0 && v[1] == -8) {
+        //console.log(v);
+        //console.log("!");
+        //console.log(ang);
+        //console.log(rad);
+        //console.log(point(v,rad+ang));
+    }
+    return point(v,rad+ang);
+}
+
+function midpoint(p1,p2,t) {
+    return add(scale(p1,1-t),scale(p2,t));
+}
+
+
+function drawVector(vector,pos,ctx) {
+    ctx.beginPath();
+    ctx.moveTo(pos[0],pos[1]);
+    ctx.lineTo(pos[0]+vector[0],pos[1]+vector[1]);
+    ctx.stroke();
+}
+/* ------------------------------       PerfectFreehand      ------------------------------*/
+/* ------------------------------        GetStroke.js        ------------------------------*/
+/**
+ * ## getStroke
+ * @description Get an array of points describing a polygon that surrounds the input points.
+ * @param points An array of points (as `[x, y, pressure]` or `{x, y, pressure}`). Pressure is optional in both cases.
+ * @param options (optional) An object with options.
+ * @param options.size	The base size (diameter) of the stroke.
+ * @param options.thinning The effect of pressure on the stroke's size.
+ * @param options.smoothing	How much to soften the stroke's edges.
+ * @param options.easing	An easing function to apply to each point's pressure.
+ * @param options.simulatePressure Whether to simulate pressure based on velocity.
+ * @param options.start Cap, taper and easing for the start of the line.
+ * @param options.end Cap, taper and easing for the end of the line.
+ * @param options.last Whether to handle the points as a completed stroke.
+ */
+ function getStroke(points, options) {
+    if (options === void 0) { options = {}; }
+    return getStrokeOutlinePoints(getStrokePoints(points, options), options);
+}
+//# sourceMappingURL=getStroke.js.map
+var __spreadArray = function (to, from, pack) {
+    if (pack || arguments.length === 2) for (var i = 0, l = from.length, ar; i < l; i++) {
+        if (ar || !(i in from)) {
+            if (!ar) ar = Array.prototype.slice.call(from, 0, i);
+            ar[i] = from[i];
+        }
+    }
+    return to.concat(ar || Array.prototype.slice.call(from));
+};
+var min = Math.min, PI = Math.PI;
+// This is the rate of change for simulated pressure. It could be an option.
+var RATE_OF_PRESSURE_CHANGE = 0.275;
+// Browser strokes seem to be off if PI is regular, a tiny offset seems to fix it
+var FIXED_PI = PI + 0.0001;
+/**
+ * ## getStrokeOutlinePoints
+ * @description Get an array of points (as `[x, y]`) representing the outline of a stroke.
+ * @param points An array of StrokePoints as returned from `getStrokePoints`.
+ * @param options (optional) An object with options.
+ * @param options.size	The base size (diameter) of the stroke.
+ * @param options.thinning The effect of pressure on the stroke's size.
+ * @param options.smoothing	How much to soften the stroke's edges.
+ * @param options.easing	An easing function to apply to each point's pressure.
+ * @param options.simulatePressure Whether to simulate pressure based on velocity.
+ * @param options.start Cap, taper and easing for the start of the line.
+ * @param options.end Cap, taper and easing for the end of the line.
+ * @param options.last Whether to handle the points as a completed stroke.
+ */
+ function getStrokeOutlinePoints(points, options) {
+    if (options === void 0) { options = {}; }
+    var _a = options.size, size = _a === void 0 ? 16 : _a, _b = options.smoothing, smoothing = _b === void 0 ? 0.5 : _b, _c = options.thinning, thinning = _c === void 0 ? 0.5 : _c, _d = options.simulatePressure, simulatePressure = _d === void 0 ? true : _d, _e = options.easing, easing = _e === void 0 ? function (t) { return t; } : _e, _f = options.start, start = _f === void 0 ? {} : _f, _g = options.end, end = _g === void 0 ? {} : _g, _h = options.last, isComplete = _h === void 0 ? false : _h;
+    var _j = start.cap, capStart = _j === void 0 ? true : _j, _k = start.taper, taperStart = _k === void 0 ? 0 : _k, _l = start.easing, taperStartEase = _l === void 0 ? function (t) { return t * (2 - t); } : _l;
+    var _m = end.cap, capEnd = _m === void 0 ? true : _m, _o = end.taper, taperEnd = _o === void 0 ? 0 : _o, _p = end.easing, taperEndEase = _p === void 0 ? function (t) { return --t * t * t + 1; } : _p;
+    // We can't do anything with an empty array or a stroke with negative size.
+    if (points.length === 0 || size <= 0) {
+        return [];
+    }
+    // The total length of the line
+    var totalLength = points[points.length - 1].runningLength;
+    // The minimum allowed distance between points (squared)
+    var minDistance = Math.pow(size * smoothing, 2);
+    // Our collected left and right points
+    var leftPts = [];
+    var rightPts = [];
+    // Previous pressure (start with average of first five pressures,
+    // in order to prevent fat starts for every line. Drawn lines
+    // almost always start slow!
+    var prevPressure = points.slice(0, 10).reduce(function (acc, curr) {
+        var pressure = curr.pressure;
+        if (simulatePressure) {
+            // Speed of change - how fast should the the pressure changing?
+            var sp = min(1, curr.distance / size);
+            // Rate of change - how much of a change is there?
+            var rp = min(1, 1 - sp);
+            // Accelerate the pressure
+            pressure = min(1, acc + (rp - acc) * (sp * RATE_OF_PRESSURE_CHANGE));
+        }
+        return (acc + pressure) / 2;
+    }, points[0].pressure);
+    // The current radius
+    var radius = getStrokeRadius(size, thinning, points[points.length - 1].pressure, easing);
+    // The radius of the first saved point
+    var firstRadius = undefined;
+    // Previous vector
+    var prevVector = points[0].vector;
+    // Previous left and right points
+    var pl = points[0].point;
+    var pr = pl;
+    // Temporary left and right points
+    var tl = pl;
+    var tr = pr;
+    // let short = true
+    /*
+      Find the outline's left and right points
+  
+      Iterating through the points and populate the rightPts and leftPts arrays,
+      skipping the first and last pointsm, which will get caps later on.
+    */
+    for (var i = 0; i < points.length; i++) {
+        var pressure = points[i].pressure;
+        var _q = points[i], point = _q.point, vector = _q.vector, distance = _q.distance, runningLength = _q.runningLength;
+        // Removes noise from the end of the line
+        if (i < points.length - 1 && totalLength - runningLength < 3) {
+            continue;
+        }
+        /*
+          Calculate the radius
+    
+          If not thinning, the current point's radius will be half the size; or
+          otherwise, the size will be based on the current (real or simulated)
+          pressure.
+        */
+        if (thinning) {
+            if (simulatePressure) {
+                // If we're simulating pressure, then do so based on the distance
+                // between the current point and the previous point, and the size
+                // of the stroke. Otherwise, use the input pressure.
+                var sp = min(1, distance / size);
+                var rp = min(1, 1 - sp);
+                pressure = min(1, prevPressure + (rp - prevPressure) * (sp * RATE_OF_PRESSURE_CHANGE));
+            }
+            radius = getStrokeRadius(size, thinning, pressure, easing);
+        }
+        else {
+            radius = size / 2;
+        }
+        if (firstRadius === undefined) {
+            firstRadius = radius;
+        }
+        /*
+          Apply tapering
+    
+          If the current length is within the taper distance at either the
+          start or the end, calculate the taper strengths. Apply the smaller
+          of the two taper strengths to the radius.
+        */
+        var ts = runningLength < taperStart
+            ? taperStartEase(runningLength / taperStart)
+            : 1;
+        var te = totalLength - runningLength < taperEnd
+            ? taperEndEase((totalLength - runningLength) / taperEnd)
+            : 1;
+        radius = Math.max(0.01, radius * Math.min(ts, te));
+        /* Add points to left and right */
+        // Handle the last point
+        if (i === points.length - 1) {
+            var offset_1 = mul(per(vector), radius);
+            leftPts.push(sub(point, offset_1));
+            rightPts.push(add(point, offset_1));
+            continue;
+        }
+        var nextVector = points[i + 1].vector;
+        var nextDpr = dpr(vector, nextVector);
+        /*
+          Handle sharp corners
+    
+          Find the difference (dot product) between the current and next vector.
+          If the next vector is at more than a right angle to the current vector,
+          draw a cap at the current point.
+        */
+        if (nextDpr < 0) {
+            // It's a sharp corner. Draw a rounded cap and move on to the next point
+            // Considering saving these and drawing them later? So that we can avoid
+            // crossing future points.
+            var offset_2 = mul(per(prevVector), radius);
+            for (var step = 1 / 13, t = 0; t <= 1; t += step) {
+                tl = rotAround(sub(point, offset_2), point, FIXED_PI * t);
+                leftPts.push(tl);
+                tr = rotAround(add(point, offset_2), point, FIXED_PI * -t);
+                rightPts.push(tr);
+            }
+            pl = tl;
+            pr = tr;
+            continue;
+        }
+        /*
+          Add regular points
+    
+          Project points to either side of the current point, using the
+          calculated size as a distance. If a point's distance to the
+          previous point on that side greater than the minimum distance
+          (or if the corner is kinda sharp), add the points to the side's
+          points array.
+        */
+        var offset = mul(per(lrp(nextVector, vector, nextDpr)), radius);
+        tl = sub(point, offset);
+        if (i <= 1 || dist2(pl, tl) > minDistance) {
+            leftPts.push(tl);
+            pl = tl;
+        }
+        tr = add(point, offset);
+        if (i <= 1 || dist2(pr, tr) > minDistance) {
+            rightPts.push(tr);
+            pr = tr;
+        }
+        // Set variables for next iteration
+        prevPressure = pressure;
+        prevVector = vector;
+    }
+    /*
+      Drawing caps
+      
+      Now that we have our points on either side of the line, we need to
+      draw caps at the start and end. Tapered lines don't have caps, but
+      may have dots for very short lines.
+    */
+    var firstPoint = points[0].point.slice(0, 2);
+    var lastPoint = points.length > 1
+        ? points[points.length - 1].point.slice(0, 2)
+        : add(points[0].point, [1, 1]);
+    var startCap = [];
+    var endCap = [];
+    /*
+      Draw a dot for very short or completed strokes
+      
+      If the line is too short to gather left or right points and if the line is
+      not tapered on either side, draw a dot. If the line is tapered, then only
+      draw a dot if the line is both very short and complete. If we draw a dot,
+      we can just return those points.
+    */
+    if (convertDotStrokes == true && points.length === 1) {
+        if (!(taperStart || taperEnd) || isComplete) {
+            var start_1 = prj(firstPoint, uni(per(sub(firstPoint, lastPoint))), -(firstRadius || radius));
+            var dotPts = [];
+            for (var step = 1 / 13, t = step; t <= 1; t += step) {
+                dotPts.push(rotAround(start_1, firstPoint, FIXED_PI * 2 * t));
+            }
+            return dotPts;
+        }
+    }
+    else {
+        /*
+        Draw a start cap
+    
+        Unless the line has a tapered start, or unless the line has a tapered end
+        and the line is very short, draw a start cap around the first point. Use
+        the distance between the second left and right point for the cap's radius.
+        Finally remove the first left and right points. :psyduck:
+      */
+        if (taperStart || (taperEnd && points.length === 1)) {
+            // The start point is tapered, noop
+        }
+        else if (capStart) {
+            // Draw the round cap - add thirteen points rotating the right point around the start point to the left point
+            for (var step = 1 / 13, t = step; t <= 1; t += step) {
+                var pt = rotAround(rightPts[0], firstPoint, FIXED_PI * t);
+                startCap.push(pt);
+            }
+        }
+        else {
+            // Draw the flat cap - add a point to the left and right of the start point
+            var cornersVector = sub(leftPts[0], rightPts[0]);
+            var offsetA = mul(cornersVector, 0.5);
+            var offsetB = mul(cornersVector, 0.51);
+            startCap.push(sub(firstPoint, offsetA), sub(firstPoint, offsetB), add(firstPoint, offsetB), add(firstPoint, offsetA));
+        }
+        /*
+        Draw an end cap
+    
+        If the line does not have a tapered end, and unless the line has a tapered
+        start and the line is very short, draw a cap around the last point. Finally,
+        remove the last left and right points. Otherwise, add the last point. Note
+        that This cap is a full-turn-and-a-half: this prevents incorrect caps on
+        sharp end turns.
+      */
+        var direction = per(neg(points[points.length - 1].vector));
+        if (taperEnd || (taperStart && points.length === 1)) {
+            // Tapered end - push the last point to the line
+            endCap.push(lastPoint);
+        }
+        else if (capEnd) {
+            // Draw the round end cap
+            var start_2 = prj(lastPoint, direction, radius);
+            for (var step = 1 / 29, t = step; t < 1; t += step) {
+                endCap.push(rotAround(start_2, lastPoint, FIXED_PI * 3 * t));
+            }
+        }
+        else {
+            // Draw the flat end cap
+            endCap.push(add(lastPoint, mul(direction, radius)), add(lastPoint, mul(direction, radius * 0.99)), sub(lastPoint, mul(direction, radius * 0.99)), sub(lastPoint, mul(direction, radius)));
+        }
+    }
+    /*
+      Return the points in the correct winding order: begin on the left side, then
+      continue around the end cap, then come back along the right side, and finally
+      complete the start cap.
+    */
+    return leftPts.concat(endCap, rightPts.reverse(), startCap);
+}
+
+function getStrokePoints(points, options) {
+    var _a;
+    if (options === void 0) { options = {}; }
+    var _b = options.streamline, streamline = _b === void 0 ? 0.5 : _b, _c = options.size, size = _c === void 0 ? 16 : _c, _d = options.last, isComplete = _d === void 0 ? false : _d;
+    // If we don't have any points, return an empty array.
+    if (points.length === 0)
+        return [];
+    // Find the interpolation level between points.
+    var t = 0.15 + (1 - streamline) * 0.85;
+    // Whatever the input is, make sure that the points are in number[][].
+    var pts = Array.isArray(points[0])
+        ? points
+        : points.map(function (_a) {
+            var x = _a.x, y = _a.y, _b = _a.pressure, pressure = _b === void 0 ? 0.5 : _b;
+            return [x, y, pressure];
+        });
+    // Add extra points between the two, to help avoid "dash" lines
+    // for strokes with tapered start and ends. Don't mutate the
+    // input array!
+    if (pts.length === 2) {
+        var last = pts[1];
+        pts = pts.slice(0, -1);
+        for (var i = 1; i < 5; i++) {
+            pts.push(lrp(pts[0], last, i / 4));
+        }
+    }
+    // If there's only one point, add another point at a 1pt offset.
+    // Don't mutate the input array!
+    if (pts.length === 1) {
+        pts = __spreadArray(__spreadArray([], pts, true), [__spreadArray(__spreadArray([], add(pts[0], [1, 1]), true), pts[0].slice(2), true)], false);
+    }
+    // The strokePoints array will hold the points for the stroke.
+    // Start it out with the first point, which needs no adjustment.
+    var strokePoints = [
+        {
+            point: [pts[0][0], pts[0][1]],
+            pressure: pts[0][2] >= 0 ? pts[0][2] : 0.25,
+            vector: [1, 1],
+            distance: 0,
+            runningLength: 0,
+        },
+    ];
+    // A flag to see whether we've already reached out minimum length
+    var hasReachedMinimumLength = false;
+    // We use the runningLength to keep track of the total distance
+    var runningLength = 0;
+    // We're set this to the latest point, so we can use it to calculate
+    // the distance and vector of the next point.
+    var prev = strokePoints[0];
+    var max = pts.length - 1;
+    // Iterate through all of the points, creating StrokePoints.
+    for (var i = 1; i < pts.length; i++) {
+        var point = isComplete && i === max
+            ? // If we're at the last point, and `options.last` is true,
+                // then add the actual input point.
+                pts[i].slice(0, 2)
+            : // Otherwise, using the t calculated from the streamline
+                // option, interpolate a new point between the previous
+                // point the current point.
+                lrp(prev.point, pts[i], t);
+        // If the new point is the same as the previous point, skip ahead.
+        if (isEqual(prev.point, point))
+            continue;
+        // How far is the new point from the previous point?
+        var distance = dist(point, prev.point);
+        // Add this distance to the total "running length" of the line.
+        runningLength += distance;
+        // At the start of the line, we wait until the new point is a
+        // certain distance away from the original point, to avoid noise
+        if (i < max && !hasReachedMinimumLength) {
+            if (runningLength < size)
+                continue;
+            hasReachedMinimumLength = true;
+            // TODO: Backfill the missing points so that tapering works correctly.
+        }
+        // Create a new strokepoint (it will be the new "previous" one).
+        prev = {
+            // The adjusted point
+            point: point,
+            // The input pressure (or .5 if not specified)
+            pressure: pts[i][2] >= 0 ? pts[i][2] : 0.5,
+            // The vector from the current point to the previous point
+            vector: uni(sub(prev.point, point)),
+            // The distance between the current point and the previous point
+            distance: distance,
+            // The total distance so far
+            runningLength: runningLength,
+        };
+        // Push it to the strokePoints array.
+        strokePoints.push(prev);
+    }
+    // Set the vector of the first point to be the same as the second point.
+    strokePoints[0].vector = ((_a = strokePoints[1]) === null || _a === void 0 ? void 0 : _a.vector) || [0, 0];
+    return strokePoints;
+}
+function getStrokeRadius(size, thinning, pressure, easing) {
+    if (easing === void 0) { easing = function (t) { return t; }; }
+    return size * easing(0.5 - thinning * (0.5 - pressure));
+}
+
+/**
+ * Negate a vector.
+ * @param A
+ * @internal
+ */
+function neg(A) {
+    return [-A[0], -A[1]];
+}
+/**
+ * Add vectors.
+ * @param A
+ * @param B
+ * @internal
+ */
+ function add(A, B) {
+    return [A[0] + B[0], A[1] + B[1]];
+}
+/**
+ * Subtract vectors.
+ * @param A
+ * @param B
+ * @internal
+ */
+ function sub(A, B) {
+    return [A[0] - B[0], A[1] - B[1]];
+}
+/**
+ * Vector multiplication by scalar
+ * @param A
+ * @param n
+ * @internal
+ */
+ function mul(A, n) {
+    return [A[0] * n, A[1] * n];
+}
+/**
+ * Vector division by scalar.
+ * @param A
+ * @param B
+ * @internal
+ */
+ function div(A, n) {
+    return [A[0] / n, A[1] / n];
+}
+/**
+ * Perpendicular rotation of a vector A
+ * @param A
+ * @internal
+ */
+ function per(A) {
+    return [A[1], -A[0]];
+}
+/**
+ * Dot product
+ * @param A
+ * @param B
+ * @internal
+ */
+ function dpr(A, B) {
+    return A[0] * B[0] + A[1] * B[1];
+}
+/**
+ * Get whether two vectors are equal.
+ * @param A
+ * @param B
+ * @internal
+ */
+ function isEqual(A, B) {
+    return A[0] === B[0] && A[1] === B[1];
+}
+/**
+ * Length of the vector
+ * @param A
+ * @internal
+ */
+ function len(A) {
+    return Math.hypot(A[0], A[1]);
+}
+/**
+ * Length of the vector squared
+ * @param A
+ * @internal
+ */
+ function len2(A) {
+    return A[0] * A[0] + A[1] * A[1];
+}
+/**
+ * Dist length from A to B squared.
+ * @param A
+ * @param B
+ * @internal
+ */
+ function dist2(A, B) {
+    return len2(sub(A, B));
+}
+/**
+ * Get normalized / unit vector.
+ * @param A
+ * @internal
+ */
+ function uni(A) {
+    return div(A, len(A));
+}
+/**
+ * Dist length from A to B
+ * @param A
+ * @param B
+ * @internal
+ */
+ function dist(A, B) {
+    return Math.hypot(A[1] - B[1], A[0] - B[0]);
+}
+/**
+ * Mean between two vectors or mid vector between two vectors
+ * @param A
+ * @param B
+ * @internal
+ */
+ function med(A, B) {
+    return mul(add(A, B), 0.5);
+}
+/**
+ * Rotate a vector around another vector by r (radians)
+ * @param A vector
+ * @param C center
+ * @param r rotation in radians
+ * @internal
+ */
+ function rotAround(A, C, r) {
+    var s = Math.sin(r);
+    var c = Math.cos(r);
+    var px = A[0] - C[0];
+    var py = A[1] - C[1];
+    var nx = px * c - py * s;
+    var ny = px * s + py * c;
+    return [nx + C[0], ny + C[1]];
+}
+/**
+ * Interpolate vector A to B with a scalar t
+ * @param A
+ * @param B
+ * @param t scalar
+ * @internal
+ */
+ function lrp(A, B, t) {
+    return add(A, mul(sub(B, A), t));
+}
+/**
+ * Project a point A in the direction B by a scalar c
+ * @param A
+ * @param B
+ * @param c
+ * @internal
+ */
+ function prj(A, B, c) {
+    return add(A, mul(B, c));
+}
+
+function handleEraserDrag(e) {
+    if (!isEraserDragging) return;
+    
+    // 两次事件之间扫过的路径在下一帧统一检测和删除
+    queue_eraser_sweep(e.offsetX, e.offsetY, null);
+}
+
+// 橡皮擦上一次的位置，与本次位置连成扫掠线段；null表示刚开始擦除
+var eraserSweepLast = null;
+// 本帧待检测的扫掠线段，x1, y1, x2, y2, ...
+var eraserSweepPath = [];
+// 本帧直线(两点笔画)使用的容差，笔端擦除对直线更宽松
+var eraserSweepLineTolerance = null;
+var eraserSweepFrameRequested = false;
+var eraserSweepStats = {
+    frames: 0,   // 执行过擦除检测的帧数
+    segments: 0, // 检测的扫掠线段数
+    removed: 0   // 删除的笔画数
+};
+
+/**
+ * 记录橡皮擦移动到(x, y)，并申请一帧统一处理
+ * @param {number|null} lineTolerance - 直线(两点笔画)的容差，null表示与普通笔画相同
+ */
+function queue_eraser_sweep(x, y, lineTolerance) {
+    var last = eraserSweepLast || [x, y];
+    eraserSweepPath.push(last[0], last[1], x, y);
+    eraserSweepLast = [x, y];
+    eraserSweepLineTolerance = lineTolerance;
+    if (!eraserSweepFrameRequested) {
+        eraserSweepFrameRequested = true;
+        requestAnimationFrame(flush_eraser_sweep);
+    }
+}
+
+/**
+ * 擦除结束：立即处理尚未检测的路径，下一次擦除重新开始
+ */
+function end_eraser_sweep() {
+    flush_eraser_sweep();
+    eraserSweepLast = null;
+}
+
+/**
+ * 检测本帧橡皮擦扫过的路径，一次删除所有被扫到的笔画，
+ * 整批只记录一次撤销、申请一次重绘和一次保存
+ */
+function flush_eraser_sweep() {
+    eraserSweepFrameRequested = false;
+    if (!eraserSweepPath.length) return;
+    var path = eraserSweepPath;
+    eraserSweepPath = [];
+    eraserSweepStats.frames++;
+    eraserSweepStats.segments += path.length / 4;
+    
+    var batch = erase_along_path(path, eraser_hit_tolerance(), eraserSweepLineTolerance);
+    if (!batch.length) return;
+    eraserSweepStats.removed += batch.length;
+    
+    // 整批作为一次擦除操作加入撤销日志
+    record_erase_batch(batch);
+    
+    // 设置操作类型为擦除
+    strokeOperation = 'E';
+    
+    // 检查是否所有笔迹都被擦除
+    if (arrays_of_points.length === 0 && strokes.length === 0) {
+        // 重置nextLine和nextPoint，确保下一次绘制正确开始
+        nextLine = 0;
+        nextPoint = 0;
+        nextStroke = 0;
+    }
+    
+    // 被擦除的区域已由mark_line_removed/mark_calligraphy_removed标记为局部重绘，在同一帧内完成
+    
+    // 标记笔迹已变化，触发保存
+    strokesChanged = true;
+    save_strokes_debounced();
+}
+
+/**
+ * 是否为矩形(两个点表示对角)
+ */
+function is_rectangle_line(points) {
+    var style = read_line(points).style;
+    return !!(style && style.style === 'rectangle');
+}
+
+/**
+ * 删除与扫掠路径(以容差为半径的胶囊体)相交的所有笔画
+ * @param {Array} path - 扫掠线段，x1, y1, x2, y2, ...
+ * @param {number} tolerance - 普通笔画的容差
+ * @param {number|null} lineTolerance - 直线(两点笔画)的容差，null表示与普通笔画相同
+ * @returns {Array} 被删除的笔画记录，按删除顺序排列，撤销时倒序恢复；
+ *     精确擦除模式下记录中的pieces为替换原笔画的剩余部分
+ */
+function erase_along_path(path, tolerance, lineTolerance) {
+    var radius = Math.max(tolerance, lineTolerance || 0);
+    var hitLines = new Map();
+    // 精确擦除时记录每条笔画在各网格中被登记的线段，只切开这些线段
+    var hitSegments = new Map();
+    for (var k = 0; k < path.length; k += 4) {
+        var ax = path[k], ay = path[k + 1], bx = path[k + 2], by = path[k + 3];
+        var candidates = query_line_index({
+            left: Math.min(ax, bx) - radius,
+            top: Math.min(ay, by) - radius,
+            right: Math.max(ax, bx) + radius,
+            bottom: Math.max(ay, by) + radius
+        });
+        for (var c = 0; c < candidates.length; c++) {
+            var points = candidates[c].points;
+            if (precisionEraseMode) {
+                var segments = hitSegments.get(points) || new Set();
+                candidates[c].segments.forEach(function(j) { segments.add(j); });
+                hitSegments.set(points, segments);
+            }
+            if (hitLines.has(points)) continue;
+            var limit = (lineTolerance && points.length === 2) ? lineTolerance : tolerance;
+            if (line_sweep_distance(points, ax, ay, bx, by, limit, candidates[c].segments) < limit) {
+                hitLines.set(points, candidates[c].index);
+            }
+        }
+    }
+    
+    var batch = [];
+    // 从大到小删除，前面的下标不受影响
+    var indices = Array.from(hitLines.values()).sort(function(a, b) { return b - a; });
+    for (var n = 0; n < indices.length; n++) {
+        var i = indices[n];
+        var points = arrays_of_points[i];
+        var entry = {
+            points: points,
+            perfectCache: perfect_cache[i],
+            lineType: is_rectangle_line(points) ? 'R' : 'L',
+            index: i
+        };
+        // 精确擦除：矩形无法切开，仍整体删除；其他笔画只保留橡皮擦之外的部分
+        if (precisionEraseMode && entry.lineType !== 'R') {
+            var limit = (lineTolerance && points.length === 2) ? lineTolerance : tolerance;
+            var pieces = split_line_by_path(points, path, limit, hitSegments.get(points));
+            if (!pieces) continue;
+            var line = read_line(points);
+            entry.pieces = pieces.map(function(xy) {
+                return store_line_xy(xy, line.color, line.width, line.style);
+            });
+        }
+        batch.push(entry);
+        remove_erased_stroke(entry);
+    }
+    
+    // 书法笔画数量很少，直接遍历
+    var calligraphyTolerance = getEraserTolerance('calligraphy');
+    for (var i = strokes.length - 1; i >= 0; i--) {
+        var bounds = get_calligraphy_bounds(strokes[i]);
+        for (var k = 0; k < path.length; k += 4) {
+            var box = {
+                left: Math.min(path[k], path[k + 2]) - calligraphyTolerance,
+                top: Math.min(path[k + 1], path[k + 3]) - calligraphyTolerance,
+                right: Math.max(path[k], path[k + 2]) + calligraphyTolerance,
+                bottom: Math.max(path[k + 1], path[k + 3]) + calligraphyTolerance
+            };
+            if (!bounds_intersect(bounds, box)) continue;
+            if (calligraphy_sweep_distance(strokes[i], path[k], path[k + 1], path[k + 2], path[k + 3],
+                                           calligraphyTolerance) <= calligraphyTolerance) {
+                var entry = {
+                    calligraphyStroke: strokes[i],
+                    index: i,
+                    lineType: 'C'
+                };
+                batch.push(entry);
+                remove_erased_stroke(entry);
+                break;
+            }
+        }
+    }
+    return batch;
+}
+
+function switch_line_mode() {
+    stop_drawing();
+    lineMode = !lineMode;
+    var lineButton = document.getElementById('ts_line_button');
+    if(lineMode) {
+        lineButton.className = 'active';
+        
+        // 确保直线工具的属性在第一次使用时有合理的默认值
+        if (lineColor === '#fff' && color !== '#fff') {
+            lineColor = color; // 如果直线颜色未设置，则继承当前画笔颜色
+        }
+        if (lineWidth === 4 && line_width !== 4) {
+            lineWidth = line_width; // 如果直线线宽未设置，则继承当前画笔线宽
+        }
+        
+        // 应用直线工具设置
+        update_line_settings();
+        
+        // Deactivate other modes
+        ts_perfect_freehand_button.className = '';
+        perfectFreehand = false;
+        ts_kanji_button.className = '';
+        calligraphy = false;
+        if (eraserMode) {
+            toggleEraser(false);
+        }
+        // 如果笔端擦除模式活跃，禁用它
+        isPenEraserActive = false;
+        
+        // 如果矩形模式活跃，禁用它
+        if (rectangleMode) {
+            rectangleMode = false;
+            document.getElementById('ts_rectangle_button').className = '';
+        }
+    } else {
+        lineButton.className = '';
+    }
+}
+
+/**
+ * 设置直线样式
+ * @param {string} style - 样式类型：solid(实线)、dashed(虚线)、wavy(波浪线)
+ */
+function setLineStyle(style) {
+    lineStyle = style;
+    
+    // 根据样式设置虚线模式
+    if (style === 'dashed') {
+        lineDashPattern = [10, 5]; // 10像素实线，5像素空白
+    } else if (style === 'wavy') {
+        lineDashPattern = []; // 波浪线不使用虚线模式
+    } else {
+        // 实线
+        lineDashPattern = [];
+    }
+    
+    // 更新直线设置
+    update_line_settings();
+    
+    // 保存设置
+    if (typeof pycmd === 'function') {
+        pycmd('ankidraw_save_line_style:' + style);
+    }
+}
+
+/**
+ * 创建直线样式选择器
+ */
+function createLineStyleSlider() {
+    if (!lineStyleSlider) {
+        // 创建容器
+        var sliderContainer = document.createElement('div');
+        sliderContainer.id = 'line-style-slider-container';
+        sliderContainer.style.position = 'fixed';
+        sliderContainer.style.zIndex = '9998';
+        sliderContainer.style.background = 'rgba(0, 0, 0, 0.5)';
+        sliderContainer.style.padding = '10px';
+        sliderContainer.style.borderRadius = '5px';
+        sliderContainer.style.display = 'none';
+        sliderContainer.style.transition = '0.3s';
+        sliderContainer.style.boxShadow = '0 2px 5px rgba(0,0,0,0.2)';
+        sliderContainer.style.opacity = '0.5';
+        
+        // 添加标题
+        var sliderTitle = document.createElement('div');
+        sliderTitle.textContent = ankidraw_text('line_style', 'Line Style');
+        sliderTitle.style.color = 'white';
+        sliderTitle.style.fontSize = '12px';
+        sliderTitle.style.marginBottom = '5px';
+        sliderTitle.style.textAlign = 'center';
+        sliderContainer.appendChild(sliderTitle);
+        
+        // 创建样式选项容器
+        var styleOptions = document.createElement('div');
+        styleOptions.style.display = 'flex';
+        styleOptions.style.flexDirection = 'column';
+        styleOptions.style.gap = '8px';
+        
+        // 样式选项：实线
+        var solidOption = createStyleOption('solid', 'Solid');
+        
+        // 样式选项：虚线
+        var dashedOption = createStyleOption('dashed', 'Dashed');
+        
+        // 样式选项：波浪线
+        var wavyOption = createStyleOption('wavy', 'Wavy');
+        
+        // 添加样式选项到容器
+        styleOptions.appendChild(solidOption);
+        styleOptions.appendChild(dashedOption);
+        styleOptions.appendChild(wavyOption);
+        sliderContainer.appendChild(styleOptions);
+        
+        // 鼠标进入容器时清除自动隐藏计时器和增加不透明度
+        sliderContainer.addEventListener('mouseenter', function() {
+            clearTimeout(lineStyleSliderTimeout);
+            this.style.opacity = '1';
+            this.style.transform = 'scale(1.05)';
+        });
+        
+        // 鼠标离开容器时设置自动隐藏和恢复透明度
+        sliderContainer.addEventListener('mouseleave', function() {
+            this.style.opacity = '0.5';
+            this.style.transform = 'scale(1)';
+            startLineStyleSliderHideTimer();
+        });
+        
+        // 将容器添加到文档
+        document.body.appendChild(sliderContainer);
+        lineStyleSlider = sliderContainer;
+    }
+    
+    return lineStyleSlider;
+}
+
+/**
+ * 创建样式选项
+ * @param {string} style - 样式名称
+ * @param {string} label - 样式显示文本
+ * @returns {HTMLElement} - 样式选项元素
+ */
+function createStyleOption(style, label) {
+    var option = document.createElement('div');
+    option.className = 'line-style-option';
+    option.dataset.style = style;
+    option.style.display = 'flex';
+    option.style.alignItems = 'center';
+    option.style.cursor = 'pointer';
+    option.style.padding = '5px';
+    option.style.borderRadius = '3px';
+    option.style.transition = '0.2s';
+    
+    // 当前选中的样式添加高亮
+    if (style === lineStyle) {
+        option.style.background = 'rgba(33, 150, 243, 0.3)';
+    }
+    
+    // 样式示例
+    var preview = document.createElement('div');
+    preview.style.width = '30px';
+    preview.style.height = '20px';
+    preview.style.marginRight = '10px';
+    preview.style.position = 'relative';
+    
+    // 为不同样式创建不同的预览
+    var previewLine = document.createElement('div');
+    previewLine.style.position = 'absolute';
+    previewLine.style.top = '50%';
+    previewLine.style.left = '0';
+    previewLine.style.right = '0';
+    previewLine.style.height = '2px';
+    previewLine.style.background = 'white';
+    
+    if (style === 'solid') {
+        // 实线不需要特殊处理
+    } else if (style === 'dashed') {
+        // 虚线效果
+        previewLine.style.borderTop = '2px dashed white';
+        previewLine.style.background = 'transparent';
+    } else if (style === 'wavy') {
+        // 波浪线效果
+        previewLine.style.borderTop = '2px solid transparent';
+        previewLine.style.background = 'transparent';
+        previewLine.style.height = '6px';
+        
+        // 更新SVG波浪预览以使其更加明显
+        var svg = `<svg width="30" height="6" xmlns="http://www.w3.org/2000/svg">
+            <path d="M0,3 Q2,1 4,5 Q6,1 8,5 Q10,1 12,5 Q14,1 16,5 Q18,1 20,5 Q22,1 24,5 Q26,1 28,5 Q30,3" stroke="white" fill="none" stroke-width="1.5" stroke-linecap="round" stroke-linejoin="round"/>
+        </svg>`;
+        var encoded = encodeURIComponent(svg);
+        previewLine.style.backgroundImage = `url("data:image/svg+xml;charset=utf-8,${encoded}")`;
+        previewLine.style.backgroundRepeat = 'no-repeat';
+    }
+    
+    preview.appendChild(previewLine);
+    
+    // 样式文本 - 从本地化字符串表读取
+    var text = document.createElement('span');
+    text.textContent = ankidraw_text('line_style_' + style, label);
+    text.style.color = 'white';
+    text.style.fontSize = '12px';
+    
+    option.appendChild(preview);
+    option.appendChild(text);
+    
+    // 添加点击事件
+    option.addEventListener('click', function() {
+        setLineStyle(style);
+        
+        // 更新所有选项的样式
+        var options = document.querySelectorAll('.line-style-option');
+        options.forEach(function(opt) {
+            if (opt.dataset.style === style) {
+                opt.style.background = 'rgba(33, 150, 243, 0.3)';
+            } else {
+                opt.style.background = 'transparent';
+            }
+        });
+
+        // 立即隐藏滚动条
+        hideLineStyleSlider();
+    });
+    
+    // 添加悬停效果
+    option.addEventListener('mouseenter', function() {
+        if (this.dataset.style !== lineStyle) {
+            this.style.background = 'rgba(255, 255, 255, 0.1)';
+        }
+    });
+    
+    option.addEventListener('mouseleave', function() {
+        if (this.dataset.style !== lineStyle) {
+            this.style.background = 'transparent';
+        }
+    });
+    
+    return option;
+}
+
+/**
+ * 显示直线样式选择器
+ */
+function showLineStyleSlider() {
+    var sliderContainer = createLineStyleSlider();
+    
+    // 清除可能存在的隐藏计时器
+    clearTimeout(lineStyleSliderTimeout);
+    
+    // 获取工具栏位置
+    var toolbarElem = document.getElementById('pencil_button_bar');
+    var lineButton = document.getElementById('ts_line_button');
+    
+    if (toolbarElem && lineButton) {
+        var toolbarRect = toolbarElem.getBoundingClientRect();
+        var buttonRect = lineButton.getBoundingClientRect();
+        
+        // 首先显示滑块以获取其尺寸
+        sliderContainer.style.display = 'block';
+        sliderContainer.style.visibility = 'hidden';
+        
+        // 获取滑块的尺寸
+        var sliderWidth = sliderContainer.offsetWidth;
+        var sliderHeight = sliderContainer.offsetHeight;
+        
+        // 计算初始位置
+        var initialLeft, initialTop;
+        
+        // 根据工具栏位置决定滚动条位置
+        if (toolbarRect.left < window.innerWidth / 2) {
+            // 工具栏在左侧，滚动条显示在右侧
+            initialLeft = buttonRect.right + 10;
+            initialTop = buttonRect.top;
+        } else {
+            // 工具栏在右侧，滚动条显示在左侧
+            initialLeft = buttonRect.left - sliderWidth - 10;
+            initialTop = buttonRect.top;
+        }
+        
+        // 确保滑块在视口内
+        // 限制右边界
+        if (initialLeft + sliderWidth > window.innerWidth) {
+            initialLeft = window.innerWidth - sliderWidth - 10;
+        }
+        
+        // 限制左边界
+        if (initialLeft < 0) {
+            initialLeft = 10;
+        }
+        
+        // 限制底部边界
+        if (initialTop + sliderHeight > window.innerHeight) {
+            initialTop = window.innerHeight - sliderHeight - 10;
+        }
+        
+        // 限制顶部边界
+        if (initialTop < 0) {
+            initialTop = 10;
+        }
+        
+        // 设置位置
+        sliderContainer.style.left = initialLeft + 'px';
+        sliderContainer.style.top = initialTop + 'px';
+        sliderContainer.style.visibility = 'visible';
+    } else {
+        // 默认位置
+        sliderContainer.style.left = '10px';
+        sliderContainer.style.top = '10px';
+        sliderContainer.style.visibility = 'visible';
+    }
+    
+    // 显示选择器
+    sliderContainer.style.display = 'block';
+    
+    // 设置自动隐藏计时器
+    startLineStyleSliderHideTimer();
+}
+
+/**
+ * 开始计时隐藏直线样式选择器
+ */
+function startLineStyleSliderHideTimer() {
+    // 清除可能存在的计时器
+    clearTimeout(lineStyleSliderTimeout);
+    
+    // 设置3秒后隐藏
+    lineStyleSliderTimeout = setTimeout(function() {
+        hideLineStyleSlider();
+    }, 3000);
+}
+
+/**
+ * 隐藏直线样式选择器
+ */
+function hideLineStyleSlider() {
+    if (lineStyleSlider) {
+        lineStyleSlider.style.display = 'none';
+    }
+}
+
+/**
+ * 设置直线工具按钮的双击事件
+ */
+function setupLineStyleEvents() {
+    // 设置直线按钮的双击事件
+    var lineButton = document.getElementById('ts_line_button');
+    if (lineButton) {
+        // 移除可能存在的旧事件处理器
+        lineButton.removeEventListener('dblclick', handleLineButtonDblClick);
+        
+        // 添加双击事件处理器
+        lineButton.addEventListener('dblclick', handleLineButtonDblClick);
+    }
+    
+    // 添加点击空白处隐藏选择器的事件处理
+    document.addEventListener('click', function(e) {
+        // 如果选择器存在且可见
+        if (lineStyleSlider && lineStyleSlider.style.display === 'block') {
+            // 检查点击是否在选择器容器外
+            var isOutsideSlider = !lineStyleSlider.contains(e.target);
+            // 检查点击是否不是直线按钮（避免与双击事件冲突）
+            var isNotLineButton = lineButton && !lineButton.contains(e.target);
+            
+            if (isOutsideSlider && isNotLineButton) {
+                // 点击在选择器外部，立即隐藏选择器
+                hideLineStyleSlider();
+            }
+        }
+    });
+}
+
+/**
+ * 处理直线按钮的双击事件
+ * @param {MouseEvent} e - 鼠标事件
+ */
+function handleLineButtonDblClick(e) {
+    e.preventDefault();
+    e.stopPropagation();
+    
+    // 确保直线模式已激活
+    if (!lineMode) {
+        switch_line_mode(); // 如果未激活，则激活直线模式
+    }
+    
+    // 显示样式选择面板
+    showLineStyleSlider();
+}
+
+// 当DOM加载完成后，设置直线样式事件
+document.addEventListener('DOMContentLoaded', function() {
+    setupLineStyleEvents();
+});
+
+// 如果DOM已经加载完成，立即设置
+if (document.readyState === 'complete' || document.readyState === 'interactive') {
+    setupLineStyleEvents();
+}
+
+// 设置直线颜色
+function set_line_color(newColor) {
+    lineColor = newColor;
+    update_line_settings();
+}
+
+// 设置直线线宽
+function set_line_width(newWidth) {
+    lineWidth = newWidth;
+    update_line_settings();
+}
+
+// 设置普通画笔颜色
+function set_pen_color(newColor) {
+    color = newColor;
+    update_pen_settings();
+}
+
+// 设置普通画笔线宽
+function set_pen_width(newWidth) {
+    line_width = newWidth;
+    update_pen_settings();
+}
+
+// 处理Surface Pen笔端擦除按下事件
+function handlePenEraser(e) {
+    // 检查是否是Surface Pen (pointerType为"pen")并且使用笔端擦除按钮(button为5)
+    if (e.pointerType === 'pen' && e.button === 5) {
+        e.preventDefault();
+        e.stopPropagation();
+        
+        // 阻止事件继续传播到其他处理程序
+        if (e.stopImmediatePropagation) {
+            e.stopImmediatePropagation();
+        }
+        
+        isPenEraserActive = true;
+        
+        // 如果正在绘制矩形，取消矩形绘制
+        if (isDrawingRect) {
+            isDrawingRect = false;
+            clear_secondary_canvas();
+        }
+        
+        // 暂时移除矩形工具事件监听器，避免同时绘制矩形
+        if (rectangleMode && typeof pointerDownRectangle === 'function') {
+            canvas.removeEventListener('pointerdown', pointerDownRectangle);
+            canvas.removeEventListener('pointermove', pointerMoveRectangle);
+            window.removeEventListener('pointerup', pointerUpRectangle);
+        }
+        
+        // 如果最后一次绘制是一个孤立的点（可能是擦除开始时意外创建的）
+        // 检查是否已经绘制了点并且是最新添加的
+        if (arrays_of_points.length > 0) {
+            var lastStroke = arrays_of_points[arrays_of_points.length - 1];
+            // 如果最后一笔只有一个点或两个非常接近的点，并且是刚刚添加的（不到50ms前）
+            if (lastStroke.length <= 2 && Date.now() - e.timeStamp < 50) {
+                // 删除这个可能是由擦除操作触发的点
+                forget_line_added(lastStroke);
+                release_line(arrays_of_points.pop());
+                perfect_cache.pop();
+                ts_redraw(); // 重绘以消除这个点
+            }
+        }
+        
+        // 从按下的位置开始新的扫掠路径，立即处理擦除操作
+        end_eraser_sweep();
+        handlePenEraserDrag(e);
+    }
+}
+
+// 处理Surface Pen笔端擦除移动事件
+function handlePenEraserMove(e) {
+    if (isPenEraserActive && e.pointerType === 'pen') {
+        e.preventDefault();
+        e.stopPropagation();
+        
+        // 阻止事件继续传播到其他处理程序
+        if (e.stopImmediatePropagation) {
+            e.stopImmediatePropagation();
+        }
+        
+        handlePenEraserDrag(e);
+    }
+}
+
+// 停止Surface Pen笔端擦除
+function stopPenEraser(e) {
+    if (e.pointerType === 'pen' && e.button === 5) {
+        isPenEraserActive = false;
+        end_eraser_sweep();
+        
+        // 恢复矩形工具事件监听器（如果矩形模式仍然激活）
+        if (rectangleMode && typeof pointerDownRectangle === 'function') {
+            canvas.addEventListener('pointerdown', pointerDownRectangle);
+            canvas.addEventListener('pointermove', pointerMoveRectangle);
+            window.addEventListener('pointerup', pointerUpRectangle);
+        }
+        
+        // 如果之前有擦除操作，确保保存笔迹
+        if (undo_log_dirty()) {
+            // 标记笔迹已变化，触发保存
+            strokesChanged = true;
+            save_strokes_debounced();
+            console.log('AnkiDraw Debug: 笔尖擦除器停止使用，触发保存');
+        }
+    }
+}
+
+// 处理Surface Pen笔端擦除拖动
+function handlePenEraserDrag(e) {
+    if (!isPenEraserActive) return;
+    
+    var rect = get_canvas_rect();
+    // 笔端擦除对直线使用10像素的容差，更容易擦到细直线
+    queue_eraser_sweep(e.clientX - rect.left, e.clientY - rect.top, 10);
+}
+
+// 获取适当的擦除容差，考虑擦除模式类型
+function getEraserTolerance(strokeType) {
+    // 获取橡皮擦大小，如果未定义则使用默认值
+    var eraserSize = typeof eraserIndicatorSize !== 'undefined' ? eraserIndicatorSize : 4;
+    
+    // 计算基础容差 - 橡皮擦越大，容差越大
+    var baseTolerance = Math.max(eraserSize / 2, 1);
+    
+    // 根据笔画类型进行调整
+    if (strokeType === 'line') {
+        return baseTolerance;
+    }
+    else if (strokeType === 'calligraphy') {
+        // 书法笔迹需要更精确的控制
+        return baseTolerance * 0.75;
+    }
+    // 普通笔迹
+    else {
+        return baseTolerance;
+    }
+}
+
+// 检查点是否在笔画附近，考虑擦除模式
+function isPointNearStroke(point, strokePoints, segments) {
+    // 根据笔迹类型获取适当的容差
+    var tolerance = getEraserTolerance((strokePoints.length === 2) ? 'line' : 'normal');
+    if (!point_near_bounds(get_line_bounds(strokePoints), point[0], point[1], tolerance)) return false;
+    
+    // 检查点到每个线段的距离，直接读取笔画存储中的坐标
+    return line_min_distance(strokePoints, point[0], point[1], tolerance, segments) <= tolerance;
+}
+
+// 检查点是否在书法笔画附近，考虑擦除模式
+function isPointNearCalligraphyStrokeWithTolerance(point, stroke) {
+    // 获取书法笔迹的容差
+    var tolerance = getEraserTolerance('calligraphy');
+    
+    // 先用包围盒排除，再检查每个控制点对
+    if (!point_near_bounds(get_calligraphy_bounds(stroke), point[0], point[1], tolerance)) return false;
+    return calligraphy_min_distance(stroke, point[0], point[1], tolerance) <= tolerance;
+}
+
+// 设置矩形颜色
+function set_rectangle_color(newColor) {
+    rectangleColor = newColor;
+}
+
+// 设置矩形线宽
+function set_rectangle_width(newWidth) {
+    rectangleWidth = newWidth;
+}
+
+// 专门更新矩形工具的设置
+function update_rectangle_settings(){
+    secondary_ctx.lineJoin = 'round';
+    secondary_ctx.lineCap = 'round';
+    secondary_ctx.lineWidth = rectangleWidth; // 使用矩形专用的线宽
+    secondary_ctx.strokeStyle = rectangleColor; // 使用矩形专用的颜色
+    secondary_ctx.fillStyle = rectangleColor;
+    secondary_ctx.setLineDash([]); // 矩形总是使用实线
+}
+
+// 切换矩形模式
+function switch_rectangle_mode() {
+    stop_drawing();
+    rectangleMode = !rectangleMode;
+    
+    var rectangleButton = document.getElementById('ts_rectangle_button');
+    
+    if (rectangleMode) {
+        rectangleButton.className = 'active';
+        
+        // 确保矩形工具的属性在第一次使用时有合理的默认值
+        if (rectangleColor === '#fff' && color !== '#fff') {
+            rectangleColor = color; // 如果矩形颜色未设置，则继承当前画笔颜色
+        }
+        if (rectangleWidth === 2 && line_width !== 2) {
+            rectangleWidth = line_width; // 如果矩形线宽未设置，则继承当前画笔线宽
+        }
+        
+        // 禁用其他模式
+        ts_perfect_freehand_button.className = '';
+        perfectFreehand = false;
+        ts_kanji_button.className = '';
+        calligraphy = false;
+        
+        // 停用直线模式
+        lineMode = false;
+        document.getElementById('ts_line_button').className = '';
+        
+        if (eraserMode) {
+            toggleEraser(false);
+        }
+        
+        // 如果笔端擦除模式活跃，禁用它
+        isPenEraserActive = false;
+        
+        // 为矩形模式设置正确的事件监听器
+        if (typeof pointerDownRectangle === 'function') {
+            // 确保事件监听器只添加一次
+            canvas.removeEventListener('pointerdown', pointerDownRectangle);
+            canvas.removeEventListener('pointermove', pointerMoveRectangle);
+            window.removeEventListener('pointerup', pointerUpRectangle);
+            
+            canvas.addEventListener('pointerdown', pointerDownRectangle);
+            canvas.addEventListener('pointermove', pointerMoveRectangle);
+            window.addEventListener('pointerup', pointerUpRectangle);
+        }
+    } else {
+        rectangleButton.className = '';
+        
+        // 移除矩形工具的事件监听器
+        if (typeof pointerDownRectangle === 'function') {
+            canvas.removeEventListener('pointerdown', pointerDownRectangle);
+            canvas.removeEventListener('pointermove', pointerMoveRectangle);
+            window.removeEventListener('pointerup', pointerUpRectangle);
+        }
+    }
+}
+
+// 在pointerUpLine函数定义后添加以下函数
+
+function pointerDownRectangle(e) {
+    if (!rectangleMode || !visible) return;
+    
+    // 检查是否是橡皮擦模式或侧键擦除模式，或者笔端擦除模式，如果是则不绘制矩形
+    if (eraserMode || isSidePenButtonEraser || isPenEraserActive || 
+        (e.pointerType === 'pen' && (e.button === 1 || e.button === 2 || e.button === 5))) {
+        return;
+    }
+    
+    e.preventDefault();
+    isDrawingRect = true;
+    
+    // 记录起始点
+    rectStartX = e.offsetX;
+    rectStartY = e.offsetY;
+    
+    // 清除可能的临时绘制
+    clear_secondary_canvas();
+}
+
+function pointerMoveRectangle(e) {
+    if (!isDrawingRect || !rectangleMode || !visible) return;
+    
+    // 检查是否是橡皮擦模式或侧键擦除模式，如果是则不绘制矩形
+    if (eraserMode || isSidePenButtonEraser) {
+        return;
+    }
+    
+    e.preventDefault();
+    
+    // 清除临时绘制
+    clear_secondary_canvas();
+    
+    // 绘制矩形预览
+    secondary_ctx.beginPath();
+    secondary_ctx.strokeStyle = rectangleColor;
+    secondary_ctx.lineWidth = rectangleWidth;
+    secondary_ctx.rect(
+        rectStartX,
+        rectStartY,
+        e.offsetX - rectStartX,
+        e.offsetY - rectStartY
+    );
+    secondary_ctx.stroke();
+}
+
+function pointerUpRectangle(e) {
+    if (!isDrawingRect || !rectangleMode) return;
+    
+    // 检查是否是橡皮擦模式或侧键擦除模式，如果是则不绘制矩形
+    if (eraserMode || isSidePenButtonEraser) {
+        isDrawingRect = false;
+        return;
+    }
+    
+    e.preventDefault();
+    isDrawingRect = false;
+    
+    // 清除临时绘制
+    clear_secondary_canvas();
+    
+    // 添加矩形到主画布
+    var startPoint = [rectStartX, rectStartY, rectangleColor, rectangleWidth, {style: 'rectangle', dashPattern: []}];
+    var endPoint = [e.offsetX, e.offsetY];
+    
+    // 添加到点集合中
+    arrays_of_points.push(store_line([startPoint, endPoint]));
+    
+    // 创建Perfect Freehand的缓存项
+    perfect_cache.push(null);
+    
+    // 添加到撤销日志中
+    record_line_added(arrays_of_points[arrays_of_points.length - 1], 'R'); // 使用R表示矩形类型
+    
+    // 新的矩形会在下一帧追加到已提交图层
+    request_redraw_frame();
+    
+    // 激活撤销按钮
+    ts_undo_button.className = "active";
+    
+    // 设置操作类型为添加
+    strokeOperation = 'A';
+    
+    // 标记笔迹已变化，触发保存
+    strokesChanged = true;
+    save_strokes_debounced();
+    
+    // 添加调试日志
+    console.log('AnkiDraw Debug: 矩形绘制完成，触发保存');
+}
+
+// 添加矩形工具设置更新函数
+function update_rectangle_settings() {
+    // 设置矩形绘制的样式
+    secondary_ctx.strokeStyle = rectangleColor;
+    secondary_ctx.lineWidth = rectangleWidth;
+    secondary_ctx.setLineDash([]); // 矩形使用实线
+}
+
+// 初始化事件监听器时添加矩形处理函数
+// 在原有初始化代码后添加以下内容:
+canvas.addEventListener("pointerdown", pointerDownRectangle);
+canvas.addEventListener("pointermove", pointerMoveRectangle);
+window.addEventListener("pointerup", pointerUpRectangle);
+
+// 添加函数，用于在页面加载时初始化矩形工具设置
+function initializeRectangleSettings(color, width) {
+    // 保存矩形工具的颜色和宽度到全局变量
+    rectangleColor = color;
+    rectangleWidth = width;
+    
+    // 更新矩形工具设置
+    update_rectangle_settings();
+}
+
+// 添加函数，用于应用保存的矩形工具设置
+function applyRectangleSettings() {
+    // 更新矩形工具设置
+    update_rectangle_settings();
+}
+
+// 添加侧键橡皮擦功能处理
+function setupSidePenButtonEraser() {
+    // 监听全局按下事件，检测Surface Pen侧键按下
+    document.addEventListener('pointerdown', handleSidePenButtonDown);
+}
+
+// 处理Surface Pen侧键按下事件
+function handleSidePenButtonDown(e) {
+    // 检查是否是Surface Pen并且使用侧键(button为1或2)
+    if (e.pointerType === 'pen' && (e.button === 1 || e.button === 2)) {
+        e.preventDefault();
+        e.stopPropagation();
+        
+        if (!isSidePenButtonEraser) {
+            // 如果当前没有激活侧键橡皮擦，保存当前工具状态并激活橡皮擦
+            saveCurrentToolState();
+            activateSidePenButtonEraser();
+            
+            // 添加body类
+            document.body.classList.add('side-button-active');
+            
+            // 如果是在绘制矩形中，取消矩形绘制
+            if (isDrawingRect) {
+                isDrawingRect = false;
+                clear_secondary_canvas();
+            }
+        } else {
+            // 如果已经激活了侧键橡皮擦，恢复之前的工具状态
+            deactivateSidePenButtonEraser();
+            
+            // 移除body类
+            document.body.classList.remove('side-button-active');
+        }
+    }
+}
+
+// 保存当前工具状态
+function saveCurrentToolState() {
+    previousToolState = {
+        perfectFreehand: perfectFreehand,
+        calligraphy: calligraphy,
+        lineMode: lineMode,
+        rectangleMode: rectangleMode,
+        eraserMode: typeof eraserMode !== 'undefined' ? eraserMode : false
+    };
+}
+
+// 激活侧键橡皮擦模式
+function activateSidePenButtonEraser() {
+    isSidePenButtonEraser = true;
+    
+    // 如果当前不是橡皮擦模式，切换到橡皮擦模式
+    if (typeof toggleEraser === 'function' && !eraserMode) {
+        toggleEraser(true, true); // 第二个参数表示这是侧键模式
+    }
+    
+    // 更新UI状态
+    if (typeof eraserMode !== 'undefined' && eraserMode) {
+        var eraserButton = document.getElementById('ts_eraser_button');
+        if (eraserButton) {
+            eraserButton.classList.add('active');
+            eraserButton.classList.add('side-button-active');
+        }
+    }
+}
+
+// 取消激活侧键橡皮擦模式
+function deactivateSidePenButtonEraser() {
+    isSidePenButtonEraser = false;
+    
+    // 移除body类
+    document.body.classList.remove('side-button-active');
+    
+    // 如果当前是橡皮擦模式且是侧键激活的，关闭橡皮擦并恢复之前的工具
+    if (typeof eraserMode !== 'undefined' && eraserMode) {
+        toggleEraser(false, true); // 关闭橡皮擦
+        
+        // 移除侧键激活标记
+        var eraserButton = document.getElementById('ts_eraser_button');
+        if (eraserButton) {
+            eraserButton.classList.remove('side-button-active');
+        }
+        
+        // 清除提示信息
+        var hint = document.getElementById('side-button-mode-hint');
+        if (hint) {
+            hint.parentNode.removeChild(hint);
+        }
+        
+        // 恢复之前的工具状态
+        restorePreviousToolState();
+    }
+}
+
+// 恢复之前的工具状态
+function restorePreviousToolState() {
+    // 恢复之前的完美手绘状态
+    if (previousToolState.perfectFreehand && !perfectFreehand) {
+        switch_perfect_freehand();
+    } else if (!previousToolState.perfectFreehand && perfectFreehand) {
+        switch_perfect_freehand();
+    }
+    
+    // 恢复之前的书法模式状态
+    if (previousToolState.calligraphy && !calligraphy) {
+        switch_kanji_mode();
+    } else if (!previousToolState.calligraphy && calligraphy) {
+        switch_kanji_mode();
+    }
+    
+    // 恢复之前的直线模式状态
+    if (previousToolState.lineMode && !lineMode) {
+        switch_line_mode();
+    } else if (!previousToolState.lineMode && lineMode) {
+        switch_line_mode();
+    }
+    
+    // 恢复之前的矩形模式状态
+    if (previousToolState.rectangleMode && !rectangleMode) {
+        switch_rectangle_mode();
+    } else if (!previousToolState.rectangleMode && rectangleMode) {
+        switch_rectangle_mode();
+    }
+}
+
+function blackboard_init() {
+    // 初始化各种工具和事件监听器
+    
+    // 设置各工具的初始状态
+    update_pen_settings();
+    if (typeof update_line_settings === 'function') {
+        update_line_settings();
+    }
+    if (typeof update_rectangle_settings === 'function') {
+        update_rectangle_settings();
+    }
+    
+    // 设置直线样式选择器
+    if (typeof setupLineStyleEvents === 'function') {
+        setupLineStyleEvents();
+    }
+    
+    // 初始化Surface Pen侧键橡皮擦功能
+    setupSidePenButtonEraser();
+    
+    // 设置Surface Pen笔端擦除事件监听器
+    canvas.addEventListener('pointerdown', handlePenEraser);
+    canvas.addEventListener('pointermove', handlePenEraserMove);
+    window.addEventListener('pointerup', stopPenEraser);
+    
+    // 如果有eraser模块，设置橡皮擦事件监听器
+    if (typeof setupEraserEvents === 'function') {
+        setupEraserEvents();
+    }
+    
+    console.log("AnkiDraw: Blackboard initialized with Surface Pen eraser support");
+}
+
+// 调用blackboard初始化函数
+document.addEventListener('DOMContentLoaded', function() {
+    // 确保DOM完全加载后再初始化
+    setTimeout(function() {
+        blackboard_init();
+    }, 500);
+});
+
+// 添加笔迹保存和加载的相关函数
+
+/**
+ * 将当前笔迹数据转换为JSON字符串，用于保存
+ */
+function serialize_strokes() {
+    try {
+        console.log('AnkiDraw Debug: 开始序列化笔迹数据，操作类型:', strokeOperation);
+        // 创建一个包含所有笔迹数据的对象
+        var strokeData = {
+            // 从笔画存储生成保存格式的点数组
+            arrays_of_points: lines_to_json(arrays_of_points),
+            // 更早的笔画已合并到底图(底图单独保存)
+            baked: hasBakedLayer,
+            // 仍可撤销的笔画类型，载入后据此重建撤销日志
+            line_type_history: undo_log_kinds(),
+            perfect_cache: perfect_cache,
+            strokes: typeof strokes !== 'undefined' ? strokes : [],  // 添加书法笔画数据
+            lastModified: new Date().getTime()
+        };
+        
+        // 只有在添加笔迹操作时才更新窗口大小
+        if (strokeOperation === 'A') {
+            // 记录当前窗口大小
+            var currentWindowWidth = window.innerWidth;
+            var currentWindowHeight = window.innerHeight;
+            
+            // 获取设备像素比
+            var dpr = window.devicePixelRatio || 1;
+            console.log('AnkiDraw Debug: 当前设备像素比(DPR):', dpr);
+            
+            // 考虑设备像素比调整窗口高度 - 对高度额外增加10%以补偿Windows缩放问题
+            var adjustedHeight = Math.ceil(currentWindowHeight * 1.1);
+            
+            // 更新窗口大小信息
+            strokeData.window_size = {
+                width: currentWindowWidth,
+                height: adjustedHeight,
+                dpr: dpr,
+                originalHeight: currentWindowHeight // 保存原始高度用于调试
+            };
+            
+            // 更新最后保存的窗口大小
+            lastWindowSize.width = currentWindowWidth;
+            lastWindowSize.height = adjustedHeight;
+            
+            console.log('AnkiDraw Debug: 笔迹数据对象创建成功', 
+                        'points数组长度:', arrays_of_points.length,
+                        '撤销日志长度:', undoLog.length,
+                        '原始窗口大小: 宽=' + currentWindowWidth + ', 高=' + currentWindowHeight,
+                        '调整后窗口大小: 宽=' + currentWindowWidth + ', 高=' + adjustedHeight);
+        }
+        // 对于撤销和擦除操作，使用最后保存的窗口大小
+        else if (lastWindowSize.width > 0 && lastWindowSize.height > 0) {
+            strokeData.window_size = {
+                width: lastWindowSize.width,
+                height: lastWindowSize.height,
+                dpr: window.devicePixelRatio || 1,
+                originalHeight: lastWindowSize.height // 对于撤销和擦除操作，originalHeight就是调整后的高度
+            };
+            
+            console.log('AnkiDraw Debug: 使用最后保存的窗口大小', 
+                        'width:', lastWindowSize.width, 
+                        'height:', lastWindowSize.height);
+        }
+        
+        console.log('AnkiDraw Debug: 笔迹数据对象创建成功', 
+                    'points数组长度:', arrays_of_points.length,
+                    '撤销日志长度:', undoLog.length,
+                    '操作类型:', strokeOperation);
+        
+        // 将对象转换为JSON字符串
+        var jsonStr = JSON.stringify(strokeData);
+        console.log('AnkiDraw Debug: 序列化完成，JSON长度:', jsonStr.length);
+        return jsonStr;
+    } catch (e) {
+        console.error('AnkiDraw Error: 序列化笔迹数据时出错', e);
+        return JSON.stringify({
+            arrays_of_points: [],
+            line_type_history: [],
+            perfect_cache: [],
+            strokes: [],
+            lastModified: new Date().getTime()
+        });
+    }
+}
+
+/**
+ * 保存当前笔迹数据到服务器
+ * 上次保存以来的变化都来自操作日志时只发送补丁，否则发送完整数据
+ * @param {boolean} [full] - 是否强制发送完整数据
+ */
+function save_strokes(full) {
+    // 防止重复操作
+    if (isProcessingStrokeData) {
+        console.log('AnkiDraw Debug: 笔迹数据正在处理中，跳过保存');
+        return;
+    }
+    
+    try {
+        console.log('AnkiDraw Debug: 开始保存笔迹数据，是否仅正面笔迹:', isQuestionSide);
+        isProcessingStrokeData = true;
+        
+        // 确保有卡片ID
+        if (!currentCardId) {
+            console.error('AnkiDraw Error: 保存笔迹失败，没有卡片ID');
+            isProcessingStrokeData = false;
+            return;
+        }
+        
+        console.log('AnkiDraw Debug: 准备保存卡片ID:', currentCardId);
+        var patch = full ? null : build_save_patch();
+        if (patch && typeof pycmd === 'function') {
+            patch.line_type_history = undo_log_kinds();
+            patch.baked = hasBakedLayer;
+            patch.lastModified = new Date().getTime();
+            // 与完整保存一样，只有添加笔迹时才更新窗口大小
+            if (strokeOperation === 'A') {
+                patch.window_size = { width: window.innerWidth, height: window.innerHeight };
+            }
+            pycmd('ankidraw:patch_strokes:' + currentCardId + ':' + (isQuestionSide ? 'front' : 'all') + ':' + JSON.stringify(patch));
+            console.log('AnkiDraw Debug: 笔迹补丁已发送，卡片ID:', currentCardId, '变化数:', patch.changes.length);
+            mark_undo_log_saved();
+            schedule_ink_snapshot();
+            strokesChanged = false;
+            return;
+        }
+        // 序列化笔迹数据
+        var strokeData = serialize_strokes();
+        
+        // 通过pycmd发送到Python端保存
+        if (typeof pycmd === 'function') {
+            console.log('AnkiDraw Debug: 发送笔迹数据到Python端，数据长度:', strokeData.length);
+            
+            // 获取窗口大小信息 - 只有在添加笔迹操作时才发送
+            if (strokeOperation === 'A') {
+                var windowWidth = window.innerWidth;
+                var windowHeight = window.innerHeight;
+                pycmd('ankidraw:save_strokes:' + currentCardId + ':' + strokeData + ':' + windowWidth + ':' + windowHeight);
+                console.log('AnkiDraw Debug: 笔迹数据已发送，卡片ID:', currentCardId, '窗口大小:', windowWidth, 'x', windowHeight);
+            } else {
+                // 撤销或擦除操作，不发送窗口大小
+                pycmd('ankidraw:save_strokes_no_window:' + currentCardId + ':' + strokeData);
+                console.log('AnkiDraw Debug: 笔迹数据已发送，卡片ID:', currentCardId, '(不更新窗口大小)');
+            }
+            // 记录已保存的日志位置，撤销后再重做回到这里时不需要再次保存
+            mark_undo_log_saved();
+            // 空闲时更新打开卡片时显示的快照
+            schedule_ink_snapshot();
+        } else {
+            console.error('AnkiDraw Error: pycmd函数不可用，无法保存笔迹');
+        }
+        
+        // 重置变化标记
+        strokesChanged = false;
+    } catch (e) {
+        console.error('AnkiDraw Error: 保存笔迹时出错', e);
+    } finally {
+        isProcessingStrokeData = false;
+    }
+}
+
+/**
+ * Python端无法应用补丁(文件与页面不一致)时调用，改为保存完整数据
+ * @param {string} cardId - 补丁所属的卡片
+ * @param {boolean} front - 补丁是否属于正面
+ */
+function request_full_stroke_save(cardId, front) {
+    if (String(cardId) !== String(currentCardId) || front !== isQuestionSide) return;
+    save_strokes(true);
+}
+
+/**
+ * 防抖函数，延迟保存笔迹数据，避免频繁保存
+ */
+function save_strokes_debounced() {
+    // 如果没有卡片ID，不执行保存
+    if (!currentCardId) return;
+    
+    // 清除之前的计时器
+    if (saveDebounceTimer) {
+        clearTimeout(saveDebounceTimer);
+    }
+    
+    // 设置新的计时器，延迟1秒后保存
+    saveDebounceTimer = setTimeout(function() {
+        // 只有在笔迹与上次保存时不同时才保存
+        if (strokesChanged && undo_log_dirty()) {
+            save_strokes();
+        }
+    }, 1000);
+}
+
+/**
+ * Python端开始加载新一面的笔迹时调用：记下卡片和请求编号，编号不同的加载结果会被丢弃
+ * @param {string} cardId - 卡片ID
+ * @param {boolean} front - 是否为正面
+ * @param {number} generation - 请求编号
+ */
+function begin_stroke_load(cardId, front, generation) {
+    strokeLoadGeneration = generation;
+    currentCardId = String(cardId);
+    isQuestionSide = front;
+}
+
+/**
+ * 从保存的数据中加载笔迹
+ * @param {string} strokesJson - 包含笔迹数据的JSON字符串
+ * @param {boolean} isQuestionOnly - 是否仅加载问题侧的笔迹
+ */
+function load_saved_strokes(strokesJson, isQuestionOnly, generation) {
+    // 已经切换到其他卡片或另一面时，旧请求的数据不再解析
+    if (generation !== undefined && generation !== strokeLoadGeneration) {
+        console.log('AnkiDraw Debug: 笔迹加载请求已过期，跳过', generation, '当前:', strokeLoadGeneration);
+        return;
+    }
+    // 防止重复操作
+    if (isProcessingStrokeData) {
+        console.log('AnkiDraw Debug: 笔迹数据正在处理中，跳过加载');
+        return;
+    }
+    
+    try {
+        console.log('AnkiDraw Debug: 开始加载笔迹数据，数据长度:', strokesJson.length, '是否仅正面笔迹:', isQuestionOnly);
+        isProcessingStrokeData = true;
+        
+        // 更新全局变量
+        isQuestionSide = isQuestionOnly !== false;
+        
+        // 解析JSON数据
+        console.log('AnkiDraw Debug: 解析JSON数据');
+        let strokeData;
+        try {
+            strokeData = JSON.parse(strokesJson);
+            console.log('AnkiDraw Debug: 直接解析JSON成功');
+        } catch (parseError) {
+            // 第一次解析失败，尝试处理转义字符
+            console.log('AnkiDraw Debug: 直接解析失败，尝试处理转义字符', parseError);
+            try {
+                // 两层解析：首先把字符串恢复成正确的JSON字符串，然后再解析
+                let jsonString = JSON.parse('"' + strokesJson + '"');
+                strokeData = JSON.parse(jsonString);
+                console.log('AnkiDraw Debug: 两步解析JSON成功');
+            } catch (deepError) {
+                // 两层解析也失败，尝试直接使用传入的数据
+                console.error('AnkiDraw Error: 两步解析也失败', deepError);
+                throw deepError;
+            }
+        }
+        
+        // 非问题侧且当前存在已加载的笔迹，并且正在显示答案，需要考虑合并正面笔迹
+        // 任一侧有底图时笔画数不能反映内容，不合并
+        if (!isQuestionOnly && arrays_of_points.length > 0 && !isQuestionSide && !hasBakedLayer && !strokeData.baked) {
+            console.log('AnkiDraw Debug: 显示答案时，尝试保留当前笔迹(可能包含正面笔迹)');
+            
+            // 如果新加载的数据(背面笔迹)和当前已有的数据(正面笔迹)是不同的，进行合并
+            // 比较第一个笔画是否不同来判断是否需要合并
+            let needMerge = false;
+            if (strokeData.arrays_of_points.length === 0 && arrays_of_points.length > 0) {
+                needMerge = true; // 新数据为空，但当前有数据，需要合并
+            } else if (strokeData.arrays_of_points.length > 0 && arrays_of_points.length > 0) {
+                // 比较第一个点的坐标是否相同
+                if (JSON.stringify(lines_to_json([strokeData.arrays_of_points[0]])) !== JSON.stringify(lines_to_json([arrays_of_points[0]]))) {
+                    needMerge = true;
+                }
+            }
+            
+            if (needMerge) {
+                console.log('AnkiDraw Debug: 当前显示答案，保留正面笔迹并合并新加载的背面笔迹');
+                
+                // 保存当前正面笔迹数据
+                // 复制为点数组，载入时会清空笔画存储
+                let currentArraysOfPoints = lines_to_json(arrays_of_points);
+                let currentLineTypeHistory = undo_log_kinds();
+                let currentPerfectCache = perfect_cache || [];
+                let currentStrokes = strokes || [];
+                
+                // 清除当前画布，准备合并
+                console.log('AnkiDraw Debug: 清除当前画布，准备合并笔迹');
+                ctx.clearRect(0, 0, ctx.canvas.width, ctx.canvas.height);
+                
+                // 合并正面笔迹与新加载的背面笔迹
+                strokeData.arrays_of_points = currentArraysOfPoints.concat(strokeData.arrays_of_points);
+                strokeData.line_type_history = currentLineTypeHistory.concat(strokeData.line_type_history || []);
+                
+                // 处理书法笔画数据
+                if (strokeData.strokes && currentStrokes.length > 0) {
+                    strokeData.strokes = currentStrokes.concat(strokeData.strokes);
+                } else if (currentStrokes.length > 0) {
+                    strokeData.strokes = currentStrokes;
+                }
+                
+                // 处理完美手写缓存
+                if (strokeData.perfect_cache && currentPerfectCache.length > 0) {
+                    strokeData.perfect_cache = currentPerfectCache.concat(strokeData.perfect_cache);
+                } else if (currentPerfectCache.length > 0) {
+                    strokeData.perfect_cache = currentPerfectCache;
+                }
+                
+                console.log('AnkiDraw Debug: 完成笔迹合并，合并后points数组长度:', strokeData.arrays_of_points.length);
+                
+                // 重置变化标记，触发保存
+                strokesChanged = true;
+                save_strokes_debounced();
+            }
+        }
+        
+        // 清除当前画布
+        console.log('AnkiDraw Debug: 清除当前画布');
+        ctx.clearRect(0, 0, ctx.canvas.width, ctx.canvas.height);
+        
+        // 加载笔迹数据
+        console.log('AnkiDraw Debug: 加载笔迹数据到内存');
+        reset_stroke_store();
+        reset_line_index();
+        arrays_of_points = store_lines(strokeData.arrays_of_points || []);
+        perfect_cache = strokeData.perfect_cache || [];
+        
+        // 如果数据中有strokes数组（用于书法功能），也加载它
+        if (strokeData.strokes) {
+            console.log('AnkiDraw Debug: 加载书法笔画数据');
+            strokes = strokeData.strokes;
+        } else {
+            strokes = [];
+        }
+        
+        // 撤销日志中的笔画属于之前的数据，按保存的笔画类型重建
+        seed_undo_log(strokeData.line_type_history);
+        ts_undo_button.className = undoLog.length ? "active" : "";
+        
+        console.log('AnkiDraw Debug: 加载完成，points数组长度:', arrays_of_points.length,
+                   '撤销日志长度:', undoLog.length);
+        
+        // 确保重绘前调整画布大小
+        console.log('AnkiDraw Debug: 调整画布大小');
+        resize();
+        
+        // 重绘所有笔迹
+        console.log('AnkiDraw Debug: 重绘所有笔迹');
+        ts_redraw();
+        // 矢量笔迹画完后移除打开卡片时显示的快照
+        swap_in_live_ink();
+        
+        console.log('AnkiDraw Debug: 成功加载笔迹数据，卡片ID:', currentCardId, '是否仅正面笔迹:', isQuestionSide);
+        
+        // 从加载的数据中提取窗口大小并保存到lastWindowSize
+        if (strokeData.window_size) {
+            lastWindowSize.width = strokeData.window_size.width;
+            lastWindowSize.height = strokeData.window_size.height;
+            console.log('AnkiDraw Debug: 加载笔迹时更新最后保存的窗口大小:', 
+                       'width:', lastWindowSize.width, 
+                       'height:', lastWindowSize.height);
+        }
+        
+        // 加载后重置变化标记和操作类型，防止立即触发保存
+        strokesChanged = false;
+        strokeOperation = '';
+        
+        // 显示底图或检查是否需要合并旧笔画；合并后要立即保存，等加载流程结束后再进行
+        setTimeout(function() { begin_bake_session(!!strokeData.baked); }, 0);
+    } catch (e) {
+        console.error('AnkiDraw Error: 加载笔迹数据时出错', e, '原始数据:', strokesJson.substring(0, 100) + '...');
+        // 出错时清空画布，避免显示错误的笔迹
+        clear_canvas();
+    } finally {
+        isProcessingStrokeData = false;
+    }
+}
+
+// 获取当前卡片ID并加载笔迹数据的功能
+document.addEventListener('DOMContentLoaded', function() {
+    setTimeout(function() {
+        console.log('AnkiDraw Debug: DOM加载完成，开始获取卡片ID');
+        
+        if (typeof pycmd !== 'function') {
+            console.error('AnkiDraw Error: pycmd函数不可用，无法获取卡片ID');
+            return;
+        }
+        
+        // 获取卡片ID
+        var cardId = '';
+        
+        try {
+            // 尝试从全局变量中获取卡片ID (桌面版Anki)
+            if (typeof globalThis !== 'undefined' && typeof globalThis.ankiPlatform !== 'undefined') {
+                console.log('AnkiDraw Debug: 正在使用Anki桌面版方法获取卡片ID');
+            }
+            
+            // 尝试最常见的方法
+            if (typeof globalThis !== 'undefined' && typeof globalThis.cardid !== 'undefined') {
+                cardId = globalThis.cardid;
+                console.log('AnkiDraw Debug: 从globalThis.cardid获取到卡片ID:', cardId);
+            } 
+            // 尝试AnkiDroid方法
+            else if (typeof AnkiDroidJS !== 'undefined' && typeof AnkiDroidJS.ankiGetCardId === 'function') {
+                cardId = AnkiDroidJS.ankiGetCardId();
+                console.log('AnkiDraw Debug: 从AnkiDroidJS获取到卡片ID:', cardId);
+            }
+            // 后备方法: 从页面元素获取
+            else {
+                console.log('AnkiDraw Debug: 尝试从页面元素中查找卡片ID');
+                // 有些版本的Anki在特定元素中存储了cardid
+                var metaElements = document.querySelectorAll('meta[name="cardid"]');
+                if (metaElements.length > 0) {
+                    cardId = metaElements[0].getAttribute('content');
+                    console.log('AnkiDraw Debug: 从meta标签获取到卡片ID:', cardId);
+                }
+            }
+        } catch (e) {
+            console.error('AnkiDraw Error: 获取卡片ID失败', e);
+        }
+        
+        if (cardId) {
+            window.currentCardId = cardId;
+            console.log('AnkiDraw Debug: 成功设置当前卡片ID:', cardId);
+            
+            // 请求加载此卡片的笔迹数据 - 根据当前是问题还是答案加载不同笔迹
+            try {
+                // 检测当前是否显示答案
+                var isShowingAnswer = false;
+                if (document.getElementById('answer')) {
+                    var answerElement = document.getElementById('answer');
+                    isShowingAnswer = answerElement && window.getComputedStyle(answerElement).display !== 'none';
+                }
+                
+                if (isShowingAnswer) {
+                    console.log('AnkiDraw Debug: 检测到答案区域，加载全部笔迹');
+                    pycmd('ankidraw:load_all_strokes:' + cardId);
+                } else {
+                    console.log('AnkiDraw Debug: 未检测到答案区域，加载正面笔迹');
+                    pycmd('ankidraw:load_front_strokes:' + cardId);
+                }
+            } catch (e) {
+                console.error('AnkiDraw Error: 检测卡片区域失败，默认加载正面笔迹', e);
+                // 出错时默认加载正面笔迹
+                pycmd('ankidraw:load_front_strokes:' + cardId);
+            }
+        } else {
+            // 如果无法获取卡片ID，尝试从Python获取
+            console.log('AnkiDraw Debug: 通过Python获取卡片ID');
+            pycmd('ankidraw:get_card_id');
+        }
+    }, 500); // 延迟执行，确保DOM已完全加载
+});
+
+/**
+ * 恢复到书写时的窗口大小
+ */
+function restore_window_size() {
+    try {
+        console.log('AnkiDraw Debug: 尝试恢复窗口大小');
+        
+        // 确保有卡片ID
+        if (!currentCardId) {
+            console.error('AnkiDraw Error: 恢复窗口大小失败，没有卡片ID');
+            return;
+        }
+        
+        // 获取当前DPI和操作系统信息
+        var dpr = window.devicePixelRatio || 1;
+        var isWindows = navigator.userAgent.indexOf('Windows') !== -1;
+        
+        console.log('AnkiDraw Debug: 当前环境信息 - DPR:', dpr, '是否Windows:', isWindows);
+        
+        // 附加当前DPI和操作系统信息
+        var systemInfo = `:${dpr}:${isWindows ? 'win' : 'other'}`;
+        
+        // 通过pycmd发送命令到Python端，指定当前视图状态
+        if (typeof pycmd === 'function') {
+            console.log('AnkiDraw Debug: 发送恢复窗口大小命令，卡片ID:', currentCardId, '是否正面:', isQuestionSide);
+            
+            if (isQuestionSide) {
+                // 正面笔迹的窗口大小
+                pycmd('ankidraw:restore_front_window_size:' + currentCardId + systemInfo);
+            } else {
+                // 背面笔迹的窗口大小
+                pycmd('ankidraw:restore_all_window_size:' + currentCardId + systemInfo);
+            }
+        } else {
+            console.error('AnkiDraw Error: pycmd函数不可用，无法恢复窗口大小');
+        }
+    } catch (e) {
+        console.error('AnkiDraw Error: 恢复窗口大小时出错', e);
+    }
+}
@@ -0,0 +1,304 @@
+/**
+ * AnkiDraw 分块画布
+ * 长卡片(讲义、大图)上整页画布的位图会非常大，容易超过浏览器的画布尺寸限制，
+ * 每次clearRect也很慢。分块模式下已提交的笔迹被拆分到固定大小的分块中，
+ * 分块只在有笔迹的位置按需创建；正在书写的笔画画在与视口等大的secondary_canvas上。
+ */
+
+// 是否启用分块画布(由Python端设置)
+var tiledCanvas = /*TILED_CANVAS_PLACEHOLDER*/;
+// 分块边长(CSS像素)
+var TILE_SIZE = 512;
+// 已创建的分块，键为"列,行"
+var canvasTiles = new Map();
+// 分块所在的容器，位于主画布之上且不接收指针事件
+var tileLayer = null;
+// 分块当前使用的设备像素比，0表示分块模式尚未启用
+var tileDpr = 0;
+// secondary_canvas在分块模式下覆盖的区域(画布坐标)
+var secondaryViewport = { left: 0, top: 0, width: 0, height: 0 };
+var tileStats = {
+    allocated: 0, // 累计创建的分块数
+    released: 0   // 累计释放的分块数
+};
+
+/**
+ * 当前是否使用分块画布
+ * 只有整页画布(非小画布、非跟随滚动)才需要分块
+ */
+function use_tiled_canvas() {
+    return tiledCanvas && !small_canvas && !fullscreen_follow;
+}
+
+function tile_key(col, row) {
+    return col + ',' + row;
+}
+
+/**
+ * 创建分块容器
+ */
+function ensure_tile_layer() {
+    if (tileLayer) return tileLayer;
+    tileLayer = document.createElement('div');
+    tileLayer.id = 'ankidraw_tile_layer';
+    tileLayer.style.display = canvas.style.display;
+    // 放在主画布之后，使分块显示在主画布的背景色之上
+    wrapper.insertBefore(tileLayer, canvas.nextSibling);
+    return tileLayer;
+}
+
+/**
+ * 获取指定位置的分块
+ * @param {number} col - 列
+ * @param {number} row - 行
+ * @param {boolean} create - 不存在时是否创建
+ * @returns {Object|null} {canvas, ctx, col, row}
+ */
+function get_tile(col, row, create) {
+    var key = tile_key(col, row);
+    var tile = canvasTiles.get(key);
+    if (tile || !create) return tile || null;
+
+    var tileCanvas = document.createElement('canvas');
+    tileCanvas.className = 'ankidraw_tile';
+    tileCanvas.width = Math.ceil(TILE_SIZE * tileDpr);
+    tileCanvas.height = Math.ceil(TILE_SIZE * tileDpr);
+    tileCanvas.style.left = (col * TILE_SIZE) + 'px';
+    tileCanvas.style.top = (row * TILE_SIZE) + 'px';
+    tileCanvas.style.width = TILE_SIZE + 'px';
+    tileCanvas.style.height = TILE_SIZE + 'px';
+
+    var tileCtx = tileCanvas.getContext('2d');
+    // 分块使用画布坐标绘制，偏移到分块自身的原点
+    tileCtx.setTransform(tileDpr, 0, 0, tileDpr, -col * TILE_SIZE * tileDpr, -row * TILE_SIZE * tileDpr);
+    tileCtx.lineJoin = tileCtx.lineCap = 'round';
+    tileCtx.fillStyle = color;
+
+    ensure_tile_layer().appendChild(tileCanvas);
+    tile = { canvas: tileCanvas, ctx: tileCtx, col: col, row: row };
+    canvasTiles.set(key, tile);
+    tileStats.allocated++;
+    return tile;
+}
+
+/**
+ * 获取与区域相交的分块
+ * @param {Object} bounds - {left, top, right, bottom}
+ * @param {boolean} create - 是否创建不存在的分块
+ * @returns {Array} 分块列表
+ */
+function tiles_for_bounds(bounds, create) {
+    var result = [];
+    if (!bounds || !isFinite(bounds.left)) return result;
+    var firstCol = Math.max(0, Math.floor(bounds.left / TILE_SIZE));
+    var lastCol = Math.floor(bounds.right / TILE_SIZE);
+    var firstRow = Math.max(0, Math.floor(bounds.top / TILE_SIZE));
+    var lastRow = Math.floor(bounds.bottom / TILE_SIZE);
+    for (var row = firstRow; row <= lastRow; row++) {
+        for (var col = firstCol; col <= lastCol; col++) {
+            var tile = get_tile(col, row, create);
+            if (tile) result.push(tile);
+        }
+    }
+    return result;
+}
+
+/**
+ * 分块在画布坐标中的范围
+ */
+function tile_bounds(tile) {
+    return {
+        left: tile.col * TILE_SIZE,
+        top: tile.row * TILE_SIZE,
+        right: (tile.col + 1) * TILE_SIZE,
+        bottom: (tile.row + 1) * TILE_SIZE
+    };
+}
+
+/**
+ * 释放所有分块
+ */
+function release_all_tiles() {
+    canvasTiles.forEach(function(tile) {
+        tile.canvas.remove();
+        // 立即归还位图内存
+        tile.canvas.width = tile.canvas.height = 0;
+        tileStats.released++;
+    });
+    canvasTiles.clear();
+}
+
+/**
+ * 将一条已完成的线绘制到它经过的分块
+ * @param {number} i - 线在arrays_of_points中的下标
+ */
+function tiles_draw_line(i) {
+    var tiles = tiles_for_bounds(get_line_bounds(arrays_of_points[i]), true);
+    for (var t = 0; t < tiles.length; t++) {
+        draw_committed_line(tiles[t].ctx, i);
+    }
+}
+
+/**
+ * 将一个书法笔画绘制到它经过的分块
+ * @param {Stroke} stroke - 书法笔画
+ */
+function tiles_draw_calligraphy(stroke) {
+    var tiles = tiles_for_bounds(get_calligraphy_bounds(stroke), true);
+    for (var t = 0; t < tiles.length; t++) {
+        tiles[t].ctx.fillStyle = color;
+        stroke.draw(WEIGHT, tiles[t].ctx);
+    }
+}
+
+/**
+ * 为笔画包围盒与区域的交集创建分块
+ * @param {Object} bounds - 笔画包围盒
+ * @param {Object} region - 重绘区域
+ */
+function allocate_tiles_in_region(bounds, region) {
+    if (!bounds_intersect(bounds, region)) return;
+    tiles_for_bounds({
+        left: Math.max(bounds.left, region.left),
+        top: Math.max(bounds.top, region.top),
+        right: Math.min(bounds.right, region.right),
+        bottom: Math.min(bounds.bottom, region.bottom)
+    }, true);
+}
+
+/**
+ * 在分块模式下局部重绘：只处理与区域相交的分块
+ * @param {Object} region - {left, top, right, bottom}，CSS像素
+ * @returns {number} 重画的笔画数
+ */
+function tiles_redraw_region(region) {
+    var redrawn = 0;
+    var lineCount = Math.min(nextLine, arrays_of_points.length);
+    var strokeCount = Math.min(nextStroke, strokes.length);
+
+    // 区域内有笔迹但分块尚未创建(例如重建后首次绘制或滚动到新位置)时按需创建
+    for (var i = 0; i < lineCount; i++) {
+        if (is_live_line(i) || !arrays_of_points[i].length) continue;
+        allocate_tiles_in_region(get_line_bounds(arrays_of_points[i]), region);
+    }
+    for (var i = 0; i < strokeCount; i++) {
+        allocate_tiles_in_region(get_calligraphy_bounds(strokes[i]), region);
+    }
+
+    var tiles = tiles_for_bounds(region, false);
+    for (var t = 0; t < tiles.length; t++) {
+        var tile = tiles[t];
+        var area = tile_bounds(tile);
+        // 区域与分块的交集，对齐到设备像素
+        var clip = {
+            left: Math.floor(Math.max(area.left, region.left) * tileDpr) / tileDpr,
+            top: Math.floor(Math.max(area.top, region.top) * tileDpr) / tileDpr,
+            right: Math.ceil(Math.min(area.right, region.right) * tileDpr) / tileDpr,
+            bottom: Math.ceil(Math.min(area.bottom, region.bottom) * tileDpr) / tileDpr
+        };
+        if (clip.right <= clip.left || clip.bottom <= clip.top) continue;
+
+        var tileCtx = tile.ctx;
+        tileCtx.save();
+        tileCtx.beginPath();
+        tileCtx.rect(clip.left, clip.top, clip.right - clip.left, clip.bottom - clip.top);
+        tileCtx.clip();
+        tileCtx.clearRect(clip.left, clip.top, clip.right - clip.left, clip.bottom - clip.top);
+
+        for (var i = 0; i < lineCount; i++) {
+            if (is_live_line(i) || !arrays_of_points[i].length) continue;
+            if (bounds_intersect(get_line_bounds(arrays_of_points[i]), clip)) {
+                draw_committed_line(tileCtx, i);
+                redrawn++;
+            }
+        }
+        for (var i = 0; i < strokeCount; i++) {
+            if (bounds_intersect(get_calligraphy_bounds(strokes[i]), clip)) {
+                tileCtx.fillStyle = color;
+                strokes[i].draw(WEIGHT, tileCtx);
+                redrawn++;
+            }
+        }
+        tileCtx.restore();
+    }
+    return redrawn;
+}
+
+/**
+ * 让secondary_canvas覆盖当前视口，并使用画布坐标绘制
+ * @param {boolean} force - 即使位置未变化也重新设置
+ */
+function position_secondary_viewport(force) {
+    var logicalWidth = parseFloat(canvas.style.width) || 0;
+    var logicalHeight = parseFloat(canvas.style.height) || 0;
+    var wrapperTop = wrapper.getBoundingClientRect().top;
+    var height = Math.min(window.innerHeight, logicalHeight);
+    var top = Math.max(0, Math.min(-wrapperTop, logicalHeight - height));
+
+    if (!force && top === secondaryViewport.top && height === secondaryViewport.height &&
+        logicalWidth === secondaryViewport.width) {
+        return false;
+    }
+
+    secondaryViewport = { left: 0, top: top, width: logicalWidth, height: height };
+    secondary_canvas.width = Math.ceil(logicalWidth * tileDpr);
+    secondary_canvas.height = Math.ceil(height * tileDpr);
+    secondary_canvas.style.width = logicalWidth + 'px';
+    secondary_canvas.style.height = height + 'px';
+    secondary_canvas.style.top = top + 'px';
+    secondary_ctx.setTransform(tileDpr, 0, 0, tileDpr, 0, -top * tileDpr);
+    update_pen_settings();
+
+    // 视口移动后，正在书写的笔画需要从头重画到新的位置
+    if (liveLineIndex >= 0 && isPointerDown) {
+        nextPoint = 0;
+        request_redraw_frame();
+    }
+    return true;
+}
+
+/**
+ * 在resize中设置分块模式下的各个画布
+ * 主画布只保留CSS尺寸作为输入和背景层，不再持有整页位图
+ * @param {number} dpr - 设备像素比
+ * @returns {boolean} 需要重建所有分块时返回true
+ */
+function resize_tiled_surfaces(dpr) {
+    ctx.canvas.width = 1;
+    ctx.canvas.height = 1;
+    committed_canvas.width = committed_canvas.height = 1;
+    committedLayerDpr = 0;
+
+    var rebuild = tileDpr !== dpr;
+    if (rebuild) {
+        release_all_tiles();
+        tileDpr = dpr;
+    }
+    position_secondary_viewport(true);
+    return rebuild;
+}
+
+/**
+ * 离开分块模式(切换为小画布或跟随滚动时)，释放分块并恢复secondary_canvas
+ */
+function leave_tiled_mode() {
+    if (!tileDpr) return;
+    release_all_tiles();
+    tileDpr = 0;
+    secondary_canvas.style.top = '';
+    secondaryViewport = { left: 0, top: 0, width: 0, height: 0 };
+}
+
+/**
+ * 获取分块画布的统计信息，用于诊断
+ */
+function get_tile_stats() {
+    var stats = Object.assign({}, tileStats);
+    stats.active = canvasTiles.size;
+    stats.enabled = use_tiled_canvas();
+    return stats;
+}
+
+window.addEventListener('scroll', function() {
+    if (tileDpr) position_secondary_viewport(false);
+}, { passive: true });
@@ -0,0 +1,334 @@
+/**
+ * AnkiDraw 后台线程绘制
+ * 已提交笔迹的画布通过transferControlToOffscreen交给Web Worker，路径生成和光栅化都在Worker中进行，
+ * 主线程只处理输入和secondary_canvas上正在书写的笔画，每帧把新增、擦除等笔画增量作为一个命令批次发送给Worker。
+ * 浏览器不支持OffscreenCanvas或Worker启动失败时退回到主线程的已提交图层。
+ */
+
+// 是否启用后台线程绘制(由Python端设置)
+var workerCanvas = /*WORKER_CANVAS_PLACEHOLDER*/;
+// Worker脚本(templates/ink_worker.js)
+var inkWorkerSource = /*INK_WORKER_SOURCE_PLACEHOLDER*/;
+var inkWorker = null;
+// 交给Worker的画布元素，位于主画布之上且不接收指针事件
+var workerCanvasElement = null;
+// Worker不可用时置为true，之后一直使用主线程绘制
+var workerCanvasFailed = false;
+// Worker画布当前的尺寸，width为0表示尚未设置
+var workerSurface = { width: 0, height: 0, scale: 0 };
+// 本帧待发送的命令
+var workerBatch = [];
+// 已发送给Worker的笔画：点数组 -> {id, pointCount}
+var workerLineIds = new WeakMap();
+var nextWorkerLineId = 1;
+// 书法笔画录制的绘制命令缓存
+var workerOpsCache = new WeakMap();
+var workerStats = {
+    posts: 0,       // postMessage次数
+    commands: 0,    // 发送的命令数
+    pointsSent: 0,  // 发送的点数
+    fallbacks: 0    // 退回主线程绘制的次数
+};
+
+/**
+ * 当前是否由Worker绘制已提交笔迹；分块模式使用自己的分块，不经过Worker
+ */
+function use_worker_canvas() {
+    return workerCanvas && !workerCanvasFailed && inkWorker !== null && !use_tiled_canvas();
+}
+
+function supports_worker_canvas() {
+    return typeof Worker !== 'undefined' && typeof OffscreenCanvas !== 'undefined' &&
+        typeof HTMLCanvasElement.prototype.transferControlToOffscreen === 'function' &&
+        typeof Blob !== 'undefined' && typeof URL !== 'undefined';
+}
+
+/**
+ * Worker绘制需要的函数直接取自主线程的定义，保证两边生成的路径完全一致
+ * @returns {string} 附加到Worker脚本之后的源码
+ */
+function ink_worker_shared_source() {
+    var functions = [
+        getStroke, getStrokePoints, getStrokeOutlinePoints, getStrokeRadius,
+        neg, add, sub, mul, div, per, dpr, isEqual, len, len2, dist2, uni, dist, med,
+        rotAround, lrp, prj, getSvgPathFromStroke, getFreeDrawSvgPath,
+        build_stroke_path, create_wavy_line_path
+    ];
+    var source = [
+        'var __spreadArray = ' + __spreadArray.toString() + ';',
+        'var min = Math.min, PI = Math.PI;',
+        'var RATE_OF_PRESSURE_CHANGE = ' + RATE_OF_PRESSURE_CHANGE + ';',
+        'var FIXED_PI = ' + FIXED_PI + ';',
+        'var TO_FIXED_PRECISION = ' + TO_FIXED_PRECISION.toString() + ';'
+    ];
+    for (var i = 0; i < functions.length; i++) {
+        source.push(functions[i].toString());
+    }
+    return source.join('\n');
+}
+
+/**
+ * 按需启动Worker并把Worker画布交给它
+ * @returns {boolean} 使用Worker绘制时返回true
+ */
+function start_ink_worker() {
+    if (!workerCanvas || workerCanvasFailed || use_tiled_canvas()) return false;
+    if (inkWorker) return true;
+    if (!supports_worker_canvas()) {
+        console.log('AnkiDraw Debug: 不支持OffscreenCanvas，使用主线程绘制');
+        workerCanvasFailed = true;
+        return false;
+    }
+    try {
+        var blob = new Blob([inkWorkerSource, '\n', ink_worker_shared_source()], { type: 'text/javascript' });
+        var url = URL.createObjectURL(blob);
+        var element = document.createElement('canvas');
+        element.id = 'ankidraw_worker_canvas';
+        element.style.display = canvas.style.display;
+        var offscreen = element.transferControlToOffscreen();
+        var worker = new Worker(url);
+        URL.revokeObjectURL(url);
+
+        worker.onmessage = on_ink_worker_message;
+        worker.onerror = function(e) {
+            disable_ink_worker(e.message || 'worker error');
+        };
+        worker.postMessage({ type: 'init', canvas: offscreen, width: 1, height: 1, scale: 1 }, [offscreen]);
+
+        wrapper.insertBefore(element, canvas.nextSibling);
+        workerCanvasElement = element;
+        inkWorker = worker;
+        workerSurface = { width: 0, height: 0, scale: 0 };
+        return true;
+    } catch (e) {
+        console.log('AnkiDraw Debug: 启动绘制线程失败，使用主线程绘制', e);
+        workerCanvasFailed = true;
+        workerStats.fallbacks++;
+        return false;
+    }
+}
+
+function on_ink_worker_message(e) {
+    if (e.data.type === 'error') {
+        disable_ink_worker(e.data.message);
+    }
+}
+
+/**
+ * Worker出错时停止使用Worker，重新按主线程图层布局并重建笔迹
+ * @param {string} reason - 原因，用于调试输出
+ */
+function disable_ink_worker(reason) {
+    if (workerCanvasFailed) return;
+    console.log('AnkiDraw Debug: 绘制线程不可用，退回主线程绘制', reason);
+    workerCanvasFailed = true;
+    workerStats.fallbacks++;
+    if (inkWorker) inkWorker.terminate();
+    inkWorker = null;
+    workerBatch = [];
+    if (workerCanvasElement) workerCanvasElement.remove();
+    workerCanvasElement = null;
+    resize();
+    ts_redraw();
+}
+
+/**
+ * 在resize中设置Worker模式下的各个画布
+ * 主画布只保留CSS尺寸作为输入和背景层，已提交笔迹由Worker画布显示
+ * @param {number} scale - 位图缩放比例
+ * @returns {boolean} Worker画布内容已清空、需要整层重建时返回true
+ */
+function resize_worker_surface(scale) {
+    ctx.canvas.width = 1;
+    ctx.canvas.height = 1;
+    committed_canvas.width = committed_canvas.height = 1;
+    committedLayerDpr = 0;
+
+    var width = parseFloat(canvas.style.width) || 0;
+    var height = parseFloat(canvas.style.height) || 0;
+    workerCanvasElement.style.width = canvas.style.width;
+    workerCanvasElement.style.height = canvas.style.height;
+    workerCanvasElement.style.display = canvas.style.display;
+    if (width === workerSurface.width && height === workerSurface.height && scale === workerSurface.scale) {
+        return false;
+    }
+    // 缩放比例不变时Worker保留原有内容，只补画新露出的区域
+    var previous = workerSurface;
+    var preserve = previous.width > 0 && previous.scale === scale;
+    workerSurface = { width: width, height: height, scale: scale };
+    queue_worker_command({ op: 'resize', width: width, height: height, scale: scale, preserve: preserve });
+    if (preserve) {
+        repaint_exposed_regions(previous.width, previous.height, width, height);
+        return false;
+    }
+    return true;
+}
+
+/**
+ * 切换到分块模式时隐藏Worker画布并清空其内容
+ */
+function suspend_ink_worker() {
+    if (!workerCanvasElement || workerSurface.width === 0) return;
+    workerCanvasElement.style.display = 'none';
+    workerSurface = { width: 0, height: 0, scale: 0 };
+    queue_worker_command({ op: 'clear', reset: true });
+    workerLineIds = new WeakMap();
+    flush_worker_batch();
+}
+
+function queue_worker_command(command) {
+    workerBatch.push(command);
+}
+
+/**
+ * 把本帧积累的命令一次性发送给Worker
+ */
+function flush_worker_batch() {
+    if (!inkWorker || workerBatch.length === 0) return;
+    inkWorker.postMessage({ type: 'batch', commands: workerBatch });
+    workerStats.posts++;
+    workerStats.commands += workerBatch.length;
+    workerBatch = [];
+}
+
+/**
+ * 同步绘制设置(颜色、线宽、Perfect Freehand及单点笔画处理)
+ */
+function sync_worker_settings() {
+    if (!inkWorker) return;
+    queue_worker_command({
+        op: 'config',
+        color: color,
+        line_width: line_width,
+        perfectFreehand: perfectFreehand,
+        convertDotStrokes: convertDotStrokes
+    });
+}
+
+/**
+ * 生成一条线的绘制项；坐标只在第一次或点数变化时发送
+ * 笔画视图不能直接传给Worker，发送的是从笔画存储复制出的坐标和样式
+ * @param {Array} points - 笔画视图
+ */
+function worker_line_item(points) {
+    var known = workerLineIds.get(points);
+    if (known && known.pointCount === points.length) {
+        return { id: known.id };
+    }
+    var id = known ? known.id : nextWorkerLineId++;
+    var line = read_line(points);
+    workerLineIds.set(points, { id: id, pointCount: line.count });
+    workerStats.pointsSent += line.count;
+    return {
+        id: id,
+        line: { xy: line.xy.slice(), count: line.count, color: line.color, width: line.width, style: line.style }
+    };
+}
+
+/**
+ * 录制书法笔画的绘制命令，Worker中没有书法识别的代码，只重放这些命令
+ * @param {Stroke} stroke - 书法笔画
+ */
+function worker_calligraphy_item(stroke) {
+    var ops = workerOpsCache.get(stroke);
+    if (!ops) {
+        ops = [];
+        var recorder = {};
+        ['beginPath', 'closePath', 'moveTo', 'lineTo', 'bezierCurveTo', 'quadraticCurveTo',
+         'fill', 'stroke', 'save', 'restore', 'translate', 'rotate', 'scale'].forEach(function(name) {
+            recorder[name] = function() {
+                ops.push([name, Array.prototype.slice.call(arguments)]);
+            };
+        });
+        ['fillStyle', 'strokeStyle', 'lineWidth'].forEach(function(name) {
+            Object.defineProperty(recorder, name, {
+                set: function(value) { ops.push(['set', name, value]); }
+            });
+        });
+        stroke.draw(WEIGHT, recorder);
+        workerOpsCache.set(stroke, ops);
+    }
+    return { ops: ops };
+}
+
+/**
+ * 把一个绘制项追加到本帧的绘制命令中
+ */
+function queue_worker_draw(item) {
+    var last = workerBatch[workerBatch.length - 1];
+    if (!last || last.op !== 'draw') {
+        last = { op: 'draw', items: [] };
+        queue_worker_command(last);
+    }
+    last.items.push(item);
+}
+
+function worker_draw_line(i) {
+    queue_worker_draw(worker_line_item(arrays_of_points[i]));
+}
+
+function worker_draw_calligraphy(stroke) {
+    queue_worker_draw(worker_calligraphy_item(stroke));
+}
+
+/**
+ * 清空Worker画布，整层重建时同时丢弃Worker中保存的笔画
+ */
+function worker_clear_layer() {
+    queue_worker_command({ op: 'clear', reset: true });
+    workerLineIds = new WeakMap();
+}
+
+/**
+ * 通知Worker丢弃已被移除的笔画；撤销重新插入时会重新发送
+ * @param {Array} points - 被移除的笔画
+ */
+function worker_forget_line(points) {
+    var known = workerLineIds.get(points);
+    if (!known) return;
+    workerLineIds.delete(points);
+    queue_worker_command({ op: 'forget', ids: [known.id] });
+}
+
+/**
+ * Worker模式下的局部重绘，选出与区域相交的已提交笔画交给Worker重画
+ * @param {Object} region - {left, top, right, bottom}，CSS像素
+ * @returns {number} 重画的笔画数
+ */
+function worker_redraw_region(region) {
+    var scale = workerSurface.scale || 1;
+    var clip = {
+        left: Math.max(0, Math.floor(region.left * scale) / scale),
+        top: Math.max(0, Math.floor(region.top * scale) / scale),
+        right: Math.min(workerSurface.width, Math.ceil(region.right * scale) / scale),
+        bottom: Math.min(workerSurface.height, Math.ceil(region.bottom * scale) / scale)
+    };
+    if (clip.right <= clip.left || clip.bottom <= clip.top) return 0;
+
+    var items = [];
+    var lineCount = Math.min(nextLine, arrays_of_points.length);
+    for (var i = 0; i < lineCount; i++) {
+        if (is_live_line(i) || !arrays_of_points[i].length) continue;
+        if (bounds_intersect(get_line_bounds(arrays_of_points[i]), clip)) {
+            items.push(worker_line_item(arrays_of_points[i]));
+        }
+    }
+    var strokeCount = Math.min(nextStroke, strokes.length);
+    for (var i = 0; i < strokeCount; i++) {
+        if (bounds_intersect(get_calligraphy_bounds(strokes[i]), clip)) {
+            items.push(worker_calligraphy_item(strokes[i]));
+        }
+    }
+    queue_worker_command({ op: 'region', clip: clip, items: items });
+    return items.length;
+}
+
+/**
+ * 获取后台线程绘制的统计信息，用于诊断
+ */
+function get_worker_stats() {
+    var stats = Object.assign({}, workerStats);
+    stats.enabled = use_worker_canvas();
+    stats.supported = supports_worker_canvas();
+    return stats;
+}
@@ -0,0 +1,79 @@
+/**
+ * AnkiDraw 绘图层的显示/隐藏和设置的即时应用
+ * 开关AnkiDraw时不再重新加载复习页面：关闭时隐藏绘图层、停用快捷键，画布、分块和Worker都保留；
+ * 再次开启时重新显示，由Python端重新加载当前卡片的笔迹。
+ * 工具栏位置、透明度、自动隐藏等设置通过根元素上的CSS变量应用，样式表中的默认值即页面生成时的设置。
+ */
+
+// 绘图层当前是否显示
+var drawingLayerAttached = true;
+var drawingLayerStats = {
+    attached: 0,        // 重新显示的次数
+    detached: 0,        // 隐藏的次数
+    settingsApplied: 0  // 即时应用设置的次数
+};
+
+/**
+ * 隐藏绘图层：结束正在进行的书写，立即保存未保存的笔迹，之后不再响应快捷键和尺寸变化
+ */
+function detach_drawing_layer() {
+    if (!drawingLayerAttached) return;
+    stop_drawing();
+    if (eraserMode) toggleEraser(false);
+    hideEraserSizeSlider();
+    // 隐藏期间切换卡片时Python端不再通知页面，待保存的笔迹必须现在保存
+    if (saveDebounceTimer) {
+        clearTimeout(saveDebounceTimer);
+        saveDebounceTimer = null;
+        if (strokesChanged && undo_log_dirty()) save_strokes();
+    }
+    reset_ink_snapshot();
+    set_hotkeys_suspended(true);
+    wrapper.classList.add('ankidraw_detached');
+    drawingLayerAttached = false;
+    drawingLayerStats.detached++;
+    console.log('AnkiDraw Debug: 绘图层已隐藏');
+}
+
+/**
+ * 重新显示绘图层，页面尺寸可能已经变化，在下一帧重新检查
+ */
+function attach_drawing_layer() {
+    if (drawingLayerAttached) return;
+    wrapper.classList.remove('ankidraw_detached');
+    set_hotkeys_suspended(false);
+    drawingLayerAttached = true;
+    drawingLayerStats.attached++;
+    schedule_resize();
+    console.log('AnkiDraw Debug: 绘图层已显示');
+}
+
+/**
+ * 应用Python端发送的设置
+ * @param {Object} settings - cssVars: CSS变量名 -> 值；smallCanvas: 默认是否使用小画布
+ */
+function apply_live_settings(settings) {
+    var rootStyle = document.documentElement.style;
+    var vars = settings.cssVars || {};
+    Object.keys(vars).forEach(function(name) {
+        rootStyle.setProperty(name, String(vars[name]));
+    });
+    // 小画布的位置取自工具栏位置，画布模式不变时resize不会重新设置
+    if (appliedCanvasLayout) apply_canvas_mode_styles(appliedCanvasLayout.mode);
+    if (typeof settings.smallCanvas === 'boolean' && settings.smallCanvas !== small_canvas) {
+        switch_small_canvas();
+    } else {
+        // 小画布的尺寸可能变化
+        schedule_resize();
+    }
+    drawingLayerStats.settingsApplied++;
+}
+
+/**
+ * 获取绘图层的统计信息，用于诊断
+ */
+function get_drawing_layer_stats() {
+    var stats = Object.assign({}, drawingLayerStats);
+    stats.isAttached = drawingLayerAttached;
+    return stats;
+}
@@ -0,0 +1,192 @@
+/**
+ * AnkiDraw 键盘快捷键分发
+ * 所有快捷键登记在同一个表中，每种键盘事件只安装一个监听器。
+ * 组合键在登记时规范化为"ctrl+alt+shift+meta+键"的形式并编译成 组合键 -> 动作 的Map，
+ * 按键时只需由事件生成同样形式的组合键查一次表。
+ * 登记以id为键，重复登记同一id会替换原来的动作，重复执行注入的脚本也不会累积监听器。
+ */
+
+// Qt快捷键名称与KeyboardEvent.key的对应(均为小写)
+var HOTKEY_KEY_ALIASES = {
+    'space': ' ',
+    'del': 'delete',
+    'ins': 'insert',
+    'esc': 'escape',
+    'return': 'enter',
+    'pgup': 'pageup',
+    'pgdown': 'pagedown',
+    'left': 'arrowleft',
+    'right': 'arrowright',
+    'up': 'arrowup',
+    'down': 'arrowdown'
+};
+var HOTKEY_MODIFIERS = ['ctrl', 'alt', 'shift', 'meta'];
+
+// 登记表保存在window上，重复执行本脚本时沿用
+var hotkeyRegistry = window.ankidrawHotkeyRegistry || (window.ankidrawHotkeyRegistry = {
+    bindings: new Map(), // id -> {id, chord, action, event, preventDefault, inInputs}
+    compiled: null,      // 事件类型 -> Map(组合键 -> [绑定])，登记变化后重新编译
+    listening: {},       // 已安装监听器的事件类型
+    suspended: false     // AnkiDraw关闭时不响应快捷键
+});
+var hotkeyStats = {
+    dispatched: 0, // 收到的按键事件数
+    matched: 0     // 触发动作的次数
+};
+
+/**
+ * 把"Alt+Q"、"Ctrl+Shift+A"等快捷键写法规范化为固定顺序的小写组合键
+ * @param {string} chord - 快捷键
+ * @returns {string} 规范化的组合键，无效时返回空字符串
+ */
+function normalize_hotkey(chord) {
+    if (!chord) return '';
+    chord = String(chord).trim();
+    var key = '';
+    // 主键本身是'+'时写作"Shift++"
+    if (chord.length > 1 && chord.slice(-2) === '++') {
+        key = '+';
+        chord = chord.slice(0, -2);
+    }
+    var parts = chord ? chord.split('+') : [];
+    var modifiers = {};
+    for (var i = 0; i < parts.length; i++) {
+        var part = parts[i].trim().toLowerCase();
+        if (part === 'control') part = 'ctrl';
+        if (part === 'option') part = 'alt';
+        if (part === 'cmd' || part === 'win') part = 'meta';
+        if (HOTKEY_MODIFIERS.indexOf(part) >= 0 && (key || i < parts.length - 1)) {
+            modifiers[part] = true;
+        } else if (!key) {
+            key = HOTKEY_KEY_ALIASES[part] || part;
+        }
+    }
+    if (!key) return '';
+    return HOTKEY_MODIFIERS.filter(function(m) { return modifiers[m]; }).concat([key]).join('+');
+}
+
+/**
+ * 由键盘事件生成规范化的组合键。
+ * 按住Alt时(macOS上为Option)字母键的e.key会变成其他字符，此时按物理键位取字母
+ */
+function event_hotkey(e) {
+    if (!e.key) return '';
+    var chord = '';
+    if (e.ctrlKey) chord += 'ctrl+';
+    if (e.altKey) chord += 'alt+';
+    if (e.shiftKey) chord += 'shift+';
+    if (e.metaKey) chord += 'meta+';
+    if (e.altKey && /^Key[A-Z]$/.test(e.code || '')) return chord + e.code.charAt(3).toLowerCase();
+    return chord + e.key.toLowerCase();
+}
+
+/**
+ * 登记快捷键，同一id再次登记时替换原来的快捷键和动作
+ * @param {string} id - 登记的唯一标识，如'core:undo'
+ * @param {string} chord - 快捷键，如'Alt+Z'
+ * @param {Function} action - 动作，参数为键盘事件
+ * @param {Object} [options] - event: 'keydown'或'keyup'(默认)；
+ *     preventDefault: 是否阻止默认行为(默认true)；inInputs: 在输入框中是否也触发(默认false)
+ */
+function register_hotkey(id, chord, action, options) {
+    options = options || {};
+    var normalized = normalize_hotkey(chord);
+    if (!normalized || typeof action !== 'function') {
+        unregister_hotkey(id);
+        return;
+    }
+    hotkeyRegistry.bindings.set(id, {
+        id: id,
+        chord: normalized,
+        action: action,
+        event: options.event || 'keyup',
+        preventDefault: options.preventDefault !== false,
+        inInputs: !!options.inInputs
+    });
+    hotkeyRegistry.compiled = null;
+    install_hotkey_listener(options.event || 'keyup');
+}
+
+function unregister_hotkey(id) {
+    if (hotkeyRegistry.bindings.delete(id)) hotkeyRegistry.compiled = null;
+}
+
+/**
+ * 用一组按钮快捷键替换同一分组中原有的登记，按下时点击对应按钮
+ * @param {string} group - 分组名，登记id为"分组:按钮id"
+ * @param {Object} chords - 按钮id -> 快捷键，空快捷键表示不设置
+ */
+function bind_button_hotkeys(group, chords) {
+    var prefix = group + ':';
+    Array.from(hotkeyRegistry.bindings.keys()).forEach(function(id) {
+        if (id.indexOf(prefix) === 0) unregister_hotkey(id);
+    });
+    Object.keys(chords).forEach(function(buttonId) {
+        register_hotkey(prefix + buttonId, chords[buttonId], function() {
+            var button = document.getElementById(buttonId);
+            if (button) button.click();
+        }, { event: 'keydown' });
+    });
+}
+
+/**
+ * 把登记表编译为 事件类型 -> Map(组合键 -> [绑定])
+ */
+function compile_hotkeys() {
+    var compiled = {};
+    hotkeyRegistry.bindings.forEach(function(binding) {
+        var table = compiled[binding.event] || (compiled[binding.event] = new Map());
+        var list = table.get(binding.chord);
+        if (list) {
+            list.push(binding);
+        } else {
+            table.set(binding.chord, [binding]);
+        }
+    });
+    hotkeyRegistry.compiled = compiled;
+    return compiled;
+}
+
+/**
+ * 暂停或恢复所有快捷键，登记保持不变
+ */
+function set_hotkeys_suspended(suspended) {
+    hotkeyRegistry.suspended = !!suspended;
+}
+
+function install_hotkey_listener(type) {
+    if (hotkeyRegistry.listening[type]) return;
+    hotkeyRegistry.listening[type] = true;
+    document.addEventListener(type, dispatch_hotkey);
+}
+
+/**
+ * 唯一的键盘事件监听器：查表并执行对应的动作
+ */
+function dispatch_hotkey(e) {
+    if (hotkeyRegistry.suspended) return;
+    hotkeyStats.dispatched++;
+    var compiled = hotkeyRegistry.compiled || compile_hotkeys();
+    var table = compiled[e.type];
+    if (!table) return;
+    var list = table.get(event_hotkey(e));
+    if (!list) return;
+    var target = e.target;
+    var inInput = target && (target.tagName === 'INPUT' || target.tagName === 'TEXTAREA' || target.isContentEditable);
+    for (var i = 0; i < list.length; i++) {
+        var binding = list[i];
+        if (inInput && !binding.inInputs) continue;
+        if (binding.preventDefault) e.preventDefault();
+        hotkeyStats.matched++;
+        binding.action(e);
+    }
+}
+
+/**
+ * 获取快捷键分发的统计信息，用于诊断
+ */
+function get_hotkey_stats() {
+    var stats = Object.assign({}, hotkeyStats);
+    stats.bindings = hotkeyRegistry.bindings.size;
+    return stats;
+}
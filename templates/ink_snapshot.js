@@ -0,0 +1,179 @@
+/**
+ * AnkiDraw 笔迹快照
+ * 打开卡片时要先解析全部矢量笔画再重绘，笔画越多，笔迹出现得越晚。
+ * 每次保存笔迹后，在浏览器空闲时把卡片顶部一屏的笔迹画成WebP图片，由Python端保存在笔迹文件旁边。
+ * 下次打开这一面时，Python端在发送矢量数据之前先发送快照，页面立即显示它，
+ * 矢量笔迹载入并画完后再移除快照。
+ * 快照记录生成时的窗口大小和设备像素比，窗口大小不同时不显示并删除快照，随后按新的窗口大小重新生成。
+ * 只用于整页画布，小画布和跟随滚动模式下画布位置随滚动变化。
+ */
+
+// 保存后等待多久生成快照(毫秒)，浏览器空闲时可能更早
+var SNAPSHOT_DELAY = 1000;
+// WebP压缩质量
+var SNAPSHOT_QUALITY = 0.85;
+// 正在显示的快照图片
+var snapshotImage = null;
+// 当前卡片已保存的快照对应的窗口，与current_snapshot_window()相同时不必重新生成
+var snapshotWindow = null;
+var snapshotTimer = null;
+var snapshotStats = {
+    shown: 0,       // 显示快照的次数
+    invalidated: 0, // 因窗口大小变化而丢弃的快照数
+    generated: 0    // 生成的快照数
+};
+
+function use_ink_snapshot() {
+    return !small_canvas && !fullscreen_follow;
+}
+
+/**
+ * 快照适用的窗口：窗口大小和设备像素比
+ */
+function current_snapshot_window() {
+    return window.innerWidth + 'x' + window.innerHeight + '@' + (window.devicePixelRatio || 1);
+}
+
+/**
+ * 显示Python端发送的快照，窗口大小不同时删除它
+ * @param {string} cardId - 快照所属的卡片
+ * @param {boolean} front - 是否为正面笔迹的快照
+ * @param {string} json - {image, width, height, window}
+ */
+function show_ink_snapshot(cardId, front, json) {
+    var data = JSON.parse(json);
+    if (data.window !== current_snapshot_window()) {
+        snapshotStats.invalidated++;
+        if (typeof pycmd === 'function') {
+            pycmd('ankidraw:delete_ink_snapshot:' + cardId + ':' + (front ? 'front' : 'all'));
+        }
+        return;
+    }
+    snapshotWindow = data.window;
+    if (!use_ink_snapshot()) return;
+    hide_ink_snapshot();
+    snapshotImage = document.createElement('img');
+    snapshotImage.id = 'ankidraw_ink_snapshot';
+    snapshotImage.style.width = data.width + 'px';
+    snapshotImage.style.height = data.height + 'px';
+    snapshotImage.style.display = canvas.style.display;
+    snapshotImage.src = data.image;
+    // 与分块层一样放在主画布之后
+    wrapper.insertBefore(snapshotImage, canvas.nextSibling);
+    snapshotStats.shown++;
+}
+
+/**
+ * 移除快照
+ */
+function hide_ink_snapshot() {
+    if (!snapshotImage) return;
+    snapshotImage.remove();
+    snapshotImage = null;
+}
+
+/**
+ * 矢量笔迹载入后，等重绘的这一帧呈现后再移除快照(Worker模式下画布在下一帧才更新)
+ */
+function swap_in_live_ink() {
+    if (snapshotImage) {
+        requestAnimationFrame(function() { requestAnimationFrame(hide_ink_snapshot); });
+    }
+    if (snapshotWindow !== current_snapshot_window()) schedule_ink_snapshot();
+}
+
+/**
+ * 切换卡片时移除快照，快照状态属于上一张卡片
+ */
+function reset_ink_snapshot() {
+    hide_ink_snapshot();
+    snapshotWindow = null;
+    if (snapshotTimer) {
+        clearTimeout(snapshotTimer);
+        snapshotTimer = null;
+    }
+}
+
+/**
+ * 在保存笔迹或窗口大小变化后安排生成快照
+ */
+function schedule_ink_snapshot() {
+    if (!currentCardId || typeof pycmd !== 'function' || !use_ink_snapshot()) return;
+    if (snapshotTimer) clearTimeout(snapshotTimer);
+    var cardId = currentCardId, front = isQuestionSide;
+    snapshotTimer = setTimeout(function() {
+        snapshotTimer = null;
+        var run = function() {
+            if (cardId === currentCardId && front === isQuestionSide) generate_ink_snapshot(cardId, front);
+        };
+        if (typeof requestIdleCallback === 'function') {
+            requestIdleCallback(run, { timeout: SNAPSHOT_DELAY });
+        } else {
+            run();
+        }
+    }, SNAPSHOT_DELAY);
+}
+
+/**
+ * 把卡片顶部一屏的笔迹(包括底图)画成图片，交给Python端保存
+ */
+function generate_ink_snapshot(cardId, front) {
+    var side = front ? 'front' : 'all';
+    if (!arrays_of_points.length && !strokes.length && !(hasBakedLayer && bakedLayer)) {
+        // 笔迹被清空后删除原有的快照
+        if (snapshotWindow) pycmd('ankidraw:delete_ink_snapshot:' + cardId + ':' + side);
+        snapshotWindow = null;
+        return;
+    }
+    var width = parseFloat(canvas.style.width) || canvas.clientWidth;
+    var height = Math.min(parseFloat(canvas.style.height) || canvas.clientHeight, window.innerHeight);
+    if (!(width > 0 && height > 0)) return;
+    var area = { left: 0, top: 0, right: width, bottom: height };
+    var scale = compute_render_scale(width, height);
+    var surface = document.createElement('canvas');
+    surface.width = Math.max(1, Math.ceil(width * scale));
+    surface.height = Math.max(1, Math.ceil(height * scale));
+    var surfaceCtx = surface.getContext('2d');
+    surfaceCtx.setTransform(scale, 0, 0, scale, 0, 0);
+    surfaceCtx.lineJoin = surfaceCtx.lineCap = 'round';
+    if (hasBakedLayer && bakedLayer) {
+        surfaceCtx.drawImage(bakedLayer.image, bakedLayer.left, bakedLayer.top, bakedLayer.width, bakedLayer.height);
+    }
+    for (var i = 0; i < arrays_of_points.length; i++) {
+        if (is_live_line(i) || !bounds_intersect(get_line_bounds(arrays_of_points[i]), area)) continue;
+        draw_committed_line(surfaceCtx, i);
+    }
+    for (var i = 0; i < strokes.length; i++) {
+        if (typeof strokes[i].draw !== 'function' ||
+            !bounds_intersect(get_calligraphy_bounds(strokes[i]), area)) continue;
+        strokes[i].draw(WEIGHT, surfaceCtx);
+    }
+    var windowKey = current_snapshot_window();
+    // 编码和读取都是异步的，不阻塞书写
+    surface.toBlob(function(blob) {
+        surface.width = surface.height = 0;
+        if (!blob) return;
+        var reader = new FileReader();
+        reader.onload = function() {
+            if (cardId !== currentCardId) return;
+            pycmd('ankidraw:save_ink_snapshot:' + cardId + ':' + side + ':' + JSON.stringify({
+                image: reader.result,
+                width: width,
+                height: height,
+                window: windowKey
+            }));
+            snapshotWindow = windowKey;
+            snapshotStats.generated++;
+        };
+        reader.readAsDataURL(blob);
+    }, 'image/webp', SNAPSHOT_QUALITY);
+}
+
+/**
+ * 获取快照的统计信息，用于诊断
+ */
+function get_snapshot_stats() {
+    var stats = Object.assign({}, snapshotStats);
+    stats.showing = !!snapshotImage;
+    return stats;
+}
@@ -0,0 +1,173 @@
+/**
+ * AnkiDraw 后台绘制线程(Web Worker)
+ * 已提交笔迹画在通过transferControlToOffscreen交给本线程的画布上，
+ * 主线程只负责输入和正在书写的笔画，并把笔画增量以命令批次发送过来。
+ * 生成路径用的函数(Perfect Freehand、build_stroke_path等)由主线程在创建Worker时附加到本脚本之后。
+ */
+
+var surface = null;
+var surfaceCtx = null;
+// 画布位图相对CSS像素的缩放比例
+var surfaceScale = 1;
+// 与主线程保持一致的绘制设置
+var color = '#fff';
+var line_width = 4;
+var perfectFreehand = false;
+var convertDotStrokes = true;
+// 已收到的笔画，键为主线程分配的编号：{data, entry, perfectPath}
+var lines = new Map();
+
+/**
+ * 把坐标数据还原为点数组，Perfect Freehand需要这种格式
+ * @param {Object} line - {xy, count, color, width}
+ */
+function unpack_points(line) {
+    var points = new Array(line.count);
+    for (var j = 0; j < line.count; j++) {
+        points[j] = [line.xy[j * 2], line.xy[j * 2 + 1], line.color, line.width];
+    }
+    return points;
+}
+
+/**
+ * 设置画布像素尺寸并恢复坐标变换(设置尺寸会清空画布并重置上下文状态)
+ * @param {boolean} preserve - 是否把原有内容复制回调整后的画布
+ */
+function resize_surface(width, height, scale, preserve) {
+    var previous = null;
+    if (preserve && surface.width > 1 && surface.height > 1) {
+        previous = new OffscreenCanvas(surface.width, surface.height);
+        previous.getContext('2d').drawImage(surface, 0, 0);
+    }
+    surfaceScale = scale;
+    surface.width = Math.max(1, Math.ceil(width * scale));
+    surface.height = Math.max(1, Math.ceil(height * scale));
+    if (previous) surfaceCtx.drawImage(previous, 0, 0);
+    surfaceCtx.setTransform(scale, 0, 0, scale, 0, 0);
+    surfaceCtx.lineJoin = surfaceCtx.lineCap = 'round';
+}
+
+function clear_surface() {
+    surfaceCtx.save();
+    surfaceCtx.setTransform(1, 0, 0, 1, 0, 0);
+    surfaceCtx.clearRect(0, 0, surface.width, surface.height);
+    surfaceCtx.restore();
+}
+
+/**
+ * 绘制一条线，逻辑与主线程的draw_committed_line相同
+ * @param {Object} item - {id, line}，坐标只在第一次发送或点数变化时携带
+ */
+function draw_line(item) {
+    var line = lines.get(item.id);
+    if (item.line) {
+        line = { data: item.line, entry: null, perfectPath: null };
+        lines.set(item.id, line);
+    }
+    if (!line || !line.data.count) return;
+
+    if (perfectFreehand) {
+        if (!line.perfectPath) {
+            line.perfectPath = new Path2D(getFreeDrawSvgPath(unpack_points(line.data), true));
+        }
+        surfaceCtx.fillStyle = line.data.color || color;
+        surfaceCtx.fill(line.perfectPath);
+        return;
+    }
+    if (!line.entry) line.entry = build_stroke_path(line.data);
+    surfaceCtx.lineWidth = line.entry.width;
+    surfaceCtx.strokeStyle = line.entry.color;
+    surfaceCtx.setLineDash(line.entry.dashPattern);
+    surfaceCtx.stroke(line.entry.path);
+    surfaceCtx.setLineDash([]);
+}
+
+/**
+ * 重放主线程录制的书法笔画绘制命令
+ * @param {Array} ops - [方法名, 参数] 或 ['set', 属性名, 值]
+ */
+function draw_ops(ops) {
+    surfaceCtx.fillStyle = color;
+    for (var i = 0; i < ops.length; i++) {
+        var op = ops[i];
+        if (op[0] === 'set') {
+            surfaceCtx[op[1]] = op[2];
+        } else {
+            surfaceCtx[op[0]].apply(surfaceCtx, op[1]);
+        }
+    }
+}
+
+function draw_items(items) {
+    for (var i = 0; i < items.length; i++) {
+        if (items[i].ops) {
+            draw_ops(items[i].ops);
+        } else {
+            draw_line(items[i]);
+        }
+    }
+}
+
+/**
+ * 局部重绘：裁剪到区域，清空后重画与之相交的笔画
+ * @param {Object} clip - {left, top, right, bottom}，CSS像素
+ * @param {Array} items - 需要重画的笔画
+ */
+function redraw_region(clip, items) {
+    surfaceCtx.save();
+    surfaceCtx.beginPath();
+    surfaceCtx.rect(clip.left, clip.top, clip.right - clip.left, clip.bottom - clip.top);
+    surfaceCtx.clip();
+    surfaceCtx.clearRect(clip.left, clip.top, clip.right - clip.left, clip.bottom - clip.top);
+    draw_items(items);
+    surfaceCtx.restore();
+}
+
+function run_command(command) {
+    switch (command.op) {
+        case 'config':
+            color = command.color;
+            line_width = command.line_width;
+            perfectFreehand = command.perfectFreehand;
+            convertDotStrokes = command.convertDotStrokes;
+            break;
+        case 'resize':
+            resize_surface(command.width, command.height, command.scale, command.preserve);
+            break;
+        case 'clear':
+            clear_surface();
+            // 整层重建时主线程会重新发送所有笔画
+            if (command.reset) lines.clear();
+            break;
+        case 'draw':
+            draw_items(command.items);
+            break;
+        case 'region':
+            redraw_region(command.clip, command.items);
+            break;
+        case 'forget':
+            for (var i = 0; i < command.ids.length; i++) lines.delete(command.ids[i]);
+            break;
+    }
+}
+
+self.onmessage = function(e) {
+    var msg = e.data;
+    try {
+        if (msg.type === 'init') {
+            surface = msg.canvas;
+            surfaceCtx = surface.getContext('2d');
+            if (!surfaceCtx || typeof Path2D === 'undefined') {
+                throw new Error('2d context or Path2D is not available in worker');
+            }
+            resize_surface(msg.width, msg.height, msg.scale, false);
+            self.postMessage({ type: 'ready' });
+        } else if (msg.type === 'batch' && surfaceCtx) {
+            for (var i = 0; i < msg.commands.length; i++) {
+                run_command(msg.commands[i]);
+            }
+        }
+    } catch (err) {
+        self.postMessage({ type: 'error', message: String(err && err.message || err) });
+    }
+};
@@ -0,0 +1,187 @@
+/**
+ * AnkiDraw 已提交图层的位图检查点
+ * 笔迹很多的卡片上，撤销或擦除一条较大的笔画时，局部重绘要重画区域内的大量笔画。
+ * 每提交一定数量的笔画就把已提交图层(视口裁剪时只复制已绘制的范围)复制一份，
+ * 记下当时已提交的线和书法笔画数量。之后修改了某个下标之前的笔画时，只丢弃更晚的检查点；
+ * 重绘时如果需要重放的笔画比局部重绘要画的少，就恢复最近的检查点并只重放它之后的笔画，
+ * 撤销的开销因此与卡片上的笔画总数无关。
+ * 只用于单一已提交图层，分块和Worker模式有各自的局部重绘。
+ */
+
+// 每提交多少条笔画保存一个检查点
+var CHECKPOINT_INTERVAL = 64;
+// 所有检查点位图可以占用的内存(MB)，不足以保存一个检查点时不启用
+var checkpointMemoryBudget = 64;
+// 检查点，按已提交笔画数从少到多排列：{canvas, x, y, width, height, range, lines, strokes}
+var layerCheckpoints = [];
+var checkpointStats = {
+    captured: 0, // 保存的检查点数
+    dropped: 0,  // 因修改了更早的笔画或超出内存而丢弃的检查点数
+    restores: 0, // 从检查点恢复的次数
+    replayed: 0  // 恢复后重放的笔画数
+};
+
+function use_layer_checkpoints() {
+    return checkpointMemoryBudget > 0 && !use_tiled_canvas() && !use_worker_canvas();
+}
+
+/**
+ * 已提交图层中需要保存的像素范围：视口裁剪时为已绘制的纵向范围，否则为整个图层
+ * @returns {Object} 设备像素 {x, y, width, height}
+ */
+function checkpoint_rect() {
+    var dpr = committedLayerDpr || 1;
+    var top = 0, bottom = committed_canvas.height;
+    if (paintedRange) {
+        top = Math.max(0, Math.floor(paintedRange.top * dpr));
+        bottom = Math.min(bottom, Math.ceil(paintedRange.bottom * dpr));
+    }
+    return { x: 0, y: top, width: committed_canvas.width, height: Math.max(0, bottom - top) };
+}
+
+/**
+ * 内存预算下最多可以保存的检查点数
+ */
+function max_layer_checkpoints(rect) {
+    var bytes = rect.width * rect.height * 4;
+    if (!bytes) return 0;
+    return Math.floor(checkpointMemoryBudget * 1024 * 1024 / bytes);
+}
+
+function release_checkpoint(checkpoint) {
+    checkpoint.canvas.width = checkpoint.canvas.height = 0;
+    checkpointStats.dropped++;
+}
+
+/**
+ * 丢弃所有检查点(图层尺寸变化、整层重建或切换绘制模式时)
+ */
+function reset_layer_checkpoints() {
+    for (var i = 0; i < layerCheckpoints.length; i++) release_checkpoint(layerCheckpoints[i]);
+    layerCheckpoints = [];
+}
+
+/**
+ * 第lineIndex条线或第strokeIndex个书法笔画被移除或插入，丢弃包含它的检查点
+ * @param {number} lineIndex - 修改的线下标，没有修改线时传Infinity
+ * @param {number} strokeIndex - 修改的书法笔画下标，没有修改书法笔画时传Infinity
+ */
+function drop_checkpoints_after(lineIndex, strokeIndex) {
+    while (layerCheckpoints.length) {
+        var last = layerCheckpoints[layerCheckpoints.length - 1];
+        if (last.lines <= lineIndex && last.strokes <= strokeIndex) break;
+        release_checkpoint(layerCheckpoints.pop());
+    }
+}
+
+/**
+ * 距离上一个检查点已提交足够多的笔画时保存一个检查点。
+ * 在提交循环中调用，图层此时与nextLine、nextStroke之前的笔画完全一致
+ */
+function maybe_capture_checkpoint() {
+    if (!use_layer_checkpoints() || dirtyRegion || lazyPaintRegions.length) return;
+    var last = layerCheckpoints[layerCheckpoints.length - 1];
+    var committed = nextLine + nextStroke;
+    if (committed - (last ? last.lines + last.strokes : 0) < CHECKPOINT_INTERVAL) return;
+    var rect = checkpoint_rect();
+    var limit = max_layer_checkpoints(rect);
+    if (!limit) return;
+    // 整层重建时，会被之后的检查点挤出预算的检查点不必保存
+    var pending = (arrays_of_points.length - nextLine) + (strokes.length - nextStroke);
+    if (pending >= CHECKPOINT_INTERVAL * limit) return;
+
+    // 超出预算时丢弃最早的检查点，复用它的画布
+    var reused = null;
+    while (layerCheckpoints.length >= limit) {
+        if (reused) release_checkpoint(reused);
+        reused = layerCheckpoints.shift();
+    }
+    if (reused) checkpointStats.dropped++;
+    var copy = reused ? reused.canvas : document.createElement('canvas');
+    copy.width = rect.width;
+    copy.height = rect.height;
+    copy.getContext('2d').drawImage(committed_canvas, rect.x, rect.y, rect.width, rect.height,
+                                    0, 0, rect.width, rect.height);
+    layerCheckpoints.push({
+        canvas: copy,
+        x: rect.x,
+        y: rect.y,
+        width: rect.width,
+        height: rect.height,
+        range: paintedRange ? { top: paintedRange.top, bottom: paintedRange.bottom } : null,
+        lines: nextLine,
+        strokes: nextStroke
+    });
+    checkpointStats.captured++;
+}
+
+/**
+ * 检查点是否覆盖当前已绘制的范围；视口裁剪下滚动扩展了范围后，旧检查点缺少新露出的笔画
+ */
+function checkpoint_covers_painted_range(checkpoint) {
+    if (!paintedRange) return !checkpoint.range;
+    return !!checkpoint.range && checkpoint.range.top <= paintedRange.top &&
+        checkpoint.range.bottom >= paintedRange.bottom;
+}
+
+/**
+ * 统计局部重绘区域需要重画的笔画数，超过limit即停止
+ */
+function count_region_strokes(region, limit) {
+    var count = 0;
+    var lineCount = Math.min(nextLine, arrays_of_points.length);
+    for (var i = 0; i < lineCount && count <= limit; i++) {
+        if (bounds_intersect(get_line_bounds(arrays_of_points[i]), region)) count++;
+    }
+    var strokeCount = Math.min(nextStroke, strokes.length);
+    for (var i = 0; i < strokeCount && count <= limit; i++) {
+        if (bounds_intersect(get_calligraphy_bounds(strokes[i]), region)) count++;
+    }
+    return count;
+}
+
+/**
+ * 用最近的检查点代替局部重绘：恢复检查点位图，再重放它之后提交的笔画。
+ * 只有重放的笔画少于局部重绘要画的笔画时才这样做
+ * @param {Object} region - 脏区域 {left, top, right, bottom}
+ * @returns {boolean} 已从检查点恢复时返回true，否则调用方按原方式局部重绘
+ */
+function restore_layer_checkpoint(region) {
+    if (!use_layer_checkpoints()) return false;
+    var checkpoint = layerCheckpoints[layerCheckpoints.length - 1];
+    if (!checkpoint || !checkpoint_covers_painted_range(checkpoint)) return false;
+    var replay = (nextLine - checkpoint.lines) + (nextStroke - checkpoint.strokes);
+    if (count_region_strokes(region, replay) <= replay) return false;
+
+    committed_ctx.save();
+    committed_ctx.setTransform(1, 0, 0, 1, 0, 0);
+    committed_ctx.clearRect(0, 0, committed_canvas.width, committed_canvas.height);
+    committed_ctx.drawImage(checkpoint.canvas, checkpoint.x, checkpoint.y);
+    committed_ctx.restore();
+
+    var lineCount = Math.min(nextLine, arrays_of_points.length);
+    for (var i = checkpoint.lines; i < lineCount; i++) {
+        if (is_live_line(i) || !is_in_painted_range(get_line_bounds(arrays_of_points[i]))) continue;
+        draw_committed_line(committed_ctx, i);
+        checkpointStats.replayed++;
+    }
+    var strokeCount = Math.min(nextStroke, strokes.length);
+    for (var i = checkpoint.strokes; i < strokeCount; i++) {
+        if (!is_in_painted_range(get_calligraphy_bounds(strokes[i]))) continue;
+        strokes[i].draw(WEIGHT, committed_ctx);
+        checkpointStats.replayed++;
+    }
+    present_committed_layer();
+    checkpointStats.restores++;
+    return true;
+}
+
+/**
+ * 获取检查点的统计信息，用于诊断
+ */
+function get_checkpoint_stats() {
+    var stats = Object.assign({}, checkpointStats);
+    stats.checkpoints = layerCheckpoints.length;
+    stats.bytes = layerCheckpoints.reduce(function(sum, c) { return sum + c.width * c.height * 4; }, 0);
+    return stats;
+}
@@ -0,0 +1,308 @@
+/**
+ * AnkiDraw 旧笔迹合并为底图
+ * 多次复习后笔画很多的卡片，每次重绘和保存的开销都随笔画数增长。启用后(设置阈值大于0)，
+ * 载入时如果上次保存的笔画数或点数超过阈值，就把这些之前的笔画画成一张PNG图片，
+ * 作为主画布的背景显示；本次复习中新画的笔画仍是可以擦除和撤销的矢量笔画。
+ * 图片和被合并笔画的矢量数据由Python端保存在笔迹文件旁边，"恢复合并的笔迹"会把矢量笔画放回画布。
+ * 只有Python端确认底图已写入后(commit_bake)才从画布上移除被合并的笔画，写入失败时笔画保持不变。
+ */
+
+// 合并阈值(笔画数，由Python端设置)，0表示不合并
+var bakeStrokeThreshold = /*BAKE_THRESHOLD_PLACEHOLDER*/;
+// 点数阈值为笔画数阈值乘以该值，少量很长的笔画也会触发合并
+var BAKE_POINTS_PER_STROKE = 100;
+// 当前显示的底图：{image, left, top, width, height}，CSS像素
+var bakedLayer = null;
+// 当前卡片是否有底图；用户清空画布时隐藏，撤销清空时重新显示
+var hasBakedLayer = false;
+// 本次载入的笔画，只有它们会被合并
+var sessionLoadedLines = new WeakSet();
+var sessionLoadedStrokes = new WeakSet();
+// 本次载入后是否已经合并或恢复过，避免同一次复习中反复处理
+var bakeSessionDone = false;
+// 已发送给Python端、等待确认的合并：{cardId, front, lines, strokes, image, left, top, width, height}
+var pendingBake = null;
+var bakeStats = {
+    baked: 0,   // 合并的笔画数
+    unbaked: 0  // 恢复的笔画数
+};
+
+/**
+ * 载入笔迹后记录本次载入的笔画，并显示或请求底图
+ * @param {boolean} baked - 保存的数据是否带有底图
+ */
+function begin_bake_session(baked) {
+    sessionLoadedLines = new WeakSet(arrays_of_points);
+    sessionLoadedStrokes = new WeakSet(strokes);
+    bakeSessionDone = false;
+    // 之前的卡片或另一面的合并不再适用
+    pendingBake = null;
+    if (baked && currentCardId && typeof pycmd === 'function') {
+        hasBakedLayer = true;
+        // 底图较大，不放在笔迹数据中，由Python端单独发送；显示后再检查是否需要合并
+        pycmd('ankidraw:load_baked_strokes:' + currentCardId);
+    } else {
+        clear_baked_layer();
+        maybe_bake_strokes();
+    }
+}
+
+/**
+ * 把底图设置为主画布的背景，背景色仍在底图之下
+ */
+function apply_baked_background() {
+    if (hasBakedLayer && bakedLayer) {
+        canvas.style.backgroundImage = 'url("' + bakedLayer.image.src + '")';
+        canvas.style.backgroundRepeat = 'no-repeat';
+        canvas.style.backgroundPosition = bakedLayer.left + 'px ' + bakedLayer.top + 'px';
+        canvas.style.backgroundSize = bakedLayer.width + 'px ' + bakedLayer.height + 'px';
+    } else {
+        canvas.style.backgroundImage = '';
+    }
+}
+
+/**
+ * 显示Python端发送的底图
+ * @param {string} cardId - 底图所属的卡片
+ * @param {string} json - {image, left, top, width, height}
+ */
+function show_baked_layer(cardId, json) {
+    if (String(cardId) !== String(currentCardId)) return;
+    var data = JSON.parse(json);
+    var image = new Image();
+    image.onload = function() {
+        if (String(cardId) !== String(currentCardId)) return;
+        bakedLayer = { image: image, left: data.left, top: data.top, width: data.width, height: data.height };
+        apply_baked_background();
+        maybe_bake_strokes();
+    };
+    image.src = data.image;
+}
+
+/**
+ * 移除底图(切换卡片或恢复为矢量笔画时)
+ */
+function clear_baked_layer() {
+    pendingBake = null;
+    bakedLayer = null;
+    hasBakedLayer = false;
+    apply_baked_background();
+}
+
+/**
+ * 显示或隐藏底图，用于清空画布及其撤销
+ */
+function set_baked_layer_visible(visible) {
+    hasBakedLayer = visible && !!bakedLayer;
+    apply_baked_background();
+}
+
+/**
+ * 本次载入的笔画是否超过合并阈值
+ */
+function should_bake_strokes() {
+    if (!(bakeStrokeThreshold > 0) || bakeSessionDone || !currentCardId || typeof pycmd !== 'function') return false;
+    var count = 0, points = 0;
+    for (var i = 0; i < arrays_of_points.length; i++) {
+        if (!sessionLoadedLines.has(arrays_of_points[i])) continue;
+        count++;
+        points += arrays_of_points[i].length;
+    }
+    for (var i = 0; i < strokes.length; i++) {
+        if (is_bakeable_stroke(strokes[i])) count++;
+    }
+    return count > bakeStrokeThreshold || points > bakeStrokeThreshold * BAKE_POINTS_PER_STROKE;
+}
+
+/**
+ * 本次载入、可以画到底图上的书法笔画(没有绘制方法的笔画保持为矢量数据)
+ */
+function is_bakeable_stroke(stroke) {
+    return sessionLoadedStrokes.has(stroke) && typeof stroke.draw === 'function';
+}
+
+/**
+ * 需要时把本次载入的笔画合并到底图
+ */
+function maybe_bake_strokes() {
+    if (should_bake_strokes()) bake_loaded_strokes();
+}
+
+/**
+ * 把本次载入的笔画(连同原有底图)画成一张新的底图，矢量数据交给Python端存档；
+ * 画布上的笔画在Python端确认保存后由commit_bake移除
+ */
+function bake_loaded_strokes() {
+    bakeSessionDone = true;
+    var bakedLines = [];
+    var bounds = bakedLayer && hasBakedLayer ? {
+        left: bakedLayer.left,
+        top: bakedLayer.top,
+        right: bakedLayer.left + bakedLayer.width,
+        bottom: bakedLayer.top + bakedLayer.height
+    } : null;
+    var extend = function(b) {
+        if (!b || !isFinite(b.left)) return;
+        if (!bounds) {
+            bounds = { left: b.left, top: b.top, right: b.right, bottom: b.bottom };
+            return;
+        }
+        bounds.left = Math.min(bounds.left, b.left);
+        bounds.top = Math.min(bounds.top, b.top);
+        bounds.right = Math.max(bounds.right, b.right);
+        bounds.bottom = Math.max(bounds.bottom, b.bottom);
+    };
+    for (var i = 0; i < arrays_of_points.length; i++) {
+        if (sessionLoadedLines.has(arrays_of_points[i]) && !is_live_line(i)) {
+            bakedLines.push(i);
+            extend(get_line_bounds(arrays_of_points[i]));
+        }
+    }
+    var bakedStrokes = strokes.filter(is_bakeable_stroke);
+    bakedStrokes.forEach(function(stroke) { extend(get_calligraphy_bounds(stroke)); });
+    if (!bounds || (!bakedLines.length && !bakedStrokes.length)) return;
+
+    bounds.left = Math.floor(Math.max(0, bounds.left));
+    bounds.top = Math.floor(Math.max(0, bounds.top));
+    var width = Math.max(1, Math.ceil(bounds.right - bounds.left));
+    var height = Math.max(1, Math.ceil(bounds.bottom - bounds.top));
+    // 与已提交图层相同的分辨率限制
+    var scale = compute_render_scale(width, height);
+    var surface = document.createElement('canvas');
+    surface.width = Math.max(1, Math.ceil(width * scale));
+    surface.height = Math.max(1, Math.ceil(height * scale));
+    var surfaceCtx = surface.getContext('2d');
+    surfaceCtx.setTransform(scale, 0, 0, scale, -bounds.left * scale, -bounds.top * scale);
+    surfaceCtx.lineJoin = surfaceCtx.lineCap = 'round';
+    if (bakedLayer && hasBakedLayer) {
+        surfaceCtx.drawImage(bakedLayer.image, bakedLayer.left, bakedLayer.top, bakedLayer.width, bakedLayer.height);
+    }
+    for (var n = 0; n < bakedLines.length; n++) {
+        draw_committed_line(surfaceCtx, bakedLines[n]);
+    }
+    bakedStrokes.forEach(function(stroke) { stroke.draw(WEIGHT, surfaceCtx); });
+    var image = surface.toDataURL('image/png');
+    surface.width = surface.height = 0;
+
+    var archive = {
+        arrays_of_points: lines_to_json(bakedLines.map(function(i) { return arrays_of_points[i]; })),
+        strokes: JSON.parse(JSON.stringify(bakedStrokes))
+    };
+    var side = isQuestionSide ? 'front' : 'all';
+    pendingBake = {
+        cardId: String(currentCardId),
+        front: isQuestionSide,
+        lines: new Set(bakedLines.map(function(i) { return arrays_of_points[i]; })),
+        strokes: new Set(bakedStrokes),
+        image: image,
+        left: bounds.left,
+        top: bounds.top,
+        width: width,
+        height: height
+    };
+    pycmd('ankidraw:save_baked_strokes:' + currentCardId + ':' + side + ':' + JSON.stringify({
+        image: image,
+        left: bounds.left,
+        top: bounds.top,
+        width: width,
+        height: height,
+        // 原有底图已被用户清空时，旧的存档不再需要
+        replace: !hasBakedLayer,
+        archive: archive
+    }));
+}
+
+/**
+ * Python端已保存底图和存档：从画布上移除被合并的笔画，并保存剩下的矢量笔画
+ * @param {string} cardId - 底图所属的卡片
+ * @param {boolean} front - 底图是否属于正面
+ */
+function commit_bake(cardId, front) {
+    var bake = pendingBake;
+    if (!bake || bake.cardId !== String(cardId) || bake.front !== front ||
+        bake.cardId !== String(currentCardId) || front !== isQuestionSide) return;
+    pendingBake = null;
+
+    // 画布上只留下没有合并的笔画(等待确认期间笔画可能有增减，按对象而不是位置匹配)
+    var keptLines = [], keptCache = [], removed = 0;
+    for (var i = 0; i < arrays_of_points.length; i++) {
+        if (bake.lines.has(arrays_of_points[i]) && !is_live_line(i)) {
+            release_line(arrays_of_points[i]);
+            removed++;
+        } else {
+            keptLines.push(arrays_of_points[i]);
+            keptCache.push(perfect_cache[i]);
+        }
+    }
+    if (liveLineIndex >= 0) liveLineIndex = keptLines.indexOf(arrays_of_points[liveLineIndex]);
+    arrays_of_points = keptLines;
+    perfect_cache = keptCache;
+    var keptStrokes = strokes.filter(function(stroke) { return !bake.strokes.has(stroke); });
+    removed += strokes.length - keptStrokes.length;
+    strokes = keptStrokes;
+    reset_line_index();
+    // 被合并的笔画不能再撤销
+    reset_undo_log();
+    ts_undo_button.className = "";
+
+    var layerImage = new Image();
+    layerImage.onload = function() {
+        if (String(cardId) !== String(currentCardId)) return;
+        bakedLayer = { image: layerImage, left: bake.left, top: bake.top, width: bake.width, height: bake.height };
+        hasBakedLayer = true;
+        apply_baked_background();
+    };
+    layerImage.src = bake.image;
+    hasBakedLayer = true;
+    ts_redraw();
+    bakeStats.baked += removed;
+    console.log('AnkiDraw Debug: 已合并', removed, '条旧笔画到底图');
+
+    // 立即保存剩下的矢量笔画，与底图保持一致
+    strokeOperation = 'E';
+    strokesChanged = true;
+    save_strokes();
+}
+
+/**
+ * 把存档中的矢量笔画放回画布(排在当前笔画之前)并移除底图
+ * @param {string} cardId - 存档所属的卡片
+ * @param {string} json - {archive: [{arrays_of_points, strokes}, ...]}，按合并顺序排列
+ */
+function unbake_strokes(cardId, json) {
+    if (String(cardId) !== String(currentCardId) || !hasBakedLayer) return;
+    var data = JSON.parse(json);
+    var lines = [], restoredStrokes = [];
+    (data.archive || []).forEach(function(batch) {
+        lines = lines.concat(batch.arrays_of_points || []);
+        restoredStrokes = restoredStrokes.concat(batch.strokes || []);
+    });
+    stop_drawing();
+    arrays_of_points = store_lines(lines).concat(arrays_of_points);
+    perfect_cache = lines.map(function() { return null; }).concat(perfect_cache);
+    strokes = restoredStrokes.concat(strokes);
+    reset_line_index();
+    reset_undo_log();
+    ts_undo_button.className = "";
+    clear_baked_layer();
+    // 同一次复习中不再合并
+    bakeSessionDone = true;
+    ts_redraw();
+    bakeStats.unbaked += lines.length + restoredStrokes.length;
+
+    // 先保存恢复后的矢量笔画，再删除存档
+    strokeOperation = 'E';
+    strokesChanged = true;
+    save_strokes();
+    pycmd('ankidraw:delete_baked_strokes:' + currentCardId + ':' + (isQuestionSide ? 'front' : 'all'));
+}
+
+/**
+ * 获取底图合并的统计信息，用于诊断
+ */
+function get_bake_stats() {
+    var stats = Object.assign({}, bakeStats);
+    stats.pending = !!pendingBake;
+    stats.layer = hasBakedLayer && bakedLayer ? { width: bakedLayer.width, height: bakedLayer.height } : null;
+    return stats;
+}
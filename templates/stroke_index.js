@@ -0,0 +1,213 @@
+/**
+ * AnkiDraw 笔画空间索引
+ * 把普通笔画、直线和矩形的线段登记到均匀网格中，橡皮擦按点或按框查询时只检查
+ * 附近网格里的笔画和线段，不必遍历所有笔画的所有线段。
+ * 索引以笔画视图为键，与笔画在arrays_of_points中的下标无关：
+ * 新笔画在查询时从数组末尾补登记，删除和撤销恢复由mark_line_removed/mark_line_inserted维护，
+ * 清空和载入时整体重置。
+ * 查询结果需要笔画在数组中的下标，下标由linePositions缓存：删除或插入笔画后只有其后的下标失效，
+ * 下次查询时从失效处重新编号，不必对每个候选笔画搜索整个数组。
+ */
+
+// 网格边长(CSS像素)
+var INDEX_CELL_SIZE = 64;
+// 网格，键为cell_key(列, 行)，值为 Map(笔画视图 -> 经过该网格的线段起点下标)
+var lineIndexCells = new Map();
+// 笔画视图 -> 它登记过的网格键，用于删除
+var lineIndexEntries = new WeakMap();
+// 笔画视图 -> 在arrays_of_points中的下标；arrays_of_points[下标]不是该视图时表示缓存已失效
+var linePositions = new WeakMap();
+// 从该下标起的缓存可能已失效
+var linePositionsFrom = 0;
+var lineIndexStats = {
+    indexed: 0,   // 登记的笔画数
+    removed: 0,   // 移出索引的笔画数
+    queries: 0,   // 查询次数
+    candidates: 0, // 查询返回的候选笔画数
+    renumbered: 0  // 重新编号的笔画数
+};
+
+function cell_key(col, row) {
+    // 列、行限制在±32767以内，合成一个数字键
+    return (col + 32768) * 65536 + (row + 32768);
+}
+
+function cell_of(value) {
+    return Math.max(-32767, Math.min(32767, Math.floor(value / INDEX_CELL_SIZE)));
+}
+
+/**
+ * 登记一条笔画的所有线段；只有一个点的笔画登记该点
+ * @param {Array} points - 笔画视图
+ */
+function index_line(points) {
+    if (lineIndexEntries.has(points)) unindex_line(points);
+    var line = read_line(points);
+    var xy = line.xy;
+    var keys = [];
+    var segmentCount = Math.max(line.count - 1, line.count ? 1 : 0);
+    for (var j = 0; j < segmentCount; j++) {
+        var k = Math.min(j + 1, line.count - 1);
+        var firstCol = cell_of(Math.min(xy[j * 2], xy[k * 2]));
+        var lastCol = cell_of(Math.max(xy[j * 2], xy[k * 2]));
+        var firstRow = cell_of(Math.min(xy[j * 2 + 1], xy[k * 2 + 1]));
+        var lastRow = cell_of(Math.max(xy[j * 2 + 1], xy[k * 2 + 1]));
+        for (var row = firstRow; row <= lastRow; row++) {
+            for (var col = firstCol; col <= lastCol; col++) {
+                var key = cell_key(col, row);
+                var cell = lineIndexCells.get(key);
+                if (!cell) {
+                    cell = new Map();
+                    lineIndexCells.set(key, cell);
+                }
+                var segments = cell.get(points);
+                if (!segments) {
+                    segments = [];
+                    cell.set(points, segments);
+                    keys.push(key);
+                }
+                segments.push(j);
+            }
+        }
+    }
+    lineIndexEntries.set(points, keys);
+    lineIndexStats.indexed++;
+}
+
+/**
+ * 把一条笔画移出索引
+ * @param {Array} points - 笔画视图
+ */
+function unindex_line(points) {
+    var keys = lineIndexEntries.get(points);
+    if (!keys) return;
+    for (var k = 0; k < keys.length; k++) {
+        var cell = lineIndexCells.get(keys[k]);
+        if (!cell) continue;
+        cell.delete(points);
+        if (!cell.size) lineIndexCells.delete(keys[k]);
+    }
+    lineIndexEntries.delete(points);
+    lineIndexStats.removed++;
+}
+
+/**
+ * 清空索引(清空画布或载入笔迹时调用)
+ */
+function reset_line_index() {
+    lineIndexCells = new Map();
+    lineIndexEntries = new WeakMap();
+    linePositions = new WeakMap();
+    linePositionsFrom = 0;
+}
+
+/**
+ * 第i条笔画被删除或插入后，其后笔画的下标都会变化
+ */
+function invalidate_line_positions(i) {
+    linePositionsFrom = Math.min(linePositionsFrom, Math.max(0, i));
+}
+
+/**
+ * 从下标from起重新编号
+ */
+function renumber_lines(from) {
+    for (var i = from; i < arrays_of_points.length; i++) {
+        linePositions.set(arrays_of_points[i], i);
+    }
+    lineIndexStats.renumbered += Math.max(0, arrays_of_points.length - from);
+    linePositionsFrom = arrays_of_points.length;
+}
+
+/**
+ * 笔画在arrays_of_points中的下标，不在数组中时返回-1
+ * @param {Array} points - 笔画视图
+ * @param {Object} state - 同一次查询共用：{full: 是否已经整体重新编号}
+ */
+function line_position(points, state) {
+    var i = linePositions.get(points);
+    if (i !== undefined && arrays_of_points[i] === points) return i;
+    if (linePositionsFrom < arrays_of_points.length) {
+        renumber_lines(linePositionsFrom);
+        i = linePositions.get(points);
+        if (i !== undefined && arrays_of_points[i] === points) return i;
+    }
+    // 没有经过mark_line_removed/mark_line_inserted的修改，每次查询最多整体重新编号一次
+    if (!state.full) {
+        state.full = true;
+        renumber_lines(0);
+        i = linePositions.get(points);
+        if (i !== undefined && arrays_of_points[i] === points) return i;
+    }
+    return -1;
+}
+
+/**
+ * 登记尚未进入索引的新笔画。新笔画总是追加在数组末尾，从末尾向前遇到已登记的笔画即可停止；
+ * 正在书写的笔画还会变化，暂不登记
+ */
+function sync_line_index() {
+    for (var i = arrays_of_points.length - 1; i >= 0; i--) {
+        var points = arrays_of_points[i];
+        if (lineIndexEntries.has(points)) break;
+        if (is_live_line(i)) continue;
+        index_line(points);
+        linePositions.set(points, i);
+    }
+}
+
+/**
+ * 查询与区域相交的网格中登记的笔画
+ * @param {Object} area - {left, top, right, bottom}
+ * @returns {Array} [{index, points, segments}]，按下标从大到小(从上层到下层)排列；
+ *     segments为经过这些网格的线段起点下标，可能有重复
+ */
+function query_line_index(area) {
+    sync_line_index();
+    var found = new Map();
+    var firstCol = cell_of(area.left), lastCol = cell_of(area.right);
+    var firstRow = cell_of(area.top), lastRow = cell_of(area.bottom);
+    for (var row = firstRow; row <= lastRow; row++) {
+        for (var col = firstCol; col <= lastCol; col++) {
+            var cell = lineIndexCells.get(cell_key(col, row));
+            if (!cell) continue;
+            cell.forEach(function(segments, points) {
+                var known = found.get(points);
+                found.set(points, known ? known.concat(segments) : segments);
+            });
+        }
+    }
+    var result = [];
+    var stale = [];
+    var positionState = { full: false };
+    found.forEach(function(segments, points) {
+        var index = line_position(points, positionState);
+        if (index < 0) {
+            // 没有经过mark_line_removed就被移除的笔画
+            stale.push(points);
+            return;
+        }
+        result.push({ index: index, points: points, segments: segments });
+    });
+    for (var s = 0; s < stale.length; s++) unindex_line(stale[s]);
+    result.sort(function(a, b) { return b.index - a.index; });
+    lineIndexStats.queries++;
+    lineIndexStats.candidates += result.length;
+    return result;
+}
+
+/**
+ * 查询点(x, y)附近radius范围内的笔画
+ */
+function query_lines_near(x, y, radius) {
+    return query_line_index({ left: x - radius, top: y - radius, right: x + radius, bottom: y + radius });
+}
+
+/**
+ * 获取空间索引的统计信息，用于诊断
+ */
+function get_line_index_stats() {
+    var stats = Object.assign({}, lineIndexStats);
+    stats.cells = lineIndexCells.size;
+    return stats;
+}
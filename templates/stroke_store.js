@@ -0,0 +1,765 @@
+/**
+ * AnkiDraw 笔画存储
+ * 普通笔画、直线和矩形的坐标集中保存在可增长的Float32Array中，每条笔画在偏移量、
+ * 点数和容量表中各占一项，颜色、线宽和样式按笔画保存一次。
+ * 这样长时间书写不会产生成千上万个[x, y, color, width]小数组，GC压力和内存占用都更小。
+ *
+ * arrays_of_points中的元素是笔画的视图(Proxy)：旧代码仍可按 points[j][0]、points.length、
+ * points.push(...) 的方式使用，读取某个点时临时生成点数组。
+ * 渲染、橡皮擦命中检测和序列化通过read_line等函数直接读取坐标缓冲区。
+ */
+
+// 坐标缓冲区：x0, y0, x1, y1, ...
+var strokeCoords = new Float32Array(8192);
+// 已分配的坐标数(浮点数个数)，新笔画追加在末尾
+var strokeCoordsUsed = 0;
+// 已释放但尚未回收的坐标数，超过一半时整理缓冲区
+var strokeCoordsReleased = 0;
+// 每条笔画(槽位)的起始偏移(浮点数下标)、点数和容量(点数)
+var strokeOffsets = new Int32Array(256);
+var strokeLengths = new Int32Array(256);
+var strokeCapacities = new Int32Array(256);
+// 每条笔画的颜色、线宽，以及直线和矩形的样式信息
+var strokeColors = [];
+var strokeWidths = new Float32Array(256);
+var strokeStyles = [];
+var strokeSlotCount = 0;
+var freeStrokeSlots = [];
+// 清空存储时递增，之前创建的视图随之失效
+var strokeStoreGeneration = 1;
+// 正在书写的笔画预留的容量(点数)，避免每次追加都移动数据
+var LIVE_LINE_CAPACITY = 64;
+// 视图到其Proxy目标的映射，目标上记录槽位和创建时的存储代数
+var lineViewTargets = new WeakMap();
+
+var strokeStoreStats = {
+    stored: 0,      // 存入的笔画数
+    released: 0,    // 释放的笔画数
+    relocations: 0, // 笔画因容量不足被移动到缓冲区末尾的次数
+    compactions: 0, // 整理缓冲区的次数
+    grows: 0        // 缓冲区扩容次数
+};
+
+/**
+ * 获取视图对应的槽位
+ * @param {Array} points - 笔画视图
+ * @returns {number} 槽位，普通数组或已失效的视图返回-1
+ */
+function line_slot(points) {
+    var target = lineViewTargets.get(points);
+    if (!target || target.generation !== strokeStoreGeneration) return -1;
+    return target.slot;
+}
+
+/**
+ * 确保坐标缓冲区还能追加extra个浮点数
+ */
+function ensure_coord_capacity(extra) {
+    var needed = strokeCoordsUsed + extra;
+    if (needed <= strokeCoords.length) return;
+    var grown = new Float32Array(Math.max(needed, strokeCoords.length * 2));
+    grown.set(strokeCoords.subarray(0, strokeCoordsUsed));
+    strokeCoords = grown;
+    strokeStoreStats.grows++;
+}
+
+function grow_int_table(table, size) {
+    var grown = new table.constructor(size);
+    grown.set(table);
+    return grown;
+}
+
+/**
+ * 分配一个槽位以及capacity个点的坐标空间
+ */
+function allocate_line_slot(capacity) {
+    var slot;
+    if (freeStrokeSlots.length) {
+        slot = freeStrokeSlots.pop();
+    } else {
+        slot = strokeSlotCount++;
+        if (slot >= strokeOffsets.length) {
+            var size = strokeOffsets.length * 2;
+            strokeOffsets = grow_int_table(strokeOffsets, size);
+            strokeLengths = grow_int_table(strokeLengths, size);
+            strokeCapacities = grow_int_table(strokeCapacities, size);
+            strokeWidths = grow_int_table(strokeWidths, size);
+        }
+    }
+    ensure_coord_capacity(capacity * 2);
+    strokeOffsets[slot] = strokeCoordsUsed;
+    strokeLengths[slot] = 0;
+    strokeCapacities[slot] = capacity;
+    strokeCoordsUsed += capacity * 2;
+    return slot;
+}
+
+/**
+ * 为槽位腾出至少count个点的空间。笔画位于缓冲区末尾时原地扩展，否则移动到末尾
+ */
+function reserve_line_points(slot, count) {
+    if (count <= strokeCapacities[slot]) return;
+    var offset = strokeOffsets[slot];
+    var capacity = Math.max(count, strokeCapacities[slot] * 2);
+    if (offset + strokeCapacities[slot] * 2 === strokeCoordsUsed) {
+        ensure_coord_capacity((capacity - strokeCapacities[slot]) * 2);
+        strokeCoordsUsed = offset + capacity * 2;
+    } else {
+        ensure_coord_capacity(capacity * 2);
+        strokeCoords.copyWithin(strokeCoordsUsed, offset, offset + strokeLengths[slot] * 2);
+        strokeCoordsReleased += strokeCapacities[slot] * 2;
+        strokeOffsets[slot] = strokeCoordsUsed;
+        strokeCoordsUsed += capacity * 2;
+        strokeStoreStats.relocations++;
+    }
+    strokeCapacities[slot] = capacity;
+}
+
+/**
+ * 为槽位创建视图
+ */
+function create_line_view(slot) {
+    var target = [];
+    target.slot = slot;
+    target.generation = strokeStoreGeneration;
+    var view = new Proxy(target, lineViewHandler);
+    lineViewTargets.set(view, target);
+    strokeStoreStats.stored++;
+    return view;
+}
+
+/**
+ * 开始一条新的手写笔画，预留书写过程中追加点的空间
+ * @returns {Array} 笔画视图
+ */
+function begin_line(x, y, strokeColor, strokeWidth) {
+    var slot = allocate_line_slot(LIVE_LINE_CAPACITY);
+    strokeColors[slot] = strokeColor;
+    strokeWidths[slot] = strokeWidth;
+    strokeStyles[slot] = null;
+    strokeCoords[strokeOffsets[slot]] = x;
+    strokeCoords[strokeOffsets[slot] + 1] = y;
+    strokeLengths[slot] = 1;
+    return create_line_view(slot);
+}
+
+/**
+ * 把点数组形式的笔画存入缓冲区；已经是视图的笔画原样返回
+ * 颜色、线宽和样式取自第一个点
+ * @param {Array} points - [[x, y, color, width, styleInfo?], ...]
+ * @returns {Array} 笔画视图
+ */
+function store_line(points) {
+    if (line_slot(points) >= 0) return points;
+    var count = points.length;
+    var slot = allocate_line_slot(Math.max(count, 1));
+    var first = points[0] || [];
+    strokeColors[slot] = first[2];
+    strokeWidths[slot] = first[3] || 0;
+    strokeStyles[slot] = first[4] || null;
+    var offset = strokeOffsets[slot];
+    for (var j = 0; j < count; j++) {
+        strokeCoords[offset + j * 2] = points[j][0];
+        strokeCoords[offset + j * 2 + 1] = points[j][1];
+    }
+    strokeLengths[slot] = count;
+    return create_line_view(slot);
+}
+
+/**
+ * 把坐标数据存为一条新笔画(例如部分擦除后剩下的一段)
+ * @param {Float32Array} xy - x0, y0, x1, y1, ...
+ * @returns {Array} 笔画视图
+ */
+function store_line_xy(xy, strokeColor, strokeWidth, style) {
+    var count = xy.length / 2;
+    var slot = allocate_line_slot(Math.max(count, 1));
+    strokeColors[slot] = strokeColor;
+    strokeWidths[slot] = strokeWidth || 0;
+    strokeStyles[slot] = style || null;
+    strokeCoords.set(xy, strokeOffsets[slot]);
+    strokeLengths[slot] = count;
+    return create_line_view(slot);
+}
+
+/**
+ * 把一组点数组形式的笔画存入缓冲区
+ * @param {Array} lines - 笔画列表
+ * @returns {Array} 视图列表
+ */
+function store_lines(lines) {
+    var result = new Array(lines.length);
+    for (var i = 0; i < lines.length; i++) {
+        result[i] = store_line(lines[i] || []);
+    }
+    return result;
+}
+
+/**
+ * 向笔画末尾追加一个点
+ * @param {Array} points - 笔画视图
+ */
+function line_push_point(points, x, y) {
+    var slot = line_slot(points);
+    if (slot < 0) {
+        points.push([x, y, color, line_width]);
+        return;
+    }
+    var count = strokeLengths[slot];
+    reserve_line_points(slot, count + 1);
+    var offset = strokeOffsets[slot] + count * 2;
+    strokeCoords[offset] = x;
+    strokeCoords[offset + 1] = y;
+    strokeLengths[slot] = count + 1;
+}
+
+/**
+ * 就地删除笔画中的点(视图本身不变，缓存和撤销记录仍指向同一个视图)
+ * @param {Array} points - 笔画视图
+ * @param {Uint8Array} keep - 每个点是否保留
+ * @returns {number} 保留的点数
+ */
+function filter_line_points(points, keep) {
+    var slot = line_slot(points);
+    var count = 0;
+    if (slot < 0) {
+        for (var j = 0; j < points.length; j++) {
+            if (keep[j]) points[count++] = points[j];
+        }
+        points.length = count;
+        return count;
+    }
+    var offset = strokeOffsets[slot];
+    for (var j = 0; j < strokeLengths[slot]; j++) {
+        if (!keep[j]) continue;
+        strokeCoords[offset + count * 2] = strokeCoords[offset + j * 2];
+        strokeCoords[offset + count * 2 + 1] = strokeCoords[offset + j * 2 + 1];
+        count++;
+    }
+    strokeLengths[slot] = count;
+    return count;
+}
+
+/**
+ * 笔画完成后归还预留但未使用的空间
+ * @param {Array} points - 笔画视图
+ */
+function seal_line(points) {
+    var slot = line_slot(points);
+    if (slot < 0) return;
+    var count = Math.max(strokeLengths[slot], 1);
+    var offset = strokeOffsets[slot];
+    if (offset + strokeCapacities[slot] * 2 === strokeCoordsUsed) {
+        strokeCoordsUsed = offset + count * 2;
+    } else {
+        strokeCoordsReleased += (strokeCapacities[slot] - count) * 2;
+    }
+    strokeCapacities[slot] = count;
+}
+
+/**
+ * 释放一条不再被任何地方引用的笔画(例如被撤销的新笔画)
+ * 被橡皮擦删除的笔画仍保存在撤销记录中，不能释放
+ * @param {Array} points - 笔画视图
+ */
+function release_line(points) {
+    var slot = line_slot(points);
+    if (slot < 0) return;
+    lineViewTargets.get(points).generation = 0;
+    strokeCoordsReleased += strokeCapacities[slot] * 2;
+    strokeLengths[slot] = strokeCapacities[slot] = 0;
+    strokeColors[slot] = strokeStyles[slot] = null;
+    freeStrokeSlots.push(slot);
+    strokeStoreStats.released++;
+    if (strokeCoordsReleased > 65536 && strokeCoordsReleased * 2 > strokeCoordsUsed) {
+        compact_stroke_store();
+    }
+}
+
+/**
+ * 整理缓冲区：把仍在使用的笔画依次复制到新的缓冲区，回收已释放的空间
+ */
+function compact_stroke_store() {
+    var live = strokeCoordsUsed - strokeCoordsReleased;
+    var compacted = new Float32Array(Math.max(8192, live * 2));
+    var used = 0;
+    var free = new Set(freeStrokeSlots);
+    for (var slot = 0; slot < strokeSlotCount; slot++) {
+        if (free.has(slot)) continue;
+        var offset = strokeOffsets[slot];
+        compacted.set(strokeCoords.subarray(offset, offset + strokeLengths[slot] * 2), used);
+        strokeOffsets[slot] = used;
+        strokeCapacities[slot] = strokeLengths[slot];
+        used += strokeLengths[slot] * 2;
+    }
+    strokeCoords = compacted;
+    strokeCoordsUsed = used;
+    strokeCoordsReleased = 0;
+    strokeStoreStats.compactions++;
+}
+
+/**
+ * 清空存储，之前创建的所有视图失效(清空画布或载入其他卡片的笔迹时调用)
+ */
+function reset_stroke_store() {
+    strokeStoreGeneration++;
+    strokeCoordsUsed = strokeCoordsReleased = 0;
+    strokeSlotCount = 0;
+    freeStrokeSlots = [];
+    strokeColors = [];
+    strokeStyles = [];
+    if (strokeCoords.length > 65536) strokeCoords = new Float32Array(8192);
+}
+
+/**
+ * 读取笔画的坐标和样式
+ * @param {Array} points - 笔画视图，也接受普通点数组(例如Worker中或尚未存入的数据)
+ * @returns {Object} {xy, count, color, width, style}，xy为x0, y0, x1, y1, ...
+ *     视图返回的xy直接引用缓冲区，只能在下次追加点之前使用
+ */
+function read_line(points) {
+    var slot = line_slot(points);
+    if (slot >= 0) {
+        var offset = strokeOffsets[slot];
+        var count = strokeLengths[slot];
+        return {
+            xy: strokeCoords.subarray(offset, offset + count * 2),
+            count: count,
+            color: strokeColors[slot],
+            width: strokeWidths[slot],
+            style: strokeStyles[slot]
+        };
+    }
+    var xy = new Float32Array(points.length * 2);
+    for (var j = 0; j < points.length; j++) {
+        xy[j * 2] = points[j][0];
+        xy[j * 2 + 1] = points[j][1];
+    }
+    var first = points[0] || [];
+    return { xy: xy, count: points.length, color: first[2], width: first[3] || 0, style: first[4] || null };
+}
+
+/**
+ * 生成视图中第j个点的数组，供旧代码使用
+ */
+function line_point(slot, j) {
+    var offset = strokeOffsets[slot] + j * 2;
+    var point = [strokeCoords[offset], strokeCoords[offset + 1], strokeColors[slot], strokeWidths[slot]];
+    if (strokeStyles[slot]) point.push(strokeStyles[slot]);
+    return point;
+}
+
+/**
+ * 数组下标形式的属性名转换为数字，其他属性返回-1
+ */
+function view_index(key) {
+    if (typeof key !== 'string' || !key.length) return -1;
+    var code = key.charCodeAt(0);
+    if (code < 48 || code > 57) return -1;
+    var index = Number(key);
+    return index === Math.floor(index) ? index : -1;
+}
+
+function view_length(target) {
+    return target.generation === strokeStoreGeneration ? strokeLengths[target.slot] : 0;
+}
+
+/**
+ * 视图的行为与点数组相同：读取下标得到点数组，写入下标修改坐标，写入length截断笔画
+ */
+var lineViewHandler = {
+    get: function(target, key, receiver) {
+        if (key === 'length') return view_length(target);
+        var index = view_index(key);
+        if (index >= 0) {
+            return index < view_length(target) ? line_point(target.slot, index) : undefined;
+        }
+        return Reflect.get(target, key, receiver);
+    },
+    set: function(target, key, value, receiver) {
+        var count = view_length(target);
+        if (target.generation !== strokeStoreGeneration) return true;
+        var slot = target.slot;
+        if (key === 'length') {
+            if (value < count) strokeLengths[slot] = Math.max(0, value);
+            return true;
+        }
+        var index = view_index(key);
+        if (index < 0) return Reflect.set(target, key, value, receiver);
+        if (index > count) return true;
+        if (index === count) {
+            reserve_line_points(slot, count + 1);
+            strokeLengths[slot] = count + 1;
+        }
+        var offset = strokeOffsets[slot] + index * 2;
+        strokeCoords[offset] = value[0];
+        strokeCoords[offset + 1] = value[1];
+        if (index === 0) {
+            strokeColors[slot] = value[2];
+            strokeWidths[slot] = value[3] || 0;
+            strokeStyles[slot] = value[4] || null;
+        }
+        return true;
+    },
+    has: function(target, key) {
+        var index = view_index(key);
+        if (index >= 0) return index < view_length(target);
+        return Reflect.has(target, key);
+    },
+    deleteProperty: function(target, key) {
+        return view_index(key) >= 0 || Reflect.deleteProperty(target, key);
+    }
+};
+
+function round_coord(value) {
+    return Math.round(value * 100) / 100;
+}
+
+/**
+ * 转换为保存用的点数组格式，坐标保留两位小数(与Float32精度相当，避免JSON中出现过长的小数)
+ * @param {Array} lines - 笔画视图或点数组的列表
+ * @returns {Array} [[[x, y, color, width, styleInfo?], ...], ...]
+ */
+function lines_to_json(lines) {
+    var result = new Array(lines.length);
+    for (var i = 0; i < lines.length; i++) {
+        var line = read_line(lines[i]);
+        var points = new Array(line.count);
+        for (var j = 0; j < line.count; j++) {
+            points[j] = [round_coord(line.xy[j * 2]), round_coord(line.xy[j * 2 + 1]), line.color, line.width];
+            if (line.style) points[j].push(line.style);
+        }
+        result[i] = points;
+    }
+    return result;
+}
+
+/**
+ * 点到笔画各线段的最短距离，距离小于limit时提前返回
+ * @param {Array} points - 笔画视图
+ * @param {Array} [segments] - 只检查这些线段(起点下标)，省略时检查全部线段
+ * @returns {number} 最短距离，只有一个点的笔画没有线段，返回Infinity
+ */
+function line_min_distance(points, x, y, limit, segments) {
+    var line = read_line(points);
+    var xy = line.xy;
+    var best = Infinity;
+    var total = segments ? segments.length : line.count - 1;
+    for (var s = 0; s < total; s++) {
+        var j = segments ? segments[s] : s;
+        if (j + 1 >= line.count) continue;
+        var d = segment_distance(x, y, xy[j * 2], xy[j * 2 + 1], xy[j * 2 + 2], xy[j * 2 + 3]);
+        if (d < best) {
+            best = d;
+            if (best < limit) break;
+        }
+    }
+    return best;
+}
+
+/**
+ * 线段(ax, ay)-(bx, by)到笔画各线段的最短距离，即以该线段为轴的胶囊体检测，
+ * 用于橡皮擦在两次事件之间扫过的路径；距离小于limit时提前返回
+ * @param {Array} points - 笔画视图
+ * @param {Array} [segments] - 只检查这些线段(起点下标)，省略时检查全部线段
+ * @returns {number} 最短距离，只有一个点的笔画没有线段，返回Infinity
+ */
+function line_sweep_distance(points, ax, ay, bx, by, limit, segments) {
+    var line = read_line(points);
+    var xy = line.xy;
+    var best = Infinity;
+    var total = segments ? segments.length : line.count - 1;
+    for (var s = 0; s < total; s++) {
+        var j = segments ? segments[s] : s;
+        if (j + 1 >= line.count) continue;
+        var d = segment_segment_distance(ax, ay, bx, by, xy[j * 2], xy[j * 2 + 1], xy[j * 2 + 2], xy[j * 2 + 3]);
+        if (d < best) {
+            best = d;
+            if (best < limit) break;
+        }
+    }
+    return best;
+}
+
+/**
+ * 线段(px, py)-(qx, qy)上落在以(ax, ay)-(bx, by)为轴、radius为半径的胶囊体内的参数区间
+ * 点到胶囊轴的距离沿线段是凸函数：先三分找到最近点，再分别二分两侧的边界
+ * @returns {Array|null} [t0, t1]，0 <= t0 <= t1 <= 1；不相交时返回null
+ */
+function capsule_interval(px, py, qx, qy, ax, ay, bx, by, radius) {
+    var dx = qx - px, dy = qy - py;
+    function distance_at(t) {
+        return segment_distance(px + dx * t, py + dy * t, ax, ay, bx, by);
+    }
+    var lo = 0, hi = 1;
+    for (var k = 0; k < 40; k++) {
+        var m1 = lo + (hi - lo) / 3, m2 = hi - (hi - lo) / 3;
+        if (distance_at(m1) < distance_at(m2)) hi = m2;
+        else lo = m1;
+    }
+    var tMin = (lo + hi) / 2;
+    if (distance_at(tMin) >= radius) return null;
+    var t0 = 0, t1 = 1;
+    if (distance_at(0) >= radius) {
+        var outside = 0, inside = tMin;
+        for (var k = 0; k < 30; k++) {
+            var mid = (outside + inside) / 2;
+            if (distance_at(mid) < radius) inside = mid;
+            else outside = mid;
+        }
+        t0 = inside;
+    }
+    if (distance_at(1) >= radius) {
+        var inside = tMin, outside = 1;
+        for (var k = 0; k < 30; k++) {
+            var mid = (outside + inside) / 2;
+            if (distance_at(mid) < radius) inside = mid;
+            else outside = mid;
+        }
+        t1 = inside;
+    }
+    return [t0, t1];
+}
+
+/**
+ * 按橡皮擦扫过的路径切开笔画，被擦到的部分在橡皮擦边界处断开
+ * @param {Array} points - 笔画视图
+ * @param {Array} path - 扫掠线段，x1, y1, x2, y2, ...
+ * @param {number} radius - 橡皮擦半径
+ * @param {Set} [segments] - 只检查这些线段(来自空间索引)，省略时检查全部线段
+ * @returns {Array|null} 剩下的各段坐标(Float32Array)，可能为空数组；笔画没有被擦到时返回null
+ */
+function split_line_by_path(points, path, radius, segments) {
+    var line = read_line(points);
+    var xy = line.xy;
+    if (line.count === 1) {
+        for (var k = 0; k < path.length; k += 4) {
+            if (segment_distance(xy[0], xy[1], path[k], path[k + 1], path[k + 2], path[k + 3]) < radius) return [];
+        }
+        return null;
+    }
+    
+    var pieces = [];
+    var piece = [];
+    var touched = false;
+    for (var j = 0; j + 1 < line.count; j++) {
+        var px = xy[j * 2], py = xy[j * 2 + 1], qx = xy[j * 2 + 2], qy = xy[j * 2 + 3];
+        // 该线段落在橡皮擦内的区间，按起点排序后依次跳过
+        var intervals = [];
+        if (!segments || segments.has(j)) {
+            for (var k = 0; k < path.length; k += 4) {
+                var interval = capsule_interval(px, py, qx, qy, path[k], path[k + 1], path[k + 2], path[k + 3], radius);
+                if (interval) intervals.push(interval);
+            }
+            intervals.sort(function(a, b) { return a[0] - b[0]; });
+        }
+        var cursor = 0;
+        for (var n = 0; n < intervals.length; n++) {
+            touched = true;
+            if (intervals[n][0] > cursor) {
+                if (!piece.length) piece.push(px + (qx - px) * cursor, py + (qy - py) * cursor);
+                piece.push(px + (qx - px) * intervals[n][0], py + (qy - py) * intervals[n][0]);
+                pieces.push(piece);
+                piece = [];
+            } else if (!n && piece.length) {
+                // 线段起点就在橡皮擦内，当前这一段在起点处结束
+                pieces.push(piece);
+                piece = [];
+            }
+            cursor = Math.max(cursor, intervals[n][1]);
+        }
+        if (cursor < 1) {
+            if (!piece.length) piece.push(px + (qx - px) * cursor, py + (qy - py) * cursor);
+            piece.push(qx, qy);
+        }
+    }
+    if (!touched) return null;
+    pieces.push(piece);
+    
+    // 去掉只剩一个点或短于1像素的碎片
+    var result = [];
+    for (var n = 0; n < pieces.length; n++) {
+        var coords = pieces[n];
+        var length = 0;
+        for (var k = 2; k < coords.length; k += 2) {
+            length += Math.hypot(coords[k] - coords[k - 2], coords[k + 1] - coords[k - 1]);
+        }
+        if (coords.length >= 4 && length >= 1) result.push(new Float32Array(coords));
+    }
+    return result;
+}
+
+/**
+ * 判断笔画的任一点在矩形内，或任一线段与矩形相交
+ * @param {Array} points - 笔画视图
+ */
+function line_in_rect(points, left, top, right, bottom) {
+    var line = read_line(points);
+    var xy = line.xy;
+    for (var j = 0; j < line.count; j++) {
+        var x = xy[j * 2], y = xy[j * 2 + 1];
+        if (x >= left && x <= right && y >= top && y <= bottom) return true;
+    }
+    for (var j = 0; j + 1 < line.count; j++) {
+        if (segment_intersects_rect(xy[j * 2], xy[j * 2 + 1], xy[j * 2 + 2], xy[j * 2 + 3],
+                                    left, top, right, bottom)) {
+            return true;
+        }
+    }
+    return false;
+}
+
+/**
+ * 点(px, py)到线段(ax, ay)-(bx, by)的距离
+ */
+function segment_distance(px, py, ax, ay, bx, by) {
+    var dx = bx - ax, dy = by - ay;
+    var lengthSq = dx * dx + dy * dy;
+    var t = lengthSq === 0 ? 0 : ((px - ax) * dx + (py - ay) * dy) / lengthSq;
+    if (t < 0) t = 0;
+    else if (t > 1) t = 1;
+    var ex = px - (ax + t * dx), ey = py - (ay + t * dy);
+    return Math.sqrt(ex * ex + ey * ey);
+}
+
+/**
+ * 两条线段之间的最短距离，相交时为0
+ */
+function segment_segment_distance(ax, ay, bx, by, cx, cy, dx, dy) {
+    var d1 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx);
+    var d2 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx);
+    var d3 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax);
+    var d4 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax);
+    if (((d1 > 0 && d2 < 0) || (d1 < 0 && d2 > 0)) && ((d3 > 0 && d4 < 0) || (d3 < 0 && d4 > 0))) {
+        return 0;
+    }
+    return Math.min(
+        segment_distance(ax, ay, cx, cy, dx, dy),
+        segment_distance(bx, by, cx, cy, dx, dy),
+        segment_distance(cx, cy, ax, ay, bx, by),
+        segment_distance(dx, dy, ax, ay, bx, by)
+    );
+}
+
+/**
+ * 线段是否与矩形相交(Liang–Barsky裁剪)
+ */
+function segment_intersects_rect(ax, ay, bx, by, left, top, right, bottom) {
+    var t0 = 0, t1 = 1;
+    var dx = bx - ax, dy = by - ay;
+    var p = [-dx, dx, -dy, dy];
+    var q = [ax - left, right - ax, ay - top, bottom - ay];
+    for (var k = 0; k < 4; k++) {
+        if (p[k] === 0) {
+            if (q[k] < 0) return false;
+            continue;
+        }
+        var r = q[k] / p[k];
+        if (p[k] < 0) {
+            if (r > t1) return false;
+            if (r > t0) t0 = r;
+        } else {
+            if (r < t0) return false;
+            if (r < t1) t1 = r;
+        }
+    }
+    return true;
+}
+
+// 书法笔画 -> 各段控制点的坐标(Float32Array)，载入或首次查询时规整一次
+var calligraphyPointCache = new WeakMap();
+
+/**
+ * 读取书法笔画各段的控制点坐标，[x, y]和{x, y}两种点格式在这里统一
+ * @param {Stroke} stroke - 书法笔画
+ * @returns {Array} 每段一个Float32Array，x0, y0, x1, y1, ...
+ */
+function read_calligraphy_points(stroke) {
+    var cached = calligraphyPointCache.get(stroke);
+    if (cached) return cached;
+    cached = [];
+    var segments = stroke.segments || [];
+    for (var s = 0; s < segments.length; s++) {
+        var controlPoints = segments[s].controlPoints || [];
+        var xy = new Float32Array(controlPoints.length * 2);
+        for (var j = 0; j < controlPoints.length; j++) {
+            var p = controlPoints[j];
+            xy[j * 2] = Array.isArray(p) ? p[0] : p.x;
+            xy[j * 2 + 1] = Array.isArray(p) ? p[1] : p.y;
+        }
+        cached.push(xy);
+    }
+    calligraphyPointCache.set(stroke, cached);
+    return cached;
+}
+
+/**
+ * 点到书法笔画控制点折线的最短距离，距离小于limit时提前返回
+ * @param {Stroke} stroke - 书法笔画
+ */
+function calligraphy_min_distance(stroke, x, y, limit) {
+    var parts = read_calligraphy_points(stroke);
+    var best = Infinity;
+    for (var s = 0; s < parts.length; s++) {
+        var xy = parts[s];
+        for (var j = 0; j + 3 < xy.length; j += 2) {
+            var d = segment_distance(x, y, xy[j], xy[j + 1], xy[j + 2], xy[j + 3]);
+            if (d < best) {
+                best = d;
+                if (best < limit) return best;
+            }
+        }
+    }
+    return best;
+}
+
+/**
+ * 线段(ax, ay)-(bx, by)到书法笔画控制点折线的最短距离，距离小于limit时提前返回
+ * @param {Stroke} stroke - 书法笔画
+ */
+function calligraphy_sweep_distance(stroke, ax, ay, bx, by, limit) {
+    var parts = read_calligraphy_points(stroke);
+    var best = Infinity;
+    for (var s = 0; s < parts.length; s++) {
+        var xy = parts[s];
+        for (var j = 0; j + 3 < xy.length; j += 2) {
+            var d = segment_segment_distance(ax, ay, bx, by, xy[j], xy[j + 1], xy[j + 2], xy[j + 3]);
+            if (d < best) {
+                best = d;
+                if (best < limit) return best;
+            }
+        }
+    }
+    return best;
+}
+
+/**
+ * 判断书法笔画的任一控制点在矩形内，或控制点折线与矩形相交
+ * @param {Stroke} stroke - 书法笔画
+ */
+function calligraphy_in_rect(stroke, left, top, right, bottom) {
+    var parts = read_calligraphy_points(stroke);
+    for (var s = 0; s < parts.length; s++) {
+        var xy = parts[s];
+        for (var j = 0; j + 1 < xy.length; j += 2) {
+            if (xy[j] >= left && xy[j] <= right && xy[j + 1] >= top && xy[j + 1] <= bottom) return true;
+            if (j + 3 < xy.length &&
+                segment_intersects_rect(xy[j], xy[j + 1], xy[j + 2], xy[j + 3], left, top, right, bottom)) {
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
+/**
+ * 获取笔画存储的统计信息，用于诊断
+ */
+function get_stroke_store_stats() {
+    var stats = Object.assign({}, strokeStoreStats);
+    stats.slots = strokeSlotCount - freeStrokeSlots.length;
+    stats.coordsUsed = strokeCoordsUsed;
+    stats.coordsReleased = strokeCoordsReleased;
+    stats.bufferBytes = strokeCoords.byteLength;
+    return stats;
+}
@@ -0,0 +1,512 @@
+/**
+ * AnkiDraw 撤销/重做操作日志
+ * 每次修改笔迹都记录为一条操作，撤销和重做分别执行它的逆操作和操作本身：
+ *   add   - 新增一条笔画(普通笔画、直线、矩形或书法笔画)
+ *   erase - 橡皮擦一次删除的一批笔画
+ *   split - 精确擦除一次切开的一批笔画
+ *   clear - 清空画布
+ * 撤销新增的笔画只需从数组末尾取出，擦除只移动被擦到的笔画，重绘范围由mark_*函数记录。
+ * 日志中保留的笔画数据超过内存上限时丢弃最早的操作，并归还它们独占的坐标空间。
+ * 日志的位置同时决定是否需要保存：撤销后再重做回到已保存的状态时不会重复保存。
+ * 上次保存以来执行、撤销和重做的操作同时记入保存日志，保存时转换为对笔迹文件的插入/删除补丁，
+ * 只发送变化的笔画；载入、合并底图等不经过操作日志的修改之后改为保存完整数据。
+ */
+
+// 撤销/重做记录可以占用的内存上限(MB)，0表示不限制
+var undoMemoryLimit = /*UNDO_MEMORY_PLACEHOLDER*/;
+// 每条操作本身的估算开销(字节)
+var UNDO_OPERATION_BYTES = 64;
+var undoLog = [];
+var redoLog = [];
+// 两个日志中所有操作的估算内存(字节)
+var undoLogBytes = 0;
+// 操作编号，保存时记录当时位于撤销日志顶部的操作编号
+var nextOperationId = 1;
+var savedOperationId = 0;
+// 上次保存以来的变化：[{op, undone, index, counts}]，为null时下次保存必须写入完整数据
+var saveJournal = null;
+// 上次保存时的笔画数，Python端据此确认文件与页面一致
+var saveBase = null;
+// 保存日志可能还引用的笔画，离开日志的操作等到下次保存后再归还坐标空间：[{op, undone}]
+var deferredReleases = [];
+var undoLogStats = {
+    recorded: 0, // 记录的操作数
+    undone: 0,   // 撤销次数
+    redone: 0,   // 重做次数
+    dropped: 0   // 超过内存上限被丢弃的操作数
+};
+
+/**
+ * 估算一条笔画占用的内存(字节)
+ */
+function line_bytes(points) {
+    return read_line(points).count * 8 + UNDO_OPERATION_BYTES;
+}
+
+function calligraphy_bytes(stroke) {
+    return ((stroke && stroke.segments) ? stroke.segments.length : 0) * 128 + UNDO_OPERATION_BYTES;
+}
+
+function erased_bytes(entry) {
+    var bytes = entry.lineType === 'C' ? calligraphy_bytes(entry.calligraphyStroke) : line_bytes(entry.points);
+    var pieces = entry.pieces || [];
+    for (var k = 0; k < pieces.length; k++) bytes += line_bytes(pieces[k]);
+    return bytes;
+}
+
+/**
+ * 估算一条操作引用的笔画数据大小，撤销前后两种状态中较大的一种
+ */
+function operation_bytes(op) {
+    var bytes = UNDO_OPERATION_BYTES;
+    switch (op.type) {
+        case 'add':
+            bytes += op.kind === 'C' ? calligraphy_bytes(op.stroke) : line_bytes(op.points);
+            break;
+        case 'erase':
+        case 'split':
+            for (var b = 0; b < op.batch.length; b++) bytes += erased_bytes(op.batch[b]);
+            break;
+        case 'clear':
+            for (var i = 0; i < op.lines.length; i++) bytes += line_bytes(op.lines[i]);
+            for (var s = 0; s < op.strokes.length; s++) bytes += calligraphy_bytes(op.strokes[s]);
+            break;
+    }
+    return bytes;
+}
+
+/**
+ * 归还操作离开日志后不再被引用的坐标空间
+ * @param {boolean} undone - 操作是否处于已撤销状态(位于重做日志中)
+ */
+function release_operation(op, undone) {
+    if (saveJournal) {
+        // 保存补丁要在保存时读取这些笔画
+        deferredReleases.push({ op: op, undone: undone });
+        return;
+    }
+    var b, k;
+    switch (op.type) {
+        case 'add':
+            // 已撤销的新笔画不在画布上
+            if (undone && op.kind !== 'C') release_line(op.points);
+            break;
+        case 'erase':
+        case 'split':
+            for (b = 0; b < op.batch.length; b++) {
+                var entry = op.batch[b];
+                if (undone) {
+                    // 原笔画已恢复，切开后的部分不再使用
+                    var pieces = entry.pieces || [];
+                    for (k = 0; k < pieces.length; k++) release_line(pieces[k]);
+                } else if (entry.lineType !== 'C') {
+                    release_line(entry.points);
+                }
+            }
+            break;
+        case 'clear':
+            if (!undone) {
+                for (k = 0; k < op.lines.length; k++) release_line(op.lines[k]);
+            }
+            break;
+    }
+}
+
+/**
+ * 记录一条新操作：清空重做日志，超过内存上限时丢弃最早的操作
+ */
+function record_operation(op) {
+    op.id = nextOperationId++;
+    op.bytes = operation_bytes(op);
+    undoLog.push(op);
+    undoLogBytes += op.bytes;
+    undoLogStats.recorded++;
+    journal_operation(op, false);
+    discard_redo_log();
+    trim_undo_log();
+    ts_undo_button.className = "active";
+    return op;
+}
+
+function record_line_added(points, kind) {
+    return record_operation({ type: 'add', kind: kind, points: points, index: arrays_of_points.length - 1 });
+}
+
+function record_calligraphy_added(stroke) {
+    return record_operation({ type: 'add', kind: 'C', stroke: stroke, index: strokes.length - 1 });
+}
+
+/**
+ * 记录橡皮擦一次删除的笔画，包含切开的笔画时记为split
+ * @param {Array} batch - erase_along_path等返回的删除记录，按删除顺序排列
+ */
+function record_erase_batch(batch) {
+    var split = batch.some(function(entry) { return !!entry.pieces; });
+    return record_operation({ type: split ? 'split' : 'erase', batch: batch });
+}
+
+/**
+ * 放弃重做日志(有新操作时)
+ */
+function discard_redo_log() {
+    for (var i = 0; i < redoLog.length; i++) {
+        undoLogBytes -= redoLog[i].bytes;
+        release_operation(redoLog[i], true);
+    }
+    redoLog = [];
+}
+
+/**
+ * 按内存上限丢弃最早的撤销记录，至少保留最近一条
+ */
+function trim_undo_log() {
+    if (!(undoMemoryLimit > 0)) return;
+    var limit = undoMemoryLimit * 1024 * 1024;
+    var drop = 0;
+    while (undoLogBytes > limit && drop < undoLog.length - 1) {
+        undoLogBytes -= undoLog[drop].bytes;
+        release_operation(undoLog[drop], false);
+        drop++;
+    }
+    if (drop) {
+        undoLog.splice(0, drop);
+        undoLogStats.dropped += drop;
+    }
+}
+
+/**
+ * 移除一条刚新增的笔画的记录(例如被识别为误触的点)，笔画本身由调用方处理
+ */
+function forget_line_added(points) {
+    var op = undoLog[undoLog.length - 1];
+    if (op && op.type === 'add' && op.points === points) {
+        undoLog.pop();
+        undoLogBytes -= op.bytes;
+        var last = saveJournal && saveJournal[saveJournal.length - 1];
+        if (last && last.op === op) {
+            saveJournal.pop();
+        } else {
+            saveJournal = null;
+        }
+    }
+}
+
+/**
+ * 清空撤销和重做日志(载入笔迹或切换卡片时)，日志中的笔画视图随笔画存储一起失效
+ */
+function reset_undo_log() {
+    undoLog = [];
+    redoLog = [];
+    undoLogBytes = 0;
+    savedOperationId = 0;
+    saveJournal = null;
+    // 存储已重置时旧视图的归还不起作用
+    flush_deferred_releases();
+}
+
+/**
+ * 归还推迟到保存之后的坐标空间
+ */
+function flush_deferred_releases() {
+    var pending = deferredReleases;
+    deferredReleases = [];
+    var journal = saveJournal;
+    saveJournal = null;
+    for (var i = 0; i < pending.length; i++) release_operation(pending[i].op, pending[i].undone);
+    saveJournal = journal;
+}
+
+/**
+ * 取出下标附近的普通笔画；撤销新增笔画时它通常就在末尾
+ */
+function take_line(index, points) {
+    var i = arrays_of_points[index] === points ? index : arrays_of_points.lastIndexOf(points);
+    if (i < 0) return i;
+    if (i === arrays_of_points.length - 1) {
+        arrays_of_points.pop();
+        perfect_cache.pop();
+    } else {
+        arrays_of_points.splice(i, 1);
+        perfect_cache.splice(i, 1);
+    }
+    mark_line_removed(i, points);
+    return i;
+}
+
+function take_calligraphy(index, stroke) {
+    var i = strokes[index] === stroke ? index : strokes.lastIndexOf(stroke);
+    if (i < 0) return i;
+    strokes.splice(i, 1);
+    mark_calligraphy_removed(i, stroke);
+    return i;
+}
+
+/**
+ * 执行操作的逆操作
+ * @returns {number} 撤销新增笔画时笔画实际所在的位置，找不到时为-1
+ */
+function revert_operation(op) {
+    switch (op.type) {
+        case 'add':
+            if (op.kind === 'C') {
+                return take_calligraphy(op.index, op.stroke);
+            }
+            return take_line(op.index, op.points);
+        case 'erase':
+        case 'split':
+            // 按删除的相反顺序恢复到原来的位置
+            for (var b = op.batch.length - 1; b >= 0; b--) {
+                restore_erased_stroke(op.batch[b]);
+            }
+            break;
+        case 'clear':
+            // 复制一份，重做再次清空后原数组仍保存清空前的笔画
+            replace_all_strokes(op.lines.slice(), op.perfectCache.slice(), op.strokes.slice());
+            if (op.baked) set_baked_layer_visible(true);
+            break;
+    }
+}
+
+/**
+ * 重新执行已撤销的操作
+ */
+function apply_operation(op) {
+    switch (op.type) {
+        case 'add':
+            if (op.kind === 'C') {
+                strokes.splice(op.index, 0, op.stroke);
+                mark_calligraphy_inserted(op.index, op.stroke);
+            } else {
+                arrays_of_points.splice(op.index, 0, op.points);
+                perfect_cache.splice(op.index, 0, null);
+                mark_line_inserted(op.index, op.points);
+            }
+            break;
+        case 'erase':
+        case 'split':
+            for (var b = 0; b < op.batch.length; b++) {
+                remove_erased_stroke(op.batch[b]);
+            }
+            break;
+        case 'clear':
+            replace_all_strokes([], [], []);
+            set_baked_layer_visible(false);
+            break;
+    }
+}
+
+/**
+ * 撤销最近一条操作
+ * @returns {Object|null} 被撤销的操作
+ */
+function undo_operation() {
+    var op = undoLog.pop();
+    if (!op) return null;
+    journal_operation(op, true, revert_operation(op));
+    redoLog.push(op);
+    undoLogStats.undone++;
+    return op;
+}
+
+/**
+ * 重做最近撤销的操作
+ * @returns {Object|null} 被重做的操作
+ */
+function redo_operation() {
+    var op = redoLog.pop();
+    if (!op) return null;
+    apply_operation(op);
+    journal_operation(op, false);
+    undoLog.push(op);
+    undoLogStats.redone++;
+    return op;
+}
+
+/**
+ * 当前状态与上次保存时是否不同
+ */
+function undo_log_dirty() {
+    var top = undoLog[undoLog.length - 1];
+    return (top ? top.id : 0) !== savedOperationId;
+}
+
+/**
+ * 保存后记录日志位置
+ */
+function mark_undo_log_saved() {
+    var top = undoLog[undoLog.length - 1];
+    savedOperationId = top ? top.id : 0;
+    flush_deferred_releases();
+    saveJournal = [];
+    saveBase = { lines: arrays_of_points.length, strokes: strokes.length };
+}
+
+/**
+ * 把执行、撤销或重做的操作记入保存日志。
+ * 被删除笔画的点数在记录时读取，之后笔画可能随日志裁剪被释放
+ * @param {boolean} undone - 是否为撤销
+ * @param {number} [index] - 撤销新增笔画时笔画实际所在的位置
+ */
+function journal_operation(op, undone, index) {
+    if (!saveJournal) return;
+    if (op.type === 'clear' && undone) {
+        // 恢复清空前的全部笔画，不如直接保存完整数据
+        saveJournal = null;
+        return;
+    }
+    var entry = { op: op, undone: undone, index: index, counts: [] };
+    if (op.type === 'add' && undone && op.kind !== 'C') {
+        entry.counts.push(index >= 0 ? read_line(op.points).count : 0);
+    } else if (op.type === 'erase' || op.type === 'split') {
+        for (var b = 0; b < op.batch.length; b++) {
+            var erased = op.batch[b];
+            var lines = undone ? (erased.pieces || []) : (erased.lineType === 'C' ? [] : [erased.points]);
+            entry.counts.push(lines.map(function(points) { return read_line(points).count; }));
+        }
+    }
+    saveJournal.push(entry);
+}
+
+/**
+ * 把保存日志转换为对上次保存的笔迹文件的补丁，顺序与remove_erased_stroke/restore_erased_stroke一致
+ * @returns {Object|null} {base, result, changes}，无法用补丁表示时返回null
+ */
+function build_save_patch() {
+    // 正在书写的笔画还会继续变化，这时保存完整数据
+    if (!saveJournal || !saveBase || liveLineIndex >= 0) return null;
+    var changes = [];
+    var intact = true;
+    var insertLine = function(index, points) {
+        var json = lines_to_json([points])[0];
+        // 笔画的坐标空间已被归还时补丁不完整(Python端也会拒绝)，改为保存完整数据
+        if (!json.length) intact = false;
+        changes.push({ op: 'insert_line', index: index, points: json });
+    };
+    var insertStroke = function(index, stroke) {
+        changes.push({ op: 'insert_stroke', index: index, stroke: JSON.parse(JSON.stringify(stroke)) });
+    };
+    for (var n = 0; n < saveJournal.length; n++) {
+        var entry = saveJournal[n], op = entry.op;
+        switch (op.type) {
+            case 'add':
+                if (!entry.undone) {
+                    if (op.kind === 'C') {
+                        insertStroke(op.index, op.stroke);
+                    } else {
+                        insertLine(op.index, op.points);
+                    }
+                } else if (entry.index >= 0) {
+                    if (op.kind === 'C') {
+                        changes.push({ op: 'remove_stroke', index: entry.index });
+                    } else {
+                        changes.push({ op: 'remove_line', index: entry.index, count: entry.counts[0] });
+                    }
+                }
+                break;
+            case 'erase':
+            case 'split':
+                if (!entry.undone) {
+                    for (var b = 0; b < op.batch.length; b++) {
+                        var erased = op.batch[b];
+                        if (erased.lineType === 'C') {
+                            changes.push({ op: 'remove_stroke', index: erased.index });
+                            continue;
+                        }
+                        changes.push({ op: 'remove_line', index: erased.index, count: entry.counts[b][0] });
+                        var pieces = erased.pieces || [];
+                        for (var k = 0; k < pieces.length; k++) insertLine(erased.index + k, pieces[k]);
+                    }
+                } else {
+                    for (var b = op.batch.length - 1; b >= 0; b--) {
+                        var erased = op.batch[b];
+                        var pieces = erased.pieces || [];
+                        for (var k = pieces.length - 1; k >= 0; k--) {
+                            changes.push({ op: 'remove_line', index: erased.index + k, count: entry.counts[b][k] });
+                        }
+                        if (erased.lineType === 'C') {
+                            insertStroke(erased.index, erased.calligraphyStroke);
+                        } else {
+                            insertLine(erased.index, erased.points);
+                        }
+                    }
+                }
+                break;
+            case 'clear':
+                changes.push({ op: 'clear' });
+                break;
+        }
+    }
+    if (!intact) {
+        console.log('AnkiDraw Debug: 保存补丁引用了已释放的笔画，改为保存完整数据');
+        return null;
+    }
+    return {
+        base: saveBase,
+        result: { lines: arrays_of_points.length, strokes: strokes.length },
+        changes: changes
+    };
+}
+
+/**
+ * 按新增顺序列出撤销日志中仍在画布上的笔画类型('L'、'R'或'C')，
+ * 以line_type_history保存，载入后可以继续撤销这些笔画
+ */
+function undo_log_kinds() {
+    var kinds = [];
+    for (var i = 0; i < undoLog.length; i++) {
+        if (undoLog[i].type === 'add') kinds.push(undoLog[i].kind);
+    }
+    return kinds;
+}
+
+/**
+ * 根据保存的line_type_history为载入的笔画重建新增记录。
+ * 历史记录对应最后新增的若干条笔画，更早的笔画不能撤销；旧数据中的'E'没有对应的笔画，直接跳过
+ * @param {Array} kinds - 保存的line_type_history
+ */
+function seed_undo_log(kinds) {
+    reset_undo_log();
+    kinds = kinds || [];
+    var lineKinds = 0, strokeKinds = 0;
+    for (var k = 0; k < kinds.length; k++) {
+        if (kinds[k] === 'C') {
+            strokeKinds++;
+        } else if (kinds[k] === 'L' || kinds[k] === 'R') {
+            lineKinds++;
+        }
+    }
+    var nextLineIndex = Math.max(0, arrays_of_points.length - lineKinds);
+    var nextStrokeIndex = Math.max(0, strokes.length - strokeKinds);
+    for (var k = 0; k < kinds.length; k++) {
+        var op = null;
+        if (kinds[k] === 'C') {
+            if (nextStrokeIndex < strokes.length) {
+                op = { type: 'add', kind: 'C', stroke: strokes[nextStrokeIndex], index: nextStrokeIndex };
+            }
+            nextStrokeIndex++;
+        } else if (kinds[k] === 'L' || kinds[k] === 'R') {
+            if (nextLineIndex < arrays_of_points.length) {
+                op = { type: 'add', kind: kinds[k], points: arrays_of_points[nextLineIndex], index: nextLineIndex };
+            }
+            nextLineIndex++;
+        }
+        if (!op) continue;
+        op.id = nextOperationId++;
+        op.bytes = operation_bytes(op);
+        undoLog.push(op);
+        undoLogBytes += op.bytes;
+    }
+    trim_undo_log();
+    mark_undo_log_saved();
+}
+
+/**
+ * 获取撤销日志的统计信息，用于诊断
+ */
+function get_undo_log_stats() {
+    var stats = Object.assign({}, undoLogStats);
+    stats.undo = undoLog.length;
+    stats.redo = redoLog.length;
+    stats.bytes = undoLogBytes;
+    return stats;
+}
@@ -266,7 +266,7 @@ def apply_toolbar_config(editor=None, html=None):
     # 清除按钮没有ID，所以需要通过其他方式选择
     js_code += f"""
     // 清除画布按钮 (通过标题属性查找)
-    const btnClear = Array.from(toolbar.querySelectorAll('button[title*=\"Clean canvas\"]'))[0];
+    const btnClear = Array.from(toolbar.querySelectorAll('button[data-i18n-title=\"tooltip_clean_canvas\"]'))[0];
     if (btnClear) btnClear.style.display = {str(toolbar_buttons_config['clear']).lower()} ? 'block' : 'none';
     
     """